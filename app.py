@@ -14,10 +14,13 @@ from __future__ import annotations
 
 from typing import Dict, Any
 
-from flask import Flask, app, redirect, url_for, render_template_string, session, request
-import datetime 
+from flask import Flask, app, redirect, url_for, render_template, session, request
 from config import Config
 import db
+import metrics
+from billing_logic import is_invoice_locked
+from profiling import RequestProfiler
+from templating import INLINE_TEMPLATES, init_templates, render_inline_template
 
 
 def create_app() -> Flask:
@@ -27,6 +30,16 @@ def create_app() -> Flask:
     # Inisialisasi koneksi Postgres
     db.init_app(app)
 
+    # Template inline (layout + body_html) dikompilasi sekali per proses
+    init_templates(app)
+
+    # Timing per request (Server-Timing + histogram /admin/profiling).
+    # Didaftarkan sebelum hook lain supaya seluruh request ikut terukur.
+    RequestProfiler(app)
+
+    # Metrik Prometheus: latency per endpoint + route /metrics
+    metrics.init_app(app)
+
     # Nanti di sini kita register blueprint:
     from blueprints import (
         auth_reseller,
@@ -38,6 +51,8 @@ def create_app() -> Flask:
         reports,
         admin,
         petugas,
+        jobs,
+        ppp_events,
     )
 
     app.register_blueprint(auth_reseller.bp)
@@ -49,6 +64,8 @@ def create_app() -> Flask:
     app.register_blueprint(reports.bp)
     app.register_blueprint(admin.bp)
     app.register_blueprint(petugas.bp)
+    app.register_blueprint(jobs.bp)
+    app.register_blueprint(ppp_events.bp)
 
     @app.route("/")
     def index():
@@ -158,28 +175,16 @@ def create_app() -> Flask:
         if not reseller_id:
             return
 
-        # Cek invoice bulan ini
-        today = datetime.date.today()
-        current_period_start = today.replace(day=1)
-
+        # Cek invoice bulan ini (keputusan di-cache per reseller,
+        # diinvalidasi saat invoice dibuat / ditandai paid)
         try:
-            invoice = db.query_one(
-                """
-                SELECT *
-                FROM v_reseller_invoices
-                WHERE reseller_id = %(rid)s
-                  AND period_start = %(ps)s
-                ORDER BY period_start DESC
-                LIMIT 1
-                """,
-                {"rid": reseller_id, "ps": current_period_start},
-            )
+            locked = is_invoice_locked(reseller_id)
         except Exception as e:
             print(f"[check_invoice_lock_global] gagal ambil invoice: {e}")
             return
 
         # Kondisi lock: belum bayar & lewat tanggal 10
-        if invoice and invoice["status"] != "paid" and today.day > 10:
+        if locked:
             return redirect(url_for("main.dashboard"))
 
         # kalau tidak locked, lanjut normal
@@ -190,22 +195,9 @@ def create_app() -> Flask:
 
 
 
-def render_terminal_page(title: str, body_html: str, context: Dict[str, Any] | None = None) -> str:
-    """
-    Helper untuk merender HTML dengan tema baru (dark + Tailwind).
-    body_html tetap di-render sebagai template Jinja, lalu disisipkan
-    ke dalam base layout sebagai {{ body|safe }}.
-    """
-    from flask import render_template_string, url_for, request, session  # pastikan import ini ada / sesuai
-
-    if context is None:
-        context = {}
-
-    # 1) render isi body (inner template)
-    body_rendered = render_template_string(body_html, **context)
-
-    # 2) template utama (frame Tailwind, navbar di atas)
-    base_template = r"""
+# Base layout semua halaman reseller/admin, didaftarkan sekali ke loader
+# (lihat templating.py) supaya tidak di-compile ulang tiap request.
+TERMINAL_LAYOUT = INLINE_TEMPLATES.add("layout/terminal.html", r"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -321,8 +313,23 @@ def render_terminal_page(title: str, body_html: str, context: Dict[str, Any] | N
   </script>
 </body>
 </html>
-""" 
-    return render_template_string(base_template, title=title, body=body_rendered, **context)
+""")
+
+
+def render_terminal_page(title: str, body_html: str, context: Dict[str, Any] | None = None) -> str:
+    """
+    Helper untuk merender HTML dengan tema baru (dark + Tailwind).
+    body_html tetap di-render sebagai template Jinja, lalu disisipkan
+    ke dalam base layout (layout/terminal.html) sebagai {{ body|safe }}.
+    """
+    if context is None:
+        context = {}
+
+    # 1) render isi body (inner template)
+    body_rendered = render_inline_template(body_html, **context)
+
+    # 2) template utama (frame Tailwind, navbar di atas)
+    return render_template(TERMINAL_LAYOUT, title=title, body=body_rendered, **context)
 
 
 # Jalankan langsung: python app.py
@@ -0,0 +1,91 @@
+"""
+auth.py
+-------
+Helper bersama untuk reseller yang sedang login.
+
+Sebelumnya tiap blueprint punya _require_login sendiri yang SELECT row
+resellers di setiap request (kadang lebih dari sekali per request).
+Sekarang:
+- row reseller di-load sekali per request dan disimpan di flask.g
+- antar request, row disimpan di TTLCache "reseller" (umur pendek)
+- perubahan data reseller (settings, aktif/nonaktif oleh admin) wajib
+  memanggil invalidate_reseller() supaya semua worker membaca ulang
+
+Menyediakan:
+- load_reseller(reseller_id)     -> dict | None
+- get_logged_in_reseller()       -> dict | None (dari session["reseller_id"])
+- invalidate_reseller(reseller_id)
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from flask import g, has_app_context, session
+
+import cache
+import db
+from config import Config
+
+_RESELLER_SQL = """
+SELECT id, display_name, router_username, router_password,
+       wa_number, email,
+       use_notifications, use_auto_payment,
+       isolation_mode,
+       is_active
+FROM resellers
+WHERE id = %(rid)s
+"""
+
+_reseller_cache = cache.TTLCache("reseller", max_ttl=Config.RESELLER_CACHE_TTL)
+
+
+def load_reseller(reseller_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Ambil row reseller (kolom _RESELLER_SQL) berdasarkan id.
+
+    Urutan: flask.g (request ini) -> TTLCache -> database.
+    Yang dikembalikan selalu salinan, jadi aman diubah oleh pemanggil.
+    """
+    per_request: Dict[int, Optional[Dict[str, Any]]] | None = None
+    if has_app_context():
+        per_request = g.setdefault("_resellers", {})
+        if reseller_id in per_request:
+            row = per_request[reseller_id]
+            return dict(row) if row is not None else None
+
+    row = _reseller_cache.get(reseller_id)
+    if row is cache.MISSING:
+        row = db.query_one(_RESELLER_SQL, {"rid": reseller_id})
+        if row is not None:
+            _reseller_cache.set(reseller_id, row)
+
+    if per_request is not None:
+        per_request[reseller_id] = row
+    return dict(row) if row is not None else None
+
+
+def get_logged_in_reseller() -> Optional[Dict[str, Any]]:
+    """
+    Reseller dari session["reseller_id"].
+    Kalau tidak ada / sudah non-aktif: session dibersihkan, return None.
+    """
+    reseller_id = session.get("reseller_id")
+    if not reseller_id:
+        return None
+
+    reseller = load_reseller(reseller_id)
+    if reseller is None or not reseller["is_active"]:
+        session.clear()
+        return None
+
+    return reseller
+
+
+def invalidate_reseller(reseller_id: int) -> None:
+    """
+    Buang row reseller dari cache request ini dan cache semua proses.
+    """
+    if has_app_context():
+        g.get("_resellers", {}).pop(reseller_id, None)
+    cache.invalidate("reseller", reseller_id)
@@ -0,0 +1,195 @@
+# bench/generate_reseller_invoices.py
+"""
+Benchmark generate invoice reseller: loop per reseller (cara lama, 3 query
+per reseller) vs satu INSERT ... SELECT ... RETURNING
+(billing_logic.generate_reseller_invoices_for_current_period).
+
+Butuh Postgres (DATABASE_URL). Semua tabel dibuat di schema sementara
+"bench_invoices" yang di-DROP di akhir, jadi data asli tidak tersentuh.
+Jalankan dari root repo:
+  python -m bench.generate_reseller_invoices [--resellers 10000] [--users 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+import db
+from billing_logic import add_months, generate_reseller_invoices_for_current_period
+from config import Config
+
+SCHEMA = "bench_invoices"
+
+SCHEMA_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path TO {SCHEMA};
+
+CREATE TYPE invoice_status AS ENUM ('pending', 'paid', 'overdue');
+
+CREATE TABLE resellers (
+    id                serial PRIMARY KEY,
+    display_name      text    NOT NULL,
+    wa_number         text,
+    is_active         boolean NOT NULL DEFAULT TRUE,
+    use_notifications boolean NOT NULL DEFAULT FALSE,
+    use_auto_payment  boolean NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE ppp_customers (
+    id          serial PRIMARY KEY,
+    reseller_id integer NOT NULL REFERENCES resellers(id),
+    is_enabled  boolean NOT NULL DEFAULT TRUE
+);
+CREATE INDEX ON ppp_customers (reseller_id);
+
+CREATE TABLE reseller_invoices (
+    id                  serial PRIMARY KEY,
+    reseller_id         integer NOT NULL REFERENCES resellers(id),
+    period_start        date    NOT NULL,
+    period_end          date    NOT NULL,
+    total_enabled_users integer NOT NULL,
+    price_per_user      integer NOT NULL,
+    total_amount        bigint  NOT NULL,
+    use_notifications   boolean NOT NULL,
+    use_auto_payment    boolean NOT NULL,
+    status              invoice_status NOT NULL,
+    due_date            date    NOT NULL,
+    created_at          timestamptz NOT NULL,
+    updated_at          timestamptz NOT NULL
+);
+CREATE UNIQUE INDEX reseller_invoices_reseller_period_uniq
+    ON reseller_invoices (reseller_id, period_start);
+"""
+
+
+def _seed(n_resellers: int, users_per_reseller: int) -> None:
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            INSERT INTO resellers (display_name, wa_number, use_notifications, use_auto_payment)
+            SELECT 'Reseller ' || g, '62812' || g, g % 3 > 0, g % 3 = 2
+            FROM generate_series(1, %(n)s) g
+            """,
+            {"n": n_resellers},
+        )
+        cur.execute(
+            """
+            INSERT INTO ppp_customers (reseller_id, is_enabled)
+            SELECT r.id, u % 10 > 0
+            FROM resellers r, generate_series(1, %(u)s) u
+            """,
+            {"u": users_per_reseller},
+        )
+        cur.execute("ANALYZE")
+
+
+def _legacy_loop(period_start: datetime.date) -> int:
+    """Cara lama: cek exist + COUNT(*) + INSERT per reseller."""
+    period_end = add_months(period_start, 1) - datetime.timedelta(days=1)
+    due = period_start + datetime.timedelta(days=10)
+    created = 0
+    for r in db.query_all(
+        "SELECT id, use_notifications, use_auto_payment FROM resellers WHERE is_active = TRUE"
+    ):
+        price = 250
+        if r["use_notifications"] and not r["use_auto_payment"]:
+            price = 500
+        elif r["use_notifications"] and r["use_auto_payment"]:
+            price = 1000
+
+        if db.query_one(
+            "SELECT 1 FROM reseller_invoices WHERE reseller_id=%(rid)s AND period_start=%(ps)s",
+            {"rid": r["id"], "ps": period_start},
+        ):
+            continue
+        count = db.query_one(
+            "SELECT COUNT(*) AS c FROM ppp_customers WHERE reseller_id=%(rid)s AND is_enabled=TRUE",
+            {"rid": r["id"]},
+        )["c"]
+        db.execute(
+            """
+            INSERT INTO reseller_invoices
+                (reseller_id, period_start, period_end, total_enabled_users, price_per_user,
+                 total_amount, use_notifications, use_auto_payment, status, due_date,
+                 created_at, updated_at)
+            VALUES (%(rid)s, %(ps)s, %(pe)s, %(c)s, %(p)s, %(t)s, %(n)s, %(a)s,
+                    'pending', %(due)s, NOW(), NOW())
+            """,
+            {
+                "rid": r["id"], "ps": period_start, "pe": period_end, "c": count,
+                "p": price, "t": count * price, "n": r["use_notifications"],
+                "a": r["use_auto_payment"], "due": due,
+            },
+        )
+        created += 1
+    return created
+
+
+def _timed(label: str, fn) -> None:
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:28s}: {elapsed * 1000:9.1f} ms  ({result} invoice)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resellers", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=20, help="user per reseller")
+    args = parser.parse_args()
+
+    if not Config.DATABASE_URL:
+        print("DATABASE_URL belum diset.")
+        return 1
+
+    # semua query bench (termasuk billing_logic) jalan di schema sementara
+    dsn = make_dsn(Config.DATABASE_URL, options=f"-c search_path={SCHEMA}")
+    db.init_app(SimpleNamespace(config={"DATABASE_URL": dsn}))
+
+    with psycopg2.connect(Config.DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+
+    try:
+        _seed(args.resellers, args.users)
+        print(f"{args.resellers} reseller, {args.users} user per reseller")
+
+        month_a = datetime.date.today().replace(day=1)
+        month_b = add_months(month_a, -1)
+        month_c = add_months(month_a, -2)
+
+        _timed("lama (loop per reseller)", lambda: _legacy_loop(month_b))
+        _timed("baru (satu statement)", lambda: len(generate_reseller_invoices_for_current_period(month_a)))
+        _timed("baru, dijalankan ulang", lambda: len(generate_reseller_invoices_for_current_period(month_a)))
+
+        # dua run bersamaan: total invoice yang dikembalikan harus = jumlah reseller
+        results: list[int] = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(len(generate_reseller_invoices_for_current_period(month_c)))
+            )
+            for _ in range(2)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(f"{'2 run paralel':28s}: {results} invoice (total {sum(results)})")
+    finally:
+        db.close_all()
+        with psycopg2.connect(Config.DATABASE_URL) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
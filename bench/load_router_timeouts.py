@@ -0,0 +1,187 @@
+# bench/load_router_timeouts.py
+"""
+Load test mode serving gunicorn saat sebagian router timeout.
+
+Skenario:
+- router palsu (HTTP lokal) meniru /rest/system/resource; 10% request
+  (user "slow") tidak dijawab sampai melewati timeout client
+- app uji memanggil mikrotik_client._request seperti main.dashboard
+- gunicorn dijalankan dua kali:
+    sync    : perintah lama (1 worker sync, tanpa config)
+    gthread : gunicorn.conf.py (profil produksi)
+- N client paralel menembak app selama D detik
+
+Tidak butuh database. Jalankan dari root repo:
+  python -m bench.load_router_timeouts [--duration 20] [--clients 40]
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from flask import Flask
+
+from mikrotik_client import MikrotikError, _request
+
+SLOW_EVERY = 10          # 1 dari 10 router timeout
+ROUTER_TIMEOUT = 2       # timeout client ke router di app uji (detik)
+ROUTER_HANG = 5          # router "mati" menahan koneksi selama ini (detik)
+
+
+# ======================================================================
+# App uji (dijalankan gunicorn)
+# ======================================================================
+
+def create_probe_app() -> Flask:
+    app = Flask(__name__)
+    router_host = os.environ["BENCH_ROUTER_HOST"]
+
+    @app.route("/probe/<int:n>")
+    def probe(n: int):
+        user = "slow" if n % SLOW_EVERY == 0 else "fast"
+        try:
+            data = _request("GET", router_host, "/system/resource", user, "x", timeout=ROUTER_TIMEOUT)
+            return {"ok": True, "cpu": data.get("cpu-load")}
+        except MikrotikError as e:
+            # seperti dashboard: halaman tetap tampil dengan router_error
+            return {"ok": False, "error": str(e)}
+
+    return app
+
+
+# ======================================================================
+# Router palsu
+# ======================================================================
+
+class _FakeRouter(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if "Basic c2xvdzp4" in (self.headers.get("Authorization") or ""):  # slow:x
+            time.sleep(ROUTER_HANG)
+        body = b'{"cpu-load": "3", "uptime": "1d"}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except BrokenPipeError:
+            pass  # client sudah timeout duluan
+
+    def log_message(self, *args):
+        pass
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# ======================================================================
+# Runner
+# ======================================================================
+
+def _start_gunicorn(profile: str, port: int, env: dict) -> subprocess.Popen:
+    target = "bench.load_router_timeouts:create_probe_app()"
+    if profile == "sync":
+        # cwd lain: gunicorn otomatis membaca ./gunicorn.conf.py kalau ada
+        cmd = ["gunicorn", "-b", f"127.0.0.1:{port}", target]
+        cwd = tempfile.gettempdir()
+    else:
+        cmd = ["gunicorn", "-c", os.path.abspath("gunicorn.conf.py"), target]
+        env = dict(env, GUNICORN_BIND=f"127.0.0.1:{port}")
+        cwd = None
+    proc = subprocess.Popen(cmd, env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            requests.get(f"http://127.0.0.1:{port}/probe/1", timeout=ROUTER_HANG + 2)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"gunicorn ({profile}) tidak start")
+
+
+def _load(port: int, duration: float, clients: int) -> dict:
+    stop_at = time.time() + duration
+    counter = iter(range(10**9))
+    lock = threading.Lock()
+    fast_latencies: list[float] = []
+    done = 0
+
+    def client() -> None:
+        nonlocal done
+        sess = requests.Session()
+        while time.time() < stop_at:
+            with lock:
+                n = next(counter)
+            started = time.perf_counter()
+            try:
+                sess.get(f"http://127.0.0.1:{port}/probe/{n}", timeout=60)
+            except requests.RequestException:
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                done += 1
+                if n % SLOW_EVERY:
+                    fast_latencies.append(elapsed)
+
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        for _ in range(clients):
+            ex.submit(client)
+
+    fast_latencies.sort()
+    return {
+        "rps": done / duration,
+        "p50": statistics.median(fast_latencies) * 1000 if fast_latencies else float("nan"),
+        "p95": fast_latencies[int(len(fast_latencies) * 0.95)] * 1000 if fast_latencies else float("nan"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--clients", type=int, default=40)
+    parser.add_argument("--profiles", default="sync,gthread")
+    args = parser.parse_args()
+
+    router_port = _free_port()
+    router = ThreadingHTTPServer(("127.0.0.1", router_port), _FakeRouter)
+    router.daemon_threads = True
+    threading.Thread(target=router.serve_forever, daemon=True).start()
+
+    env = dict(os.environ, BENCH_ROUTER_HOST=f"127.0.0.1:{router_port}")
+    env["PYTHONPATH"] = os.getcwd() + os.pathsep + env.get("PYTHONPATH", "")
+
+    print(f"{args.clients} client, {args.duration:.0f} detik, 1/{SLOW_EVERY} router timeout ({ROUTER_TIMEOUT}s)")
+    for profile in args.profiles.split(","):
+        port = _free_port()
+        proc = _start_gunicorn(profile, port, env)
+        try:
+            r = _load(port, args.duration, args.clients)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        print(
+            f"{profile:8s}: {r['rps']:7.1f} req/s | router sehat p50 {r['p50']:7.1f} ms, p95 {r['p95']:7.1f} ms"
+        )
+
+    router.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+# bench/render_terminal_page.py
+"""
+Benchmark render_terminal_page: compile sekali (loader + cache) vs
+render_template_string per request (cara lama).
+
+Tidak butuh database / router. Jalankan dari root repo:
+  python -m bench.render_terminal_page [--n 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+
+from flask import Flask, render_template_string
+
+from app import TERMINAL_LAYOUT, render_terminal_page
+from templating import INLINE_TEMPLATES, init_templates
+
+# Body tipikal halaman list: tabel 20 baris + filter + pagination
+BODY_HTML = """
+<div class="space-y-3">
+  <form method="get" class="flex gap-2 text-[13px]">
+    <input name="q" value="{{ q }}" class="rounded-md border border-slate-700 bg-slate-900 px-2 py-1">
+    <select name="status" class="rounded-md border border-slate-700 bg-slate-900 px-2 py-1">
+      {% for s in ['all', 'paid', 'unpaid', 'isolated', 'disabled'] %}
+      <option value="{{ s }}" {% if s == status_filter %}selected{% endif %}>{{ s }}</option>
+      {% endfor %}
+    </select>
+  </form>
+  <table class="w-full text-[12px]">
+    <thead><tr><th>User</th><th>Nama</th><th>Profile</th><th>Harga</th><th>Status</th></tr></thead>
+    <tbody>
+    {% for c in customers %}
+      <tr class="border-t border-slate-800">
+        <td class="font-mono">{{ c.ppp_username }}</td>
+        <td>{{ c.full_name or '-' }}</td>
+        <td>{{ c.profile_name or '-' }}</td>
+        <td>Rp {{ '{:,.0f}'.format(c.monthly_price or 0) }}</td>
+        <td>
+          {% if c.payment_status_text == 'paid_current_period' %}
+            <span class="text-emerald-300">Lunas</span>
+          {% elif c.payment_status_text == 'isolated' %}
+            <span class="text-rose-300">Isolir</span>
+          {% else %}
+            <span class="text-amber-300">Belum bayar</span>
+          {% endif %}
+        </td>
+      </tr>
+    {% endfor %}
+    </tbody>
+  </table>
+  <div class="text-[12px]">Halaman {{ page }} / {{ total_pages }}</div>
+</div>
+"""
+
+
+def _context() -> dict:
+    customers = [
+        {
+            "ppp_username": f"user{i:03d}",
+            "full_name": f"Pelanggan {i}",
+            "profile_name": "10M",
+            "monthly_price": 150000,
+            "payment_status_text": ("paid_current_period", "unpaid_current_period", "isolated")[i % 3],
+        }
+        for i in range(20)
+    ]
+    return {"customers": customers, "q": "", "status_filter": "all", "page": 1, "total_pages": 5}
+
+
+def _render_old(title: str, body_html: str, context: dict) -> str:
+    body = render_template_string(body_html, **context)
+    layout = INLINE_TEMPLATES.get_source(None, TERMINAL_LAYOUT)[0]
+    return render_template_string(layout, title=title, body=body, **context)
+
+
+def _timeit(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config["SECRET_KEY"] = "bench"
+    app.config["TEMPLATE_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench-jinja-")
+    init_templates(app)
+    ctx = _context()
+
+    with app.test_request_context("/customers"):
+        old_html = _render_old("Customers", BODY_HTML, ctx)
+        new_html = render_terminal_page("Customers", BODY_HTML, ctx)
+        assert old_html == new_html, "output lama & baru berbeda"
+
+        # data dari context (query string, nama customer, ...) harus di-escape
+        xss = "<script>alert(1)</script>"
+        escaped = render_terminal_page("Customers", BODY_HTML, {**ctx, "q": xss})
+        assert xss not in escaped, "autoescape mati: input HTML tercetak mentah"
+        assert "&lt;script&gt;alert(1)&lt;/script&gt;" in escaped, "input tidak di-escape"
+
+        old_ms = _timeit(lambda: _render_old("Customers", BODY_HTML, ctx), args.n)
+        new_ms = _timeit(lambda: render_terminal_page("Customers", BODY_HTML, ctx), args.n)
+
+    print(f"render_template_string (lama) : {old_ms:.3f} ms/request")
+    print(f"loader + cache (baru)         : {new_ms:.3f} ms/request")
+    print(f"speedup                       : {old_ms / new_ms:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# bench/router_sync.py
+"""
+Benchmark sinkron customer dari router (router_sync.sync_customers_job):
+COPY ke temp table + satu INSERT ... ON CONFLICT DO UPDATE ... WHERE berubah.
+
+Router dipalsukan (daftar /ppp/secret dibuat di memori), jadi yang diukur
+hanya sisi DB. Butuh Postgres (DATABASE_URL). Semua tabel dibuat di schema
+sementara "bench_router_sync" yang di-DROP di akhir.
+Jalankan dari root repo:
+  python -m bench.router_sync [--secrets 20000] [--changed 0.05]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from types import SimpleNamespace
+
+import psycopg2
+from psycopg2.extensions import make_dsn
+
+import db
+import router_sync
+from config import Config
+
+SCHEMA = "bench_router_sync"
+
+SCHEMA_SQL = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+SET search_path TO {SCHEMA};
+
+CREATE TABLE resellers (
+    id serial PRIMARY KEY
+);
+
+CREATE TABLE ppp_profiles (
+    id            serial  PRIMARY KEY,
+    reseller_id   integer NOT NULL REFERENCES resellers(id),
+    name          text    NOT NULL,
+    description   text,
+    rate_limit    text,
+    is_isolation  boolean NOT NULL DEFAULT FALSE,
+    monthly_price integer NOT NULL DEFAULT 0,
+    created_at    timestamptz,
+    updated_at    timestamptz,
+    UNIQUE (reseller_id, name)
+);
+
+CREATE TABLE ppp_customers (
+    id                serial  PRIMARY KEY,
+    reseller_id       integer NOT NULL REFERENCES resellers(id),
+    profile_id        integer REFERENCES ppp_profiles(id),
+    ppp_username      text    NOT NULL,
+    ppp_password      text,
+    is_enabled        boolean NOT NULL DEFAULT TRUE,
+    is_isolated       boolean NOT NULL DEFAULT FALSE,
+    router_missing_at timestamptz,
+    created_at        timestamptz,
+    updated_at        timestamptz
+);
+CREATE UNIQUE INDEX ON ppp_customers (reseller_id, ppp_username);
+CREATE INDEX ON ppp_customers (ppp_username);
+
+CREATE TABLE router_commands (
+    id           bigserial PRIMARY KEY,
+    reseller_id  integer NOT NULL,
+    ppp_username text    NOT NULL,
+    status       text    NOT NULL
+);
+
+INSERT INTO resellers DEFAULT VALUES;
+INSERT INTO resellers DEFAULT VALUES;
+INSERT INTO ppp_profiles (reseller_id, name, is_isolation)
+VALUES (1, '10M', FALSE), (1, '20M', FALSE), (1, 'ISOLIR', TRUE);
+"""
+
+
+def _secrets(n: int, changed: float, round_no: int) -> list:
+    step = max(1, int(1 / changed)) if changed > 0 else 0
+    out = []
+    for i in range(n):
+        flip = round_no > 0 and step and i % step == 0
+        out.append({
+            ".id": f"*{i:X}",
+            "name": f"user{i:06d}",
+            "password": f"pw{i}" + ("x" if flip else ""),
+            "profile": "20M" if (i % 2 == 0) != bool(flip) else "10M",
+            "disabled": "true" if i % 50 == 0 else "false",
+        })
+    return out
+
+
+def _run(label: str, secrets: list, mark_missing: bool = False) -> None:
+    router_sync.router_snapshots.fetch = lambda *a, **kw: (
+        secrets, {"from_snapshot": False, "age_seconds": 0.0, "version": None, "error": None},
+    )
+    ctx = SimpleNamespace(
+        reseller_id=1,
+        params={"router_ip": "bench", "mark_missing": mark_missing},
+        summary={},
+        progress=lambda *a, **kw: None,
+        check_cancel=lambda: None,
+    )
+    started = time.perf_counter()
+    router_sync.sync_customers_job(ctx)
+    elapsed = time.perf_counter() - started
+    s = ctx.summary
+    print(
+        f"{label:28s}: {elapsed * 1000:9.1f} ms  (baru {s['ditambahkan']}, "
+        f"update {s['diperbarui']}, sama {s['tidak_berubah']}"
+        + (f", hilang {s.get('ditandai_tidak_ada_di_router', 0)}" if mark_missing else "")
+        + ")"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--secrets", type=int, default=20000)
+    parser.add_argument("--changed", type=float, default=0.05, help="porsi secret yang berubah di run kedua")
+    args = parser.parse_args()
+
+    if not Config.DATABASE_URL:
+        print("DATABASE_URL belum diset.")
+        return 1
+
+    dsn = make_dsn(Config.DATABASE_URL, options=f"-c search_path={SCHEMA}")
+    db.init_app(SimpleNamespace(config={"DATABASE_URL": dsn}))
+    router_sync.load_reseller = lambda rid: {
+        "id": rid, "is_active": True, "router_username": "bench", "router_password": "bench",
+    }
+
+    with psycopg2.connect(Config.DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL)
+
+    try:
+        print(f"{args.secrets} secret, {args.changed:.0%} berubah di run kedua")
+        _run("sinkron pertama (insert)", _secrets(args.secrets, args.changed, 0))
+        _run("ulang tanpa perubahan", _secrets(args.secrets, args.changed, 0))
+        _run("ulang dengan perubahan", _secrets(args.secrets, args.changed, 1))
+        _run("10% secret hilang + tandai", _secrets(args.secrets * 9 // 10, args.changed, 1), mark_missing=True)
+    finally:
+        db.close_all()
+        with psycopg2.connect(Config.DATABASE_URL) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,8 @@ Berisi logika bisnis billing:
 - generate invoice reseller untuk periode berjalan
 - ambil user belum bayar untuk notifikasi/isolate
 - update last_paid_period ketika user bayar N bulan
+- rollover status billing tersimpan saat pergantian periode
+- keputusan lock invoice reseller (di-cache per reseller)
 
 Sebagian logika memanfaatkan view yang sudah dibuat di database:
 - v_customers
@@ -15,10 +17,13 @@ Sebagian logika memanfaatkan view yang sudah dibuat di database:
 
 from __future__ import annotations
 
+import datetime
 from datetime import date
 from typing import Any, Dict, List, Optional
 
+import cache
 import db
+from config import Config
 
 
 # -----------------------------------------------------------------------------
@@ -54,90 +59,185 @@ def add_months(base: date, months: int) -> date:
 # Generate invoice reseller (dipanggil cron tanggal 5)
 # -----------------------------------------------------------------------------
 
-def generate_reseller_invoices_for_current_period() -> int:
-    """
-    Jalankan query generate invoice reseller untuk periode bulan berjalan.
+# Harga per user aktif per bulan, tergantung fitur yang dipakai reseller.
+RESELLER_PRICE_BASIC = 250        # tanpa notifikasi WA (auto payment saja juga tier ini)
+RESELLER_PRICE_NOTIF = 500        # notifikasi WA
+RESELLER_PRICE_NOTIF_AUTO = 1000  # notifikasi WA + auto payment
+
 
-    Mengembalikan jumlah invoice yang berhasil diinsert.
+def generate_reseller_invoices_for_current_period(
+    today: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Buat invoice periode bulan berjalan untuk semua reseller aktif dalam
+    SATU statement (INSERT ... SELECT ... RETURNING).
+
+    - jumlah user enabled dihitung sekali (GROUP BY) untuk semua reseller
+    - reseller tanpa user enabled tetap dapat invoice Rp 0
+    - jatuh tempo = tanggal 1 + INVOICE_LOCK_DAY hari
+    - idempotent: ON CONFLICT (reseller_id, period_start) DO NOTHING
+      (unique index migrations/0003). Kalau dua run berjalan bersamaan,
+      run kedua menunggu commit run pertama lalu melewati row yang sama,
+      jadi setiap invoice hanya dikembalikan ke SATU run.
+
+    Mengembalikan invoice yang BARU dibuat (+ display_name & wa_number
+    reseller) untuk dipakai kirim notifikasi.
     """
+    period_start = (today or date.today()).replace(day=1)
+    period_end = add_months(period_start, 1) - datetime.timedelta(days=1)
+    due_date = period_start + datetime.timedelta(days=INVOICE_LOCK_DAY)
+
     sql = """
-    WITH period AS (
-        SELECT
-            date_trunc('month', CURRENT_DATE)::date AS period_start,
-            (
-                date_trunc('month', CURRENT_DATE)
-                + INTERVAL '1 month - 1 day'
-            )::date AS period_end
-    ),
-    enabled_counts AS (
+    WITH enabled_counts AS (
         SELECT
             reseller_id,
             COUNT(*) AS total_enabled_users
         FROM ppp_customers
         WHERE is_enabled = TRUE
         GROUP BY reseller_id
-    )
-    INSERT INTO reseller_invoices (
-        reseller_id,
-        period_start,
-        period_end,
-        total_enabled_users,
-        price_per_user,
-        total_amount,
-        use_notifications,
-        use_auto_payment,
-        status,
-        due_date,
-        created_at,
-        updated_at
+    ),
+    priced AS (
+        SELECT
+            r.id AS reseller_id,
+            COALESCE(ec.total_enabled_users, 0) AS total_enabled_users,
+            CASE
+                WHEN r.use_notifications AND r.use_auto_payment THEN %(price_notif_auto)s
+                WHEN r.use_notifications                        THEN %(price_notif)s
+                ELSE %(price_basic)s
+            END AS price_per_user,
+            r.use_notifications,
+            r.use_auto_payment
+        FROM resellers r
+        LEFT JOIN enabled_counts ec
+            ON ec.reseller_id = r.id
+        WHERE r.is_active = TRUE
+    ),
+    inserted AS (
+        INSERT INTO reseller_invoices (
+            reseller_id,
+            period_start,
+            period_end,
+            total_enabled_users,
+            price_per_user,
+            total_amount,
+            use_notifications,
+            use_auto_payment,
+            status,
+            due_date,
+            created_at,
+            updated_at
+        )
+        SELECT
+            p.reseller_id,
+            %(ps)s,
+            %(pe)s,
+            p.total_enabled_users,
+            p.price_per_user,
+            p.total_enabled_users * p.price_per_user,
+            p.use_notifications,
+            p.use_auto_payment,
+            'pending'::invoice_status,
+            %(due)s,
+            NOW(),
+            NOW()
+        FROM priced p
+        -- urutan tetap: run paralel mengunci row dengan urutan sama (tanpa deadlock)
+        ORDER BY p.reseller_id
+        ON CONFLICT (reseller_id, period_start) DO NOTHING
+        RETURNING
+            reseller_id,
+            period_start,
+            total_enabled_users,
+            price_per_user,
+            total_amount,
+            use_notifications,
+            due_date
     )
     SELECT
-        r.id AS reseller_id,
-        p.period_start,
-        p.period_end,
-        COALESCE(ec.total_enabled_users, 0) AS total_enabled_users,
+        i.*,
+        r.display_name,
+        r.wa_number
+    FROM inserted i
+    JOIN resellers r ON r.id = i.reseller_id
+    ORDER BY i.reseller_id;
+    """
+    params = {
+        "ps": period_start,
+        "pe": period_end,
+        "due": due_date,
+        "price_basic": RESELLER_PRICE_BASIC,
+        "price_notif": RESELLER_PRICE_NOTIF,
+        "price_notif_auto": RESELLER_PRICE_NOTIF_AUTO,
+    }
+    with db.transaction() as cur:
+        cur.execute(sql, params)
+        created = [dict(r) for r in cur.fetchall()]
+
+    if created:
+        # satu NOTIFY untuk semua reseller, bukan satu per invoice
+        invalidate_invoice_lock()
+    return created
+
+
+# -----------------------------------------------------------------------------
+# Lock invoice reseller (dipakai before_request global di app.py)
+# -----------------------------------------------------------------------------
 
-        CASE
-            WHEN r.use_notifications = FALSE AND r.use_auto_payment = FALSE THEN 250
-            WHEN r.use_notifications = TRUE  AND r.use_auto_payment = FALSE THEN 500
-            WHEN r.use_notifications = TRUE  AND r.use_auto_payment = TRUE  THEN 1000
-            ELSE 1000
-        END AS price_per_user,
+# Invoice bulan berjalan yang belum paid mengunci panel setelah tanggal ini.
+INVOICE_LOCK_DAY = 10
 
-        COALESCE(ec.total_enabled_users, 0) *
-        CASE
-            WHEN r.use_notifications = FALSE AND r.use_auto_payment = FALSE THEN 250
-            WHEN r.use_notifications = TRUE  AND r.use_auto_payment = FALSE THEN 500
-            WHEN r.use_notifications = TRUE  AND r.use_auto_payment = TRUE  THEN 1000
-            ELSE 1000
-        END AS total_amount,
+_invoice_lock_cache = cache.TTLCache("invoice_lock", max_ttl=Config.INVOICE_LOCK_CACHE_TTL)
 
-        r.use_notifications,
-        r.use_auto_payment,
 
-        'pending'::invoice_status AS status,
+def _invoice_lock_expiry(today: date, status: Optional[str]) -> float:
+    """
+    Sampai kapan keputusan lock untuk `today` + status invoice tetap valid
+    kalau tidak ada perubahan invoice (generate / mark paid -> invalidasi).
 
-        CURRENT_DATE AS due_date,
+    - belum paid & belum lewat INVOICE_LOCK_DAY: sampai tanggal lock mulai
+    - selain itu: sampai awal bulan depan (periode invoice berganti)
+    """
+    if status is not None and status != "paid" and today.day <= INVOICE_LOCK_DAY:
+        until = today.replace(day=INVOICE_LOCK_DAY + 1)
+    else:
+        until = add_months(today, 1)
+    return datetime.datetime.combine(until, datetime.time.min).timestamp()
 
-        NOW() AS created_at,
-        NOW() AS updated_at
 
-    FROM resellers r
-    CROSS JOIN period p
-    LEFT JOIN enabled_counts ec
-        ON ec.reseller_id = r.id
+def is_invoice_locked(reseller_id: int) -> bool:
+    """
+    True kalau invoice reseller bulan ini belum paid dan sudah lewat
+    INVOICE_LOCK_DAY. Hasil di-cache per reseller; error DB -> tidak lock
+    (dan tidak di-cache).
+    """
+    locked = _invoice_lock_cache.get(reseller_id)
+    if locked is not cache.MISSING:
+        return locked
 
-    WHERE
-        r.is_active = TRUE
-        AND COALESCE(ec.total_enabled_users, 0) > 0
-        AND NOT EXISTS (
-            SELECT 1
-            FROM reseller_invoices ri
-            WHERE ri.reseller_id = r.id
-              AND ri.period_start = p.period_start
-        );
+    today = date.today()
+    invoice = db.query_one(
+        """
+        SELECT status
+        FROM v_reseller_invoices
+        WHERE reseller_id = %(rid)s
+          AND period_start = %(ps)s
+        LIMIT 1
+        """,
+        {"rid": reseller_id, "ps": today.replace(day=1)},
+    )
+    status = invoice["status"] if invoice else None
+
+    locked = status is not None and status != "paid" and today.day > INVOICE_LOCK_DAY
+    _invoice_lock_cache.set(reseller_id, locked, _invoice_lock_expiry(today, status))
+    return locked
+
+
+def invalidate_invoice_lock(reseller_id: Optional[int] = None) -> None:
     """
-    return db.execute(sql)
+    Buang keputusan lock dari cache semua proses.
+    reseller_id None = semua reseller (mis. setelah generate invoice massal).
+    """
+    cache.invalidate("invoice_lock", cache.ALL_KEYS if reseller_id is None else reseller_id)
 
 
 # -----------------------------------------------------------------------------
@@ -204,6 +304,32 @@ def get_customers_to_isolate(reseller_id: Optional[int] = None) -> List[Dict[str
     return db.query_all(sql, {"reseller_id": reseller_id})
 
 
+# -----------------------------------------------------------------------------
+# Rollover status billing (dipanggil cron awal bulan)
+# -----------------------------------------------------------------------------
+
+def rollover_billing_status() -> int:
+    """
+    Hitung ulang status billing tersimpan di ppp_customers
+    (payment_status_text, has_paid_current_period, should_isolate_current_period)
+    untuk semua row yang statusnya masih milik periode lama.
+
+    Perhitungan dilakukan trigger ppp_customers_set_billing_status
+    (lihat migrations/0001_customer_billing_status.sql); di sini cukup
+    menyentuh row yang status_period-nya sudah basi. Aman dijalankan berulang:
+    kalau semua row sudah periode berjalan, tidak ada yang di-update.
+
+    Mengembalikan jumlah row yang dihitung ulang.
+    """
+    sql = """
+    UPDATE ppp_customers
+    SET status_period = NULL
+    WHERE status_period IS NULL
+       OR status_period < date_trunc('month', CURRENT_DATE)::date;
+    """
+    return db.execute(sql)
+
+
 # -----------------------------------------------------------------------------
 # Update last_paid_period saat user bayar N bulan
 # -----------------------------------------------------------------------------
@@ -264,3 +390,172 @@ def mark_customer_paid(customer_id: int, months_paid: int) -> Optional[date]:
     )
 
     return new_last_paid
+
+
+# -----------------------------------------------------------------------------
+# Log pembayaran (tabel partisi customer_payments)
+# -----------------------------------------------------------------------------
+#
+# customer_payments dipartisi per bulan berdasarkan created_at
+# (migrations/0002_partition_customer_payments.sql). Query di bawah sengaja
+# menyertakan filter created_at supaya Postgres hanya menyentuh partisi
+# yang relevan (partition pruning).
+
+_PAYMENT_INSERT_SQL = """
+INSERT INTO customer_payments (
+    customer_id,
+    reseller_id,
+    months,
+    old_last_period,
+    new_last_period,
+    old_is_isolated,
+    new_is_isolated,
+    source,
+    note
+) VALUES (
+    %(cid)s,
+    %(rid)s,
+    %(months)s,
+    %(old_last)s,
+    %(new_last)s,
+    %(old_iso)s,
+    %(new_iso)s,
+    %(source)s,
+    %(note)s
+)
+RETURNING id, created_at
+"""
+
+
+def record_customer_payment(
+    customer_id: int,
+    reseller_id: int,
+    months: int,
+    old_last_period: Optional[date],
+    new_last_period: Optional[date],
+    old_is_isolated: Optional[bool],
+    new_is_isolated: Optional[bool],
+    source: str,
+    note: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Catat satu event pembayaran ke customer_payments.
+    Mengembalikan {"id": ..., "created_at": ...} dari row baru.
+    """
+    row = db.query_one(
+        _PAYMENT_INSERT_SQL,
+        {
+            "cid": customer_id,
+            "rid": reseller_id,
+            "months": months,
+            "old_last": old_last_period,
+            "new_last": new_last_period,
+            "old_iso": old_is_isolated,
+            "new_iso": new_is_isolated,
+            "source": source,
+            "note": note,
+        },
+        commit=True,
+    )
+    return row or {}
+
+
+def get_last_reversible_payment(customer_id: int, reseller_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Ambil pembayaran TERAKHIR customer yang belum di-undo (reversed_by_id IS NULL).
+
+    Kasus umum (bayar lalu dibatalkan di bulan yang sama) cukup membaca
+    partisi bulan berjalan. Kalau di bulan ini tidak ada, baru cari ke
+    semua partisi.
+    """
+    sql = """
+    SELECT
+      id,
+      created_at,
+      months,
+      old_last_period,
+      new_last_period,
+      old_is_isolated,
+      new_is_isolated
+    FROM customer_payments
+    WHERE customer_id = %(cid)s
+      AND reseller_id = %(rid)s
+      AND reversed_by_id IS NULL
+      {since_filter}
+    ORDER BY created_at DESC
+    LIMIT 1
+    """
+    params = {"cid": customer_id, "rid": reseller_id, "since": get_current_period()}
+
+    row = db.query_one(sql.format(since_filter="AND created_at >= %(since)s"), params)
+    if row is not None:
+        return row
+    return db.query_one(sql.format(since_filter=""), params)
+
+
+def reverse_customer_payment(
+    payment: Dict[str, Any],
+    customer_id: int,
+    reseller_id: int,
+    source: str,
+    note: str,
+) -> int:
+    """
+    UNDO satu event pembayaran (hasil get_last_reversible_payment) dalam satu transaksi:
+    - kembalikan last_paid_period & is_isolated customer ke kondisi sebelum bayar
+    - catat event rollback (months negatif)
+    - isi reversed_by_id pada payment asli (dibatasi ke partisinya lewat created_at)
+
+    Mengembalikan id event rollback.
+    """
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            UPDATE ppp_customers
+            SET last_paid_period = %(old_last)s,
+                is_isolated      = COALESCE(%(old_iso)s, is_isolated),
+                updated_at       = NOW()
+            WHERE id = %(cid)s
+              AND reseller_id = %(rid)s
+            """,
+            {
+                "old_last": payment["old_last_period"],
+                "old_iso": payment["old_is_isolated"],
+                "cid": customer_id,
+                "rid": reseller_id,
+            },
+        )
+
+        cur.execute(
+            _PAYMENT_INSERT_SQL,
+            {
+                "cid": customer_id,
+                "rid": reseller_id,
+                "months": -payment["months"],
+                # old_* = kondisi SETELAH payment (sebelum rollback)
+                "old_last": payment["new_last_period"],
+                "old_iso": payment["new_is_isolated"],
+                # new_* = kondisi SESUDAH rollback (kembali ke sebelum bayar)
+                "new_last": payment["old_last_period"],
+                "new_iso": payment["old_is_isolated"],
+                "source": source,
+                "note": note,
+            },
+        )
+        rollback_id = cur.fetchone()["id"]
+
+        cur.execute(
+            """
+            UPDATE customer_payments
+            SET reversed_by_id = %(rbid)s
+            WHERE id = %(pid)s
+              AND created_at = %(created_at)s
+            """,
+            {
+                "rbid": rollback_id,
+                "pid": payment["id"],
+                "created_at": payment["created_at"],
+            },
+        )
+
+    return rollback_id
@@ -7,6 +7,8 @@ from . import invoices
 from . import reports
 from . import admin
 from . import petugas
+from . import jobs
+from . import ppp_events
 
 __all__ = [
     "auth_reseller",
@@ -18,4 +20,6 @@ __all__ = [
     "reports",
     "admin",
     "petugas",  
+    "jobs",
+    "ppp_events",
 ]
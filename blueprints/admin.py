@@ -2,8 +2,12 @@
 
 from __future__ import annotations
 
+import os
+
 from flask import (
     Blueprint,
+    current_app,
+    jsonify,
     request,
     session,
     redirect,
@@ -11,7 +15,10 @@ from flask import (
 )
 
 import db
+import metrics
 from app import render_terminal_page
+from auth import invalidate_reseller
+from billing_logic import invalidate_invoice_lock
 from config import Config
 
 bp = Blueprint("admin", __name__, url_prefix="/admin")
@@ -211,13 +218,29 @@ def admin_invoices():
       </p>
     </div>
 
-    <a
-      href="{{ url_for('admin.admin_logout') }}"
-      class="inline-flex items-center gap-1 rounded-md border border-rose-500/60 bg-rose-500/10
-             px-3 py-1.5 text-xs font-medium text-rose-300 hover:bg-rose-500/20"
-    >
-      🚪 <span>Logout Admin</span>
-    </a>
+    <div class="flex items-center gap-2">
+      <a
+        href="{{ url_for('admin.admin_profiling') }}"
+        class="inline-flex items-center gap-1 rounded-md border border-slate-700 bg-slate-900
+               px-3 py-1.5 text-xs font-medium text-slate-200 hover:bg-slate-800"
+      >
+        ⏱️ <span>Profiling</span>
+      </a>
+      <a
+        href="{{ url_for('admin.admin_resellers') }}"
+        class="inline-flex items-center gap-1 rounded-md border border-slate-700 bg-slate-900
+               px-3 py-1.5 text-xs font-medium text-slate-200 hover:bg-slate-800"
+      >
+        👥 <span>Reseller</span>
+      </a>
+      <a
+        href="{{ url_for('admin.admin_logout') }}"
+        class="inline-flex items-center gap-1 rounded-md border border-rose-500/60 bg-rose-500/10
+               px-3 py-1.5 text-xs font-medium text-rose-300 hover:bg-rose-500/20"
+      >
+        🚪 <span>Logout Admin</span>
+      </a>
+    </div>
   </div>
 
   <!-- Alerts -->
@@ -404,7 +427,7 @@ def admin_mark_paid(invoice_id: int):
         return resp
 
     try:
-        db.execute(
+        row = db.query_one(
             """
             UPDATE reseller_invoices
             SET status = 'paid',
@@ -412,10 +435,305 @@ def admin_mark_paid(invoice_id: int):
                 payment_channel = COALESCE(payment_channel, 'admin-panel'),
                 updated_at = NOW()
             WHERE id = %(iid)s
+            RETURNING reseller_id
             """,
             {"iid": invoice_id},
+            commit=True,
         )
     except Exception as e:
         return redirect(url_for("admin.admin_invoices", error=f"Gagal update invoice: {e}"))
 
+    if row:
+        invalidate_invoice_lock(row["reseller_id"])
+
     return redirect(url_for("admin.admin_invoices", success=f"Invoice {invoice_id} ditandai PAID."))
+
+
+# ======================================================================
+# Admin: Reseller (aktif / non-aktif)
+# ======================================================================
+
+@bp.route("/resellers", methods=["GET"])
+def admin_resellers():
+    """
+    List semua reseller + tombol aktif/non-aktif.
+    """
+    ok, resp = _require_admin()
+    if not ok:
+        return resp
+
+    error = request.args.get("error") or None
+    success = request.args.get("success") or None
+
+    db_error = None
+    resellers = []
+    try:
+        resellers = db.query_all(
+            """
+            SELECT id, display_name, router_username, wa_number,
+                   is_active, last_login_at
+            FROM resellers
+            ORDER BY is_active DESC, COALESCE(display_name, router_username)
+            """
+        )
+    except Exception as e:
+        db_error = f"Gagal mengambil data reseller: {e}"
+
+    body_html = """
+<div class="space-y-4">
+  <div class="flex flex-wrap items-center justify-between gap-3">
+    <div>
+      <h1 class="flex items-center gap-2 text-base font-semibold text-slate-100">
+        <span>👥</span>
+        <span>Admin – Reseller</span>
+      </h1>
+      <p class="text-[11px] text-slate-500">
+        Reseller non-aktif langsung ter-logout dan tidak bisa login sampai diaktifkan lagi.
+      </p>
+    </div>
+    <a
+      href="{{ url_for('admin.admin_invoices') }}"
+      class="inline-flex items-center gap-1 rounded-md border border-slate-700 bg-slate-900
+             px-3 py-1.5 text-xs font-medium text-slate-200 hover:bg-slate-800"
+    >
+      🧾 <span>Invoice</span>
+    </a>
+  </div>
+
+  <div class="space-y-2">
+    {% if error %}
+      <div class="rounded-md border border-rose-500/60 bg-rose-500/10 px-3 py-2 text-xs text-rose-100">
+        ⚠️ {{ error }}
+      </div>
+    {% endif %}
+    {% if db_error %}
+      <div class="rounded-md border border-rose-500/60 bg-rose-500/10 px-3 py-2 text-xs text-rose-100">
+        ⚠️ {{ db_error }}
+      </div>
+    {% endif %}
+    {% if success %}
+      <div class="rounded-md border border-emerald-500/60 bg-emerald-500/10 px-3 py-2 text-xs text-emerald-100">
+        ✅ {{ success }}
+      </div>
+    {% endif %}
+  </div>
+
+  <div class="overflow-x-auto rounded-lg border border-slate-800 bg-slate-900/60">
+    <table class="min-w-full border-collapse text-xs">
+      <thead>
+        <tr class="border-b border-slate-800 bg-slate-900">
+          <th class="px-2 py-2 text-left font-medium text-slate-300">ID</th>
+          <th class="px-2 py-2 text-left font-medium text-slate-300">Reseller</th>
+          <th class="px-2 py-2 text-left font-medium text-slate-300">Username</th>
+          <th class="px-2 py-2 text-left font-medium text-slate-300">WA</th>
+          <th class="px-2 py-2 text-left font-medium text-slate-300">Login Terakhir</th>
+          <th class="px-2 py-2 text-center font-medium text-slate-300">Status</th>
+        </tr>
+      </thead>
+      <tbody>
+        {% for r in resellers %}
+        <tr class="border-b border-slate-800 hover:bg-slate-900/80">
+          <td class="px-2 py-2 text-slate-200">{{ r.id }}</td>
+          <td class="px-2 py-2 text-slate-200">{{ r.display_name or '-' }}</td>
+          <td class="px-2 py-2 font-mono text-slate-200">{{ r.router_username }}</td>
+          <td class="px-2 py-2 text-slate-200">{{ r.wa_number or '-' }}</td>
+          <td class="px-2 py-2 text-slate-200">{{ r.last_login_at or '-' }}</td>
+          <td class="px-2 py-2 text-center">
+            <form
+              method="post"
+              action="{{ url_for('admin.admin_toggle_reseller', reseller_id=r.id) }}"
+              class="inline"
+              onsubmit="return confirm('{{ 'Non-aktifkan' if r.is_active else 'Aktifkan' }} reseller {{ r.router_username }}?');"
+            >
+              {% if r.is_active %}
+                <button type="submit"
+                        class="rounded-md border border-emerald-500/60 bg-emerald-500/10 px-2 py-1 text-[11px] text-emerald-300 hover:bg-emerald-500/20">
+                  ✅ Aktif
+                </button>
+              {% else %}
+                <button type="submit"
+                        class="rounded-md border border-rose-500/60 bg-rose-500/10 px-2 py-1 text-[11px] text-rose-300 hover:bg-rose-500/20">
+                  ⛔ Non-aktif
+                </button>
+              {% endif %}
+            </form>
+          </td>
+        </tr>
+        {% else %}
+        <tr>
+          <td colspan="6" class="px-4 py-6 text-center text-xs text-slate-400">Belum ada reseller.</td>
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+  </div>
+</div>
+    """
+
+    return render_terminal_page(
+        title="Admin – Reseller",
+        body_html=body_html,
+        context={
+            "error": error,
+            "success": success,
+            "db_error": db_error,
+            "resellers": resellers,
+        },
+    )
+
+
+@bp.route("/resellers/<int:reseller_id>/toggle-active", methods=["POST"])
+def admin_toggle_reseller(reseller_id: int):
+    """
+    Balik status is_active reseller. Cache row reseller (auth.py) dibuang
+    supaya sesi reseller yang sedang login langsung ikut berubah.
+    """
+    ok, resp = _require_admin()
+    if not ok:
+        return resp
+
+    try:
+        row = db.query_one(
+            """
+            UPDATE resellers
+            SET is_active = NOT is_active,
+                updated_at = NOW()
+            WHERE id = %(rid)s
+            RETURNING router_username, is_active
+            """,
+            {"rid": reseller_id},
+            commit=True,
+        )
+    except Exception as e:
+        return redirect(url_for("admin.admin_resellers", error=f"Gagal update reseller: {e}"))
+
+    if row is None:
+        return redirect(url_for("admin.admin_resellers", error=f"Reseller {reseller_id} tidak ditemukan."))
+
+    invalidate_reseller(reseller_id)
+
+    state = "diaktifkan" if row["is_active"] else "dinon-aktifkan"
+    return redirect(url_for("admin.admin_resellers", success=f"Reseller {row['router_username']} {state}."))
+
+
+# ======================================================================
+# Admin: Profiling latency per endpoint
+# ======================================================================
+
+@bp.route("/profiling", methods=["GET"])
+def admin_profiling():
+    """
+    Histogram latency per endpoint dari RequestProfiler (profiling.py).
+    Angka hanya dari worker yang melayani halaman ini.
+    """
+    ok, resp = _require_admin()
+    if not ok:
+        return resp
+
+    profiler = current_app.extensions.get("request_profiler")
+    rows = profiler.endpoint_stats() if profiler else []
+
+    body_html = """
+<div class="space-y-4">
+  <div class="flex flex-wrap items-center justify-between gap-3">
+    <div>
+      <h1 class="flex items-center gap-2 text-base font-semibold text-slate-100">
+        <span>⏱️</span>
+        <span>Admin – Profiling Endpoint</span>
+      </h1>
+      <p class="text-[11px] text-slate-500">
+        {{ window }} request terakhir per endpoint, worker pid {{ pid }}. Waktu dalam ms;
+        kolom db/router/wa/tpl = rata-rata per request.
+      </p>
+    </div>
+    <a
+      href="{{ url_for('admin.admin_invoices') }}"
+      class="inline-flex items-center gap-1 rounded-md border border-slate-700 bg-slate-900
+             px-3 py-1.5 text-xs font-medium text-slate-200 hover:bg-slate-800"
+    >
+      🧾 <span>Invoice</span>
+    </a>
+  </div>
+
+  <div class="overflow-x-auto rounded-lg border border-slate-800 bg-slate-900/60">
+    <table class="min-w-full border-collapse text-xs">
+      <thead>
+        <tr class="border-b border-slate-800 bg-slate-900">
+          <th class="px-2 py-2 text-left font-medium text-slate-300">Endpoint</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">Request</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">p50</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">p95</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">p99</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">max</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">db</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">router</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">wa</th>
+          <th class="px-2 py-2 text-right font-medium text-slate-300">tpl</th>
+        </tr>
+      </thead>
+      <tbody>
+        {% for r in rows %}
+        <tr class="border-b border-slate-800 hover:bg-slate-900/80 tabular-nums">
+          <td class="px-2 py-2 font-mono text-slate-200">{{ r.endpoint }}</td>
+          <td class="px-2 py-2 text-right text-slate-200">{{ r.count }}</td>
+          <td class="px-2 py-2 text-right text-slate-200">{{ '%.1f' % r.p50 }}</td>
+          <td class="px-2 py-2 text-right text-amber-300">{{ '%.1f' % r.p95 }}</td>
+          <td class="px-2 py-2 text-right text-slate-200">{{ '%.1f' % r.p99 }}</td>
+          <td class="px-2 py-2 text-right text-slate-200">{{ '%.1f' % r.max }}</td>
+          <td class="px-2 py-2 text-right text-slate-300">{{ '%.1f' % r.avg_db }}</td>
+          <td class="px-2 py-2 text-right text-slate-300">{{ '%.1f' % r.avg_router }}</td>
+          <td class="px-2 py-2 text-right text-slate-300">{{ '%.1f' % r.avg_wa }}</td>
+          <td class="px-2 py-2 text-right text-slate-300">{{ '%.1f' % r.avg_tpl }}</td>
+        </tr>
+        {% else %}
+        <tr>
+          <td colspan="10" class="px-4 py-6 text-center text-xs text-slate-400">Belum ada data request.</td>
+        </tr>
+        {% endfor %}
+      </tbody>
+    </table>
+  </div>
+
+  <p class="text-[11px] text-slate-500">
+    Capture cProfile satu request: buka halaman dengan <span class="font-mono">?_profile=1</span> (sesi admin),
+    atau kirim header <span class="font-mono">X-Profile-Token</span> berisi PROFILE_TOKEN untuk halaman reseller.
+    Lokasi file .pstats ada di header respon <span class="font-mono">X-Profile-File</span>.
+  </p>
+  <p class="text-[11px] text-slate-500">
+    Metrik gabungan semua worker + cron:
+    <a href="{{ url_for('admin.admin_metrics_json') }}" class="font-mono text-sky-400 hover:underline">/admin/metrics.json</a>
+    (ringkas) atau <a href="/metrics" class="font-mono text-sky-400 hover:underline">/metrics</a> (Prometheus).
+  </p>
+</div>
+    """
+
+    return render_terminal_page(
+        title="Admin – Profiling",
+        body_html=body_html,
+        context={
+            "rows": rows,
+            "window": profiler.window if profiler else 0,
+            "pid": os.getpid(),
+        },
+    )
+
+
+# ======================================================================
+# Admin: Ringkasan metrik (JSON)
+# ======================================================================
+
+@bp.route("/metrics.json", methods=["GET"])
+def admin_metrics_json():
+    """
+    Ringkasan metrik Prometheus (metrics.py) dalam JSON, gabungan semua
+    worker gunicorn + job cron kalau PROMETHEUS_MULTIPROC_DIR diset.
+    """
+    if not session.get("is_admin"):
+        return jsonify({"error": "not_admin"}), 401
+
+    return jsonify(
+        {
+            "multiprocess": bool(metrics.MULTIPROC_DIR),
+            "metrics": metrics.collect_json(),
+        }
+    )
@@ -2,7 +2,6 @@
 
 from __future__ import annotations
 
-import requests
 from requests.auth import HTTPBasicAuth
 
 from flask import (
@@ -16,10 +15,12 @@ from flask import (
 )
 
 from config import Config
+from http_session import get_session
 
 
 import db
 from app import render_terminal_page
+from auth import get_logged_in_reseller, invalidate_reseller
 
 bp = Blueprint("auth_reseller", __name__)
 
@@ -71,7 +72,7 @@ def _router_admin_request(
 
     url = base_url.rstrip("/") + path
 
-    resp = requests.request(
+    resp = get_session().request(
         method=method.upper(),
         url=url,
         auth=HTTPBasicAuth(admin_user, admin_pass),
@@ -116,9 +117,9 @@ def _create_l2tp_secret_for_reseller(username: str, password: str) -> None:
 
 
 
-def _get_router_ip_for_reseller(username: str) -> str | None:
+def _get_router_ip_map() -> dict[str, str] | None:
     """
-    Ambil IP router reseller dari Router Admin berdasarkan PPP active (L2TP).
+    Ambil IP router SEMUA reseller dari Router Admin berdasarkan PPP active (L2TP).
 
     Alur:
     - GET /rest/ppp/active  di Router Admin
@@ -132,8 +133,10 @@ def _get_router_ip_for_reseller(username: str) -> str | None:
           },
           ...
         ]
-    - Kita cari entry dengan name == username
-    - Ambil field "address" sebagai IP router reseller (IP L2TP remote)
+    - Field "name" = username reseller, "address" = IP router reseller
+      (IP L2TP remote)
+
+    Return {username: ip}, atau None kalau Router Admin gagal diakses.
     """
     try:
         data = _router_admin_request("GET", "/ppp/active")
@@ -142,7 +145,7 @@ def _get_router_ip_for_reseller(username: str) -> str | None:
         return None
 
     if data is None:
-        return None
+        return {}
 
     # Jika RouterOS mengembalikan 1 object saja (tidak umum, tapi kita antisipasi)
     if isinstance(data, dict):
@@ -150,24 +153,34 @@ def _get_router_ip_for_reseller(username: str) -> str | None:
     elif isinstance(data, list):
         data_list = data
     else:
-        return None
+        return {}
 
+    ips: dict[str, str] = {}
     for row in data_list:
         if not isinstance(row, dict):
             continue
-        if row.get("name") != username:
-            continue
+        name = row.get("name")
         addr = row.get("address")
+        if not name or name in ips:
+            continue
         if isinstance(addr, str) and addr.strip():
             ip = addr.strip()
             # kalau formatnya "10.168.255.254/32" atau sejenis, ambil bagian depannya
             ip = ip.split()[0]
             ip = ip.split("/")[0]
-            print(f"[RouterAdmin] IP router untuk {username} = {ip}")
-            return ip
+            ips[name] = ip
+    return ips
 
-    # Tidak ketemu entry dengan name = username
-    return None
+
+def _get_router_ip_for_reseller(username: str) -> str | None:
+    """
+    Ambil IP router satu reseller (lihat _get_router_ip_map).
+    """
+    ip = (_get_router_ip_map() or {}).get(username)
+    if ip:
+        print(f"[RouterAdmin] IP router untuk {username} = {ip}")
+    # None kalau tidak ketemu entry dengan name = username
+    return ip
 
 
 
@@ -378,7 +391,7 @@ def login():
     4) Simpan reseller_id, router_username, router_ip ke session.
     5) Redirect ke halaman utama ("/").
     """
-    if session.get("reseller_id"):
+    if get_logged_in_reseller() is not None:
         return redirect(url_for("index"))
 
     error: str | None = None
@@ -454,6 +467,9 @@ add name={username}-l2tp \\
                         {"rid": row["id"]},
                     )
 
+                    # row baru saja dibaca: buang salinan lama di cache
+                    invalidate_reseller(row["id"])
+
                     # 5) Redirect ke halaman utama (nanti bisa ke /dashboard)
                     return redirect(url_for("index"))
 
@@ -5,7 +5,9 @@ from __future__ import annotations
 import datetime
 from cron_jobs.notify_unpaid_users import format_rupiah, is_valid_wa
 
-from wa_client import send_wa, WhatsAppError
+import router_queue
+import router_snapshots
+import wa_outbox
 from flask import (
     Blueprint,
     session,
@@ -15,11 +17,17 @@ from flask import (
 )
 from datetime import date
 import db
+from auth import get_logged_in_reseller
 from app import render_terminal_page 
+from blueprints.jobs import start_job
+from config import Config
+from billing_logic import (
+    record_customer_payment,
+    get_last_reversible_payment,
+    reverse_customer_payment,
+)
 
 from mikrotik_client import (
-    get_ppp_secrets,
-    get_ppp_active,
     terminate_ppp_active_by_name,
     update_ppp_secret,
     delete_ppp_secret,
@@ -71,20 +79,8 @@ def _require_login():
     if not reseller_id:
         return None, None, redirect(url_for("auth_reseller.login"))
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username, router_password,
-               wa_number, email,
-               use_notifications, use_auto_payment,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, None, redirect(url_for("auth_reseller.login"))
 
     if not router_ip:
@@ -151,7 +147,7 @@ def list_customers():
             "payment_status_text IN ('unpaid_current_period','never_paid')"
         )
     elif status_filter == "isolated":
-        where_clauses.append("is_isolated = TRUE")
+        where_clauses.append("payment_status_text = 'isolated'")
     elif status_filter == "disabled":
         where_clauses.append("is_enabled = FALSE")
 
@@ -170,6 +166,7 @@ def list_customers():
     customers = []
     db_error = None
     router_error = None
+    router_notice = None
     online_names = set()
     total_rows = 0
     total_pages = 1
@@ -272,7 +269,15 @@ def list_customers():
         api_user = reseller["router_username"]
         api_pass = reseller["router_password"]
         try:
-            active_list = get_ppp_active(router_ip, api_user, api_pass)
+            active_list, active_meta = router_snapshots.fetch(
+                reseller["id"], "ppp_active", router_ip, api_user, api_pass,
+                max_age=Config.ROUTER_SNAPSHOT_VIEW_AGE,
+            )
+            if active_meta["error"]:
+                router_notice = (
+                    f"Gagal membaca PPP active: {active_meta['error']} — status online "
+                    f"dari snapshot {router_snapshots.describe_age(active_meta['age_seconds'])}."
+                )
             if isinstance(active_list, list):
                 for a in active_list:
                     if isinstance(a, dict):
@@ -293,6 +298,31 @@ def list_customers():
     online_count = sum(1 for c in customers if c.get("is_online"))
     offline_count = len(customers) - online_count
 
+    # 6) Perintah router yang belum selesai (badge "pending di router")
+    try:
+        router_pending = router_queue.pending_by_username(reseller["id"])
+    except Exception as e:
+        print(f"[list_customers] gagal baca antrian router: {e}")
+        router_pending = {}
+
+    # 7) Customer yang tidak ada di router saat sinkron terakhir
+    try:
+        router_missing = {
+            r["ppp_username"]
+            for r in db.query_all(
+                """
+                SELECT ppp_username
+                FROM ppp_customers
+                WHERE reseller_id = %(rid)s
+                  AND router_missing_at IS NOT NULL
+                """,
+                {"rid": reseller["id"]},
+            )
+        }
+    except Exception as e:
+        print(f"[list_customers] gagal baca tanda router_missing: {e}")
+        router_missing = set()
+
     # ---------------- HTML ----------------
     body_html = """
 <!-- HEADER HALAMAN -->
@@ -317,11 +347,16 @@ def list_customers():
     <!-- Sinkron Customers -->
     <form method="post"
           action="{{ url_for('customers.sync_customers') }}"
-          class="inline-flex">
+          class="inline-flex items-center gap-2">
       <button type="submit"
               class="inline-flex items-center gap-1 rounded-md border border-brand-500 bg-brand-500/10 px-3 py-1.5 text-xs font-medium text-emerald-300 hover:bg-brand-500/20">
         🔄 <span>Sinkron Customers</span>
       </button>
+      <label class="inline-flex items-center gap-1 text-[11px] text-slate-400"
+             title="Customer yang tidak ada di /ppp/secret diberi tanda (tidak dihapus)">
+        <input type="checkbox" name="mark_missing" value="1" class="h-3 w-3">
+        tandai yang tidak ada di router
+      </label>
     </form>
 
     <!-- Tambah Customer -->
@@ -338,6 +373,11 @@ def list_customers():
     ⚠️ Router: {{ router_error }}
   </div>
 {% endif %}
+{% if router_notice %}
+  <div class="mt-3 rounded-md border border-amber-400/70 bg-amber-400/10 px-3 py-2 text-xs text-amber-100">
+    🕒 Router: {{ router_notice }}
+  </div>
+{% endif %}
 {% if error %}
   <div class="mt-3 rounded-md border border-rose-500/70 bg-rose-500/10 px-3 py-2 text-xs text-rose-100">
     ⚠️ {{ error }}
@@ -609,6 +649,18 @@ def list_customers():
             <!-- Username -->
             <td class="px-2 py-1 align-top font-mono text-slate-100">
               {{ c.ppp_username }}
+              {% set rp = router_pending.get(c.ppp_username) %}
+              {% if rp and rp.status == 'failed' %}
+                <span class="ml-1 inline-flex rounded border border-rose-500/70 px-1 text-[10px] text-rose-300"
+                      title="{{ rp.last_error or '' }}">⚠️ gagal di router</span>
+              {% elif rp %}
+                <span class="ml-1 inline-flex rounded border border-amber-400/70 px-1 text-[10px] text-amber-300"
+                      title="{{ rp.last_error or 'menunggu worker antrian router' }}">⏳ pending di router</span>
+              {% endif %}
+              {% if c.ppp_username in router_missing %}
+                <span class="ml-1 inline-flex rounded border border-slate-500/70 px-1 text-[10px] text-slate-300"
+                      title="tidak ditemukan di /ppp/secret saat sinkron terakhir">❔ tidak ada di router</span>
+              {% endif %}
             </td>
 
             <!-- Alamat -->
@@ -690,6 +742,7 @@ def list_customers():
             "reseller_name": reseller["display_name"] or reseller["router_username"],
             "customers": customers,
             "router_error": router_error,
+            "router_notice": router_notice,
             "error": error,
             "success": success,
             "db_error": db_error,
@@ -706,7 +759,8 @@ def list_customers():
             "paid_total": paid_total,
             "unpaid_count": unpaid_count,
             "unpaid_total": unpaid_total,
-
+            "router_pending": router_pending,
+            "router_missing": router_missing,
         },
     )
 
@@ -719,13 +773,16 @@ def list_customers():
 @bp.route("/customers/sync", methods=["POST"])
 def sync_customers():
     """
-    Sinkron customers dari router reseller:
+    Sinkron customers dari router reseller (job latar belakang, lihat
+    router_sync.sync_customers_job):
 
     - Ambil /ppp/secret dari router
-    - Ambil daftar existing ppp_username dari DB
-    - Untuk setiap secret:
-        - kalau name belum ada → INSERT ppp_customers
-        - mapping profile_name -> profile_id jika ada di ppp_profiles
+    - Upsert ppp_customers: username baru → INSERT, yang sudah ada →
+      profile / password / disabled diperbarui kalau berbeda
+    - mapping profile_name -> profile_id jika ada di ppp_profiles
+    - checkbox mark_missing: tandai customer yang tidak ada di router
+
+    Handler ini hanya mengantrikan job lalu redirect ke halaman progres.
     """
     reseller, router_ip, redirect_resp = _require_login()
     if redirect_resp is not None:
@@ -735,84 +792,12 @@ def sync_customers():
         error = "Router IP tidak tersedia di session. Silakan login ulang."
         return _redirect_back_with_message(url_for("customers.list_customers", error=error))
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
-    # 1. Ambil PPP secret dari router
-    try:
-        secrets = get_ppp_secrets(router_ip, api_user, api_pass)
-    except MikrotikError as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"Gagal mengambil PPP secret: {e}"))
-    except Exception as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"Error tidak terduga saat akses router: {e}"))
-
-    if not secrets:
-        return _redirect_back_with_message(url_for("customers.list_customers", error="Router tidak punya PPP secret."))
-
-    # 2. Ambil existing username dari DB
-    existing_rows = db.query_all(
-        """
-        SELECT ppp_username
-        FROM ppp_customers
-        WHERE reseller_id = %(rid)s
-        """,
-        {"rid": reseller["id"]},
+    return start_job(
+        "sync_customers",
+        reseller["id"],
+        {"router_ip": router_ip, "mark_missing": request.form.get("mark_missing") == "1"},
+        return_url=url_for("customers.list_customers"),
     )
-    existing_usernames = {r["ppp_username"] for r in existing_rows}
-
-    # 3. Buat mapping profile_name -> profile_id
-    profile_rows = db.query_all(
-        """
-        SELECT id, name
-        FROM ppp_profiles
-        WHERE reseller_id = %(rid)s
-        """,
-        {"rid": reseller["id"]},
-    )
-    profile_map = {p["name"]: p["id"] for p in profile_rows}
-
-    inserted = 0
-
-    for sec in secrets:
-        if not isinstance(sec, dict):
-            continue
-
-        name = sec.get("name")
-        if not name:
-            continue
-
-        if name in existing_usernames:
-            continue  # sudah ada di DB, skip
-
-        password = sec.get("password") or None
-        sec_profile_name = sec.get("profile") or None
-        profile_id = profile_map.get(sec_profile_name) if sec_profile_name else None
-        try:
-            db.execute(
-                """
-                INSERT INTO ppp_customers
-                    (reseller_id, profile_id, ppp_username, ppp_password,
-                     is_enabled, is_isolated, created_at, updated_at)
-                VALUES
-                    (%(rid)s, %(pid)s, %(user)s, %(pass)s,
-                     TRUE, FALSE, NOW(), NOW())
-                """,
-                {
-                    "rid": reseller["id"],
-                    "pid": profile_id,
-                    "user": name,
-                    "pass": password,
-                },
-            )
-            inserted += 1
-        except Exception as e:
-            err_msg = f"Gagal insert user {name}: {e}. Sinkron dihentikan."
-            return _redirect_back_with_message(url_for("customers.list_customers", error=err_msg))
-
-
-
-    success = f"Sinkron selesai. {inserted} user baru ditambahkan."
-    return _redirect_back_with_message(url_for("customers.list_customers", success=success))
 
 @bp.route("/customers/new", methods=["GET", "POST"])
 def create_customer():
@@ -945,6 +930,7 @@ def create_customer():
                 except Exception:
                     # kalau endpoint update tidak ada / gagal, biarkan saja: secret sudah dibuat
                     pass
+                router_snapshots.mark_stale(reseller["id"], ("ppp_secret",))
             except Exception as e:
                 error = f"DB sudah insert, tetapi gagal membuat PPP secret di router: {e}"
 
@@ -1242,9 +1228,6 @@ def toggle_enable_customer(customer_id: int):
     username = cust["ppp_username"]
     is_enabled = bool(cust["is_enabled"])
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
     new_is_enabled = not is_enabled
     mt_disabled = "no" if new_is_enabled else "yes"
 
@@ -1261,25 +1244,19 @@ def toggle_enable_customer(customer_id: int):
     except Exception as e:
         return _redirect_back_with_message(url_for("customers.list_customers", error=f"Gagal update DB: {e}"))
 
+    # router diupdate worker antrian (+ kill session aktif supaya tidak nyantol)
     try:
-        update_ppp_secret(
-            router_ip,
-            api_user,
-            api_pass,
-            secret_name=username,
+        router_queue.enqueue(
+            reseller["id"], router_ip, username,
             updates={"disabled": mt_disabled},
+            kill_session=True,
+            customer_id=customer_id,
+            source="toggle_enable",
         )
-    except MikrotikError as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah berubah, tapi gagal update router: {e}"))
-    except Exception as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah berubah, tapi error update router: {e}"))
-    # setelah update router, kill session aktif (kalau ada) supaya tidak nyantol
-    try:
-        terminate_ppp_active_by_name(router_ip, api_user, api_pass, username)
     except Exception as e:
-        print(f"[toggle_enable_customer] gagal terminate session {username}: {e}")
+        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah berubah, tapi gagal antrikan perintah router: {e}"))
 
-    msg = f"User '{username}' sekarang {'ENABLED' if new_is_enabled else 'DISABLED'}."
+    msg = f"User '{username}' sekarang {'ENABLED' if new_is_enabled else 'DISABLED'} (router menyusul)."
     return _redirect_back_with_message(url_for("customers.list_customers", success=msg))
 
 
@@ -1328,9 +1305,6 @@ def isolate_customer(customer_id: int):
     iso_profile_id = iso_profile["id"]
     iso_profile_name = iso_profile["name"]
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
     try:
         db.execute(
             """
@@ -1345,25 +1319,20 @@ def isolate_customer(customer_id: int):
     except Exception as e:
         return _redirect_back_with_message(url_for("customers.list_customers", error=f"Gagal update DB untuk isolate: {e}"))
 
+    # ganti profile (+ kill session / address-list, sesuai isolation_mode
+    # reseller) dijalankan worker antrian router
     try:
-        update_ppp_secret(
-            router_ip,
-            api_user,
-            api_pass,
-            secret_name=username,
+        router_queue.enqueue(
+            reseller["id"], router_ip, username,
             updates={"profile": iso_profile_name},
+            isolation="isolate",
+            customer_id=customer_id,
+            source="isolate",
         )
-    except MikrotikError as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah isolate, tapi gagal ganti profile di router: {e}"))
     except Exception as e:
-        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah isolate, tapi error ganti profile di router: {e}"))
-    # kill session aktif agar reconnect dengan profile isolasi
-    try:
-        terminate_ppp_active_by_name(router_ip, api_user, api_pass, username)
-    except Exception as e:
-        print(f"[isolate_customer] gagal terminate session {username}: {e}")
+        return _redirect_back_with_message(url_for("customers.list_customers", error=f"DB sudah isolate, tapi gagal antrikan isolasi router: {e}"))
 
-    msg = f"User '{username}' sudah di-isolate dengan profile '{iso_profile_name}'."
+    msg = f"User '{username}' sudah di-isolate ke profile '{iso_profile_name}' (router menyusul)."
     return _redirect_back_with_message(url_for("customers.list_customers", success=msg))
 
 
@@ -1463,40 +1432,25 @@ def unisolate_customer(customer_id: int):
             )
         )
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
-    # 2) Update profile di Mikrotik → sesuai profile_id (profil normal)
+    # 2) Antrikan update profile di Mikrotik → sesuai profile_id (profil normal),
+    #    hapus address-list / kill session sesuai isolation_mode reseller
     try:
-        update_ppp_secret(
-            router_ip,
-            api_user,
-            api_pass,
-            secret_name=username,
+        router_queue.enqueue(
+            reseller["id"], router_ip, username,
             updates={"profile": norm_name},
-        )
-    except MikrotikError as e:
-        return _redirect_back_with_message(
-            url_for(
-                "customers.list_customers",
-                error=f"DB sudah unisolate, tapi gagal ganti profile di router: {e}",
-            )
+            isolation="unisolate",
+            customer_id=customer_id,
+            source="unisolate",
         )
     except Exception as e:
         return _redirect_back_with_message(
             url_for(
                 "customers.list_customers",
-                error=f"DB sudah unisolate, tapi error ganti profile di router: {e}",
+                error=f"DB sudah unisolate, tapi gagal antrikan perintah router: {e}",
             )
         )
 
-    # 3) Kill session supaya reconnect dengan profil normal
-    try:
-        terminate_ppp_active_by_name(router_ip, api_user, api_pass, username)
-    except Exception as e:
-        print(f"[unisolate_customer] gagal terminate session {username}: {e}")
-
-    msg = f"User '{username}' sudah dikembalikan dari isolasi ke profile '{norm_name}'."
+    msg = f"User '{username}' sudah dikembalikan dari isolasi ke profile '{norm_name}' (router menyusul)."
     return _redirect_back_with_message(url_for("customers.list_customers", success=msg))
 
 
@@ -1529,6 +1483,12 @@ def delete_customer(customer_id: int):
     api_user = reseller["router_username"]
     api_pass = reseller["router_password"]
 
+    # 0) perintah router yang belum jalan untuk secret ini tidak berlaku lagi
+    try:
+        router_queue.cancel_pending(reseller["id"], username)
+    except Exception as e:
+        print(f"[delete_customer] gagal batalkan antrian router {username}: {e}")
+
     # 1) kill session aktif (kalau ada)
     try:
         terminate_ppp_active_by_name(router_ip, api_user, api_pass, username)
@@ -1544,6 +1504,8 @@ def delete_customer(customer_id: int):
     except Exception as e:
         print(f"[delete_customer] error delete PPP secret {username} di router: {e}")
 
+    router_snapshots.mark_stale(reseller["id"])
+
     # 3) hapus dari DB
     try:
         db.execute(
@@ -1593,6 +1555,7 @@ def edit_customer(customer_id: int):
           c.billing_start_date,
           c.last_paid_period,
           c.is_enabled,
+          c.is_isolated,
           c.profile_id,
           p.name AS profile_name
         FROM ppp_customers c
@@ -1707,31 +1670,34 @@ def edit_customer(customer_id: int):
 
                 # Update router PPP secret (tanpa rename username)
         if not error and router_ip and router_ip != "-":
-            api_user = reseller["router_username"]
-            api_pass = reseller["router_password"]
-
             updates = {"disabled": mt_disabled}
             if new_password:
                 updates["password"] = new_password
             if new_profile_name:
                 updates["profile"] = new_profile_name
 
+            # status isolasi berubah lewat pilihan profile → lewat isolation.py
+            # (address-list / kill session sesuai isolation_mode reseller)
+            isolation = None
+            if new_is_isolated and not cust["is_isolated"]:
+                isolation = "isolate"
+            elif cust["is_isolated"] and not new_is_isolated:
+                isolation = "unisolate"
+                updates.setdefault("profile", None)
 
             try:
-                update_ppp_secret(
-                    router_ip,
-                    api_user,
-                    api_pass,
-                    secret_name=old_username,
+                router_queue.enqueue(
+                    reseller["id"], router_ip, old_username,
                     updates=updates,
+                    isolation=isolation,
+                    customer_id=customer_id,
+                    source="edit",
                 )
-            except MikrotikError as e:
-                error = f"DB sudah berubah, tapi gagal update PPP secret di router: {e}"
             except Exception as e:
-                error = f"DB sudah berubah, tapi error update PPP secret di router: {e}"
+                error = f"DB sudah berubah, tapi gagal antrikan update PPP secret di router: {e}"
 
         if not error:
-            success = "Data dan PPP secret berhasil diperbarui."
+            success = "Data tersimpan. PPP secret di router diperbarui di latar belakang."
             # refresh data
             cust = db.query_one(
                 """
@@ -1746,6 +1712,7 @@ def edit_customer(customer_id: int):
                   c.billing_start_date,
                   c.last_paid_period,
                   c.is_enabled,
+                  c.is_isolated,
                   c.profile_id,
                   p.name AS profile_name
                 FROM ppp_customers c
@@ -2055,34 +2022,17 @@ def _do_pay_customer(
                 {"cid": customer_id, "rid": reseller_id},
             )
 
-            # 1.c kalau router_ip & nama profil normal tersedia → update Mikrotik
-            if router_ip and router_ip != "-" and norm_name:
-                api_user = reseller["router_username"]
-                api_pass = reseller["router_password"]
-
-                try:
-                    update_ppp_secret(
-                        router_ip,
-                        api_user,
-                        api_pass,
-                        secret_name=cust["ppp_username"],
-                        updates={"profile": norm_name},
-                    )
-                except MikrotikError as e:
-                    # DB sudah unisolate, Mikrotik gagal → hentikan dengan error
-                    raise Exception(
-                        f"DB sudah unisolate, tapi gagal ganti profile di router: {e}"
-                    )
-
-                # 1.d kill session supaya reconnect dengan profil normal
-                try:
-                    terminate_ppp_active_by_name(
-                        router_ip, api_user, api_pass, cust["ppp_username"]
-                    )
-                except Exception as e:
-                    print(
-                        f"[_do_pay_customer] gagal terminate session {cust['ppp_username']}: {e}"
-                    )
+            # 1.c kalau router_ip tersedia → antrikan update Mikrotik sesuai
+            #     isolation_mode (profile normal + kill session, atau hapus
+            #     address-list); dijalankan worker antrian router
+            if router_ip and router_ip != "-":
+                router_queue.enqueue(
+                    reseller_id, router_ip, cust["ppp_username"],
+                    updates={"profile": norm_name},
+                    isolation="unisolate",
+                    customer_id=customer_id,
+                    source="pay",
+                )
     except Exception:
         # biar bubbling ke caller (UI / webhook)
         raise
@@ -2136,41 +2086,15 @@ def _do_pay_customer(
 
     # --- 4) Catat log pembayaran ke tabel customer_payments ---
     try:
-        db.execute(
-            """
-            INSERT INTO customer_payments (
-                customer_id,
-                reseller_id,
-                months,
-                old_last_period,
-                new_last_period,
-                old_is_isolated,
-                new_is_isolated,
-                source,
-                note
-            ) VALUES (
-                %(cid)s,
-                %(rid)s,
-                %(months)s,
-                %(old_last)s,
-                %(new_last)s,
-                %(old_iso)s,
-                %(new_iso)s,
-                %(source)s,
-                %(note)s
-            )
-            """,
-            {
-                "cid": customer_id,
-                "rid": reseller_id,
-                "months": months,
-                "old_last": old_last_period,
-                "new_last": new_last_period,
-                "old_iso": old_is_isolated,
-                "new_iso": new_is_isolated,
-                "source": "manual_ui",
-                "note": None,
-            },
+        payment = record_customer_payment(
+            customer_id,
+            reseller_id,
+            months,
+            old_last_period,
+            new_last_period,
+            old_is_isolated,
+            new_is_isolated,
+            source="manual_ui",
         )
     except Exception as e:
         # Di titik ini last_paid_period sudah berubah, tapi log gagal.
@@ -2226,13 +2150,17 @@ def _do_pay_customer(
                         f"Salam,\nSistem Billing"
                     )
 
-                try:
-                    send_wa(wa_target, message)
-                    print(f"[_do_pay_customer] sukses kirim WA ke {wa_target}")
-                except WhatsAppError as e:
-                    print(f"[_do_pay_customer] gagal kirim WA ke {wa_target}: {e}")
+                # masuk antrian, dikirim worker outbox (tidak menahan request)
+                wa_outbox.enqueue(
+                    wa_target,
+                    message,
+                    template="payment_receipt",
+                    dedupe_key=f"payment_receipt:{payment['id']}",
+                    reseller_id=reseller_id,
+                    customer_id=customer_id,
+                )
     except Exception as e:
-        print(f"[_do_pay_customer] error umum kirim WA: {e}")
+        print(f"[_do_pay_customer] gagal antrikan WA: {e}")
 
     # --- 6) Pesan sukses untuk UI / webhook ---
     return f"Pembayaran {months} bulan tercatat untuk user {cust['ppp_username']}."
@@ -2331,24 +2259,7 @@ def cancel_pay_customer(customer_id: int):
         )
 
     # Cari pembayaran TERAKHIR yang belum di-undo
-    payment = db.query_one(
-        """
-        SELECT
-          id,
-          months,
-          old_last_period,
-          new_last_period,
-          old_is_isolated,
-          new_is_isolated
-        FROM customer_payments
-        WHERE customer_id = %(cid)s
-          AND reseller_id = %(rid)s
-          AND reversed_by_id IS NULL
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        {"cid": customer_id, "rid": reseller["id"]},
-    )
+    payment = get_last_reversible_payment(customer_id, reseller["id"])
 
     if payment is None:
         return _redirect_back_with_message(
@@ -2358,80 +2269,18 @@ def cancel_pay_customer(customer_id: int):
             )
         )
 
-    old_last_period = payment["old_last_period"]
-    new_last_period = payment["new_last_period"]
     old_iso = payment["old_is_isolated"]
     new_iso = payment["new_is_isolated"]
 
     try:
-        # 1) Kembalikan last_paid_period dan is_isolated ke nilai sebelum pembayaran itu
-        db.execute(
-            """
-            UPDATE ppp_customers
-            SET last_paid_period = %(old_last)s,
-                is_isolated      = COALESCE(%(old_iso)s, is_isolated),
-                updated_at       = NOW()
-            WHERE id = %(cid)s
-              AND reseller_id = %(rid)s
-            """,
-            {
-                "old_last": old_last_period,
-                "old_iso": old_iso,
-                "cid": customer_id,
-                "rid": reseller["id"],
-            },
-        )
-
-        # 2) Catat event rollback di customer_payments (months negatif)
-        rollback = db.query_one(
-            """
-            INSERT INTO customer_payments (
-                customer_id,
-                reseller_id,
-                months,
-                old_last_period,
-                new_last_period,
-                old_is_isolated,
-                new_is_isolated,
-                source,
-                note
-            ) VALUES (
-                %(cid)s,
-                %(rid)s,
-                %(months)s,
-                %(old_last)s,
-                %(new_last)s,
-                %(old_iso)s,
-                %(new_iso)s,
-                %(source)s,
-                %(note)s
-            )
-            RETURNING id
-            """,
-            {
-                "cid": customer_id,
-                "rid": reseller["id"],
-                "months": -payment["months"],
-                # old_last = kondisi SETELAH payment (sebelum rollback)
-                "old_last": new_last_period,
-                # new_last = kondisi SESUDAH rollback (kembali ke old_last_period)
-                "new_last": old_last_period,
-                "old_iso": new_iso,   # sebelum rollback = state sesudah bayar
-                "new_iso": old_iso,   # sesudah rollback = state sebelum bayar
-                "source": "cancel_pay",
-                "note": f"Undo payment {payment['id']}",
-            },
-        )
-        rollback_id = rollback["id"]
-
-        # 3) Tandai payment lama sudah di-undo
-        db.execute(
-            """
-            UPDATE customer_payments
-            SET reversed_by_id = %(rbid)s
-            WHERE id = %(pid)s
-            """,
-            {"rbid": rollback_id, "pid": payment["id"]},
+        # Rollback last_paid_period + is_isolated, catat event rollback
+        # (months negatif), dan tandai payment asli sudah di-undo.
+        reverse_customer_payment(
+            payment,
+            customer_id,
+            reseller["id"],
+            source="cancel_pay",
+            note=f"Undo payment {payment['id']}",
         )
     except Exception as e:
         return _redirect_back_with_message(
@@ -2462,33 +2311,15 @@ def cancel_pay_customer(customer_id: int):
                 )
 
                 if iso_profile:
-                    api_user = reseller["router_username"]
-                    api_pass = reseller["router_password"]
-                    try:
-                        update_ppp_secret(
-                            router_ip,
-                            api_user,
-                            api_pass,
-                            secret_name=cust["ppp_username"],
-                            updates={"profile": iso_profile["name"]},
-                        )
-                        try:
-                            terminate_ppp_active_by_name(
-                                router_ip,
-                                api_user,
-                                api_pass,
-                                cust["ppp_username"],
-                            )
-                        except Exception as e:
-                            print(
-                                f"[cancel_pay_customer] gagal terminate session {cust['ppp_username']}: {e}"
-                            )
-                    except MikrotikError as e:
-                        # DB sudah rollback & set is_isolated TRUE, router gagal di-update → log saja
-                        print(
-                            f"[cancel_pay_customer] DB rollback OK, "
-                            f"tapi gagal set profile isolasi di router: {e}"
-                        )
+                    # diantrikan di belakang unisolate dari pembayaran (kalau
+                    # belum jalan, keduanya digabung: isolate yang menang)
+                    router_queue.enqueue(
+                        reseller["id"], router_ip, cust["ppp_username"],
+                        updates={"profile": iso_profile["name"]},
+                        isolation="isolate",
+                        customer_id=customer_id,
+                        source="cancel_pay",
+                    )
         # kalau old_iso == new_iso, berarti pembayaran tidak mengubah status isolasi
         # → rollback juga tidak perlu ubah Mikrotik.
     except Exception as e:
@@ -2594,9 +2425,15 @@ def send_wa_customer(customer_id: int):
     )
 
     try:
-        send_wa(wa_clean, message)
-    except WhatsAppError as e:
-        print(f"[send_wa_customer] gagal kirim WA ke {wa_clean}: {e}")
+        wa_outbox.enqueue(
+            wa_clean,
+            message,
+            template="unpaid_manual",
+            reseller_id=reseller["id"],
+            customer_id=customer_id,
+        )
+    except Exception as e:
+        print(f"[send_wa_customer] gagal antrikan WA ke {wa_clean}: {e}")
         return _redirect_back_with_message(
             url_for(
                 "customers.list_customers",
@@ -2607,6 +2444,6 @@ def send_wa_customer(customer_id: int):
     return _redirect_back_with_message(
         url_for(
             "customers.list_customers",
-            success=f"WA berhasil dikirim ke {user} ({wa_clean}).",
+            success=f"WA untuk {user} ({wa_clean}) masuk antrian kirim.",
         )
     )
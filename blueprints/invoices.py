@@ -11,7 +11,9 @@ from flask import (
 )
 
 import db
+from auth import get_logged_in_reseller
 from app import render_terminal_page
+from billing_logic import invalidate_invoice_lock
 
 bp = Blueprint("invoices", __name__)
 
@@ -25,19 +27,8 @@ def _require_login():
     if not reseller_id:
         return None, redirect(url_for("auth_reseller.login"))
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username,
-               wa_number, email,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, redirect(url_for("auth_reseller.login"))
 
     return reseller, None
@@ -315,4 +306,6 @@ def mark_paid(invoice_id: int):
     except Exception as e:
         return redirect(url_for("invoices.list_invoices", error=f"Gagal update invoice: {e}"))
 
+    invalidate_invoice_lock(reseller["id"])
+
     return redirect(url_for("invoices.view_invoice", invoice_id=invoice_id, _anchor="top"))
@@ -0,0 +1,262 @@
+# blueprints/jobs.py
+
+from __future__ import annotations
+
+from urllib.parse import urlencode
+
+from flask import (
+    Blueprint,
+    jsonify,
+    redirect,
+    request,
+    session,
+    url_for,
+)
+
+import jobs
+import router_sync  # noqa: F401  (daftarkan handler job)
+from auth import get_logged_in_reseller
+from app import render_terminal_page
+
+bp = Blueprint("jobs", __name__)
+
+
+def _require_login():
+    """
+    Pastikan reseller sudah login.
+    Return (reseller_row, redirect_response_or_None)
+    """
+    if not session.get("reseller_id"):
+        return None, redirect(url_for("auth_reseller.login"))
+
+    reseller = get_logged_in_reseller()
+    if reseller is None:
+        return None, redirect(url_for("auth_reseller.login"))
+
+    return reseller, None
+
+
+def _safe_return_url(job) -> str:
+    url = (job.get("params") or {}).get("return_url") or ""
+    # hanya path lokal (diisi server lewat url_for saat enqueue)
+    if not url.startswith("/") or url.startswith("//"):
+        return url_for("main.dashboard")
+    return url
+
+
+def _return_url_with_message(job) -> str:
+    base = _safe_return_url(job)
+    # nama query pesan di halaman asal (dashboard memakai p_success/p_error)
+    success_key, error_key = (job.get("params") or {}).get("return_keys") or ("success", "error")
+    if job["status"] == "succeeded":
+        query = {success_key: job.get("message") or "Selesai."}
+    elif job["status"] in ("failed", "cancelled"):
+        query = {error_key: job.get("message") or job["status"]}
+    else:
+        return base
+    connector = "&" if "?" in base else "?"
+    return f"{base}{connector}{urlencode(query)}"
+
+
+def _job_status(job) -> dict:
+    total = job.get("progress_total")
+    done = job.get("progress_done") or 0
+    percent = None
+    if total:
+        percent = min(100, int(done * 100 / total))
+    elif job["status"] == "succeeded":
+        percent = 100
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "label": jobs.job_label(job["kind"]),
+        "status": job["status"],
+        "finished": job["status"] in jobs.FINISHED_STATUSES,
+        "cancel_requested": job["cancel_requested"],
+        "done": done,
+        "total": total,
+        "percent": percent,
+        "message": job.get("message"),
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "return_url": _return_url_with_message(job),
+    }
+
+
+def start_job(
+    kind: str,
+    reseller_id: int,
+    params: dict,
+    return_url: str,
+    return_keys: tuple = ("success", "error"),
+):
+    """
+    Antrikan job lalu redirect ke halaman progresnya. Kalau reseller masih
+    punya job aktif, redirect ke job itu (satu job aktif per reseller).
+
+    return_url + return_keys: tujuan tombol Kembali, dengan pesan hasil job
+    di query string (?success=... / ?error=...).
+    """
+    try:
+        job_id, created = jobs.enqueue(
+            kind,
+            reseller_id,
+            {**params, "return_url": return_url, "return_keys": list(return_keys)},
+        )
+    except Exception as e:
+        connector = "&" if "?" in return_url else "?"
+        query = urlencode({return_keys[1]: f"Gagal membuat job: {e}"})
+        return redirect(f"{return_url}{connector}{query}")
+
+    if not created:
+        return redirect(url_for("jobs.progress", job_id=job_id, busy=1))
+    return redirect(url_for("jobs.progress", job_id=job_id))
+
+
+@bp.route("/jobs/<int:job_id>", methods=["GET"])
+def progress(job_id: int):
+    """
+    Halaman progres job; JS polling /jobs/<id>/status sampai job selesai.
+    """
+    reseller, redirect_resp = _require_login()
+    if redirect_resp is not None:
+        return redirect_resp
+
+    job = jobs.get_job(job_id, reseller["id"])
+    if job is None:
+        return redirect(url_for("main.dashboard"))
+
+    body_html = """
+<section class="mx-auto max-w-2xl rounded-lg border border-slate-800 bg-slate-900/60 p-4 shadow-sm">
+  <h2 class="text-sm font-semibold text-slate-200">⏳ {{ status.label }} <span class="font-mono text-xs text-slate-500">#{{ status.id }}</span></h2>
+
+  {% if busy %}
+    <p class="mt-2 text-xs text-amber-300">⚠️ Masih ada job lain yang berjalan untuk akun ini. Tunggu sampai selesai.</p>
+  {% endif %}
+
+  <div class="mt-4 h-3 w-full overflow-hidden rounded bg-slate-800">
+    <div id="job-bar" class="h-3 bg-emerald-500 transition-all" style="width: {{ status.percent or 0 }}%"></div>
+  </div>
+  <div class="mt-2 flex items-center justify-between text-xs">
+    <span id="job-message" class="text-slate-300">{{ status.message or "-" }}</span>
+    <span id="job-count" class="font-mono text-slate-400">
+      {% if status.total %}{{ status.done }}/{{ status.total }}{% endif %}
+    </span>
+  </div>
+  <p class="mt-1 text-xs">Status: <span id="job-status" class="font-mono text-slate-200">{{ status.status }}</span></p>
+
+  <table id="job-result" class="mt-4 min-w-full border-collapse text-xs {% if not status.result %}hidden{% endif %}">
+    <tbody>
+      {% for key, value in (status.result or {}).items() %}
+        <tr class="border-b border-slate-800/70">
+          <td class="px-2 py-1 text-slate-400">{{ key }}</td>
+          <td class="px-2 py-1 font-mono text-slate-200">{{ value }}</td>
+        </tr>
+      {% endfor %}
+    </tbody>
+  </table>
+
+  <div class="mt-4 flex gap-2">
+    <form id="job-cancel" method="post" action="{{ url_for('jobs.cancel', job_id=status.id) }}"
+          class="{% if status.finished %}hidden{% endif %}">
+      <button type="submit"
+              class="inline-flex items-center gap-1 rounded-md border border-rose-500 bg-rose-500/10 px-3 py-1.5 text-xs font-medium text-rose-300 hover:bg-rose-500/20">
+        ✖ <span>Batalkan</span>
+      </button>
+    </form>
+    <a id="job-back" href="{{ status.return_url }}"
+       class="inline-flex items-center gap-1 rounded-md border border-slate-700 bg-slate-900 px-3 py-1.5 text-xs font-medium text-slate-200 hover:border-emerald-500 hover:text-emerald-300">
+      ← <span>Kembali</span>
+    </a>
+  </div>
+</section>
+
+<script>
+  const JOB_STATUS_URL = "{{ url_for('jobs.status', job_id=status.id) }}";
+
+  function renderResult(result) {
+    const table = document.getElementById("job-result");
+    const tbody = table.querySelector("tbody");
+    tbody.innerHTML = "";
+    if (!result) return;
+    Object.keys(result).forEach(function(key) {
+      const tr = document.createElement("tr");
+      tr.className = "border-b border-slate-800/70";
+      const k = document.createElement("td");
+      k.className = "px-2 py-1 text-slate-400";
+      k.textContent = key;
+      const v = document.createElement("td");
+      v.className = "px-2 py-1 font-mono text-slate-200";
+      v.textContent = typeof result[key] === "object" ? JSON.stringify(result[key]) : result[key];
+      tr.appendChild(k);
+      tr.appendChild(v);
+      tbody.appendChild(tr);
+    });
+    table.classList.remove("hidden");
+  }
+
+  function applyStatus(s) {
+    document.getElementById("job-bar").style.width = (s.percent || 0) + "%";
+    document.getElementById("job-message").textContent = s.message || "-";
+    document.getElementById("job-count").textContent = s.total ? (s.done + "/" + s.total) : "";
+    document.getElementById("job-status").textContent =
+      s.status + (s.cancel_requested && !s.finished ? " (membatalkan...)" : "");
+    document.getElementById("job-back").href = s.return_url;
+    if (s.finished) {
+      document.getElementById("job-cancel").classList.add("hidden");
+      renderResult(s.result);
+    }
+  }
+
+  async function pollJob() {
+    while (true) {
+      try {
+        const resp = await fetch(JOB_STATUS_URL, { cache: "no-store" });
+        if (resp.ok) {
+          const s = await resp.json();
+          applyStatus(s);
+          if (s.finished) return;
+        }
+      } catch (e) {
+        // jaringan putus sebentar: coba lagi
+      }
+      await new Promise(function(resolve) { setTimeout(resolve, 1000); });
+    }
+  }
+
+  {% if not status.finished %}
+  pollJob();
+  {% endif %}
+</script>
+"""
+    return render_terminal_page(
+        title=jobs.job_label(job["kind"]),
+        body_html=body_html,
+        context={
+            "status": _job_status(job),
+            "busy": request.args.get("busy") == "1",
+        },
+    )
+
+
+@bp.route("/jobs/<int:job_id>/status", methods=["GET"])
+def status(job_id: int):
+    """Status job (JSON) untuk polling halaman progres."""
+    if not session.get("reseller_id"):
+        return jsonify({"error": "not_logged_in"}), 401
+
+    job = jobs.get_job(job_id, session["reseller_id"])
+    if job is None:
+        return jsonify({"error": "not_found"}), 404
+    return jsonify(_job_status(job))
+
+
+@bp.route("/jobs/<int:job_id>/cancel", methods=["POST"])
+def cancel(job_id: int):
+    """Minta job dibatalkan (job running berhenti di titik cek berikutnya)."""
+    reseller, redirect_resp = _require_login()
+    if redirect_resp is not None:
+        return redirect_resp
+
+    jobs.request_cancel(job_id, reseller["id"])
+    return redirect(url_for("jobs.progress", job_id=job_id))
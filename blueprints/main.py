@@ -3,6 +3,8 @@
 from __future__ import annotations
 
 import datetime
+import json
+import time
 from urllib.parse import quote_plus
 
 from flask import (
@@ -12,16 +14,18 @@ from flask import (
     url_for,
     request,
     jsonify,
+    Response,
 )
 
 import db
+import router_snapshots
+import router_stats
+from auth import get_logged_in_reseller
 from app import render_terminal_page
+from blueprints.jobs import start_job
+from config import Config
 from mikrotik_client import (
-    get_system_resource,
-    get_system_identity,
-    get_ppp_active,
-    get_ppp_profiles,
-    MikrotikError,
+    get_router_snapshot,
 )
 
 bp = Blueprint("main", __name__)
@@ -42,20 +46,8 @@ def _get_logged_in_reseller():
     if not reseller_id:
         return None, None
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username, router_password,
-               wa_number, email,
-               use_notifications, use_auto_payment,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, None
 
     if not router_ip:
@@ -64,6 +56,23 @@ def _get_logged_in_reseller():
     return reseller, router_ip
 
 
+def _empty_router_snapshot():
+    """
+    Snapshot kosong (format sama dengan get_router_snapshot) untuk sesi
+    yang tidak punya router_ip.
+    """
+    return {
+        "router_name": "N/A",
+        "uptime": "N/A",
+        "cpu_load": "N/A",
+        "cpu_percent": None,
+        "mem_display": "N/A",
+        "mem_used_pct": None,
+        "active_ppp_count": None,
+        "router_error": "Router IP tidak tersedia di session. Silakan login ulang.",
+    }
+
+
 # ======================================================================
 # DASHBOARD
 # ======================================================================
@@ -239,63 +248,26 @@ def dashboard():
     # TIDAK terkunci invoice → dashboard normal
     # ------------------------------------------------------------------
 
-    # 1) Data router via REST Mikrotik
-    router_error = None
-    router_name = "N/A"
-    uptime = "N/A"
-    cpu_load = "N/A"
-    mem_display = "N/A"
-    active_ppp_count = None
-    cpu_percent = None
-    mem_used_pct = None
-
+    # 1) Data router via REST Mikrotik (3 call paralel, satu deadline)
     if router_ip != "-":
-        try:
-            identity = get_system_identity(router_ip, router_username, router_password)
-            resource = get_system_resource(router_ip, router_username, router_password)
-            active_list = get_ppp_active(router_ip, router_username, router_password)
-
-            router_name = identity.get("name") or "N/A"
-            uptime = resource.get("uptime") or "N/A"
-            cpu_load = resource.get("cpu-load") or resource.get("cpu_load") or "N/A"
-
-            # coba konversi ke int untuk progress bar
-            try:
-                cpu_percent = int(str(cpu_load))
-            except Exception:
-                cpu_percent = None
-            free_mem = resource.get("free-memory") or resource.get("free_memory")
-            total_mem = resource.get("total-memory") or resource.get("total_memory")
-
-            def _fmt_bytes(b):
-                try:
-                    b = int(b)
-                except Exception:
-                    return "N/A"
-                mb = b / (1024 * 1024)
-                return f"{mb:.0f} MB"
-
-            if free_mem is not None and total_mem is not None:
-                mem_display = f"{_fmt_bytes(total_mem)} total / {_fmt_bytes(free_mem)} free"
-                # hitung persentase RAM terpakai
-                try:
-                    total_i = int(total_mem)
-                    free_i = int(free_mem)
-                    used_i = total_i - free_i
-                    mem_used_pct = int(used_i * 100 / total_i)
-                except Exception:
-                    mem_used_pct = None
-            else:
-                mem_display = "N/A"
-
-            active_ppp_count = len(active_list) if isinstance(active_list, list) else None
-
-        except MikrotikError as e:
-            router_error = str(e)
-        except Exception as e:
-            router_error = f"Error tidak terduga saat akses router: {e}"
+        snap = get_router_snapshot(
+            router_ip, router_username, router_password,
+            deadline=Config.ROUTER_SNAPSHOT_DEADLINE,
+        )
+        # router tidak menjawab: tampilkan snapshot terakhir + umurnya
+        snap = router_snapshots.fill_router_summary(reseller["id"], snap)
     else:
-        router_error = "Router IP tidak tersedia di session. Silakan login ulang."
+        snap = _empty_router_snapshot()
+
+    router_error = snap["router_error"]
+    snapshot_age = snap.get("snapshot_age")
+    router_name = snap["router_name"]
+    uptime = snap["uptime"]
+    cpu_load = snap["cpu_load"]
+    mem_display = snap["mem_display"]
+    active_ppp_count = snap["active_ppp_count"]
+    cpu_percent = snap["cpu_percent"]
+    mem_used_pct = snap["mem_used_pct"]
 
     # 2) Ringkasan billing & user
     unpaid_count = 0
@@ -408,7 +380,11 @@ def dashboard():
     ⚠️ {{ db_error }}
   </div>
 {% endif %}
-{% if router_error %}
+{% if router_error and snapshot_age %}
+  <div class="mt-3 rounded-md border border-amber-400/60 bg-amber-400/10 px-3 py-2 text-xs text-amber-100">
+    ⚠️ {{ router_error }} — menampilkan snapshot {{ snapshot_age }}.
+  </div>
+{% elif router_error %}
   <div class="mt-3 rounded-md border border-rose-500/60 bg-rose-500/10 px-3 py-2 text-xs text-rose-100">
     ⚠️ {{ router_error }}
   </div>
@@ -421,9 +397,15 @@ def dashboard():
   <div class="rounded-lg border border-slate-800 bg-slate-900/60 p-4 shadow-sm">
     <div class="flex items-center justify-between gap-2">
       <h2 class="text-sm font-semibold text-slate-200">📡 Router Status</h2>
-      <span class="inline-flex items-center gap-1 rounded-full border border-emerald-500/60 bg-emerald-500/10 px-2 py-0.5 text-[11px] font-medium text-emerald-300">
-        <span class="h-1.5 w-1.5 rounded-full bg-emerald-400"></span>
-        Live
+      <span id="router-freshness"
+            class="inline-flex items-center gap-1 rounded-full border px-2 py-0.5 text-[11px] font-medium
+                   {% if snapshot_age %}border-amber-400/60 bg-amber-400/10 text-amber-300{% else %}border-emerald-500/60 bg-emerald-500/10 text-emerald-300{% endif %}">
+        {% if snapshot_age %}
+          🕒 <span id="router-freshness-text">snapshot {{ snapshot_age }}</span>
+        {% else %}
+          <span class="h-1.5 w-1.5 rounded-full bg-emerald-400"></span>
+          <span id="router-freshness-text">Live</span>
+        {% endif %}
       </span>
     </div>
     <dl class="mt-3 space-y-1 text-xs text-slate-300">
@@ -655,75 +637,136 @@ def dashboard():
 
 <!-- SCRIPT: LIVE STATS -->
 <script>
-  async function fetchStats() {
-    try {
-      const resp = await fetch("{{ url_for('main.dashboard_stats') }}", {
-        cache: "no-store"
-      });
-      if (!resp.ok) {
-        return;
-      }
-      const data = await resp.json();
-      if (data.error) {
-        return;
-      }
+  // Live stats: SSE (satu sampler router dipakai bersama semua tab),
+  // fallback ke long polling kalau EventSource tidak ada / ditolak server.
+  const STATS_URL = "{{ url_for('main.dashboard_stats') }}";
+  const STREAM_URL = "{{ url_for('main.dashboard_stats_stream') }}";
+  let lastSeq = 0;
+
+  function applyStats(data) {
+    if (!data || data.error) {
+      return;
+    }
+    if (data.seq) {
+      lastSeq = data.seq;
+    }
 
-      const ipEl = document.getElementById("router-ip");
-      const nameEl = document.getElementById("router-name");
-      const uptimeEl = document.getElementById("router-uptime");
-      const activePppEl = document.getElementById("router-active-ppp");
-      if (ipEl && data.router_ip !== undefined) ipEl.textContent = data.router_ip;
-      if (nameEl && data.router_name !== undefined) nameEl.textContent = data.router_name;
-      if (uptimeEl && data.uptime !== undefined) uptimeEl.textContent = data.uptime;
-      if (activePppEl && data.active_ppp_count !== undefined && data.active_ppp_count !== null) {
-        activePppEl.textContent = data.active_ppp_count;
+    const ipEl = document.getElementById("router-ip");
+    const nameEl = document.getElementById("router-name");
+    const uptimeEl = document.getElementById("router-uptime");
+    const activePppEl = document.getElementById("router-active-ppp");
+    if (ipEl && data.router_ip !== undefined) ipEl.textContent = data.router_ip;
+    if (nameEl && data.router_name !== undefined) nameEl.textContent = data.router_name;
+    if (uptimeEl && data.uptime !== undefined) uptimeEl.textContent = data.uptime;
+    if (activePppEl && data.active_ppp_count !== undefined && data.active_ppp_count !== null) {
+      activePppEl.textContent = data.active_ppp_count;
+    }
+
+    const cpuValueEl = document.getElementById("cpu-value");
+    const cpuBarEl = document.getElementById("cpu-meter-fill");
+    if (cpuValueEl) {
+      if (data.cpu_load === "N/A" || data.cpu_load === null) {
+        cpuValueEl.textContent = "N/A";
+      } else {
+        cpuValueEl.textContent = data.cpu_load + "%";
       }
+    }
+    if (cpuBarEl) {
+      let pct = parseInt(data.cpu_percent || data.cpu_load || 0, 10);
+      if (isNaN(pct) || pct < 0) pct = 0;
+      if (pct > 100) pct = 100;
+      cpuBarEl.style.width = pct + "%";
+    }
 
-      const cpuValueEl = document.getElementById("cpu-value");
-      const cpuBarEl = document.getElementById("cpu-meter-fill");
-      if (cpuValueEl) {
-        if (data.cpu_load === "N/A" || data.cpu_load === null) {
-          cpuValueEl.textContent = "N/A";
-        } else {
-          cpuValueEl.textContent = data.cpu_load + "%";
+    const memTextEl = document.getElementById("mem-text");
+    const memBarEl = document.getElementById("mem-meter-fill");
+    if (memTextEl && data.mem_display !== undefined) {
+      memTextEl.textContent = data.mem_display;
+    }
+    if (memBarEl) {
+      let mpct = parseInt(data.mem_used_pct || 0, 10);
+      if (isNaN(mpct) || mpct < 0) mpct = 0;
+      if (mpct > 100) mpct = 100;
+      memBarEl.style.width = mpct + "%";
+    }
+
+    const freshEl = document.getElementById("router-freshness");
+    const freshTextEl = document.getElementById("router-freshness-text");
+    if (freshEl && freshTextEl) {
+      const fromSnapshot = !!data.snapshot_age;
+      freshTextEl.textContent = fromSnapshot ? ("snapshot " + data.snapshot_age) : "Live";
+      ["border-amber-400/60", "bg-amber-400/10", "text-amber-300"].forEach(function(c) {
+        freshEl.classList.toggle(c, fromSnapshot);
+      });
+      ["border-emerald-500/60", "bg-emerald-500/10", "text-emerald-300"].forEach(function(c) {
+        freshEl.classList.toggle(c, !fromSnapshot);
+      });
+    }
+
+    const lastUpdateEl = document.getElementById("last-update");
+    if (lastUpdateEl) {
+      const now = new Date();
+      const hh = String(now.getHours()).padStart(2, "0");
+      const mm = String(now.getMinutes()).padStart(2, "0");
+      const ss = String(now.getSeconds()).padStart(2, "0");
+      lastUpdateEl.textContent = "updated " + hh + ":" + mm + ":" + ss;
+    }
+  }
+
+  function sleep(ms) {
+    return new Promise(function(resolve) { setTimeout(resolve, ms); });
+  }
+
+  async function longPoll() {
+    while (true) {
+      try {
+        const resp = await fetch(STATS_URL + "?since=" + lastSeq, { cache: "no-store" });
+        if (!resp.ok) {
+          await sleep(3000);
+          continue;
         }
+        const data = await resp.json();
+        applyStats(data);
+        if (data.retry_ms) {
+          // server sibuk: dijawab tanpa menunggu, jangan langsung poll lagi
+          await sleep(data.retry_ms);
+        }
+      } catch (err) {
+        await sleep(3000);
       }
-      if (cpuBarEl) {
-        let pct = parseInt(data.cpu_percent || data.cpu_load || 0, 10);
-        if (isNaN(pct) || pct < 0) pct = 0;
-        if (pct > 100) pct = 100;
-        cpuBarEl.style.width = pct + "%";
-      }
+    }
+  }
 
-      const memTextEl = document.getElementById("mem-text");
-      const memBarEl = document.getElementById("mem-meter-fill");
-      if (memTextEl && data.mem_display !== undefined) {
-        memTextEl.textContent = data.mem_display;
+  function startStream() {
+    if (!window.EventSource) {
+      longPoll();
+      return;
+    }
+    const es = new EventSource(STREAM_URL);
+    let failures = 0;
+    es.onmessage = function(ev) {
+      failures = 0;
+      try {
+        applyStats(JSON.parse(ev.data));
+      } catch (err) {
+        // abaikan event rusak
       }
-      if (memBarEl) {
-        let mpct = parseInt(data.mem_used_pct || 0, 10);
-        if (isNaN(mpct) || mpct < 0) mpct = 0;
-        if (mpct > 100) mpct = 100;
-        memBarEl.style.width = mpct + "%";
+    };
+    es.addEventListener("fallback", function() {
+      es.close();
+      longPoll();
+    });
+    es.onerror = function() {
+      // reconnect normal (stream habis umur) memicu 1x error; gagal terus -> long poll
+      failures += 1;
+      if (failures >= 3) {
+        es.close();
+        longPoll();
       }
-
-      const lastUpdateEl = document.getElementById("last-update");
-      if (lastUpdateEl) {
-        const now = new Date();
-        const hh = String(now.getHours()).padStart(2, "0");
-        const mm = String(now.getMinutes()).padStart(2, "0");
-        const ss = String(now.getSeconds()).padStart(2, "0");
-        lastUpdateEl.textContent = "updated " + hh + ":" + mm + ":" + ss;
-      }
-    } catch (err) {
-      // optional: console.log(err);
-    }
+    };
   }
 
-  window.addEventListener("load", function() {
-    fetchStats();
-    setInterval(fetchStats, 3000);
-  });
+  window.addEventListener("load", startStream);
 </script>
     """
 
@@ -734,6 +777,7 @@ def dashboard():
         context={
             "reseller_name": reseller_name,
             "router_error": router_error,
+            "snapshot_age": snapshot_age,
             "db_error": db_error,
             "router_ip": router_ip,
             "router_name": router_name,
@@ -767,89 +811,107 @@ def dashboard():
 @bp.route("/dashboard/stats")
 def dashboard_stats():
     """
-    Endpoint ringan untuk mengembalikan status router dalam bentuk JSON.
-    Dipakai oleh JavaScript di dashboard untuk update progress bar CPU/RAM.
+    Status router dalam bentuk JSON (fallback long polling untuk live stats).
+
+    - tanpa ?since     : snapshot terbaru (tunggu sampel pertama kalau belum ada)
+    - dengan ?since=N  : tunggu sampai ada snapshot seq > N
+                         (maks STATS_LONGPOLL_TIMEOUT detik)
+    Snapshot diambil sampler bersama (router_stats.py), bukan per request.
+    Kalau slot long poll proses ini penuh (STATS_LONGPOLL_MAX), langsung
+    dijawab snapshot terakhir + retry_ms (JS menunggu sebelum poll lagi).
     """
     reseller, router_ip = _get_logged_in_reseller()
     if reseller is None:
         return jsonify({"error": "not_logged_in"}), 401
 
-    router_username = reseller["router_username"]
-    router_password = reseller["router_password"]
+    if router_ip == "-":
+        return jsonify({"router_ip": router_ip, "seq": 0, **_empty_router_snapshot()})
 
-    cpu_percent = None
-    mem_used_pct = None
-    cpu_load = "N/A"
-    mem_display = "N/A"
-    uptime = "N/A"
-    active_ppp_count = None
-    router_name = "N/A"
-    router_error = None
+    try:
+        since = int(request.args.get("since", "0"))
+    except ValueError:
+        since = 0
+    timeout = Config.STATS_LONGPOLL_TIMEOUT if since else Config.ROUTER_SNAPSHOT_DEADLINE + 1
+
+    waiting = router_stats.try_open_poll()
+    try:
+        with router_stats.subscription(
+            reseller["id"], router_ip, reseller["router_username"], reseller["router_password"]
+        ) as sampler:
+            seq, snap = sampler.wait_newer(since, timeout=timeout if waiting else 0)
+    finally:
+        if waiting:
+            router_stats.close_poll()
+
+    if snap is None:
+        snap = dict(_empty_router_snapshot(), router_error="Router belum menjawab.")
+
+    payload = {"router_ip": router_ip, "seq": seq, **snap}
+    if not waiting:
+        payload["retry_ms"] = int(Config.ROUTER_STATS_INTERVAL * 1000)
+    return jsonify(payload)
+
+
+@bp.route("/dashboard/stats/stream")
+def dashboard_stats_stream():
+    """
+    Server-Sent Events: push snapshot router setiap ada sampel baru.
+
+    Satu sampler per router dipakai bersama semua tab reseller ini.
+    Stream ditutup setelah SSE_MAX_AGE detik (browser reconnect otomatis,
+    login & lock invoice dicek ulang). Kalau slot stream proses ini penuh
+    atau router_ip tidak ada, server kirim event "fallback" dan JS
+    dashboard pindah ke long polling /dashboard/stats?since=N.
+    """
+    reseller, router_ip = _get_logged_in_reseller()
+    if reseller is None:
+        return jsonify({"error": "not_logged_in"}), 401
+
+    reseller_id = reseller["id"]
+    api_user = reseller["router_username"]
+    api_pass = reseller["router_password"]
+
+    def _event(seq, snap):
+        payload = json.dumps({"router_ip": router_ip, "seq": seq, **snap})
+        return f"id: {seq}\ndata: {payload}\n\n"
+
+    def generate():
+        if router_ip == "-" or not router_stats.try_open_stream():
+            yield "event: fallback\ndata: {}\n\n"
+            return
 
-    if router_ip != "-":
         try:
-            identity = get_system_identity(router_ip, router_username, router_password)
-            resource = get_system_resource(router_ip, router_username, router_password)
-            active_list = get_ppp_active(router_ip, router_username, router_password)
-
-            router_name = identity.get("name") or "N/A"
-            uptime = resource.get("uptime") or "N/A"
-            cpu_load = resource.get("cpu-load") or resource.get("cpu_load") or "N/A"
-
-            # CPU %
-            try:
-                cpu_percent = int(str(cpu_load))
-            except Exception:
-                cpu_percent = None
-
-            free_mem = resource.get("free-memory") or resource.get("free_memory")
-            total_mem = resource.get("total-memory") or resource.get("total_memory")
-
-            def _fmt_bytes(b):
-                try:
-                    b = int(b)
-                except Exception:
-                    return "N/A"
-                mb = b / (1024 * 1024)
-                return f"{mb:.0f} MB"
-
-            if free_mem is not None and total_mem is not None:
-                mem_display = f"{_fmt_bytes(total_mem)} total / {_fmt_bytes(free_mem)} free"
-                try:
-                    total_i = int(total_mem)
-                    free_i = int(free_mem)
-                    used_i = total_i - free_i
-                    mem_used_pct = int(used_i * 100 / total_i)
-                except Exception:
-                    mem_used_pct = None
-            else:
-                mem_display = "N/A"
-
-            active_ppp_count = len(active_list) if isinstance(active_list, list) else None
-
-        except MikrotikError as e:
-            router_error = str(e)
-        except Exception as e:
-            router_error = f"Error tidak terduga saat akses router: {e}"
-    else:
-        router_error = "Router IP tidak tersedia di session. Silakan login ulang."
-
-    return jsonify({
-        "router_ip": router_ip,
-        "router_name": router_name,
-        "uptime": uptime,
-        "cpu_load": cpu_load,
-        "cpu_percent": cpu_percent,
-        "mem_display": mem_display,
-        "mem_used_pct": mem_used_pct,
-        "active_ppp_count": active_ppp_count,
-        "router_error": router_error,
-    })
+            started = time.monotonic()
+            seq = 0
+            yield "retry: 3000\n\n"
+
+            with router_stats.subscription(reseller_id, router_ip, api_user, api_pass) as sampler:
+                while time.monotonic() - started < Config.SSE_MAX_AGE:
+                    new_seq, snap = sampler.wait_newer(seq, timeout=15)
+                    if new_seq == seq or snap is None:
+                        # komentar SSE: jaga koneksi & deteksi tab tertutup
+                        yield ": keepalive\n\n"
+                        continue
+                    seq = new_seq
+                    yield _event(seq, snap)
+        finally:
+            router_stats.close_stream()
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # jangan di-buffer reverse proxy
+        },
+    )
+
 
 @bp.route("/dashboard/profiles/sync", methods=["POST"]) 
 def sync_profiles_dashboard():
     """
-    Sinkron profil dari router reseller (dipanggil dari dashboard):
+    Sinkron profil dari router reseller (dipanggil dari dashboard), sebagai
+    job latar belakang (router_sync.sync_profiles_job):
     - Ambil /ppp/profile dari Mikrotik reseller.
     - Untuk setiap profil:
         * kalau sudah ada (reseller_id + name) → UPDATE description & rate_limit
@@ -867,95 +929,13 @@ def sync_profiles_dashboard():
             )
         )
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
-    # 1. Ambil profil dari router
-    try:
-        mt_profiles = get_ppp_profiles(router_ip, api_user, api_pass)
-    except MikrotikError as e:
-        return redirect(
-            url_for("main.dashboard", p_error=f"Gagal mengambil profil dari router: {e}")
-        )
-    except Exception as e:
-        return redirect(
-            url_for("main.dashboard", p_error=f"Error tidak terduga saat akses router: {e}")
-        )
-
-    if not mt_profiles:
-        return redirect(
-            url_for("main.dashboard", p_error="Router tidak mengembalikan data profil PPP.")
-        )
-
-    # 2. Loop dan merge ke ppp_profiles (tanpa ON CONFLICT)
-    inserted = 0
-    updated = 0
-
-    for prof in mt_profiles:
-        if not isinstance(prof, dict):
-            continue
-
-        name = prof.get("name")
-        if not name:
-            continue
-
-        desc = prof.get("comment") or prof.get("description") or None
-        rate_limit = prof.get("rate-limit") or prof.get("rate_limit") or None
-
-        try:
-            # cek apakah profile sudah ada untuk reseller ini
-            existing = db.query_one(
-                """
-                SELECT id
-                FROM ppp_profiles
-                WHERE reseller_id = %(rid)s
-                  AND name = %(name)s
-                """,
-                {"rid": reseller["id"], "name": name},
-            )
-
-            if existing:
-                # sudah ada → update deskripsi & rate limit
-                db.execute(
-                    """
-                    UPDATE ppp_profiles
-                    SET description = %(desc)s,
-                        rate_limit  = %(rate)s,
-                        updated_at  = NOW()
-                    WHERE id = %(id)s
-                    """,
-                    {
-                        "id": existing["id"],
-                        "desc": desc,
-                        "rate": rate_limit,
-                    },
-                )
-                updated += 1
-            else:
-                # belum ada → insert baru
-                db.execute(
-                    """
-                    INSERT INTO ppp_profiles
-                        (reseller_id, name, description, rate_limit,
-                         is_isolation, monthly_price, created_at, updated_at)
-                    VALUES
-                        (%(rid)s, %(name)s, %(desc)s, %(rate)s,
-                         FALSE, 0, NOW(), NOW())
-                    """,
-                    {
-                        "rid": reseller["id"],
-                        "name": name,
-                        "desc": desc,
-                        "rate": rate_limit,
-                    },
-                )
-                inserted += 1
-
-        except Exception as e:
-            print(f"[sync_profiles_dashboard] gagal sinkron profile {name}: {e}")
-
-    msg = f"Sinkron profil selesai. {inserted} profil baru, {updated} profil diperbarui."
-    return redirect(url_for("main.dashboard", p_success=msg))
+    return start_job(
+        "sync_profiles",
+        reseller["id"],
+        {"router_ip": router_ip},
+        return_url=url_for("main.dashboard"),
+        return_keys=("p_success", "p_error"),
+    )
 
 
 
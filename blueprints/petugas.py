@@ -12,12 +12,18 @@ from flask import (
     session,
     redirect,
     url_for,
-    render_template_string,
+    render_template,
 )
 
 import db
+import router_queue
+import router_snapshots
+from auth import load_reseller
+from templating import INLINE_TEMPLATES, render_inline_template
+from billing_logic import get_last_reversible_payment, reverse_customer_payment
 from cron_jobs.notify_unpaid_users import format_rupiah
-from mikrotik_client import get_ppp_active, MikrotikError 
+from config import Config
+from mikrotik_client import MikrotikError
 bp = Blueprint("petugas", __name__)
 
 
@@ -63,21 +69,7 @@ def _redirect_back_with_message(
     return redirect(f"{prev_url}{connector}{query}")
 
 
-def _render_simple_page(
-    title: str,
-    body_html: str,
-    context: Dict[str, Any] | None = None,
-):
-    """
-    Layout HTML sederhana (tanpa navbar utama app.py).
-    body_html dirender sebagai template jinja dan disisipkan ke base_template.
-    """
-    if context is None:
-        context = {}
-
-    body_rendered = render_template_string(body_html, **context)
-
-    base_template = r"""
+PETUGAS_LAYOUT = INLINE_TEMPLATES.add("layout/petugas.html", r"""
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -163,9 +155,26 @@ document.addEventListener('DOMContentLoaded', function() {
 
 </body>
 </html>
-"""
-    return render_template_string(
-        base_template,
+""")
+
+
+def _render_simple_page(
+    title: str,
+    body_html: str,
+    context: Dict[str, Any] | None = None,
+):
+    """
+    Layout HTML sederhana (tanpa navbar utama app.py).
+    body_html dirender sebagai template jinja dan disisipkan ke
+    layout/petugas.html (keduanya dikompilasi sekali per proses).
+    """
+    if context is None:
+        context = {}
+
+    body_rendered = render_inline_template(body_html, **context)
+
+    return render_template(
+        PETUGAS_LAYOUT,
         title=title,
         body=body_rendered,
         **context,
@@ -193,24 +202,7 @@ def _require_petugas_login(
             url_for("petugas.login_petugas", petugas_slug=petugas_slug)
         )
 
-    # Ambil reseller dari DB
-    reseller = db.query_one(
-        """
-        SELECT id,
-               display_name,
-               router_username,
-               router_password,
-               wa_number,
-               email,
-               use_notifications,
-               use_auto_payment,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": petugas_reseller_id},
-    )
-
+    reseller = load_reseller(petugas_reseller_id)
     if reseller is None or not reseller["is_active"]:
         _clear_petugas_session()
         return None, None, None, redirect(
@@ -394,7 +386,7 @@ def list_petugas_customers(petugas_slug: str):
             "payment_status_text IN ('unpaid_current_period','never_paid')"
         )
     elif status_filter == "isolated":
-        where_clauses.append("is_isolated = TRUE")
+        where_clauses.append("payment_status_text = 'isolated'")
     elif status_filter == "disabled":
         where_clauses.append("is_enabled = FALSE")
 
@@ -510,7 +502,15 @@ def list_petugas_customers(petugas_slug: str):
         api_user = reseller["router_username"]
         api_pass = reseller["router_password"]
         try:
-            active_list = get_ppp_active(router_ip, api_user, api_pass)
+            active_list, active_meta = router_snapshots.fetch(
+                reseller["id"], "ppp_active", router_ip, api_user, api_pass,
+                max_age=Config.ROUTER_SNAPSHOT_VIEW_AGE,
+            )
+            if active_meta["error"]:
+                router_error = (
+                    f"Gagal membaca PPP active: {active_meta['error']} — status online "
+                    f"dari snapshot {router_snapshots.describe_age(active_meta['age_seconds'])}."
+                )
             if isinstance(active_list, list):
                 for a in active_list:
                     if isinstance(a, dict):
@@ -864,24 +864,7 @@ def cancel_pay_customer(petugas_slug: str, customer_id: int):
             default_kwargs={"petugas_slug": petugas_slug},
         )
 
-    payment = db.query_one(
-        """
-        SELECT
-          id,
-          months,
-          old_last_period,
-          new_last_period,
-          old_is_isolated,
-          new_is_isolated
-        FROM customer_payments
-        WHERE customer_id = %(cid)s
-          AND reseller_id = %(rid)s
-          AND reversed_by_id IS NULL
-        ORDER BY created_at DESC
-        LIMIT 1
-        """,
-        {"cid": customer_id, "rid": reseller["id"]},
-    )
+    payment = get_last_reversible_payment(customer_id, reseller["id"])
 
     if payment is None:
         return _redirect_back_with_message(
@@ -890,78 +873,18 @@ def cancel_pay_customer(petugas_slug: str, customer_id: int):
             default_kwargs={"petugas_slug": petugas_slug},
         )
 
-    old_last_period = payment["old_last_period"]
-    new_last_period = payment["new_last_period"]
     old_iso = payment["old_is_isolated"]
     new_iso = payment["new_is_isolated"]
 
     try:
-        # 1) rollback last_paid_period + is_isolated
-        db.execute(
-            """
-            UPDATE ppp_customers
-            SET last_paid_period = %(old_last)s,
-                is_isolated      = COALESCE(%(old_iso)s, is_isolated),
-                updated_at       = NOW()
-            WHERE id = %(cid)s
-              AND reseller_id = %(rid)s
-            """,
-            {
-                "old_last": old_last_period,
-                "old_iso": old_iso,
-                "cid": customer_id,
-                "rid": reseller["id"],
-            },
-        )
-
-        # 2) catat rollback
-        rollback = db.query_one(
-            """
-            INSERT INTO customer_payments (
-                customer_id,
-                reseller_id,
-                months,
-                old_last_period,
-                new_last_period,
-                old_is_isolated,
-                new_is_isolated,
-                source,
-                note
-            ) VALUES (
-                %(cid)s,
-                %(rid)s,
-                %(months)s,
-                %(old_last)s,
-                %(new_last)s,
-                %(old_iso)s,
-                %(new_iso)s,
-                %(source)s,
-                %(note)s
-            )
-            RETURNING id
-            """,
-            {
-                "cid": customer_id,
-                "rid": reseller["id"],
-                "months": -payment["months"],
-                "old_last": new_last_period,
-                "new_last": old_last_period,
-                "old_iso": new_iso,
-                "new_iso": old_iso,
-                "source": "cancel_pay_petugas",
-                "note": f"Undo payment {payment['id']} via petugas",
-            },
-        )
-        rollback_id = rollback["id"]
-
-        # 3) tandai payment lama sudah di-undo
-        db.execute(
-            """
-            UPDATE customer_payments
-            SET reversed_by_id = %(rbid)s
-            WHERE id = %(pid)s
-            """,
-            {"rbid": rollback_id, "pid": payment["id"]},
+        # rollback last_paid_period + is_isolated, catat rollback,
+        # dan tandai payment lama sudah di-undo (satu transaksi)
+        reverse_customer_payment(
+            payment,
+            customer_id,
+            reseller["id"],
+            source="cancel_pay_petugas",
+            note=f"Undo payment {payment['id']} via petugas",
         )
     except Exception as e:
         return _redirect_back_with_message(
@@ -991,37 +914,15 @@ def cancel_pay_customer(petugas_slug: str, customer_id: int):
                     {"rid": reseller["id"]},
                 )
                 if iso_profile:
-                    from mikrotik_client import (
-                        update_ppp_secret,
-                        terminate_ppp_active_by_name,
+                    # diantrikan di belakang unisolate dari pembayaran (kalau
+                    # belum jalan, keduanya digabung: isolate yang menang)
+                    router_queue.enqueue(
+                        reseller["id"], router_ip, cust["ppp_username"],
+                        updates={"profile": iso_profile["name"]},
+                        isolation="isolate",
+                        customer_id=customer_id,
+                        source="cancel_pay",
                     )
-
-                    api_user = reseller["router_username"]
-                    api_pass = reseller["router_password"]
-
-                    try:
-                        update_ppp_secret(
-                            router_ip,
-                            api_user,
-                            api_pass,
-                            secret_name=cust["ppp_username"],
-                            updates={"profile": iso_profile["name"]},
-                        )
-                        try:
-                            terminate_ppp_active_by_name(
-                                router_ip,
-                                api_user,
-                                api_pass,
-                                cust["ppp_username"],
-                            )
-                        except Exception as e:
-                            print(
-                                f"[petugas.cancel_pay_customer] gagal terminate session {cust['ppp_username']}: {e}"
-                            )
-                    except MikrotikError as e:
-                        print(
-                            f"[petugas.cancel_pay_customer] DB rollback OK, tapi gagal set profile isolasi di router: {e}"
-                        )
     except Exception as e:
         print(f"[petugas.cancel_pay_customer] error saat penyesuaian Mikrotik: {e}")
 
@@ -1140,7 +1041,7 @@ def petugas_print_customer(petugas_slug: str, cid: int):
 </html>
     """
 
-    return render_template_string(html, escpos_text=escpos_text)
+    return render_inline_template(html, escpos_text=escpos_text)
 
 @bp.route("/petugas/<petugas_slug>/customer/<int:cid>/edit", methods=["GET", "POST"])
 def edit_petugas_customer(petugas_slug: str, cid: int):
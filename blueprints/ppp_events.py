@@ -0,0 +1,48 @@
+# blueprints/ppp_events.py
+
+from __future__ import annotations
+
+from flask import Blueprint, jsonify, request
+
+import ppp_events
+from config import Config
+
+bp = Blueprint("ppp_events", __name__)
+
+
+@bp.route("/api/ppp-events/<int:reseller_id>", methods=["POST"])
+def ingest(reseller_id: int):
+    """
+    Endpoint batch event PPP dari scheduler router (lihat ppp_events.py).
+    Tanpa session login; autentikasi = header X-Billing-Token milik
+    reseller_id di URL.
+    """
+    if not ppp_events.check_token(reseller_id, request.headers.get(ppp_events.TOKEN_HEADER)):
+        return jsonify({"error": "invalid_token"}), 401
+
+    # batas kasar ukuran body: ~200 byte per event
+    if (request.content_length or 0) > Config.PPP_EVENTS_MAX_BATCH * 200:
+        return jsonify({"error": "batch_too_large"}), 413
+
+    try:
+        epoch, router_uptime, events, invalid = ppp_events.parse_batch(
+            request.get_data(as_text=True)
+        )
+    except ValueError as e:
+        return jsonify({"error": "bad_batch", "detail": str(e)}), 400
+
+    dropped = max(0, len(events) - Config.PPP_EVENTS_MAX_BATCH)
+    if dropped:
+        events = events[:Config.PPP_EVENTS_MAX_BATCH]
+
+    result = ppp_events.ingest(reseller_id, epoch, events, router_uptime)
+    if result is None:
+        return jsonify({"error": "reseller_not_found"}), 404
+
+    if result["connect"] or result["disconnect"] or result["terlambat"]:
+        print(
+            f"📥 Event PPP reseller {reseller_id}: {result['diterima']} diterima, "
+            f"{result['duplikat']} duplikat, {result['terlambat']} terlambat, "
+            f"+{result['connect']} connect, -{result['disconnect']} disconnect"
+        )
+    return jsonify({"ok": True, "rusak": invalid, "dibuang": dropped, **result})
@@ -11,8 +11,9 @@ from flask import (
 )
 
 import db
+from auth import get_logged_in_reseller
 from app import render_terminal_page
-from mikrotik_client import get_ppp_profiles, MikrotikError
+from blueprints.jobs import start_job
 
 bp = Blueprint("profiles", __name__)
 
@@ -28,20 +29,8 @@ def _require_login():
     if not reseller_id:
         return None, None, redirect(url_for("auth_reseller.login"))
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username, router_password,
-               wa_number, email,
-               use_notifications, use_auto_payment,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, None, redirect(url_for("auth_reseller.login"))
 
     return reseller, router_ip, None
@@ -161,7 +150,8 @@ Catatan:
 @bp.route("/profiles/sync", methods=["POST"])
 def sync_profiles():
     """
-    Sinkron profil dari router reseller:
+    Sinkron profil dari router reseller, sebagai job latar belakang
+    (router_sync.sync_profiles_job):
     - Ambil /ppp/profile dari Mikrotik reseller
     - Untuk setiap profile:
         INSERT INTO ppp_profiles (reseller_id, name, description, rate_limit)
@@ -172,75 +162,13 @@ def sync_profiles():
     if redirect_resp is not None:
         return redirect_resp
 
-    error = None
-    success = None
-
     if not router_ip:
         error = "Router IP tidak tersedia di session. Silakan login ulang."
         return redirect(url_for("profiles.list_profiles", error=error))
 
-    api_user = reseller["router_username"]
-    api_pass = reseller["router_password"]
-
-    # 1. Ambil profil dari router
-    try:
-        mt_profiles = get_ppp_profiles(router_ip, api_user, api_pass)
-    except MikrotikError as e:
-        error = f"Gagal mengambil profil dari router: {e}"
-        return redirect(url_for("profiles.list_profiles", error=error))
-    except Exception as e:
-        error = f"Error tidak terduga saat akses router: {e}"
-        return redirect(url_for("profiles.list_profiles", error=error))
-
-    if not mt_profiles:
-        error = "Router tidak mengembalikan data profil PPP."
-        return redirect(url_for("profiles.list_profiles", error=error))
-
-    # 2. Upsert ke ppp_profiles
-    inserted = 0
-    updated = 0
-
-    for prof in mt_profiles:
-        if not isinstance(prof, dict):
-            continue
-
-        name = prof.get("name")
-        if not name:
-            continue
-
-        desc = prof.get("comment") or prof.get("description") or None
-        rate_limit = prof.get("rate-limit") or prof.get("rate_limit") or None
-
-        try:
-            row = db.query_one(
-                """
-                INSERT INTO ppp_profiles
-                    (reseller_id, name, description, rate_limit,
-                     is_isolation, monthly_price, created_at, updated_at)
-                VALUES
-                    (%(rid)s, %(name)s, %(desc)s, %(rate)s,
-                     FALSE, 0, NOW(), NOW())
-                ON CONFLICT (reseller_id, name)
-                DO UPDATE
-                    SET description = EXCLUDED.description,
-                        rate_limit  = EXCLUDED.rate_limit,
-                        updated_at  = NOW()
-                RETURNING xmax = 0 AS inserted
-                """,
-                {
-                    "rid": reseller["id"],
-                    "name": name,
-                    "desc": desc,
-                    "rate": rate_limit,
-                },
-            )
-            if row and row["inserted"]:
-                inserted += 1
-            else:
-                updated += 1
-        except Exception as e:
-            # kalau satu profil error, kita skip tapi tulis ke log
-            print(f"[sync_profiles] gagal upsert profile {name}: {e}")
-
-    success = f"Sinkron selesai. {inserted} profil baru, {updated} profil diperbarui."
-    return redirect(url_for("profiles.list_profiles", success=success))
+    return start_job(
+        "sync_profiles",
+        reseller["id"],
+        {"router_ip": router_ip},
+        return_url=url_for("profiles.list_profiles"),
+    )
@@ -11,8 +11,10 @@ from flask import (
 )
 
 import db
+from auth import get_logged_in_reseller
 from app import render_terminal_page
-from wa_client import send_wa, WhatsAppError
+import wa_outbox
+from wa_client import split_message
 
 bp = Blueprint("reports", __name__)
 
@@ -25,19 +27,8 @@ def _require_login():
     if not reseller_id:
         return None, redirect(url_for("auth_reseller.login"))
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username,
-               wa_number, use_notifications,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, redirect(url_for("auth_reseller.login"))
 
     return reseller, None
@@ -232,6 +223,7 @@ def unpaid_users():
 def send_wa_unpaid():
     """
     Kirim WhatsApp ke semua pelanggan yang belum bayar bulan ini.
+    Pesan dimasukkan ke antrian wa_outbox (satu INSERT) dan dikirim worker.
 
     Syarat:
     - reseller.use_notifications = TRUE
@@ -251,11 +243,13 @@ def send_wa_unpaid():
         rows = db.query_all(
             """
             SELECT
+              customer_id,
               ppp_username,
               full_name,
               wa_number,
               profile_name,
-              monthly_price
+              monthly_price,
+              current_period
             FROM v_unpaid_customers_current_period
             WHERE reseller_id = %(rid)s
               AND wa_number IS NOT NULL
@@ -269,9 +263,7 @@ def send_wa_unpaid():
     if not rows:
         return redirect(url_for("reports.unpaid_users", success="Tidak ada pelanggan unpaid yang punya nomor WA."))
 
-    sukses = 0
-    gagal = 0
-
+    messages = []
     for r in rows:
         number = r["wa_number"]
         user = r["ppp_username"]
@@ -289,14 +281,29 @@ def send_wa_unpaid():
             f"- {reseller['display_name'] or reseller['router_username']}"
         )
 
-        try:
-            send_wa(number, message)
-            sukses += 1
-        except WhatsAppError as e:
-            print(f"[send_wa_unpaid] gagal kirim WA ke {number}: {e}")
-            gagal += 1
+        # satu pengingat per pelanggan per periode: klik ulang tidak
+        # mengirim pesan ganda
+        period = r.get("current_period")
+        messages.append({
+            "to": number,
+            "message": message,
+            "template": "unpaid_reminder",
+            "dedupe_key": (
+                f"unpaid_reminder:{r['customer_id']}:{period:%Y-%m}" if period else None
+            ),
+            "reseller_id": reseller["id"],
+            "customer_id": r["customer_id"],
+        })
 
-    msg = f"WA terkirim ke {sukses} pelanggan. Gagal: {gagal}."
+    try:
+        queued = wa_outbox.enqueue_many(messages)
+    except Exception as e:
+        print(f"[send_wa_unpaid] gagal antrikan WA: {e}")
+        return redirect(url_for("reports.unpaid_users", error=f"Gagal antrikan WA: {e}"))
+
+    msg = f"{queued} pesan WA masuk antrian kirim."
+    if queued < len(messages):
+        msg += f" {len(messages) - queued} pelanggan sudah diingatkan periode ini."
     return redirect(url_for("reports.unpaid_users", success=msg))
 
 # ======================================================================
@@ -350,14 +357,10 @@ def send_wa_unpaid_summary():
             )
         )
 
-    # Susun teks ringkasan
+    # Susun teks ringkasan (dipecah kalau melebihi batas panjang pesan gateway)
     lines: list[str] = []
     header_name = reseller["display_name"] or reseller["router_username"]
 
-    lines.append("Laporan pelanggan belum bayar bulan ini:")
-    lines.append(f"Reseller: {header_name}")
-    lines.append("")
-
     total = 0
     for idx, r in enumerate(rows, start=1):
         name = r.get("full_name") or "-"
@@ -367,18 +370,26 @@ def send_wa_unpaid_summary():
 
         lines.append(f"{idx}. {name} (Petugas: {petugas}) - Rp {price:,.0f}")
 
-    lines.append("")
-    lines.append(f"Total tagihan: Rp {total:,.0f}")
-    lines.append("")
-    lines.append("Detail lengkap bisa dilihat di menu Reports » Unpaid.")
-    lines.append(f"- {header_name}")
-
-    message = "\n".join(lines)
+    messages = split_message(
+        f"Laporan pelanggan belum bayar bulan ini:\nReseller: {header_name}",
+        lines,
+        f"Total tagihan: Rp {total:,.0f}\n\n"
+        f"Detail lengkap bisa dilihat di menu Reports » Unpaid.\n"
+        f"- {header_name}",
+    )
 
     try:
-        send_wa(wa_target, message)
-    except WhatsAppError as e:
-        print(f"[send_wa_unpaid_summary] gagal kirim WA ringkasan ke reseller: {e}")
+        wa_outbox.enqueue_many(
+            {
+                "to": wa_target,
+                "message": message,
+                "template": "unpaid_summary",
+                "reseller_id": reseller["id"],
+            }
+            for message in messages
+        )
+    except Exception as e:
+        print(f"[send_wa_unpaid_summary] gagal antrikan WA ringkasan ke reseller: {e}")
         return redirect(
             url_for(
                 "reports.unpaid_users",
@@ -389,6 +400,6 @@ def send_wa_unpaid_summary():
     return redirect(
         url_for(
             "reports.unpaid_users",
-            success="Ringkasan unpaid berhasil dikirim ke WA reseller.",
+            success="Ringkasan unpaid masuk antrian kirim ke WA reseller.",
         )
     )
@@ -11,7 +11,10 @@ from flask import (
 )
 
 import db
+from auth import get_logged_in_reseller, invalidate_reseller
 from app import render_terminal_page
+from config import Config
+from isolation import ISOLATION_MODES, MODE_PROFILE, reseller_isolation_mode
 
 bp = Blueprint("reseller_settings", __name__)
 
@@ -27,20 +30,8 @@ def _require_login():
     if not reseller_id:
         return None, None, redirect(url_for("auth_reseller.login"))
 
-    reseller = db.query_one(
-        """
-        SELECT id, display_name, router_username,
-               wa_number, email,
-               use_notifications, use_auto_payment,
-               is_active
-        FROM resellers
-        WHERE id = %(rid)s
-        """,
-        {"rid": reseller_id},
-    )
-
-    if reseller is None or not reseller["is_active"]:
-        session.clear()
+    reseller = get_logged_in_reseller()
+    if reseller is None:
         return None, None, redirect(url_for("auth_reseller.login"))
 
     return reseller, router_ip, None
@@ -52,6 +43,7 @@ def settings():
     Halaman pengaturan reseller:
     - View + update display_name, WA, email
     - Toggle use_notifications & use_auto_payment
+    - Pilih mode isolasi (profile / address_list, lihat isolation.py)
     """
     reseller, router_ip, redirect_resp = _require_login()
     if redirect_resp is not None:
@@ -66,6 +58,7 @@ def settings():
     email = reseller.get("email") or ""
     use_notifications = bool(reseller.get("use_notifications", False))
     use_auto_payment = bool(reseller.get("use_auto_payment", False))
+    isolation_mode = reseller_isolation_mode(reseller)
 
     if request.method == "POST":
         display_name = (request.form.get("display_name") or "").strip()
@@ -73,9 +66,12 @@ def settings():
         email = (request.form.get("email") or "").strip()
         use_notifications = request.form.get("use_notifications") == "on"
         use_auto_payment = request.form.get("use_auto_payment") == "on"
+        isolation_mode = request.form.get("isolation_mode") or MODE_PROFILE
 
         if not display_name:
             error = "Nama reseller tidak boleh kosong."
+        elif isolation_mode not in ISOLATION_MODES:
+            error = "Mode isolasi tidak dikenal."
         else:
             try:
                 db.execute(
@@ -86,6 +82,7 @@ def settings():
                         email = %(em)s,
                         use_notifications = %(un)s,
                         use_auto_payment = %(ua)s,
+                        isolation_mode = %(im)s,
                         updated_at = NOW()
                     WHERE id = %(rid)s
                     """,
@@ -95,9 +92,11 @@ def settings():
                         "em": email or None,
                         "un": use_notifications,
                         "ua": use_auto_payment,
+                        "im": isolation_mode,
                         "rid": reseller["id"],
                     },
                 )
+                invalidate_reseller(reseller["id"])
                 success = "Pengaturan berhasil disimpan."
             except Exception as e:
                 error = f"Gagal menyimpan pengaturan: {e}"
@@ -232,6 +231,33 @@ def settings():
     </p>
   </section>
 
+  <!-- Mode Isolasi -->
+  <section class="rounded-lg border border-slate-800 bg-slate-900/70 p-4">
+    <h3 class="mb-3 text-sm font-semibold text-slate-200">🚧 Mode Isolasi</h3>
+
+    <div class="space-y-2 text-sm">
+      {% for value, label in isolation_modes.items() %}
+      <label class="flex items-start gap-2 text-xs text-slate-200">
+        <input
+          type="radio"
+          name="isolation_mode"
+          value="{{ value }}"
+          {% if isolation_mode == value %}checked{% endif %}
+          class="mt-0.5 h-3 w-3 border-slate-600 bg-slate-900"
+        >
+        <span>{{ label }}</span>
+      </label>
+      {% endfor %}
+    </div>
+
+    <p class="mt-3 text-[11px] text-slate-500 leading-relaxed">
+      Mode address-list memasukkan IP pelanggan yang diisolir ke address-list
+      <span class="font-mono text-slate-300">{{ address_list }}</span>, dan profile isolasi
+      berlaku saat reconnect berikutnya. Router perlu rule firewall, misal:<br>
+      <span class="font-mono text-slate-300">/ip firewall filter add chain=forward src-address-list={{ address_list }} action=drop</span>
+    </p>
+  </section>
+
   <!-- Tombol Aksi -->
   <div class="flex flex-wrap items-center gap-2 pt-1">
     <button
@@ -261,5 +287,8 @@ def settings():
             "email": email,
             "use_notifications": use_notifications,
             "use_auto_payment": use_auto_payment,
+            "isolation_mode": isolation_mode,
+            "isolation_modes": ISOLATION_MODES,
+            "address_list": Config.ISOLATION_ADDRESS_LIST,
         },
     )
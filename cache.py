@@ -0,0 +1,201 @@
+"""
+cache.py
+--------
+Cache in-process (per worker) dengan expiry per key + invalidasi lintas proses.
+
+Setiap worker gunicorn punya isi cache sendiri. Supaya perubahan dari worker
+lain atau dari container cron langsung terlihat, invalidasi dikirim lewat
+Postgres NOTIFY di channel "billing_cache" dengan payload "<cache>:<key>"
+(key "*" = kosongkan seluruh cache itu).
+
+Listener LISTEN berjalan di thread daemon, dibuat saat cache pertama kali
+dibaca (proses cron yang hanya invalidate tidak membuat thread). Selama
+listener belum/tidak tersambung, get() selalu miss: data tidak pernah
+disajikan tanpa jaminan invalidasi. max_ttl tetap membatasi umur data.
+
+Menyediakan:
+- TTLCache(name, max_ttl)   -> get / set / invalidate / clear
+- MISSING                   -> penanda cache miss
+- invalidate(name, key)     -> invalidasi lokal + NOTIFY ke proses lain
+"""
+
+from __future__ import annotations
+
+import os
+import select
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import psycopg2
+
+import db
+import metrics
+from config import Config
+
+CHANNEL = "billing_cache"
+ALL_KEYS = "*"
+
+MISSING = object()
+
+_CACHES: Dict[str, "TTLCache"] = {}
+
+_listener_lock = threading.Lock()
+_listener_pid: Optional[int] = None
+_listener_ready = threading.Event()
+
+
+class TTLCache:
+    """
+    Dict sederhana key -> (expires_at, value), thread-safe.
+    Key selalu dinormalisasi ke str supaya cocok dengan payload NOTIFY.
+    """
+
+    def __init__(self, name: str, max_ttl: float) -> None:
+        if ":" in name:
+            raise ValueError("nama cache tidak boleh mengandung ':'")
+        self.name = name
+        self.max_ttl = max_ttl
+        self._data: Dict[str, Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+        _CACHES[name] = self
+
+    def get(self, key: Any) -> Any:
+        """
+        Ambil value; kembalikan MISSING kalau tidak ada / kadaluarsa /
+        listener invalidasi belum aktif.
+        """
+        if not _ensure_listener():
+            metrics.CACHE_LOOKUPS.labels(self.name, "miss").inc()
+            return MISSING
+
+        k = str(key)
+        with self._lock:
+            item = self._data.get(k)
+            if item is not None and item[0] <= time.time():
+                del self._data[k]
+                item = None
+
+        if item is None:
+            metrics.CACHE_LOOKUPS.labels(self.name, "miss").inc()
+            return MISSING
+        metrics.CACHE_LOOKUPS.labels(self.name, "hit").inc()
+        return item[1]
+
+    def set(self, key: Any, value: Any, expires_at: Optional[float] = None) -> None:
+        """
+        Simpan value sampai expires_at (epoch detik), dibatasi max_ttl.
+        """
+        limit = time.time() + self.max_ttl
+        if expires_at is None or expires_at > limit:
+            expires_at = limit
+        with self._lock:
+            self._data[str(key)] = (expires_at, value)
+
+    def invalidate(self, key: Any) -> None:
+        k = str(key)
+        if k == ALL_KEYS:
+            self.clear()
+            return
+        with self._lock:
+            self._data.pop(k, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def invalidate(name: str, key: Any = ALL_KEYS) -> None:
+    """
+    Buang key dari cache `name` di proses ini dan kirim NOTIFY supaya
+    proses lain (worker gunicorn lain, web <-> cron) ikut membuangnya.
+
+    Gagal NOTIFY tidak dianggap fatal: worker lain tetap dibatasi max_ttl.
+    """
+    cache = _CACHES.get(name)
+    if cache is not None:
+        cache.invalidate(key)
+
+    try:
+        db.query_one(
+            "SELECT pg_notify(%(ch)s, %(payload)s)",
+            {"ch": CHANNEL, "payload": f"{name}:{key}"},
+            commit=True,  # NOTIFY baru terkirim saat commit
+        )
+    except Exception as e:
+        print(f"[cache] gagal NOTIFY invalidasi {name}:{key}: {e}")
+
+
+# ======================================================================
+# Listener NOTIFY
+# ======================================================================
+
+def _ensure_listener() -> bool:
+    """
+    Start thread listener sekali per proses (cek pid: aman setelah fork).
+    Mengembalikan True kalau listener sedang tersambung.
+    """
+    global _listener_pid
+
+    pid = os.getpid()
+    if _listener_pid != pid:
+        with _listener_lock:
+            if _listener_pid != pid:
+                _listener_pid = pid
+                _listener_ready.clear()
+                t = threading.Thread(
+                    target=_listen_loop,
+                    name="cache-invalidation-listener",
+                    daemon=True,
+                )
+                t.start()
+
+    return _listener_ready.is_set()
+
+
+def _apply_notify(payload: str) -> None:
+    name, _, key = payload.partition(":")
+    cache = _CACHES.get(name)
+    if cache is not None and key:
+        cache.invalidate(key)
+
+
+def _clear_all() -> None:
+    for cache in list(_CACHES.values()):
+        cache.clear()
+
+
+def _listen_loop() -> None:
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(Config.DATABASE_URL)
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+
+            # notifikasi selama putus tidak pernah sampai -> mulai dari kosong
+            _clear_all()
+            _listener_ready.set()
+
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    # sepi 60 detik: pastikan koneksi masih hidup
+                    with conn.cursor() as cur:
+                        cur.execute("SELECT 1")
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _apply_notify(conn.notifies.pop(0).payload)
+
+        except Exception as e:
+            print(f"[cache] listener invalidasi terputus: {e}")
+        finally:
+            _listener_ready.clear()
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+
+        time.sleep(5)
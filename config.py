@@ -33,4 +33,184 @@ class Config:
     # Opsi tambahan
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     TIMEZONE = os.getenv("TIMEZONE", "Asia/Jakarta")
-    ITEMS_PER_PAGE = int(os.getenv("ITEMS_PER_PAGE", "20"))
\ No newline at end of file
+    ITEMS_PER_PAGE = int(os.getenv("ITEMS_PER_PAGE", "20"))
+
+    # Arsip partisi customer_payments (cron_jobs.payment_partitions archive)
+    PAYMENT_ARCHIVE_DIR = os.getenv("PAYMENT_ARCHIVE_DIR", "/var/lib/billing/archive")
+    # Bytecode cache Jinja untuk template inline (lihat app.init_templates)
+    TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR", "/tmp/billing-jinja-cache")
+
+    # Batas umur cache keputusan lock invoice per reseller (detik).
+    # Invalidasi normal lewat NOTIFY; ini hanya jaring pengaman.
+    INVOICE_LOCK_CACHE_TTL = int(os.getenv("INVOICE_LOCK_CACHE_TTL", "900"))
+
+    # Umur cache row reseller yang sedang login (detik), lihat auth.py
+    RESELLER_CACHE_TTL = int(os.getenv("RESELLER_CACHE_TTL", "60"))
+
+    # Pool koneksi Postgres per proses (lihat db.py). DB_POOL_MAX sebaiknya
+    # >= jumlah thread per worker gunicorn (GUNICORN_THREADS).
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+
+    # Batas waktu total snapshot router di dashboard (detik), lihat
+    # mikrotik_client.get_router_snapshot
+    ROUTER_SNAPSHOT_DEADLINE = float(os.getenv("ROUTER_SNAPSHOT_DEADLINE", "4"))
+
+    # Snapshot state router (router_snapshots.py): versi yang disimpan per
+    # (reseller, jenis), jarak minimal simpan dari sampler dashboard, umur
+    # snapshot yang boleh dipakai view tanpa call router, dan umur snapshot
+    # yang boleh dipakai ulang sync/rekonsiliasi (semua waktu dalam detik)
+    ROUTER_SNAPSHOT_KEEP = int(os.getenv("ROUTER_SNAPSHOT_KEEP", "10"))
+    ROUTER_SNAPSHOT_MIN_INTERVAL = float(os.getenv("ROUTER_SNAPSHOT_MIN_INTERVAL", "60"))
+    ROUTER_SNAPSHOT_VIEW_AGE = float(os.getenv("ROUTER_SNAPSHOT_VIEW_AGE", "15"))
+    ROUTER_SNAPSHOT_REUSE_AGE = float(os.getenv("ROUTER_SNAPSHOT_REUSE_AGE", "60"))
+
+    # Live stats dashboard (router_stats.py): interval sampler, jeda sebelum
+    # sampler tanpa subscriber berhenti, batas stream SSE per proses, umur
+    # maksimal satu stream, dan lama tunggu long polling (semua dalam detik).
+    # STATS_LONGPOLL_MAX: long poll yang boleh menunggu bersamaan per proses;
+    # sisanya langsung dijawab snapshot terakhir + retry_ms supaya tab
+    # dashboard tidak menghabiskan thread gthread.
+    ROUTER_STATS_INTERVAL = float(os.getenv("ROUTER_STATS_INTERVAL", "3"))
+    ROUTER_STATS_IDLE_GRACE = float(os.getenv("ROUTER_STATS_IDLE_GRACE", "10"))
+    SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "4"))
+    SSE_MAX_AGE = float(os.getenv("SSE_MAX_AGE", "300"))
+    STATS_LONGPOLL_TIMEOUT = float(os.getenv("STATS_LONGPOLL_TIMEOUT", "20"))
+    STATS_LONGPOLL_MAX = int(os.getenv("STATS_LONGPOLL_MAX", "2"))
+
+    # Profiling request (profiling.py): jumlah sampel histogram per endpoint,
+    # folder dump cProfile, dan token capture tanpa sesi admin (kosong = mati)
+    PROFILING_WINDOW = int(os.getenv("PROFILING_WINDOW", "500"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/billing-profiles")
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+    # Metrik Prometheus (metrics.py): token Bearer untuk scrape /metrics
+    # (kosong = hanya sesi admin). Agregasi multi-proses lewat env
+    # PROMETHEUS_MULTIPROC_DIR (dibaca langsung oleh prometheus_client).
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+    # Cron isolasi (cron_jobs/isolate_unpaid_users.py): jumlah reseller yang
+    # diproses bersamaan, dan jumlah call REST paralel ke satu router
+    ISOLATE_WORKERS = int(os.getenv("ISOLATE_WORKERS", "4"))
+    ISOLATE_ROUTER_CONCURRENCY = int(os.getenv("ISOLATE_ROUTER_CONCURRENCY", "4"))
+
+    # Terminate session saat isolasi massal dilakukan bergelombang per router
+    # (mikrotik_client.terminate_ppp_active_waves): session per detik, ukuran
+    # gelombang, jitter jeda (0..1), batas CPU router (%) sebelum menunda
+    # gelombang berikutnya, dan lama tunggu maksimal saat CPU tinggi (detik)
+    TERMINATE_RATE = float(os.getenv("TERMINATE_RATE", "5"))
+    TERMINATE_WAVE_SIZE = int(os.getenv("TERMINATE_WAVE_SIZE", "20"))
+    TERMINATE_WAVE_JITTER = float(os.getenv("TERMINATE_WAVE_JITTER", "0.3"))
+    TERMINATE_CPU_THRESHOLD = int(os.getenv("TERMINATE_CPU_THRESHOLD", "70"))
+    TERMINATE_CPU_MAX_WAIT = float(os.getenv("TERMINATE_CPU_MAX_WAIT", "120"))
+
+    # Rekonsiliasi router vs DB (cron_jobs/reconcile_routers.py): reseller
+    # bersamaan, call REST paralel per router, dan kill session customer yang
+    # profile/disabled-nya diperbaiki (isolation_mode 'profile')
+    RECONCILE_WORKERS = int(os.getenv("RECONCILE_WORKERS", "4"))
+    RECONCILE_ROUTER_CONCURRENCY = int(os.getenv("RECONCILE_ROUTER_CONCURRENCY", "4"))
+    RECONCILE_KILL_SESSIONS = os.getenv("RECONCILE_KILL_SESSIONS", "true").lower() in ("1", "true", "yes")
+
+    # Nama firewall address-list untuk reseller dengan isolation_mode
+    # 'address_list' (lihat isolation.py). Router reseller perlu rule yang
+    # memblokir/redirect src-address-list ini.
+    ISOLATION_ADDRESS_LIST = os.getenv("ISOLATION_ADDRESS_LIST", "billing-isolir")
+    # timeout entry address-list isolasi (format RouterOS, kosong = permanen).
+    # Jaring pengaman terakhir saja, jauh di atas interval cron isolasi harian
+    # (yang memperbarui timeout entry yang masih berlaku) supaya router yang
+    # beberapa hari tidak terjangkau cron tidak melepas isolasi. IP yang
+    # dilepas session dibersihkan hook on-down & sapuan entry basi di cron.
+    ISOLATION_ADDRESS_TIMEOUT = os.getenv("ISOLATION_ADDRESS_TIMEOUT", "7d")
+
+    # Outbox WhatsApp (wa_outbox.py, worker: python -m cron_jobs.wa_outbox_worker)
+    # - batas laju per sender: pesan per menit + burst (token bucket di DB,
+    #   berlaku untuk semua proses worker sekaligus)
+    # - jumlah thread pengirim, jeda polling antrian kosong (detik)
+    # - retry: jeda awal (detik, dobel tiap gagal, maks WA_RETRY_MAX_DELAY)
+    #   dan jumlah percobaan maksimal sebelum status 'failed'
+    WA_RATE_PER_MINUTE = float(os.getenv("WA_RATE_PER_MINUTE", "30"))
+    WA_RATE_BURST = int(os.getenv("WA_RATE_BURST", "5"))
+    WA_WORKER_THREADS = int(os.getenv("WA_WORKER_THREADS", "4"))
+    WA_WORKER_POLL = float(os.getenv("WA_WORKER_POLL", "2"))
+    WA_RETRY_BASE_DELAY = int(os.getenv("WA_RETRY_BASE_DELAY", "30"))
+    WA_RETRY_MAX_DELAY = int(os.getenv("WA_RETRY_MAX_DELAY", "3600"))
+    WA_MAX_ATTEMPTS = int(os.getenv("WA_MAX_ATTEMPTS", "5"))
+
+    # Notifikasi unpaid (cron_jobs/notify_unpaid_users.py)
+    # - WA_MESSAGE_MAX_CHARS: batas panjang satu pesan di gateway; digest
+    #   dipecah menjadi beberapa pesan kalau melebihi batas ini
+    # - NOTIFY_DIGEST_BY: "reseller" (satu digest per reseller) atau
+    #   "petugas" (digest terpisah per petugas, tetap ke nomor reseller)
+    # - NOTIFY_CUSTOMER_DIRECT: kirim pesan per pelanggan ke nomor pelanggan
+    #   yang valid; pelanggan lain masuk digest reseller
+    WA_MESSAGE_MAX_CHARS = int(os.getenv("WA_MESSAGE_MAX_CHARS", "4000"))
+    NOTIFY_DIGEST_BY = os.getenv("NOTIFY_DIGEST_BY", "reseller")
+    NOTIFY_CUSTOMER_DIRECT = os.getenv("NOTIFY_CUSTOMER_DIRECT", "false").lower() in ("1", "true", "yes")
+
+    # wa_client.send_many: jumlah call bersamaan ke API WA, dan endpoint batch
+    # opsional (POST {"messages": [{"number", "message"}, ...]}) kalau gateway
+    # mendukung; kosong = satu POST per pesan ke WA_API_URL
+    WA_SEND_CONCURRENCY = int(os.getenv("WA_SEND_CONCURRENCY", "4"))
+    WA_API_BATCH_URL = os.getenv("WA_API_BATCH_URL") or None
+    WA_API_BATCH_SIZE = int(os.getenv("WA_API_BATCH_SIZE", "50"))
+
+    # Multi-gateway WhatsApp (lihat wa_client.py). JSON list, contoh:
+    #   [{"name":"wa1","url":"https://gw1/send","weight":2,"rate_per_minute":30},
+    #    {"name":"wa2","url":"https://gw2/send","batch_url":"https://gw2/batch"}]
+    # Kosong = satu gateway "default" (WA_API_URL, WA_RATE_PER_MINUTE).
+    # Gateway dianggap down setelah WA_GATEWAY_FAIL_THRESHOLD kegagalan
+    # berturut-turut, selama WA_GATEWAY_COOLDOWN detik.
+    WA_GATEWAYS = os.getenv("WA_GATEWAYS") or None
+    WA_GATEWAY_FAIL_THRESHOLD = int(os.getenv("WA_GATEWAY_FAIL_THRESHOLD", "3"))
+    WA_GATEWAY_COOLDOWN = int(os.getenv("WA_GATEWAY_COOLDOWN", "60"))
+
+    # Job latar belakang (jobs.py, worker: python -m cron_jobs.job_worker)
+    # - jumlah job yang dijalankan bersamaan per proses worker, jeda polling
+    # - progres ditulis ke DB paling sering tiap JOB_PROGRESS_INTERVAL detik
+    # - job running tanpa heartbeat selama JOB_STALE_SECONDS dianggap gagal
+    # - job selesai dihapus setelah JOB_RETENTION_DAYS hari
+    JOB_WORKER_THREADS = int(os.getenv("JOB_WORKER_THREADS", "2"))
+    JOB_WORKER_POLL = float(os.getenv("JOB_WORKER_POLL", "1"))
+    JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "0.5"))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "300"))
+    JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "14"))
+
+    # Antrian perintah router (router_queue.py, worker:
+    # python -m cron_jobs.router_queue_worker)
+    # - jumlah router yang dilayani bersamaan, jeda polling, perintah yang
+    #   dipindai per claim, dan maks perintah per router per claim (router
+    #   mati tidak memonopoli worker)
+    # - retry: jeda awal (detik, dobel tiap gagal, maks ROUTER_RETRY_MAX_DELAY)
+    #   dan jumlah percobaan maksimal sebelum status 'failed'
+    ROUTER_QUEUE_THREADS = int(os.getenv("ROUTER_QUEUE_THREADS", "4"))
+    ROUTER_QUEUE_POLL = float(os.getenv("ROUTER_QUEUE_POLL", "1"))
+    ROUTER_QUEUE_BATCH = int(os.getenv("ROUTER_QUEUE_BATCH", "50"))
+    ROUTER_QUEUE_PER_ROUTER = int(os.getenv("ROUTER_QUEUE_PER_ROUTER", "10"))
+    ROUTER_RETRY_BASE_DELAY = int(os.getenv("ROUTER_RETRY_BASE_DELAY", "10"))
+    ROUTER_RETRY_MAX_DELAY = int(os.getenv("ROUTER_RETRY_MAX_DELAY", "600"))
+    ROUTER_MAX_ATTEMPTS = int(os.getenv("ROUTER_MAX_ATTEMPTS", "6"))
+
+    # Pelacak session PPP (ppp_sessions.py, worker:
+    # python -m cron_jobs.session_tracker): interval baca /ppp/active semua
+    # router (detik), router yang dibaca bersamaan, dan umur riwayat
+    # ppp_sessions yang disimpan (hari)
+    SESSION_POLL_INTERVAL = float(os.getenv("SESSION_POLL_INTERVAL", "30"))
+    SESSION_TRACKER_THREADS = int(os.getenv("SESSION_TRACKER_THREADS", "8"))
+    SESSION_HISTORY_DAYS = int(os.getenv("SESSION_HISTORY_DAYS", "90"))
+
+    # Event PPP push dari router (ppp_events.py, POST /api/ppp-events/<id>):
+    # - PPP_EVENTS_BASE_URL: URL publik aplikasi yang bisa dijangkau router
+    #   (mis. "https://billing.example.com"); kosong = skrip tidak dipasang
+    #   saat sinkron profil
+    # - jeda kirim antrian event dari scheduler router (detik), heartbeat
+    #   tiap N kali jeda walau antrian kosong, maks event per request, dan
+    #   umur event yang disimpan (hari)
+    # - router yang mengirim event dalam SESSION_PUSH_GRACE detik terakhir
+    #   hanya di-poll session tracker tiap SESSION_PUSH_POLL_INTERVAL detik
+    PPP_EVENTS_BASE_URL = os.getenv("PPP_EVENTS_BASE_URL", "").rstrip("/")
+    PPP_EVENTS_FLUSH_INTERVAL = int(os.getenv("PPP_EVENTS_FLUSH_INTERVAL", "10"))
+    PPP_EVENTS_HEARTBEAT_EVERY = int(os.getenv("PPP_EVENTS_HEARTBEAT_EVERY", "30"))
+    PPP_EVENTS_MAX_BATCH = int(os.getenv("PPP_EVENTS_MAX_BATCH", "2000"))
+    PPP_EVENTS_RETENTION_DAYS = int(os.getenv("PPP_EVENTS_RETENTION_DAYS", "30"))
+    SESSION_PUSH_GRACE = float(os.getenv("SESSION_PUSH_GRACE", "900"))
+    SESSION_PUSH_POLL_INTERVAL = float(os.getenv("SESSION_PUSH_POLL_INTERVAL", "900"))
@@ -1,104 +1,64 @@
 # cron_jobs/generate_reseller_invoices.py
-import datetime
-import db
-from wa_client import send_wa, WhatsAppError  # <— tambahkan ini
+import time
 
-TODAY = datetime.date.today()
-PERIOD_START = TODAY.replace(day=1)
-PERIOD_END = (PERIOD_START + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
-DUE_DATE = PERIOD_START + datetime.timedelta(days=10)  # jatuh tempo tgl 10
+import metrics
+from billing_logic import generate_reseller_invoices_for_current_period
+import wa_outbox
 
 
 def generate_invoices():
-    # ambil wa_number juga biar bisa kirim notif
-    resellers = db.query_all("""
-        SELECT id, display_name, use_notifications, use_auto_payment, wa_number
-        FROM resellers
-        WHERE is_active = TRUE
-    """)
-
-    for r in resellers:
-        rid = r["id"]
-        name = r["display_name"]
-        use_notif = r["use_notifications"]
-        use_auto = r["use_auto_payment"]
-        wa_number = (r.get("wa_number") or "").strip()
-
-        price = 250
-        if use_notif and not use_auto:
-            price = 500
-        elif use_notif and use_auto:
-            price = 1000
-
-        # cek apakah sudah ada invoice bulan ini
-        exist = db.query_one("""
-            SELECT 1 FROM reseller_invoices
-            WHERE reseller_id=%(rid)s
-              AND period_start=%(start)s
-        """, {"rid": rid, "start": PERIOD_START})
-        if exist:
-            print(f"Reseller {rid} sudah ada invoice bulan ini, skip.")
-            continue
-
-        enabled_count = db.query_one("""
-            SELECT COUNT(*) AS c FROM ppp_customers
-            WHERE reseller_id=%(rid)s AND is_enabled=TRUE
-        """, {"rid": rid})["c"]
-
-        total = enabled_count * price
-
-        db.execute("""
-            INSERT INTO reseller_invoices
-                (reseller_id, period_start, period_end,
-                 total_enabled_users, price_per_user, total_amount,
-                 use_notifications, use_auto_payment,
-                 status, due_date, created_at, updated_at)
-            VALUES
-                (%(rid)s, %(ps)s, %(pe)s,
-                 %(c)s, %(p)s, %(t)s,
-                 %(n)s, %(a)s,
-                 'pending', %(due)s, NOW(), NOW())
-        """, {
-            "rid": rid,
-            "ps": PERIOD_START,
-            "pe": PERIOD_END,
-            "c": enabled_count,
-            "p": price,
-            "t": total,
-            "n": use_notif,
-            "a": use_auto,
-            "due": DUE_DATE,
-        })
-
-        print(f"✅ Invoice dibuat untuk reseller {name} total Rp{total:,}")
+    # satu INSERT ... SELECT ... RETURNING untuk semua reseller aktif;
+    # hanya invoice yang BARU dibuat yang dikembalikan (aman dijalankan ulang)
+    started = time.perf_counter()
+    created = generate_reseller_invoices_for_current_period()
+    elapsed = time.perf_counter() - started
+
+    total_amount = sum(inv["total_amount"] for inv in created)
+    print(
+        f"✅ {len(created)} invoice dibuat (total Rp{total_amount:,}) "
+        f"dalam {elapsed * 1000:.0f} ms"
+    )
+
+    for inv in created:
+        name = inv["display_name"]
+        wa_number = (inv.get("wa_number") or "").strip()
 
         # === KIRIM WHATSAPP KE RESELLER BAHWA TAGIHAN SUDAH TERBIT ===
         # kirim WA hanya kalau:
         # - reseller mengaktifkan notifikasi
         # - wa_number tidak kosong
-        if use_notif and wa_number:
-            period_label = PERIOD_START.strftime("%B %Y")  # misal 'November 2025'
-            due_label = DUE_DATE.strftime("%d-%m-%Y")
-
-            msg = (
-                f"Halo {name},\n\n"
-                f"Tagihan untuk periode {period_label} sudah terbit.\n"
-                f"Total user aktif: {enabled_count}\n"
-                f"Harga per user: Rp {price:,}\n"
-                f"Total tagihan: Rp {total:,}\n"
-                f"Jatuh tempo: {due_label}.\n\n"
-                f"Terima kasih."
-            )
+        if not (inv["use_notifications"] and wa_number):
+            continue
 
-            try:
-                send_wa(wa_number, msg)
-                print(f"📲 Notifikasi invoice dikirim ke {wa_number} (reseller {name})")
-            except WhatsAppError as e:
-                print(f"⚠️ Gagal kirim WA ke reseller {name} ({wa_number}): {e}")
+        period_label = inv["period_start"].strftime("%B %Y")  # misal 'November 2025'
+        due_label = inv["due_date"].strftime("%d-%m-%Y")
+
+        msg = (
+            f"Halo {name},\n\n"
+            f"Tagihan untuk periode {period_label} sudah terbit.\n"
+            f"Total user aktif: {inv['total_enabled_users']}\n"
+            f"Harga per user: Rp {inv['price_per_user']:,}\n"
+            f"Total tagihan: Rp {inv['total_amount']:,}\n"
+            f"Jatuh tempo: {due_label}.\n\n"
+            f"Terima kasih."
+        )
+
+        try:
+            wa_outbox.enqueue(
+                wa_number,
+                msg,
+                template="invoice_issued",
+                dedupe_key=f"invoice_issued:{inv['reseller_id']}:{inv['period_start']:%Y-%m}",
+                reseller_id=inv["reseller_id"],
+            )
+            print(f"📲 Notifikasi invoice diantrikan ke {wa_number} (reseller {name})")
+        except Exception as e:
+            print(f"⚠️ Gagal antrikan WA ke reseller {name} ({wa_number}): {e}")
 
 
 if __name__ == "__main__":
-    generate_invoices()
+    with metrics.cron_job("generate_reseller_invoices"):
+        generate_invoices()
 
 
 
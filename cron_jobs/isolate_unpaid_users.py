@@ -2,124 +2,258 @@
 
 from __future__ import annotations
 
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
 import db
+import metrics
+import router_snapshots
+from config import Config
+from isolation import MODE_ADDRESS_LIST, isolate_batch_address_list, reseller_isolation_mode
 
 from mikrotik_client import (
-    update_ppp_secret,
-    terminate_ppp_active_by_name,
+    update_ppp_secrets_bulk,
+    terminate_ppp_active_waves,
     MikrotikError,
 )
-from blueprints.auth_reseller import _get_router_ip_for_reseller
+from blueprints.auth_reseller import _get_router_ip_map
 
 
-def isolate_unpaid_users() -> None:
-    print("=== Mulai isolasi pelanggan unpaid ===")
+def _load_targets() -> List[Dict[str, Any]]:
+    """
+    Reseller aktif yang punya pelanggan harus diisolir, lengkap dengan
+    profile isolasi dan daftar pelanggannya (2 query untuk semua reseller).
 
-    # 1. Ambil data reseller aktif
+    Pelanggan = should_isolate_current_period (enabled, belum isolate,
+    belum bayar, billing_start_date tidak di bulan depan), jadi yang sudah
+    terisolir tidak diproses ulang setiap hari.
+    """
     resellers = db.query_all("""
-        SELECT id, display_name, username, router_username, router_password
-        FROM resellers
-        WHERE is_active = TRUE
-    """)
-
-    for r in resellers:
-        rid = r["id"]
-        name = r["display_name"]
-        reseller_ppp_name = r["username"]
-
-        api_user = r.get("router_username")
-        api_pass = r.get("router_password")
-
-        if not api_user or not api_pass:
-            print(f"⚠️ Reseller {name}: router_username/password kosong, skip.")
-            continue
-
-        # 2. Ambil router IP
-        router_ip = _get_router_ip_for_reseller(reseller_ppp_name)
-        if not router_ip:
-            print(f"⚠️ Reseller {name}: tidak dapat router_ip dari Router Admin, skip.")
-            continue
-
-        # 3. Ambil profile isolasi
-        iso_prof = db.query_one("""
-            SELECT id, name
+        SELECT
+            r.id, r.display_name, r.username, r.router_username, r.router_password,
+            r.isolation_mode,
+            p.name AS iso_profile
+        FROM resellers r
+        LEFT JOIN LATERAL (
+            SELECT name
             FROM ppp_profiles
-            WHERE reseller_id = %(rid)s
+            WHERE reseller_id = r.id
               AND is_isolation = TRUE
             ORDER BY id
             LIMIT 1
-        """, {"rid": rid})
-
-        if not iso_prof:
-            print(f"⚠️ {name} belum punya profile isolasi, skip.")
-            continue
-
-        iso_id = iso_prof["id"]
-        iso_name = iso_prof["name"]
-
-        # 4. Ambil daftar pelanggan unpaid
-        unpaid = db.query_all("""
-            SELECT v.customer_id, c.ppp_username
-            FROM v_unpaid_customers_current_period v
-            JOIN ppp_customers c ON c.id = v.customer_id
-            WHERE v.reseller_id = %(rid)s
-        """, {"rid": rid})
-
-        if not unpaid:
-            continue
-
-        print(f"Reseller {name}: isolir {len(unpaid)} pelanggan (router_ip={router_ip}).")
-
-        # 5. Proses tiap customer
-        for u in unpaid:
-            cid = u["customer_id"]
-            username = u["ppp_username"]
-
-            # 5a. Update DB
-            try:
-                db.execute("""
-                    UPDATE ppp_customers
-                    SET 
-                        is_isolated = TRUE,
-                        updated_at = NOW()
-                    WHERE id = %(cid)s
-                """, {"pid": iso_id, "cid": cid})
-            except Exception as e:
-                print(f"❌ Gagal update DB isolasi id={cid} ({username}): {e}")
-                continue
-
-            # 5b. Update profile di MikroTik
-            try:
-                update_ppp_secret(
-                    router_ip,
-                    api_user,
-                    api_pass,
-                    secret_name=username,
-                    updates={"profile": iso_name},
-                )
-            except MikrotikError as e:
-                print(
-                    f"⚠️ DB sudah isolate, tapi gagal ganti profile di router "
-                    f"untuk {username} (reseller {name}): {e}"
-                )
-                continue
-            except Exception as e:
-                print(
-                    f"⚠️ DB sudah isolate, tapi error lain saat ganti profile di router "
-                    f"untuk {username} (reseller {name}): {e}"
-                )
-                continue
-
-            # 5c. Kill session aktif agar reconnect dengan profile isolasi
-            try:
-                terminate_ppp_active_by_name(router_ip, api_user, api_pass, username)
-            except Exception as e:
-                print(f"ℹ️ Gagal terminate session {username}: {e}")
-
-            print(f"✅ {name}: user {username} di-isolate (profile '{iso_name}')")
+        ) p ON TRUE
+        WHERE r.is_active = TRUE
+          AND EXISTS (
+              SELECT 1 FROM ppp_customers c
+              WHERE c.reseller_id = r.id
+                AND c.should_isolate_current_period = TRUE
+          )
+        ORDER BY r.id
+    """)
+    if not resellers:
+        return []
+
+    customers = db.query_all("""
+        SELECT id, reseller_id, ppp_username
+        FROM ppp_customers
+        WHERE should_isolate_current_period = TRUE
+          AND reseller_id = ANY(%(rids)s)
+        ORDER BY reseller_id, id
+    """, {"rids": [r["id"] for r in resellers]})
+
+    by_reseller: Dict[int, List[Dict[str, Any]]] = {}
+    for c in customers:
+        by_reseller.setdefault(c["reseller_id"], []).append(c)
+
+    # mode address_list: pelanggan yang sudah terisolir dipakai untuk
+    # membersihkan entry address-list yang basi
+    addr_rids = [r["id"] for r in resellers if reseller_isolation_mode(r) == MODE_ADDRESS_LIST]
+    isolated: Dict[int, List[str]] = {}
+    if addr_rids:
+        for c in db.query_all("""
+            SELECT reseller_id, ppp_username
+            FROM ppp_customers
+            WHERE is_isolated = TRUE
+              AND reseller_id = ANY(%(rids)s)
+        """, {"rids": addr_rids}):
+            isolated.setdefault(c["reseller_id"], []).append(c["ppp_username"])
+
+    for r in resellers:
+        r["customers"] = by_reseller.get(r["id"], [])
+        r["isolated_names"] = isolated.get(r["id"], [])
+    return resellers
+
+
+def _isolate_reseller(r: Dict[str, Any], router_ip: Optional[str]) -> Dict[str, Any]:
+    """
+    Isolir semua pelanggan satu reseller dalam satu batch router:
+    1. /ppp/secret diambil sekali, profile diganti paralel
+    2. satu UPDATE untuk pelanggan yang berhasil diganti di router
+       (yang gagal tetap is_isolated = FALSE -> dicoba lagi run berikutnya)
+    3. /ppp/active diambil sekali, session di-terminate bergelombang
+       (rate + jitter per router, tunda kalau CPU router tinggi)
+
+    Reseller dengan isolation_mode 'address_list': langkah 1 juga
+    memasukkan IP session online ke address-list, langkah 3 dilewati.
+    """
+    started = time.perf_counter()
+    customers = r["customers"]
+    summary: Dict[str, Any] = {
+        "name": r["display_name"],
+        "target": len(customers),
+        "isolated": 0,
+        "terminated": 0,
+        "listed": 0,
+        "failed": [],
+        "skipped": None,
+        "seconds": 0.0,
+    }
+
+    api_user = r.get("router_username")
+    api_pass = r.get("router_password")
+    iso_name = r.get("iso_profile")
+
+    if not api_user or not api_pass:
+        summary["skipped"] = "router_username/password kosong"
+    elif not router_ip:
+        summary["skipped"] = "tidak dapat router_ip dari Router Admin"
+    elif not iso_name:
+        summary["skipped"] = "belum punya profile isolasi"
+
+    if summary["skipped"]:
+        summary["seconds"] = time.perf_counter() - started
+        return summary
+
+    concurrency = Config.ISOLATE_ROUTER_CONCURRENCY
+    names = [c["ppp_username"] for c in customers]
+    address_list_mode = reseller_isolation_mode(r) == MODE_ADDRESS_LIST
+
+    # 1. Ganti profile di MikroTik (+ address-list untuk mode address_list)
+    try:
+        if address_list_mode:
+            results, summary["listed"] = isolate_batch_address_list(
+                router_ip, api_user, api_pass, names, iso_name,
+                isolated_names=r["isolated_names"],
+                max_workers=concurrency,
+            )
+        else:
+            results = update_ppp_secrets_bulk(
+                router_ip, api_user, api_pass, names,
+                updates={"profile": iso_name},
+                max_workers=concurrency,
+            )
+    except MikrotikError as e:
+        results = {name: f"gagal ambil data router: {e}" for name in names}
+
+    ok = [c for c in customers if results.get(c["ppp_username"]) is None]
+    if ok:
+        router_snapshots.mark_stale(r["id"])
+    summary["failed"] = [
+        (name, err) for name, err in results.items() if err is not None
+    ]
+
+    # 2. Update DB sekaligus
+    if ok:
+        try:
+            summary["isolated"] = db.execute("""
+                UPDATE ppp_customers
+                SET
+                    is_isolated = TRUE,
+                    updated_at = NOW()
+                WHERE id = ANY(%(ids)s)
+                  AND is_isolated = FALSE
+            """, {"ids": [c["id"] for c in ok]})
+        except Exception as e:
+            summary["failed"].append(("(db)", f"router sudah isolir {len(ok)} user, UPDATE DB gagal: {e}"))
+
+    # 3. Kill session aktif agar reconnect dengan profile isolasi
+    #    (mode address_list: session sudah diblokir tanpa kill)
+    if ok and not address_list_mode:
+        try:
+            killed = terminate_ppp_active_waves(
+                router_ip, api_user, api_pass,
+                [c["ppp_username"] for c in ok],
+                rate=Config.TERMINATE_RATE,
+                wave_size=Config.TERMINATE_WAVE_SIZE,
+                jitter=Config.TERMINATE_WAVE_JITTER,
+                cpu_threshold=Config.TERMINATE_CPU_THRESHOLD,
+                cpu_max_wait=Config.TERMINATE_CPU_MAX_WAIT,
+                max_workers=concurrency,
+                label=r["display_name"],
+            )
+            summary["terminated"] = sum(1 for err in killed.values() if err is None)
+            for name, err in killed.items():
+                if err is not None:
+                    print(f"ℹ️ {r['display_name']}: gagal terminate session {name}: {err}")
+        except Exception as e:
+            print(f"ℹ️ {r['display_name']}: gagal ambil /ppp/active: {e}")
+
+    summary["seconds"] = time.perf_counter() - started
+    return summary
+
+
+def _safe_isolate_reseller(r: Dict[str, Any], router_ip: Optional[str]) -> Dict[str, Any]:
+    try:
+        return _isolate_reseller(r, router_ip)
+    except Exception as e:
+        return {
+            "name": r["display_name"],
+            "target": len(r["customers"]),
+            "isolated": 0,
+            "terminated": 0,
+            "listed": 0,
+            "failed": [("(reseller)", f"error tidak terduga: {e}")],
+            "skipped": None,
+            "seconds": 0.0,
+        }
+
+
+def _print_summary(summaries: List[Dict[str, Any]], elapsed: float) -> None:
+    print("=== Ringkasan isolasi ===")
+    print(f"{'reseller':24s} {'target':>6s} {'isolir':>6s} {'gagal':>6s} {'kill':>5s} {'addr':>5s} {'waktu':>8s}")
+    for s in summaries:
+        print(
+            f"{s['name'][:24]:24s} {s['target']:6d} {s['isolated']:6d} "
+            f"{len(s['failed']):6d} {s['terminated']:5d} {s['listed']:5d} {s['seconds']:7.1f}s"
+            + (f"  ⚠️ skip: {s['skipped']}" if s["skipped"] else "")
+        )
+        for name, err in s["failed"]:
+            print(f"    ❌ {name}: {err}")
+
+    total_target = sum(s["target"] for s in summaries)
+    total_isolated = sum(s["isolated"] for s in summaries)
+    total_failed = sum(len(s["failed"]) for s in summaries)
+    print(
+        f"Total: {total_isolated}/{total_target} diisolir, {total_failed} gagal, "
+        f"{len(summaries)} reseller dalam {elapsed:.1f} detik"
+    )
+
+
+def isolate_unpaid_users() -> None:
+    print("=== Mulai isolasi pelanggan unpaid ===")
+    started = time.perf_counter()
+
+    targets = _load_targets()
+    if not targets:
+        print("Tidak ada pelanggan yang perlu diisolir.")
+        return
+
+    # IP router semua reseller dari satu call ke Router Admin
+    router_ips = _get_router_ip_map() or {}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, Config.ISOLATE_WORKERS),
+        thread_name_prefix="isolate",
+    ) as ex:
+        summaries = list(
+            ex.map(lambda r: _safe_isolate_reseller(r, router_ips.get(r["username"])), targets)
+        )
 
+    _print_summary(summaries, time.perf_counter() - started)
     print("=== Selesai isolasi pelanggan unpaid ===")
 
 
 if __name__ == "__main__":
-    isolate_unpaid_users()
+    with metrics.cron_job("isolate_unpaid_users"):
+        isolate_unpaid_users()
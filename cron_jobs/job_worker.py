@@ -0,0 +1,115 @@
+# cron_jobs/job_worker.py
+"""
+Worker job latar belakang (jobs.py).
+
+Proses jangka panjang (service "job_worker" di docker-compose):
+  python -m cron_jobs.job_worker
+Sekali jalan sampai antrian job kosong (mis. dari crontab):
+  python -m cron_jobs.job_worker --once
+
+Boleh dijalankan lebih dari satu proses: claim memakai SKIP LOCKED.
+Tiap proses menjalankan paling banyak JOB_WORKER_THREADS job bersamaan.
+Job running yang worker-nya mati ditandai gagal setelah JOB_STALE_SECONDS.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import threading
+import time
+
+import jobs
+import metrics
+import router_sync  # noqa: F401  (daftarkan handler job)
+from config import Config
+
+# pembersihan job basi / job lama paling sering tiap N detik
+MAINTENANCE_INTERVAL = 60
+
+_stop = threading.Event()
+
+
+def _handle_stop(signum, frame) -> None:
+    print(f"🛑 Sinyal {signum} diterima, selesaikan job yang berjalan lalu berhenti.")
+    _stop.set()
+
+
+def _maintenance() -> None:
+    stale = jobs.reap_stale()
+    if stale:
+        print(f"♻️ {stale} job tanpa heartbeat ditandai gagal")
+    purged = jobs.purge_finished()
+    if purged:
+        print(f"🧹 {purged} job lama dihapus")
+
+
+def _run_loop(once: bool) -> None:
+    while not _stop.is_set():
+        try:
+            job = jobs.claim_next()
+        except Exception as e:
+            print(f"❌ Gagal mengambil job: {e}")
+            job = None
+
+        if job is None:
+            if once:
+                return
+            _stop.wait(Config.JOB_WORKER_POLL)
+            continue
+
+        started = time.perf_counter()
+        print(f"▶️ Job {job['id']} ({job['kind']}, reseller {job['reseller_id']}) mulai")
+        status = jobs.run_job(job)
+        print(
+            f"{'✅' if status == 'succeeded' else '⚠️'} Job {job['id']} {status} "
+            f"dalam {time.perf_counter() - started:.1f} s"
+        )
+
+
+def run(once: bool = False) -> None:
+    print(f"=== Job worker: {Config.JOB_WORKER_THREADS} thread, handler: {', '.join(sorted(jobs.HANDLERS))} ===")
+    try:
+        _maintenance()
+    except Exception as e:
+        print(f"ℹ️ Pembersihan job gagal: {e}")
+
+    threads = [
+        threading.Thread(target=_run_loop, args=(once,), name=f"job-{i + 1}")
+        for i in range(max(1, Config.JOB_WORKER_THREADS))
+    ]
+    for t in threads:
+        t.start()
+
+    last_maintenance = time.monotonic()
+    while any(t.is_alive() for t in threads):
+        time.sleep(1)
+        if time.monotonic() - last_maintenance >= MAINTENANCE_INTERVAL:
+            try:
+                _maintenance()
+            except Exception as e:
+                print(f"ℹ️ Pembersihan job gagal: {e}")
+            last_maintenance = time.monotonic()
+
+    for t in threads:
+        t.join()
+    print("=== Job worker berhenti ===")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Jalankan job latar belakang dari tabel jobs.")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Berhenti setelah antrian job kosong.",
+    )
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+
+    if args.once:
+        with metrics.cron_job("job_worker"):
+            run(once=True)
+    else:
+        run()
@@ -2,15 +2,16 @@
 
 from __future__ import annotations
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 import db
-from wa_client import send_wa, WhatsAppError   
+import metrics
+import wa_outbox
+from config import Config
+from wa_client import split_message
 import datetime
-import time
 import pytz
 from pathlib import Path
-import random
 import argparse
 import sys
 
@@ -56,9 +57,52 @@ def format_rupiah(amount: int) -> str:
     return f"{amount:,}".replace(",", ".")
 
 
-def notify_unpaid_users(force=False) -> None:
+def _customer_message(u: dict, reseller_name: str) -> str:
+    nama = (u.get("full_name") or "").strip() or u["ppp_username"]
+    nominal = format_rupiah(int(u["monthly_price"]))
+    return (
+        f"Halo {nama}, 👋\n\n"
+        f"Tagihan internet Anda bulan ini sebesar *Rp {nominal}* belum terbayar.\n"
+        f"Segera lakukan pembayaran agar layanan tetap aktif.\n\n"
+        f"Terima kasih 🙏\n"
+        f"- {reseller_name}"
+    )
+
+
+def _digest_messages(
+    reseller_name: str,
+    period: datetime.date,
+    customers: List[dict],
+    petugas: Optional[str] = None,
+) -> List[str]:
+    """
+    Daftar pelanggan unpaid dalam sesedikit mungkin pesan
+    (dipecah sesuai Config.WA_MESSAGE_MAX_CHARS).
+    """
+    header = f"🔔 Pelanggan belum bayar {period:%m/%Y}\nReseller: {reseller_name}"
+    if petugas is not None:
+        header += f"\nPetugas: {petugas or '-'}"
+
+    lines = []
+    total = 0
+    for idx, u in enumerate(customers, start=1):
+        nama = (u.get("full_name") or "").strip() or u["ppp_username"]
+        price = int(u["monthly_price"] or 0)
+        total += price
+        line = f"{idx}. {nama} ({u['ppp_username']}) - Rp {format_rupiah(price)}"
+        if petugas is None and u.get("petugas_name"):
+            line += f" [{u['petugas_name']}]"
+        lines.append(line)
+
+    footer = f"Total: {len(customers)} pelanggan, Rp {format_rupiah(total)}"
+    return split_message(header, lines, footer)
+
+
+def notify_unpaid_users(force=False, digest_by: Optional[str] = None) -> None:
     tz = pytz.timezone("Asia/Jakarta")
     now = datetime.datetime.now(tz)
+    digest_by = digest_by or Config.NOTIFY_DIGEST_BY
+    direct = Config.NOTIFY_CUSTOMER_DIRECT
 
     # Jalankan hanya tanggal 25, kecuali pakai --force
     if not force and now.day != 25:
@@ -73,88 +117,114 @@ def notify_unpaid_users(force=False) -> None:
             print(f"[{now:%Y-%m-%d %H:%M:%S}] ⏸️ Notifikasi tanggal {mtime.date()} sudah dikirim, skip ulang.")
             return
 
-    print(f"[{now:%Y-%m-%d %H:%M:%S}] ✅ Mulai kirim notifikasi pelanggan unpaid{' (FORCED)' if force else ''}.\n")
+    print(
+        f"[{now:%Y-%m-%d %H:%M:%S}] ✅ Mulai kirim notifikasi pelanggan unpaid"
+        f"{' (FORCED)' if force else ''} — digest per {digest_by}"
+        f"{', langsung ke nomor pelanggan' if direct else ''}.\n"
+    )
 
     resellers = db.query_all("""
-        SELECT id, display_name, use_notifications, wa_number
+        SELECT id, display_name, wa_number
         FROM resellers
         WHERE is_active = TRUE
+          AND use_notifications = TRUE
+        ORDER BY id
     """)
+    if not resellers:
+        print("Tidak ada reseller dengan notifikasi aktif.")
+        return
 
-    total_sent = 0
-    batch_size = 20       # kirim 20 pesan dulu
-    delay_seconds = 10    # istirahat 10 detik antar batch
+    # semua pelanggan unpaid reseller di atas dalam satu query
+    unpaid_by_reseller: Dict[int, List[dict]] = {}
+    for u in db.query_all("""
+        SELECT customer_id, reseller_id, ppp_username, full_name, wa_number,
+               petugas_name, monthly_price, current_period
+        FROM v_unpaid_customers_current_period
+        WHERE reseller_id = ANY(%(rids)s)
+        ORDER BY reseller_id, petugas_name NULLS LAST, full_name, ppp_username
+    """, {"rids": [r["id"] for r in resellers]}):
+        unpaid_by_reseller.setdefault(u["reseller_id"], []).append(u)
+
+    # pesan hanya diantrikan; laju kirim diatur worker outbox
+    # (WA_RATE_PER_MINUTE), jadi tidak perlu jeda/batch di sini
+    messages: List[dict] = []
 
     for r in resellers:
-        if not r.get("use_notifications"):
-            continue
-
         rid = r["id"]
         reseller_name = r["display_name"]
         reseller_wa = is_valid_wa(r.get("wa_number") or "", return_clean=True)
-        if not reseller_wa:
-            print(f"⚠️ Reseller {reseller_name}: nomor WA reseller tidak valid, lewati.\n")
-            continue
-
-        unpaid = db.query_all("""
-            SELECT ppp_username, full_name, wa_number, monthly_price
-            FROM v_unpaid_customers_current_period
-            WHERE reseller_id = %(rid)s
-        """, {"rid": rid})
+        unpaid = unpaid_by_reseller.get(rid, [])
 
         if not unpaid:
-            print(f"✅ {reseller_name}: semua pelanggan sudah bayar.\n")
+            print(f"✅ {reseller_name}: semua pelanggan sudah bayar.")
             continue
 
-        print(f"🔔 {reseller_name}: {len(unpaid)} pelanggan belum bayar.")
-
-        for i, u in enumerate(unpaid, start=1):
-            customer_wa = is_valid_wa(u.get("wa_number") or "", return_clean=True)
-
-            # --- blok siap pakai: aktifkan kirim langsung ke pelanggan ---
-            # if is_valid_wa(customer_wa):
-            #     target_wa = customer_wa
-            #     target_info = "customer"
-            # else:
-            #     target_wa = reseller_wa
-            #     target_info = "reseller (fallback)"
-            # ------------------------------------------------------------
-            
-            # default: kirim ke reseller saja
-            target_wa = reseller_wa
-            target_info = "reseller (default)"
-
-            nama = (u.get("full_name") or "").strip() or u["ppp_username"]
-            nominal = format_rupiah(int(u["monthly_price"]))
-            msg = (
-                f"Halo {nama}, 👋\n\n"
-                f"Tagihan internet Anda bulan ini sebesar *Rp {nominal}* belum terbayar.\n"
-                f"Segera lakukan pembayaran agar layanan tetap aktif.\n\n"
-                f"Terima kasih 🙏\n"
-                f"- {reseller_name}"
-            )
-
-            try:
-                send_wa(target_wa, msg)
-                print(f"✅ {i}/{len(unpaid)} Kirim ke {target_wa} ({target_info}) sukses.")
-                total_sent += 1
-            except Exception as e:
-                print(f"❌ {i}/{len(unpaid)} Gagal kirim ke {target_wa}: {e}")
-
-            # jeda acak antar kirim (0.5–2 detik)
-            time.sleep(random.uniform(0.5, 2.0))
-
-            # delay antar batch besar
-            if i % batch_size == 0:
-                print(f"⏳ Istirahat {delay_seconds} detik... (batch ke-{i // batch_size})")
-                time.sleep(delay_seconds)
-
-        print(f"✅ Selesai kirim untuk reseller {reseller_name}.\n")
+        period = unpaid[0].get("current_period") or now.date().replace(day=1)
+
+        # 1) pesan per pelanggan hanya untuk nomor pelanggan yang valid
+        digest: List[dict] = []
+        direct_count = 0
+        for u in unpaid:
+            customer_wa = is_valid_wa(u.get("wa_number") or "", return_clean=True) if direct else None
+            if not customer_wa:
+                digest.append(u)
+                continue
+            messages.append({
+                "to": customer_wa,
+                "message": _customer_message(u, reseller_name),
+                "template": "unpaid_notify",
+                "dedupe_key": f"unpaid_notify:{u['customer_id']}:{period:%Y-%m}",
+                "reseller_id": rid,
+                "customer_id": u["customer_id"],
+            })
+            direct_count += 1
+
+        # 2) sisanya digabung jadi digest ke nomor reseller
+        digest_count = 0
+        if digest and not reseller_wa:
+            print(f"⚠️ {reseller_name}: nomor WA reseller tidak valid, {len(digest)} pelanggan tidak masuk digest.")
+        elif digest:
+            if digest_by == "petugas":
+                groups: Dict[str, List[dict]] = {}
+                for u in digest:
+                    groups.setdefault(u.get("petugas_name") or "", []).append(u)
+                parts = [
+                    (f"petugas={name}", _digest_messages(reseller_name, period, rows, petugas=name))
+                    for name, rows in groups.items()
+                ]
+            else:
+                parts = [("all", _digest_messages(reseller_name, period, digest))]
+
+            for group, texts in parts:
+                for idx, text in enumerate(texts, start=1):
+                    messages.append({
+                        "to": reseller_wa,
+                        "message": text,
+                        "template": "unpaid_digest",
+                        # satu digest per reseller/grup per hari
+                        "dedupe_key": f"unpaid_digest:{rid}:{now:%Y-%m-%d}:{group}:{idx}/{len(texts)}",
+                        "reseller_id": rid,
+                    })
+                    digest_count += 1
+
+        print(
+            f"🔔 {reseller_name}: {len(unpaid)} pelanggan belum bayar → "
+            f"{direct_count} pesan ke pelanggan, {digest_count} pesan digest ke reseller."
+        )
+
+    try:
+        total_queued = wa_outbox.enqueue_many(messages)
+    except Exception as e:
+        print(f"❌ Gagal antrikan {len(messages)} pesan: {e}")
+        raise
 
     if not force:
         flag_file.touch()
 
-    print(f"🎯 Total pesan terkirim: {total_sent}")
+    print(
+        f"🎯 Total pesan masuk antrian: {total_queued}"
+        f" ({len(messages) - total_queued} sudah pernah diantrikan)"
+    )
     print(f"[{datetime.datetime.now(tz):%Y-%m-%d %H:%M:%S}] ✅ Semua notifikasi selesai.")
 
 
@@ -163,10 +233,16 @@ def notify_unpaid_users(force=False) -> None:
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Kirim notifikasi pelanggan unpaid.")
     parser.add_argument("--force", action="store_true", help="Jalankan meskipun bukan tanggal 25 atau sudah pernah kirim.")
+    parser.add_argument(
+        "--digest-by",
+        choices=("reseller", "petugas"),
+        help="Kelompokkan digest ke nomor reseller per reseller atau per petugas (default: NOTIFY_DIGEST_BY).",
+    )
     args = parser.parse_args()
 
     try:
-        notify_unpaid_users(force=args.force)
+        with metrics.cron_job("notify_unpaid_users"):
+            notify_unpaid_users(force=args.force, digest_by=args.digest_by)
     except KeyboardInterrupt:
         print("\n🛑 Dibatalkan oleh pengguna.")
         sys.exit(0)
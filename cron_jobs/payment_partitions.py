@@ -0,0 +1,123 @@
+# cron_jobs/payment_partitions.py
+"""
+Perawatan partisi bulanan tabel customer_payments.
+
+Perintah:
+  python -m cron_jobs.payment_partitions ensure [--months-ahead 3]
+      Buat partisi bulan berjalan s/d N bulan ke depan (idempotent).
+
+  python -m cron_jobs.payment_partitions archive [--keep-months 12] [--dir PATH] [--dry-run]
+      Lepas (DETACH) partisi yang lebih tua dari N bulan, simpan isinya ke
+      <dir>/customer_payments_pYYYYMM.csv.gz, lalu DROP tabel partisinya.
+      Semua langkah per partisi dalam satu transaksi: kalau tulis file gagal,
+      partisi tetap terpasang.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import gzip
+import os
+import re
+import sys
+
+import db
+import metrics
+from billing_logic import add_months, get_current_period
+from config import Config
+
+_PARTITION_RE = re.compile(r"^customer_payments_p(\d{4})(\d{2})$")
+
+
+def ensure_partitions(months_ahead: int = 3) -> int:
+    row = db.query_one(
+        "SELECT customer_payments_ensure_partitions(%(start)s, %(ahead)s) AS created",
+        {"start": get_current_period(), "ahead": months_ahead},
+        commit=True,
+    )
+    created = row["created"] if row else 0
+    print(f"✅ Partisi customer_payments siap ({created} partisi baru, {months_ahead} bulan ke depan).")
+    return created
+
+
+def _list_monthly_partitions() -> list[tuple[str, datetime.date]]:
+    rows = db.query_all(
+        """
+        SELECT c.relname AS name
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'customer_payments'
+        ORDER BY c.relname
+        """
+    )
+    result = []
+    for r in rows:
+        m = _PARTITION_RE.match(r["name"])
+        if not m:
+            continue  # partisi default / nama lain
+        result.append((r["name"], datetime.date(int(m.group(1)), int(m.group(2)), 1)))
+    return result
+
+
+def archive_partitions(keep_months: int, archive_dir: str, dry_run: bool = False) -> int:
+    if keep_months < 1:
+        raise ValueError("keep_months minimal 1 (partisi bulan berjalan tidak boleh diarsip)")
+
+    cutoff = add_months(get_current_period(), -keep_months)
+    candidates = [(name, month) for name, month in _list_monthly_partitions() if month < cutoff]
+
+    if not candidates:
+        print(f"ℹ️ Tidak ada partisi sebelum {cutoff:%Y-%m} yang perlu diarsip.")
+        return 0
+
+    os.makedirs(archive_dir, exist_ok=True)
+    archived = 0
+
+    for name, month in candidates:
+        path = os.path.join(archive_dir, f"{name}.csv.gz")
+        if dry_run:
+            print(f"[dry-run] {name} ({month:%Y-%m}) -> {path}")
+            continue
+
+        tmp_path = path + ".tmp"
+        with db.transaction() as cur:
+            cur.execute(f'ALTER TABLE customer_payments DETACH PARTITION "{name}"')
+            with gzip.open(tmp_path, "wb") as fh:
+                cur.copy_expert(f'COPY "{name}" TO STDOUT WITH (FORMAT csv, HEADER)', fh)
+            os.replace(tmp_path, path)
+            cur.execute(f'DROP TABLE "{name}"')
+
+        archived += 1
+        print(f"📦 {name} diarsip ke {path} ({os.path.getsize(path):,} bytes)")
+
+    return archived
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Perawatan partisi customer_payments.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_ensure = sub.add_parser("ensure", help="Buat partisi bulan berjalan & ke depan.")
+    p_ensure.add_argument("--months-ahead", type=int, default=3)
+
+    p_archive = sub.add_parser("archive", help="Lepas & arsip partisi lama ke file .csv.gz.")
+    p_archive.add_argument("--keep-months", type=int, default=12)
+    p_archive.add_argument("--dir", default=Config.PAYMENT_ARCHIVE_DIR)
+    p_archive.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "ensure":
+        ensure_partitions(args.months_ahead)
+    elif args.command == "archive":
+        n = archive_partitions(args.keep_months, args.dir, dry_run=args.dry_run)
+        print(f"🎯 Total partisi diarsip: {n}")
+    return 0
+
+
+if __name__ == "__main__":
+    with metrics.cron_job("payment_partitions"):
+        rc = main()
+    sys.exit(rc)
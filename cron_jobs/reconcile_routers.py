@@ -0,0 +1,144 @@
+# cron_jobs/reconcile_routers.py
+"""
+Rekonsiliasi PPP secret semua router reseller dengan DB (reconcile.py).
+
+  python -m cron_jobs.reconcile_routers                 # perbaiki drift
+  python -m cron_jobs.reconcile_routers --dry-run       # hanya tampilkan diff
+  python -m cron_jobs.reconcile_routers --reseller 12   # satu reseller saja
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import db
+import metrics
+from config import Config
+from reconcile import reconcile_reseller
+from blueprints.auth_reseller import _get_router_ip_map
+
+
+def _load_resellers(reseller_ids: Optional[List[int]]) -> List[Dict[str, Any]]:
+    sql = """
+        SELECT id, display_name, username, router_username, router_password, isolation_mode
+        FROM resellers
+        WHERE is_active = TRUE
+    """
+    params: Dict[str, Any] = {}
+    if reseller_ids:
+        sql += " AND id = ANY(%(ids)s)"
+        params["ids"] = reseller_ids
+    return db.query_all(sql + " ORDER BY id", params)
+
+
+def _safe_reconcile(r: Dict[str, Any], router_ip: Optional[str], dry_run: bool) -> Dict[str, Any]:
+    try:
+        return reconcile_reseller(r, router_ip, dry_run=dry_run)
+    except Exception as e:
+        return {
+            "name": r["display_name"] or r["username"],
+            "secrets": 0, "in_sync": 0, "patch": 0, "create": 0, "orphans": 0,
+            "missing": 0, "invalid": 0, "skipped": 0, "applied": 0, "killed": 0,
+            "failed": [("(reseller)", f"error tidak terduga: {e}")],
+            "skipped_reason": None, "seconds": 0.0,
+        }
+
+
+def _print_plan(s: Dict[str, Any], show: int) -> None:
+    plan = s.get("plan")
+    if not plan:
+        return
+    for name, p in list(plan["patch"].items())[:show]:
+        changes = ", ".join(
+            f"{f}: {'***' if f == 'password' else p['was'][f]} -> {'***' if f == 'password' else v}"
+            for f, v in p["updates"].items()
+        )
+        print(f"    ✏️ {name}: {changes}")
+    for name, body in list(plan["create"].items())[:show]:
+        print(f"    ➕ {name}: profile={body.get('profile', '-')} disabled={body['disabled']}")
+    for name, profile in plan["invalid"][:show]:
+        print(f"    ⚠️ {name}: profile '{profile}' tidak ada di router")
+    for name in plan["orphans"][:show]:
+        print(f"    ❔ {name}: ada di router, tidak ada di DB")
+    for name in plan["missing"][:show]:
+        print(f"    🚫 {name}: ditandai tidak ada di router, tidak dibuat ulang")
+
+
+def _print_summary(summaries: List[Dict[str, Any]], elapsed: float, dry_run: bool, show: int) -> None:
+    print(f"=== Ringkasan rekonsiliasi{' (dry-run)' if dry_run else ''} ===")
+    print(
+        f"{'reseller':24s} {'secret':>6s} {'sinkron':>7s} {'patch':>5s} {'buat':>5s} "
+        f"{'orphan':>6s} {'hilang':>6s} {'skip':>5s} {'ok':>5s} {'gagal':>5s} {'kill':>5s} {'waktu':>8s}"
+    )
+    for s in summaries:
+        print(
+            f"{s['name'][:24]:24s} {s['secrets']:6d} {s['in_sync']:7d} {s['patch']:5d} {s['create']:5d} "
+            f"{s['orphans']:6d} {s['missing']:6d} {s['skipped']:5d} {s['applied']:5d} {len(s['failed']):5d} "
+            f"{s['killed']:5d} {s['seconds']:7.1f}s"
+            + (f"  ⚠️ skip: {s['skipped_reason']}" if s["skipped_reason"] else "")
+        )
+        if dry_run:
+            _print_plan(s, show)
+        for name, err in s["failed"]:
+            print(f"    ❌ {name}: {err}")
+
+    total_drift = sum(s["patch"] + s["create"] for s in summaries)
+    total_applied = sum(s["applied"] for s in summaries)
+    total_failed = sum(len(s["failed"]) for s in summaries)
+    print(
+        f"Total: {total_drift} drift, {total_applied} diperbaiki, {total_failed} gagal, "
+        f"{len(summaries)} reseller dalam {elapsed:.1f} detik"
+    )
+
+
+def reconcile_routers(dry_run: bool = False, reseller_ids: Optional[List[int]] = None, show: int = 20) -> None:
+    print(f"=== Mulai rekonsiliasi router{' (dry-run)' if dry_run else ''} ===")
+    started = time.perf_counter()
+
+    resellers = _load_resellers(reseller_ids)
+    if not resellers:
+        print("Tidak ada reseller aktif.")
+        return
+
+    # IP router semua reseller dari satu call ke Router Admin
+    router_ips = _get_router_ip_map() or {}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, Config.RECONCILE_WORKERS),
+        thread_name_prefix="reconcile",
+    ) as ex:
+        summaries = list(
+            ex.map(lambda r: _safe_reconcile(r, router_ips.get(r["username"]), dry_run), resellers)
+        )
+
+    _print_summary(summaries, time.perf_counter() - started, dry_run, show)
+    print("=== Selesai rekonsiliasi router ===")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Samakan PPP secret router dengan DB.")
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Hanya tampilkan perbedaan, router tidak diubah.",
+    )
+    parser.add_argument(
+        "--reseller",
+        type=int,
+        action="append",
+        dest="reseller_ids",
+        help="ID reseller (boleh diulang). Default: semua reseller aktif.",
+    )
+    parser.add_argument(
+        "--show",
+        type=int,
+        default=20,
+        help="Jumlah baris diff per kategori per reseller pada --dry-run (default 20).",
+    )
+    args = parser.parse_args()
+
+    with metrics.cron_job("reconcile_routers"):
+        reconcile_routers(dry_run=args.dry_run, reseller_ids=args.reseller_ids, show=args.show)
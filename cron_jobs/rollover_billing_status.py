@@ -0,0 +1,34 @@
+# cron_jobs/rollover_billing_status.py
+
+from __future__ import annotations
+
+import datetime
+import time
+
+import metrics
+from billing_logic import rollover_billing_status
+
+
+def run_rollover() -> None:
+    """
+    Hitung ulang status billing tersimpan (payment_status_text,
+    has_paid_current_period, should_isolate_current_period) untuk customer
+    yang statusnya masih periode lama.
+
+    Dijadwalkan tiap hari jam 00:01: tanggal 1 semua row ikut dihitung ulang,
+    hari lain biasanya 0 row (hanya jaga-jaga kalau run tanggal 1 terlewat).
+    """
+    now = datetime.datetime.now()
+    print(f"[{now:%Y-%m-%d %H:%M:%S}] === Mulai rollover status billing ===")
+
+    started = time.monotonic()
+    updated = rollover_billing_status()
+    elapsed = time.monotonic() - started
+
+    print(f"✅ {updated} customer dihitung ulang dalam {elapsed:.2f} detik.")
+    print("=== Selesai rollover status billing ===")
+
+
+if __name__ == "__main__":
+    with metrics.cron_job("rollover_billing_status"):
+        run_rollover()
@@ -0,0 +1,134 @@
+# cron_jobs/router_queue_worker.py
+"""
+Worker antrian perintah router (router_queue.py).
+
+Proses jangka panjang (service "router_worker" di docker-compose):
+  python -m cron_jobs.router_queue_worker
+Sekali jalan sampai antrian yang jatuh tempo habis (mis. dari crontab):
+  python -m cron_jobs.router_queue_worker --once
+
+Perintah satu router dijalankan berurutan dalam satu thread; router yang
+berbeda paralel (maks ROUTER_QUEUE_THREADS). Thread yang selesai langsung
+mengambil router berikutnya, jadi router lambat / mati tidak menahan router
+lain. Boleh lebih dari satu proses: claim memakai SKIP LOCKED, secret yang
+perintahnya masih 'running' tidak diambil, dan perintah yang sedang
+dikerjakan di-heartbeat sehingga tidak dianggap basi.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import threading
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict
+
+import metrics
+import router_queue
+from config import Config
+
+_stop = threading.Event()
+
+
+def _handle_stop(signum, frame) -> None:
+    print(f"🛑 Sinyal {signum} diterima, selesaikan batch lalu berhenti.")
+    _stop.set()
+
+
+def run_once(pool: ThreadPoolExecutor, in_flight: Dict[str, Future]) -> int:
+    """
+    Satu putaran: jadwalkan ulang perintah 'running' yang basi, claim
+    perintah jatuh tempo untuk thread yang masih kosong (router yang masih
+    dikerjakan dilewati), submit per router ke pool. Return jumlah perintah
+    yang di-claim.
+    """
+    reclaimed = router_queue.reclaim_stale()
+    if reclaimed:
+        print(f"♻️ {reclaimed} perintah router 'running' basi dijadwalkan ulang")
+
+    free = max(1, Config.ROUTER_QUEUE_THREADS) - len(in_flight)
+    if free <= 0:
+        return 0
+    commands = router_queue.claim_batch(
+        Config.ROUTER_QUEUE_BATCH,
+        per_router=max(1, Config.ROUTER_QUEUE_PER_ROUTER),
+        max_routers=free,
+        busy_routers=list(in_flight),
+    )
+
+    by_router = defaultdict(list)
+    for cmd in commands:
+        by_router[cmd["router_ip"]].append(cmd)
+    for router_ip, cmds in by_router.items():
+        in_flight[router_ip] = pool.submit(router_queue.run_router_commands, cmds)
+    return len(commands)
+
+
+def _collect(in_flight: Dict[str, Future]) -> Dict[str, int]:
+    """Ambil hasil router yang sudah selesai. Return jumlah per status akhir."""
+    counts: Dict[str, int] = {}
+    for router_ip, fut in list(in_flight.items()):
+        if not fut.done():
+            continue
+        del in_flight[router_ip]
+        try:
+            for status, n in fut.result().items():
+                counts[status] = counts.get(status, 0) + n
+        except Exception as e:
+            print(f"❌ Perintah router {router_ip} gagal diproses: {e}")
+    return counts
+
+
+def run(once: bool = False) -> None:
+    print(f"=== Router queue worker: {Config.ROUTER_QUEUE_THREADS} router paralel ===")
+    in_flight: Dict[str, Future] = {}
+    with ThreadPoolExecutor(
+        max_workers=max(1, Config.ROUTER_QUEUE_THREADS), thread_name_prefix="router-queue"
+    ) as pool:
+        while True:
+            claimed = 0
+            if not _stop.is_set():
+                try:
+                    claimed = run_once(pool, in_flight)
+                except Exception as e:
+                    print(f"❌ Putaran antrian router gagal: {e}")
+
+            # tunggu salah satu router selesai kalau tidak ada yang bisa
+            # di-claim lagi; router yang selesai langsung diganti router lain
+            if in_flight and (not claimed or len(in_flight) >= Config.ROUTER_QUEUE_THREADS):
+                wait(list(in_flight.values()), timeout=Config.ROUTER_QUEUE_POLL,
+                     return_when=FIRST_COMPLETED)
+
+            counts = _collect(in_flight)
+            if counts:
+                print(
+                    "🛠️ "
+                    + ", ".join(f"{status}: {n}" for status, n in sorted(counts.items()))
+                )
+
+            if not in_flight and not claimed:
+                if once or _stop.is_set():
+                    break
+                _stop.wait(Config.ROUTER_QUEUE_POLL)
+
+    print("=== Router queue worker berhenti ===")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Jalankan perintah dari antrian router_commands.")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Berhenti setelah semua perintah yang jatuh tempo diproses.",
+    )
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+
+    if args.once:
+        with metrics.cron_job("router_queue_worker"):
+            run(once=True)
+    else:
+        run()
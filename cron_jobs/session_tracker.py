@@ -0,0 +1,168 @@
+# cron_jobs/session_tracker.py
+"""
+Pelacak session PPP (ppp_sessions.py): mengisi last_connected_at /
+last_disconnected_at customer dan riwayat ppp_sessions.
+
+Proses jangka panjang (service "session_tracker" di docker-compose):
+  python -m cron_jobs.session_tracker
+Satu putaran saja (mis. dari crontab):
+  python -m cron_jobs.session_tracker --once
+
+Tiap SESSION_POLL_INTERVAL detik: IP semua router dari satu call ke Router
+Admin, lalu /ppp/active tiap router (paralel, maks SESSION_TRACKER_THREADS).
+Jalankan satu proses saja; proses kedua tidak merusak data (satu session
+terbuka per username dijaga unique index) tapi hanya menambah beban router.
+
+Router yang mengirim event PPP sendiri (ppp_events.py, ppp_events_last_at
+dalam SESSION_PUSH_GRACE detik terakhir) hanya dibaca tiap
+SESSION_PUSH_POLL_INTERVAL detik, sebagai jaring pengaman untuk event yang
+hilang. Event lama (PPP_EVENTS_RETENTION_DAYS) ikut dibersihkan di sini.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import db
+import metrics
+import ppp_events
+import ppp_sessions
+from config import Config
+from blueprints.auth_reseller import _get_router_ip_map
+
+# pembersihan riwayat paling sering tiap N detik
+PURGE_INTERVAL = 3600
+
+_stop = threading.Event()
+
+# reseller_id -> time.monotonic() terakhir /ppp/active dibaca
+_last_polled: Dict[int, float] = {}
+
+
+def _handle_stop(signum, frame) -> None:
+    print(f"🛑 Sinyal {signum} diterima, selesaikan putaran lalu berhenti.")
+    _stop.set()
+
+
+def _load_resellers() -> List[Dict[str, Any]]:
+    return db.query_all(
+        """
+        SELECT id, username, display_name, router_username, router_password,
+               ppp_events_last_at > NOW() - make_interval(secs => %(grace)s) AS pushing
+        FROM resellers
+        WHERE is_active = TRUE
+          AND router_username IS NOT NULL
+          AND router_password IS NOT NULL
+        ORDER BY id
+        """,
+        {"grace": Config.SESSION_PUSH_GRACE},
+    )
+
+
+def _due(r: Dict[str, Any], now: float) -> bool:
+    """Router push dibaca jarang; router lain tiap putaran."""
+    if not r["pushing"]:
+        return True
+    last = _last_polled.get(r["id"])
+    return last is None or now - last >= Config.SESSION_PUSH_POLL_INTERVAL
+
+
+def _track(r: Dict[str, Any], router_ip: Optional[str]) -> Optional[Dict[str, int]]:
+    if not router_ip:
+        return None
+    try:
+        result = ppp_sessions.track_router(r, router_ip)
+        _last_polled[r["id"]] = time.monotonic()
+        return result
+    except Exception as e:
+        print(f"ℹ️ {r['display_name'] or r['username']}: session dilewati: {e}")
+        return None
+
+
+def run_once(pool: ThreadPoolExecutor) -> Dict[str, int]:
+    """
+    Satu putaran semua router yang perlu dibaca. Return total
+    online/opened/closed + router, dan push = router push yang dilewati.
+    """
+    resellers = _load_resellers()
+    router_ips = _get_router_ip_map()
+    if router_ips is None:
+        print("⚠️ Router Admin tidak menjawab, putaran dilewati.")
+        return {}
+
+    now = time.monotonic()
+    due = [r for r in resellers if _due(r, now)]
+    totals = {"routers": 0, "online": 0, "opened": 0, "closed": 0, "push": len(resellers) - len(due)}
+    for res in pool.map(lambda r: _track(r, router_ips.get(r["username"])), due):
+        if res is None:
+            continue
+        totals["routers"] += 1
+        for key in ("online", "opened", "closed"):
+            totals[key] += res[key]
+    return totals
+
+
+def run(once: bool = False) -> None:
+    print(
+        f"=== Session tracker: tiap {Config.SESSION_POLL_INTERVAL:g} s, "
+        f"{Config.SESSION_TRACKER_THREADS} router paralel ==="
+    )
+    last_purge = 0.0
+    with ThreadPoolExecutor(
+        max_workers=max(1, Config.SESSION_TRACKER_THREADS), thread_name_prefix="session-tracker"
+    ) as pool:
+        while not _stop.is_set():
+            started = time.monotonic()
+            try:
+                totals = run_once(pool)
+                if totals.get("opened") or totals.get("closed"):
+                    print(
+                        f"🔌 {totals['routers']} router (+{totals['push']} push), "
+                        f"{totals['online']} online, "
+                        f"+{totals['opened']} connect, -{totals['closed']} disconnect "
+                        f"({time.monotonic() - started:.1f} s)"
+                    )
+            except Exception as e:
+                print(f"❌ Putaran session tracker gagal: {e}")
+
+            if time.monotonic() - last_purge >= PURGE_INTERVAL:
+                try:
+                    purged = ppp_sessions.purge_history()
+                    if purged:
+                        print(f"🧹 {purged} riwayat session lama dihapus")
+                    purged = ppp_events.purge_events()
+                    if purged:
+                        print(f"🧹 {purged} event PPP lama dihapus")
+                except Exception as e:
+                    print(f"ℹ️ Pembersihan riwayat session gagal: {e}")
+                last_purge = time.monotonic()
+
+            if once:
+                break
+            _stop.wait(max(0.0, Config.SESSION_POLL_INTERVAL - (time.monotonic() - started)))
+
+    print("=== Session tracker berhenti ===")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lacak session PPP semua router reseller.")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Jalankan satu putaran lalu berhenti.",
+    )
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+
+    if args.once:
+        with metrics.cron_job("session_tracker"):
+            run(once=True)
+    else:
+        run()
@@ -0,0 +1,154 @@
+# cron_jobs/wa_outbox_worker.py
+"""
+Worker pengirim antrian WhatsApp (wa_outbox.py).
+
+Proses jangka panjang (service "wa_worker" di docker-compose):
+  python -m cron_jobs.wa_outbox_worker
+Sekali jalan sampai antrian yang siap kirim habis (mis. dari crontab):
+  python -m cron_jobs.wa_outbox_worker --once
+
+Boleh dijalankan lebih dari satu proses: claim memakai SKIP LOCKED dan
+batas laju per gateway (sender) disimpan di DB, jadi total laju tetap
+rate_per_minute per gateway. Status sehat/down gateway dicatat per proses.
+"""
+
+from __future__ import annotations
+
+import argparse
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+import metrics
+import wa_outbox
+from config import Config
+from wa_client import get_gateway, gateway_healthy, get_gateways
+
+# kedalaman antrian (gauge) diperbarui paling sering tiap N detik
+DEPTH_INTERVAL = 15
+
+_stop = threading.Event()
+
+
+def _handle_stop(signum, frame) -> None:
+    print(f"🛑 Sinyal {signum} diterima, selesaikan batch lalu berhenti.")
+    _stop.set()
+
+
+def _update_depth() -> None:
+    for status, count in wa_outbox.queue_depth().items():
+        metrics.WA_OUTBOX_DEPTH.labels(status).set(count)
+
+
+def _process_sender(sender: str) -> Dict[str, int]:
+    """Satu gateway: ambil token, claim row sejumlah itu, kirim, catat hasil."""
+    counts: Dict[str, int] = {}
+    if get_gateway(sender) is None or not gateway_healthy(sender):
+        # gateway down / dihapus dari WA_GATEWAYS: pindahkan antriannya
+        moved = wa_outbox.reroute_pending(sender)
+        if moved:
+            print(f"🔀 {moved} pesan gateway {sender} dialihkan ke gateway lain")
+            counts["rerouted"] = moved
+        return counts
+
+    granted = wa_outbox.take_tokens(sender, max(1, get_gateway(sender)["burst"]))
+    if granted <= 0:
+        return counts
+    rows = wa_outbox.claim_batch(sender, granted)
+    wa_outbox.refund_tokens(sender, granted - len(rows))
+    if not rows:
+        return counts
+    try:
+        statuses = wa_outbox.deliver_batch(rows, sender)
+    except Exception as e:
+        # error DB saat mencatat hasil: row tetap 'sending' dan akan
+        # dikembalikan reclaim_stale()
+        print(f"❌ Gagal memproses {len(rows)} pesan outbox ({sender}): {e}")
+        statuses = ["error"] * len(rows)
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def run_once() -> Dict[str, int]:
+    """
+    Satu putaran: kembalikan row 'sending' yang basi, lalu proses semua
+    gateway yang punya antrian secara paralel (laju total = jumlah laju
+    tiap gateway). Return jumlah per status akhir.
+    """
+    reclaimed = wa_outbox.reclaim_stale()
+    if reclaimed:
+        print(f"♻️ {reclaimed} pesan 'sending' basi dikembalikan ke antrian")
+
+    senders = wa_outbox.due_senders()
+    if not senders:
+        return {}
+    if len(senders) == 1:
+        results = [_process_sender(senders[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=len(senders), thread_name_prefix="wa-outbox") as ex:
+            results = list(ex.map(_process_sender, senders))
+
+    counts: Dict[str, int] = {}
+    for res in results:
+        for status, n in res.items():
+            counts[status] = counts.get(status, 0) + n
+    return counts
+
+
+def run(once: bool = False) -> None:
+    print(f"=== WA outbox worker: {Config.WA_WORKER_THREADS} thread per gateway ===")
+    for gw in get_gateways():
+        print(
+            f"    gateway {gw['name']}: {gw['rate_per_minute']:g} pesan/menit "
+            f"(burst {gw['burst']}, bobot {gw['weight']:g})"
+        )
+    last_depth = 0.0
+    while not _stop.is_set():
+        try:
+            counts = run_once()
+        except Exception as e:
+            print(f"❌ Putaran outbox gagal: {e}")
+            counts = {}
+
+        if counts:
+            print(
+                "📲 "
+                + ", ".join(f"{status}: {n}" for status, n in sorted(counts.items()))
+            )
+
+        if time.monotonic() - last_depth >= DEPTH_INTERVAL:
+            try:
+                _update_depth()
+            except Exception as e:
+                print(f"ℹ️ Gagal baca kedalaman antrian: {e}")
+            last_depth = time.monotonic()
+
+        if once and not counts:
+            if not wa_outbox.due_senders():
+                break
+        if not counts:
+            _stop.wait(Config.WA_WORKER_POLL)
+
+    print("=== WA outbox worker berhenti ===")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Kirim pesan dari antrian wa_outbox.")
+    parser.add_argument(
+        "--once",
+        action="store_true",
+        help="Berhenti setelah semua pesan yang siap kirim diproses.",
+    )
+    args = parser.parse_args()
+
+    signal.signal(signal.SIGTERM, _handle_stop)
+    signal.signal(signal.SIGINT, _handle_stop)
+
+    if args.once:
+        with metrics.cron_job("wa_outbox_worker"):
+            run(once=True)
+    else:
+        run()
@@ -3,28 +3,42 @@ db.py
 ------
 Helper koneksi Postgres menggunakan psycopg2 connection pool.
 
+Pool memakai ThreadedConnectionPool + semaphore: aman untuk worker
+gunicorn gthread, dan kalau semua koneksi terpakai, thread menunggu
+(maks DB_POOL_TIMEOUT detik) alih-alih langsung error "pool exhausted".
+
 Menyediakan fungsi:
 - init_app(app=None)
+- reset_after_fork()  -> dipanggil gunicorn post_fork (gunicorn.conf.py)
 - query_one(sql, params)
 - query_all(sql, params)
 - execute(sql, params, commit=True)
+- transaction()  -> context manager cursor (commit/rollback otomatis)
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import psycopg2
 from psycopg2 import pool
 from psycopg2.extras import RealDictCursor
 
+import metrics
+import profiling
 from config import Config
 
 # Pool koneksi global
-_DB_POOL: Optional[pool.SimpleConnectionPool] = None
+_DB_POOL: Optional[pool.ThreadedConnectionPool] = None
+# Jumlah slot = maxconn; getconn menunggu slot kosong
+_DB_SLOTS: Optional[threading.BoundedSemaphore] = None
+_INIT_LOCK = threading.Lock()
 
 
-def init_app(app=None, minconn: int = 1, maxconn: int = 10) -> None:
+def init_app(app=None, minconn: int = 1, maxconn: Optional[int] = None) -> None:
     """
     Inisialisasi connection pool.
 
@@ -32,7 +46,7 @@ def init_app(app=None, minconn: int = 1, maxconn: int = 10) -> None:
     - Jika dipanggil dari script/cron: cukup `init_app()` tanpa argumen,
       akan pakai Config.DATABASE_URL (dari .env / environment).
     """
-    global _DB_POOL
+    global _DB_POOL, _DB_SLOTS
     if _DB_POOL is not None:
         # Sudah di-init, tidak perlu diulang
         return
@@ -52,7 +66,27 @@ def init_app(app=None, minconn: int = 1, maxconn: int = 10) -> None:
             "DATABASE_URL belum diset. Pastikan environment / .env berisi DATABASE_URL."
         )
 
-    _DB_POOL = pool.SimpleConnectionPool(minconn, maxconn, dsn)
+    if maxconn is None:
+        maxconn = Config.DB_POOL_MAX
+
+    _DB_POOL = pool.ThreadedConnectionPool(minconn, maxconn, dsn)
+    _DB_SLOTS = threading.BoundedSemaphore(maxconn)
+    metrics.DB_POOL_MAX.set(maxconn)
+
+
+def reset_after_fork() -> None:
+    """
+    Buang pool warisan proses induk TANPA menutup koneksinya.
+
+    Socket koneksi induk ikut ter-copy saat fork; kalau dipakai/di-close
+    dari proses anak, sesi Postgres milik induk ikut rusak. Pool baru
+    dibuat lazy saat query pertama di proses anak.
+    """
+    global _DB_POOL, _DB_SLOTS
+    _DB_POOL = None
+    _DB_SLOTS = None
+    metrics.DB_POOL_IN_USE.set(0)
+    metrics.DB_POOL_MAX.set(0)
 
 
 def _get_conn():
@@ -63,16 +97,32 @@ def _get_conn():
     global _DB_POOL
     if _DB_POOL is None:
         # lazy init: baca dari Config / .env
-        init_app()
+        with _INIT_LOCK:
+            init_app()
 
-    if _DB_POOL is None:
+    if _DB_POOL is None or _DB_SLOTS is None:
         # Kalau masih None berarti init gagal
         raise RuntimeError(
             "Connection pool belum diinisialisasi dan init_app() gagal. "
             "Periksa konfigurasi DATABASE_URL."
         )
 
-    return _DB_POOL.getconn()
+    slots = _DB_SLOTS
+    started = time.perf_counter()
+    acquired = slots.acquire(timeout=Config.DB_POOL_TIMEOUT)
+    metrics.DB_POOL_WAIT.observe(time.perf_counter() - started)
+    if not acquired:
+        metrics.DB_POOL_TIMEOUTS.inc()
+        raise pool.PoolError(
+            f"Semua koneksi DB terpakai lebih dari {Config.DB_POOL_TIMEOUT} detik."
+        )
+    try:
+        conn = _DB_POOL.getconn()
+    except Exception:
+        slots.release()
+        raise
+    metrics.DB_POOL_IN_USE.inc()
+    return conn
 
 
 def _put_conn(conn) -> None:
@@ -81,7 +131,21 @@ def _put_conn(conn) -> None:
     """
     global _DB_POOL
     if _DB_POOL is not None:
-        _DB_POOL.putconn(conn)
+        try:
+            # koneksi yang dikembalikan harus bersih (tidak tertinggal di transaksi)
+            broken = bool(conn.closed)
+            if not broken and conn.status != psycopg2.extensions.STATUS_READY:
+                try:
+                    conn.rollback()
+                except Exception:
+                    # mis. Postgres restart: koneksi rusak, jangan dipakai lagi
+                    broken = True
+            _DB_POOL.putconn(conn, close=broken)
+        finally:
+            # slot & gauge selalu dikembalikan, walau putconn gagal
+            if _DB_SLOTS is not None:
+                _DB_SLOTS.release()
+            metrics.DB_POOL_IN_USE.dec()
     else:
         # fallback keamanan
         conn.close()
@@ -91,28 +155,41 @@ def close_all() -> None:
     """
     Tutup semua koneksi di pool (opsional, dipakai saat shutdown).
     """
-    global _DB_POOL
+    global _DB_POOL, _DB_SLOTS
     if _DB_POOL is not None:
         _DB_POOL.closeall()
         _DB_POOL = None
+        _DB_SLOTS = None
+        metrics.DB_POOL_IN_USE.set(0)
+        metrics.DB_POOL_MAX.set(0)
 
 
 ParamsType = Union[Dict[str, Any], Sequence[Any], None]
 
 
-def query_one(sql: str, params: ParamsType = None) -> Optional[Dict[str, Any]]:
+def query_one(
+    sql: str,
+    params: ParamsType = None,
+    commit: bool = False,
+) -> Optional[Dict[str, Any]]:
     """
     Jalankan SELECT dan ambil 1 row (atau None).
     Mengembalikan dict: field_name -> value.
+
+    Untuk INSERT/UPDATE ... RETURNING, kirim commit=True supaya perubahan
+    tidak tertinggal di transaksi koneksi pool.
     """
-    conn = _get_conn()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(sql, params or {})
-            row = cur.fetchone()
-        return dict(row) if row is not None else None
-    finally:
-        _put_conn(conn)
+    with profiling.timed("db"):
+        conn = _get_conn()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params or {})
+                row = cur.fetchone()
+            if commit:
+                conn.commit()
+            return dict(row) if row is not None else None
+        finally:
+            _put_conn(conn)
 
 
 def query_all(sql: str, params: ParamsType = None) -> List[Dict[str, Any]]:
@@ -120,15 +197,16 @@ def query_all(sql: str, params: ParamsType = None) -> List[Dict[str, Any]]:
     Jalankan SELECT dan ambil semua row.
     Mengembalikan list of dict.
     """
-    conn = _get_conn()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute(sql, params or {})
-            rows = cur.fetchall()
-        # pastikan list of plain dict, bukan RealDictRow
-        return [dict(r) for r in rows]
-    finally:
-        _put_conn(conn)
+    with profiling.timed("db"):
+        conn = _get_conn()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql, params or {})
+                rows = cur.fetchall()
+            # pastikan list of plain dict, bukan RealDictRow
+            return [dict(r) for r in rows]
+        finally:
+            _put_conn(conn)
 
 
 def execute(
@@ -140,13 +218,42 @@ def execute(
     Jalankan INSERT / UPDATE / DELETE.
     Mengembalikan jumlah row yang terpengaruh.
     """
-    conn = _get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params or {})
-            rowcount = cur.rowcount
-        if commit:
+    with profiling.timed("db"):
+        conn = _get_conn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, params or {})
+                rowcount = cur.rowcount
+            if commit:
+                conn.commit()
+            return rowcount
+        finally:
+            _put_conn(conn)
+
+
+@contextmanager
+def transaction() -> Iterator[Any]:
+    """
+    Context manager untuk beberapa statement dalam satu transaksi.
+
+    Contoh:
+        with db.transaction() as cur:
+            cur.execute("UPDATE ...", {...})
+            cur.execute("INSERT ... RETURNING id", {...})
+            new_id = cur.fetchone()["id"]
+
+    Cursor memakai RealDictCursor. Commit kalau blok selesai normal,
+    rollback kalau ada exception. Untuk profiling, seluruh blok dihitung
+    sebagai waktu db.
+    """
+    with profiling.timed("db"):
+        conn = _get_conn()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                yield cur
             conn.commit()
-        return rowcount
-    finally:
-        _put_conn(conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            _put_conn(conn)
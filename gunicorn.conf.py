@@ -0,0 +1,74 @@
+# gunicorn.conf.py
+"""
+Profil produksi gunicorn.
+
+Worker "gthread": tiap proses punya beberapa thread, jadi satu call router
+yang lambat/timeout (dashboard, sync, terminate) hanya menahan satu thread,
+bukan seluruh worker. Hampir semua waktu request adalah I/O (Postgres,
+REST MikroTik, WA API), jadi thread cukup tanpa perlu gevent/monkey-patch.
+
+Yang dibuat aman untuk model ini:
+- db.py            : ThreadedConnectionPool + antrian (DB_POOL_TIMEOUT)
+- http_session.py  : requests.Session per thread
+- cache.py         : listener NOTIFY dibuat per proses (cek pid)
+- metrics.py       : PROMETHEUS_MULTIPROC_DIR -> /metrics menjumlahkan semua worker
+
+Semua nilai bisa dioverride lewat environment:
+  GUNICORN_BIND, GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_TIMEOUT,
+  GUNICORN_PRELOAD
+
+Jalankan:
+  gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5000")
+
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", str(min(multiprocessing.cpu_count() * 2 + 1, 5))))
+# call router default timeout 10 detik: 8 thread = 8 router lambat sekaligus per worker
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# request terlama yang wajar: sync semua profile / terminate massal ke router
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# app di-load sekali di master (hemat memori, error import ketahuan saat start)
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+# worker di-restart berkala supaya kebocoran memori tidak menumpuk
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # file metrik worker dari run sebelumnya tidak relevan lagi
+    import metrics
+
+    metrics.reset_dir()
+
+
+def when_ready(server):
+    # create_app() di master membuka pool Postgres; tutup sebelum fork
+    # supaya worker tidak berbagi socket koneksi yang sama.
+    import db
+
+    db.close_all()
+
+
+def post_fork(server, worker):
+    import db
+
+    db.reset_after_fork()
+
+
+def child_exit(server, worker):
+    import metrics
+
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,32 @@
+"""
+http_session.py
+---------------
+requests.Session per thread untuk semua HTTP client (router MikroTik,
+Router Admin, API WhatsApp).
+
+- keep-alive: koneksi TCP ke host yang sama dipakai ulang antar call
+- requests.Session tidak dijamin thread-safe, jadi tiap thread worker
+  (gunicorn gthread / ThreadPoolExecutor) punya Session sendiri
+- Session warisan proses induk (sebelum fork) tidak dipakai (cek pid)
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+
+import requests
+
+_local = threading.local()
+
+
+def get_session() -> requests.Session:
+    """
+    Session milik thread ini (dibuat saat pertama dipakai).
+    """
+    sess = getattr(_local, "session", None)
+    if sess is None or getattr(_local, "pid", None) != os.getpid():
+        sess = requests.Session()
+        _local.session = sess
+        _local.pid = os.getpid()
+    return sess
@@ -0,0 +1,293 @@
+"""
+isolation.py
+------------
+Cara isolasi pelanggan di router, dipilih per reseller (resellers.isolation_mode):
+
+- "profile" (default):
+    PPP secret diganti ke profile isolasi, lalu session di-kill supaya
+    pelanggan reconnect dengan profile itu.
+
+- "address_list":
+    PPP secret tetap diganti ke profile isolasi (berlaku saat reconnect
+    berikutnya) TANPA kill session. Session yang sedang online langsung
+    diblokir dengan memasukkan IP-nya ke firewall address-list
+    Config.ISOLATION_ADDRESS_LIST (comment "billing:<ppp_username>").
+    Router reseller butuh rule, misal:
+        /ip firewall filter add chain=forward src-address-list=billing-isolir action=drop
+    IP session bisa dipakai pelanggan lain setelah reconnect, jadi entry
+    tidak boleh tertinggal:
+      - blok on-down yang dipasang ppp_events (kalau PPP_EVENTS_BASE_URL
+        diisi) menghapus entry "billing:<user>" saat session putus
+      - cron isolasi harian menghapus entry yang pelanggannya tidak
+        terisolir lagi atau IP-nya tidak dipakai session pelanggan itu, dan
+        memperbarui timeout entry yang masih berlaku
+      - timeout ISOLATION_ADDRESS_TIMEOUT (default 7d) hanya jaring pengaman
+        terakhir, untuk router yang lama tidak terjangkau
+    Unisolate: profile dikembalikan + entry address-list dihapus; session
+    hanya di-kill kalau session itu dibuat saat profile isolasi aktif
+    (tidak ada entry address-list untuk IP-nya).
+
+Dipakai oleh:
+- router_queue.py : perintah 'isolate' / 'unisolate' dari aksi UI
+                    (isolate_customer, unisolate_customer, _do_pay_customer,
+                    cancel_pay_customer, edit_customer)
+- cron_jobs/isolate_unpaid_users.py : versi batch (isolate_batch_address_list)
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import Config
+from mikrotik_client import (
+    MikrotikError,
+    add_address_list_entries_bulk,
+    add_address_list_entry,
+    get_address_list,
+    get_ppp_active,
+    get_ppp_active_by_name,
+    remove_address_list_entries_bulk,
+    remove_address_list_entry,
+    set_address_list_timeout_bulk,
+    set_ppp_secret_by_name,
+    terminate_ppp_active_by_id,
+    update_ppp_secrets_bulk,
+)
+
+MODE_PROFILE = "profile"
+MODE_ADDRESS_LIST = "address_list"
+
+ISOLATION_MODES = {
+    MODE_PROFILE: "Ganti profile + putus koneksi (reconnect)",
+    MODE_ADDRESS_LIST: "Firewall address-list (langsung, tanpa putus koneksi)",
+}
+
+COMMENT_PREFIX = "billing:"
+
+
+def reseller_isolation_mode(reseller: Dict[str, Any]) -> str:
+    mode = reseller.get("isolation_mode") or MODE_PROFILE
+    return mode if mode in ISOLATION_MODES else MODE_PROFILE
+
+
+def _session_address(sess: Optional[Dict[str, Any]]) -> Optional[str]:
+    if not sess:
+        return None
+    addr = (sess.get("address") or "").strip()
+    return addr.split("/")[0] or None
+
+
+# ======================================================================
+# Satu pelanggan (aksi dari UI)
+# ======================================================================
+
+def _terminate_session(
+    router_ip: str, api_user: str, api_pass: str, username: str,
+    sess: Optional[Dict[str, Any]],
+) -> None:
+    if not sess or not sess.get(".id"):
+        return
+    try:
+        terminate_ppp_active_by_id(router_ip, api_user, api_pass, sess[".id"])
+    except Exception as e:
+        print(f"[isolation] gagal terminate session {username}: {e}")
+
+
+def _add_isolation_entry(
+    router_ip: str, api_user: str, api_pass: str, username: str, address: str,
+) -> None:
+    """Tambah entry isolasi; entry yang sudah ada untuk IP itu dianggap OK."""
+    try:
+        add_address_list_entry(
+            router_ip, api_user, api_pass, Config.ISOLATION_ADDRESS_LIST, address,
+            comment=f"{COMMENT_PREFIX}{username}",
+            timeout=Config.ISOLATION_ADDRESS_TIMEOUT or None,
+        )
+    except MikrotikError as e:
+        if "already have" not in str(e):
+            raise
+
+
+def isolate_on_router(
+    reseller: Dict[str, Any],
+    router_ip: str,
+    username: str,
+    iso_profile_name: str,
+    extra_updates: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Isolir satu pelanggan di router sesuai mode reseller.
+    extra_updates: field PPP secret lain yang ikut di PATCH yang sama.
+    Return keterangan singkat cara isolasi. MikrotikError kalau gagal.
+
+    Call ke router: set profile + /ppp/active (difilter) + kill (profile)
+    atau + tambah address-list kalau online (address_list). Entry lama
+    dengan IP lain dibersihkan on-down / timeout / cron, bukan di sini.
+    """
+    api_user = reseller["router_username"]
+    api_pass = reseller["router_password"]
+    updates = {**(extra_updates or {}), "profile": iso_profile_name}
+
+    if reseller_isolation_mode(reseller) == MODE_PROFILE:
+        set_ppp_secret_by_name(router_ip, api_user, api_pass, username, updates)
+        # kill session aktif agar reconnect dengan profile isolasi
+        try:
+            sess = get_ppp_active_by_name(router_ip, api_user, api_pass, username)
+        except Exception as e:
+            print(f"[isolation] gagal terminate session {username}: {e}")
+        else:
+            _terminate_session(router_ip, api_user, api_pass, username, sess)
+        return f"profile '{iso_profile_name}'"
+
+    # blokir dulu, profile isolasi berlaku saat connect berikutnya
+    address = _session_address(get_ppp_active_by_name(router_ip, api_user, api_pass, username))
+    if address:
+        _add_isolation_entry(router_ip, api_user, api_pass, username, address)
+    set_ppp_secret_by_name(router_ip, api_user, api_pass, username, updates)
+    if not address:
+        return f"profile '{iso_profile_name}' (pelanggan sedang offline)"
+    return f"address-list '{Config.ISOLATION_ADDRESS_LIST}' ({address}), tanpa putus koneksi"
+
+
+def unisolate_on_router(
+    reseller: Dict[str, Any],
+    router_ip: str,
+    username: str,
+    normal_profile_name: Optional[str],
+    extra_updates: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Kembalikan satu pelanggan dari isolasi di router.
+
+    - tanpa normal_profile_name: profile di router tidak diubah (sama
+      dengan perilaku lama _do_pay_customer); extra_updates tetap di-PATCH
+    - extra_updates: field PPP secret lain yang ikut di PATCH yang sama
+    - entry address-list milik pelanggan selalu dihapus (juga di mode
+      profile, kalau reseller baru pindah mode)
+    Return keterangan singkat. MikrotikError kalau gagal.
+    """
+    api_user = reseller["router_username"]
+    api_pass = reseller["router_password"]
+    mode = reseller_isolation_mode(reseller)
+
+    removed_addresses: List[str] = []
+    try:
+        entries = get_address_list(
+            router_ip, api_user, api_pass, Config.ISOLATION_ADDRESS_LIST,
+            comment=f"{COMMENT_PREFIX}{username}",
+        )
+        for entry in entries:
+            if entry.get(".id"):
+                remove_address_list_entry(router_ip, api_user, api_pass, entry[".id"])
+                removed_addresses.append(entry.get("address") or "")
+    except MikrotikError as e:
+        if mode == MODE_ADDRESS_LIST:
+            raise
+        print(f"[isolation] gagal bersihkan address-list {username}: {e}")
+
+    updates = dict(extra_updates or {})
+    if not normal_profile_name:
+        if updates:
+            set_ppp_secret_by_name(router_ip, api_user, api_pass, username, updates)
+        return "address-list dihapus" if removed_addresses else "profile router tidak diubah"
+
+    updates["profile"] = normal_profile_name
+    set_ppp_secret_by_name(router_ip, api_user, api_pass, username, updates)
+
+    try:
+        sess = get_ppp_active_by_name(router_ip, api_user, api_pass, username)
+    except Exception as e:
+        print(f"[isolation] gagal terminate session {username}: {e}")
+        sess = None
+
+    if mode == MODE_PROFILE:
+        # kill session supaya reconnect dengan profil normal
+        _terminate_session(router_ip, api_user, api_pass, username, sess)
+        return f"profile '{normal_profile_name}'"
+
+    # session yang dibuat saat profile isolasi aktif (tidak diblokir lewat
+    # address-list) harus reconnect untuk dapat profile normal
+    if sess and _session_address(sess) not in removed_addresses:
+        _terminate_session(router_ip, api_user, api_pass, username, sess)
+        return f"profile '{normal_profile_name}' (reconnect)"
+    return f"profile '{normal_profile_name}', tanpa putus koneksi"
+
+
+# ======================================================================
+# Batch (cron isolasi)
+# ======================================================================
+
+def isolate_batch_address_list(
+    router_ip: str,
+    api_user: str,
+    api_pass: str,
+    names: List[str],
+    iso_profile_name: str,
+    isolated_names: List[str],
+    max_workers: int = 4,
+) -> Tuple[Dict[str, Optional[str]], int]:
+    """
+    Isolir banyak pelanggan satu router dengan mode address_list:
+    1. profile isolasi untuk semua (/ppp/secret diambil sekali, PATCH paralel)
+    2. /ppp/active + address-list diambil sekali; IP session yang online
+       ditambahkan paralel
+    3. entry "billing:*" yang basi dihapus: pelanggan sudah tidak terisolir
+       (tidak ada di names/isolated_names) atau IP session sudah berganti;
+       timeout entry yang masih berlaku diperbarui
+
+    Return ({nama: None / pesan error}, jumlah IP yang ditambahkan).
+    """
+    list_name = Config.ISOLATION_ADDRESS_LIST
+    results = update_ppp_secrets_bulk(
+        router_ip, api_user, api_pass, names,
+        updates={"profile": iso_profile_name},
+        max_workers=max_workers,
+    )
+    ok = [n for n in names if results.get(n) is None]
+
+    sessions: Dict[str, str] = {}
+    for sess in get_ppp_active(router_ip, api_user, api_pass):
+        addr = _session_address(sess)
+        if sess.get("name") and addr:
+            sessions.setdefault(sess["name"], addr)
+
+    keep = set(ok) | set(isolated_names)
+    listed: Dict[str, str] = {}
+    listed_ids: List[str] = []
+    stale: List[str] = []
+    for entry in get_address_list(router_ip, api_user, api_pass, list_name):
+        comment = entry.get("comment") or ""
+        if not comment.startswith(COMMENT_PREFIX) or not entry.get(".id"):
+            continue  # entry manual, bukan milik billing
+        name = comment[len(COMMENT_PREFIX):]
+        if name in keep and sessions.get(name) == entry.get("address") and name not in listed:
+            listed[name] = entry["address"]
+            listed_ids.append(entry[".id"])
+        else:
+            stale.append(entry[".id"])
+
+    to_add = {n: sessions[n] for n in ok if n in sessions and n not in listed}
+    added = add_address_list_entries_bulk(
+        router_ip, api_user, api_pass, list_name, to_add,
+        comment_prefix=COMMENT_PREFIX, max_workers=max_workers,
+        timeout=Config.ISOLATION_ADDRESS_TIMEOUT or None,
+    )
+    for name, err in added.items():
+        if err is not None:
+            results[name] = f"profile isolasi OK, tapi gagal tambah address-list: {err}"
+
+    for eid, err in remove_address_list_entries_bulk(
+        router_ip, api_user, api_pass, stale, max_workers=max_workers,
+    ).items():
+        if err is not None:
+            print(f"ℹ️ gagal hapus address-list basi {eid}: {err}")
+
+    if Config.ISOLATION_ADDRESS_TIMEOUT and listed_ids:
+        for eid, err in set_address_list_timeout_bulk(
+            router_ip, api_user, api_pass, listed_ids, Config.ISOLATION_ADDRESS_TIMEOUT,
+            max_workers=max_workers,
+        ).items():
+            if err is not None:
+                print(f"ℹ️ gagal perbarui timeout address-list {eid}: {err}")
+
+    return results, sum(1 for err in added.values() if err is None)
@@ -0,0 +1,332 @@
+"""
+jobs.py
+-------
+Job latar belakang berbasis Postgres (tabel jobs, migrations/0006_jobs.sql)
+untuk aksi UI yang bisa lebih lama dari timeout worker gunicorn.
+
+Alur:
+- handler POST memanggil enqueue(kind, reseller_id, params) lalu redirect
+  ke halaman progres (blueprints/jobs.py), yang polling /jobs/<id>/status
+- proses worker (python -m cron_jobs.job_worker) mengambil job dengan
+  claim_next() (FOR UPDATE SKIP LOCKED) lalu run_job()
+- handler job menerima JobContext:
+      ctx.progress(done, total, "pesan")  -> simpan progres (di-throttle),
+                                             sekaligus baca cancel_requested
+      ctx.check_cancel()                  -> raise JobCancelled kalau user
+                                             menekan Batal
+      ctx.summary[...] = ...              -> ringkasan sementara (disimpan
+                                             juga kalau job dibatalkan/gagal)
+  dan mengembalikan dict ringkasan hasil (disimpan di jobs.result)
+
+Satu job aktif per reseller (unique index parsial): enqueue kedua
+mengembalikan id job yang sedang berjalan.
+
+Handler didaftarkan dengan dekorator:
+
+    @jobs.register("sync_customers", "Sinkron customer dari router")
+    def sync_customers_job(ctx): ...
+
+(lihat router_sync.py; worker meng-import modul handler).
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import db
+from config import Config
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+HANDLERS: Dict[str, Callable[["JobContext"], Optional[Dict[str, Any]]]] = {}
+LABELS: Dict[str, str] = {}
+
+
+class JobCancelled(Exception):
+    """Dilempar handler (lewat ctx.check_cancel) saat job dibatalkan user."""
+
+
+def register(kind: str, label: str):
+    """Dekorator pendaftaran handler job."""
+    def decorator(fn):
+        HANDLERS[kind] = fn
+        LABELS[kind] = label
+        return fn
+    return decorator
+
+
+def job_label(kind: str) -> str:
+    return LABELS.get(kind, kind)
+
+
+class JobContext:
+    """Objek yang diterima handler job."""
+
+    def __init__(self, job: Dict[str, Any]) -> None:
+        self.id: int = job["id"]
+        self.kind: str = job["kind"]
+        self.reseller_id: Optional[int] = job.get("reseller_id")
+        self.params: Dict[str, Any] = job.get("params") or {}
+        self.summary: Dict[str, Any] = {}
+        self._cancel = bool(job.get("cancel_requested"))
+        self._last_flush = 0.0
+
+    def progress(
+        self,
+        done: int,
+        total: Optional[int] = None,
+        message: Optional[str] = None,
+        *,
+        force: bool = False,
+    ) -> None:
+        """
+        Simpan progres. Ditulis ke DB paling sering tiap
+        JOB_PROGRESS_INTERVAL detik (kecuali force=True).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_flush < Config.JOB_PROGRESS_INTERVAL:
+            return
+        self._last_flush = now
+        row = db.query_one(
+            """
+            UPDATE jobs
+            SET
+                progress_done = %(done)s,
+                progress_total = COALESCE(%(total)s, progress_total),
+                message = COALESCE(%(message)s, message),
+                heartbeat_at = NOW()
+            WHERE id = %(id)s
+            RETURNING cancel_requested
+            """,
+            {"id": self.id, "done": done, "total": total, "message": message},
+            commit=True,
+        )
+        if row and row["cancel_requested"]:
+            self._cancel = True
+
+    def cancelled(self) -> bool:
+        return self._cancel
+
+    def check_cancel(self) -> None:
+        if self._cancel:
+            raise JobCancelled()
+
+
+# ======================================================================
+# Dipakai handler web
+# ======================================================================
+
+def enqueue(
+    kind: str,
+    reseller_id: Optional[int],
+    params: Optional[Dict[str, Any]] = None,
+) -> Tuple[int, bool]:
+    """
+    Buat job baru. Return (job_id, True), atau (id job aktif reseller
+    itu, False) kalau reseller masih punya job queued/running.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Jenis job tidak dikenal: {kind}")
+
+    for _ in range(3):
+        row = db.query_one(
+            """
+            INSERT INTO jobs (kind, reseller_id, params, message)
+            VALUES (%(kind)s, %(rid)s, %(params)s::jsonb, 'Menunggu worker...')
+            ON CONFLICT (reseller_id) WHERE status IN ('queued', 'running')
+            DO NOTHING
+            RETURNING id
+            """,
+            {"kind": kind, "rid": reseller_id, "params": json.dumps(params or {}, default=str)},
+            commit=True,
+        )
+        if row:
+            return row["id"], True
+
+        active = active_job(reseller_id)
+        if active:
+            return active["id"], False
+        # job aktif baru saja selesai di antara INSERT dan SELECT: coba lagi
+
+    raise RuntimeError("Gagal membuat job: reseller masih punya job aktif.")
+
+
+def get_job(job_id: int, reseller_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    """Job milik reseller (reseller_id None = tanpa filter, untuk admin)."""
+    return db.query_one(
+        """
+        SELECT
+            id, kind, reseller_id, params, status,
+            progress_done, progress_total, message, result, error,
+            cancel_requested, created_at, started_at, finished_at
+        FROM jobs
+        WHERE id = %(id)s
+          AND (%(rid)s::int IS NULL OR reseller_id = %(rid)s)
+        """,
+        {"id": job_id, "rid": reseller_id},
+    )
+
+
+def active_job(reseller_id: Optional[int]) -> Optional[Dict[str, Any]]:
+    return db.query_one(
+        """
+        SELECT id, kind, status
+        FROM jobs
+        WHERE reseller_id = %(rid)s
+          AND status IN ('queued', 'running')
+        """,
+        {"rid": reseller_id},
+    )
+
+
+def request_cancel(job_id: int, reseller_id: Optional[int]) -> bool:
+    """
+    Minta job dibatalkan. Job yang masih queued langsung 'cancelled';
+    job running berhenti di cek berikutnya (ctx.check_cancel).
+    """
+    return db.execute(
+        """
+        UPDATE jobs
+        SET
+            cancel_requested = TRUE,
+            status = CASE WHEN status = 'queued' THEN 'cancelled' ELSE status END,
+            message = CASE WHEN status = 'queued' THEN 'Dibatalkan sebelum dimulai.' ELSE message END,
+            finished_at = CASE WHEN status = 'queued' THEN NOW() ELSE finished_at END
+        WHERE id = %(id)s
+          AND (%(rid)s::int IS NULL OR reseller_id = %(rid)s)
+          AND status IN ('queued', 'running')
+        """,
+        {"id": job_id, "rid": reseller_id},
+    ) > 0
+
+
+# ======================================================================
+# Dipakai worker
+# ======================================================================
+
+WORKER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_next() -> Optional[Dict[str, Any]]:
+    """Ambil satu job queued tertua (job yang sedang diambil worker lain dilewati)."""
+    return db.query_one(
+        """
+        UPDATE jobs j
+        SET
+            status = 'running',
+            started_at = NOW(),
+            heartbeat_at = NOW(),
+            worker = %(worker)s,
+            message = 'Mulai...'
+        WHERE j.id = (
+            SELECT id
+            FROM jobs
+            WHERE status = 'queued'
+            ORDER BY created_at, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING j.id, j.kind, j.reseller_id, j.params, j.cancel_requested
+        """,
+        {"worker": f"{WORKER_NAME}/{threading.current_thread().name}"},
+        commit=True,
+    )
+
+
+def _finish(job_id: int, status: str, message: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+    db.execute(
+        """
+        UPDATE jobs
+        SET
+            status = %(status)s,
+            message = %(message)s,
+            result = %(result)s::jsonb,
+            error = %(error)s,
+            finished_at = NOW(),
+            heartbeat_at = NOW()
+        WHERE id = %(id)s
+        """,
+        {
+            "id": job_id,
+            "status": status,
+            "message": message[:500],
+            "result": json.dumps(result, default=str) if result is not None else None,
+            "error": error[:2000] if error else None,
+        },
+    )
+
+
+def _heartbeat(job_id: int, stop: threading.Event) -> None:
+    # handler yang lama diam (mis. satu call router lambat) tetap dianggap hidup
+    while not stop.wait(Config.JOB_STALE_SECONDS / 3):
+        try:
+            db.execute("UPDATE jobs SET heartbeat_at = NOW() WHERE id = %(id)s", {"id": job_id})
+        except Exception as e:
+            print(f"[jobs] gagal update heartbeat job {job_id}: {e}")
+
+
+def run_job(job: Dict[str, Any]) -> str:
+    """Jalankan satu job hasil claim_next(). Return status akhir."""
+    handler = HANDLERS.get(job["kind"])
+    if handler is None:
+        _finish(job["id"], "failed", "Jenis job tidak dikenal.", None, f"handler {job['kind']} tidak ada")
+        return "failed"
+
+    ctx = JobContext(job)
+    stop = threading.Event()
+    beat = threading.Thread(target=_heartbeat, args=(job["id"], stop), daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    try:
+        ctx.check_cancel()
+        result = handler(ctx)
+        summary = {**ctx.summary, **(result or {})}
+        summary["seconds"] = round(time.perf_counter() - started, 1)
+        _finish(job["id"], "succeeded", summary.get("message") or "Selesai.", summary, None)
+        return "succeeded"
+    except JobCancelled:
+        summary = {**ctx.summary, "seconds": round(time.perf_counter() - started, 1)}
+        _finish(job["id"], "cancelled", "Dibatalkan.", summary, None)
+        return "cancelled"
+    except Exception as e:
+        print(f"[jobs] job {job['id']} ({job['kind']}) gagal: {e}")
+        summary = {**ctx.summary, "seconds": round(time.perf_counter() - started, 1)}
+        _finish(job["id"], "failed", f"Gagal: {e}", summary, repr(e))
+        return "failed"
+    finally:
+        stop.set()
+
+
+def reap_stale() -> int:
+    """Job running tanpa heartbeat (worker mati) ditandai gagal."""
+    return db.execute(
+        """
+        UPDATE jobs
+        SET
+            status = 'failed',
+            error = 'worker berhenti saat menjalankan job',
+            message = 'Gagal: worker berhenti.',
+            finished_at = NOW()
+        WHERE status = 'running'
+          AND heartbeat_at < NOW() - make_interval(secs => %(stale)s)
+        """,
+        {"stale": Config.JOB_STALE_SECONDS},
+    )
+
+
+def purge_finished() -> int:
+    """Hapus job selesai yang lebih tua dari JOB_RETENTION_DAYS."""
+    return db.execute(
+        """
+        DELETE FROM jobs
+        WHERE status IN ('succeeded', 'failed', 'cancelled')
+          AND finished_at < NOW() - make_interval(days => %(days)s)
+        """,
+        {"days": Config.JOB_RETENTION_DAYS},
+    )
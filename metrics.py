@@ -0,0 +1,312 @@
+"""
+metrics.py
+----------
+Metrik operasional format Prometheus (prometheus_client).
+
+Multi-proses:
+- Kalau env PROMETHEUS_MULTIPROC_DIR diset, setiap proses (worker gunicorn,
+  job cron) menulis nilai metriknya ke file di folder itu, dan /metrics
+  menjumlahkan semua file. Di docker-compose folder ini berupa volume yang
+  dipakai bersama container web dan cron.
+- Job cron (python -m cron_jobs.<nama>) memakai satu set file per nama job
+  (bukan per pid) supaya jumlah file tidak bertambah setiap run. Kalau job
+  yang sama sedang berjalan paralel, run berikutnya memakai slot cadangan
+  cron-<nama>-<n> (maks. _CRON_SLOTS), baru setelah itu file per pid.
+- Gauge livesum (pool DB) milik job cron dibuang saat proses selesai
+  (atexit) dan saat slot dipakai lagi (sisa run yang di-kill), supaya
+  job yang sudah berhenti tidak ikut terjumlah.
+- Tanpa PROMETHEUS_MULTIPROC_DIR (dev, satu proses) registry default dipakai.
+
+Metrik:
+- billing_http_request_duration_seconds{endpoint,method}   histogram
+- billing_http_requests_total{endpoint,method,status}
+- billing_db_pool_connections_in_use / _max                 gauge (livesum)
+- billing_db_pool_wait_seconds                             histogram
+- billing_db_pool_timeouts_total
+- billing_router_requests_total{router,result}
+- billing_router_request_duration_seconds{router}          histogram
+- billing_wa_messages_total{gateway,result}
+- billing_wa_send_duration_seconds{gateway}                histogram
+- billing_wa_outbox_messages{status}                       gauge (pending/sending)
+- billing_cache_lookups_total{cache,result}
+- billing_cron_job_duration_seconds{job,result}            histogram
+- billing_cron_job_last_success_timestamp_seconds{job}     gauge
+
+Endpoint:
+- GET /metrics            : format teks Prometheus
+                            (header "Authorization: Bearer <METRICS_TOKEN>"
+                            atau sesi admin)
+- GET /admin/metrics.json : ringkasan JSON (blueprint admin)
+"""
+
+from __future__ import annotations
+
+import atexit
+import fcntl
+import hmac
+import os
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config import Config  # load .env dulu: PROMETHEUS_MULTIPROC_DIR harus terbaca sebelum import prometheus_client
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or None
+
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    values,
+)
+from flask import Flask, Response, abort, g, request, session  # noqa: E402
+
+
+def _cron_job_name() -> Optional[str]:
+    spec = getattr(sys.modules.get("__main__"), "__spec__", None)
+    name = getattr(spec, "name", "") or ""
+    if name.startswith("cron_jobs."):
+        return name.split(".", 1)[1]
+    return None
+
+
+CRON_JOB = _cron_job_name()
+_CRON_SLOTS = 4
+_cron_lock_fh = None
+
+
+def _claim_cron_ident(job: str) -> Optional[str]:
+    """
+    Kunci slot file metrik untuk job ini: "cron-<job>", lalu
+    "cron-<job>-1" dst. None kalau semua slot sedang dipakai.
+    """
+    global _cron_lock_fh
+    for slot in range(_CRON_SLOTS):
+        ident = f"cron-{job}" if slot == 0 else f"cron-{job}-{slot}"
+        fh = open(os.path.join(MULTIPROC_DIR, f".{ident}.lock"), "w")
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            continue
+        _cron_lock_fh = fh
+        return ident
+    return None
+
+
+def _drop_live_gauges(ident: Any) -> None:
+    multiprocess.mark_process_dead(ident, MULTIPROC_DIR)
+
+
+if MULTIPROC_DIR and CRON_JOB:
+    _ident = _claim_cron_ident(CRON_JOB)
+    if _ident:
+        # sisa run sebelumnya yang mati tanpa sempat membersihkan
+        _drop_live_gauges(_ident)
+        values.ValueClass = values.MultiProcessValue(process_identifier=lambda: _ident)
+        atexit.register(_drop_live_gauges, _ident)
+    else:
+        # semua slot terpakai: file per pid, gauge live dibuang saat selesai
+        atexit.register(_drop_live_gauges, os.getpid())
+
+
+_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_LATENCY = Histogram(
+    "billing_http_request_duration_seconds",
+    "Durasi request HTTP per endpoint Flask.",
+    ["endpoint", "method"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "billing_http_requests_total",
+    "Jumlah request HTTP per endpoint & status.",
+    ["endpoint", "method", "status"],
+)
+
+DB_POOL_IN_USE = Gauge(
+    "billing_db_pool_connections_in_use",
+    "Koneksi Postgres yang sedang dipinjam dari pool.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_MAX = Gauge(
+    "billing_db_pool_connections_max",
+    "Kapasitas pool Postgres.",
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT = Histogram(
+    "billing_db_pool_wait_seconds",
+    "Lama menunggu slot koneksi pool.",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "billing_db_pool_timeouts_total",
+    "Permintaan koneksi yang gagal karena pool penuh terlalu lama.",
+)
+
+ROUTER_REQUESTS = Counter(
+    "billing_router_requests_total",
+    "Call REST ke router MikroTik per router & hasil (ok/error/unreachable).",
+    ["router", "result"],
+)
+ROUTER_LATENCY = Histogram(
+    "billing_router_request_duration_seconds",
+    "Durasi call REST ke router MikroTik.",
+    ["router"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+WA_MESSAGES = Counter(
+    "billing_wa_messages_total",
+    "Pesan WhatsApp yang dikirim per gateway (ok/error).",
+    ["gateway", "result"],
+)
+WA_LATENCY = Histogram(
+    "billing_wa_send_duration_seconds",
+    "Durasi call API WhatsApp per gateway.",
+    ["gateway"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+WA_OUTBOX_DEPTH = Gauge(
+    "billing_wa_outbox_messages",
+    "Pesan di antrian wa_outbox per status (diperbarui worker outbox).",
+    ["status"],
+    multiprocess_mode="mostrecent",
+)
+
+CACHE_LOOKUPS = Counter(
+    "billing_cache_lookups_total",
+    "Lookup cache in-process (hit/miss).",
+    ["cache", "result"],
+)
+
+CRON_DURATION = Histogram(
+    "billing_cron_job_duration_seconds",
+    "Durasi job cron.",
+    ["job", "result"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+CRON_LAST_SUCCESS = Gauge(
+    "billing_cron_job_last_success_timestamp_seconds",
+    "Waktu (epoch) job cron terakhir selesai tanpa error.",
+    ["job"],
+    multiprocess_mode="max",
+)
+
+
+# ======================================================================
+# Helper pencatatan
+# ======================================================================
+
+@contextmanager
+def cron_job(job: str) -> Iterator[None]:
+    """
+    Catat durasi & hasil satu run job cron.
+
+        with metrics.cron_job("generate_reseller_invoices"):
+            generate_invoices()
+    """
+    started = time.monotonic()
+    try:
+        yield
+    except BaseException:
+        CRON_DURATION.labels(job, "error").observe(time.monotonic() - started)
+        raise
+    CRON_DURATION.labels(job, "ok").observe(time.monotonic() - started)
+    CRON_LAST_SUCCESS.labels(job).set(time.time())
+
+
+# ======================================================================
+# Export
+# ======================================================================
+
+def _registry() -> CollectorRegistry:
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_prometheus() -> bytes:
+    return generate_latest(_registry())
+
+
+def collect_json() -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Ringkasan ringkas: {nama_sampel: [{"labels": {...}, "value": x}, ...]}.
+    Bucket histogram dibuang; _count dan _sum tetap ada.
+    """
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for family in _registry().collect():
+        for sample in family.samples:
+            if sample.name.endswith("_bucket") or sample.name.endswith("_created"):
+                continue
+            out.setdefault(sample.name, []).append(
+                {"labels": dict(sample.labels), "value": sample.value}
+            )
+    return out
+
+
+def mark_process_dead(pid: int) -> None:
+    """Dipanggil gunicorn child_exit: buang gauge live milik worker mati."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid, MULTIPROC_DIR)
+
+
+def reset_dir() -> None:
+    """
+    Dipanggil master gunicorn saat start: hapus file metrik web lama (dan
+    file per pid job cron yang tidak dapat slot).
+    File job cron (cron-*) dibiarkan supaya riwayat cron tidak hilang.
+    """
+    if not MULTIPROC_DIR:
+        return
+    for name in os.listdir(MULTIPROC_DIR):
+        if name.endswith(".db") and "_cron-" not in name:
+            try:
+                os.remove(os.path.join(MULTIPROC_DIR, name))
+            except OSError:
+                pass
+
+
+# ======================================================================
+# Flask
+# ======================================================================
+
+def init_app(app: Flask) -> None:
+    """
+    Pasang pencatatan latency request + route /metrics.
+    """
+
+    @app.before_request
+    def _metrics_start() -> None:
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            endpoint = request.endpoint or "unknown"
+            REQUEST_LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - started)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        token = Config.METRICS_TOKEN
+        auth = request.headers.get("Authorization", "")
+        bearer_ok = bool(token) and hmac.compare_digest(auth, f"Bearer {token}")
+        if not bearer_ok and not session.get("is_admin"):
+            abort(403)
+        return Response(render_prometheus(), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,189 @@
+-- migrations/0001_customer_billing_status.sql
+-- ---------------------------------------------------------------------------
+-- Status billing per customer disimpan sebagai kolom (bukan dihitung view).
+--
+-- Sebelumnya payment_status_text / has_paid_current_period /
+-- should_isolate_current_period dihitung view dari last_paid_period vs
+-- CURRENT_DATE untuk setiap row di setiap query, sehingga filter status
+-- (status=unpaid, laporan unpaid, seleksi cron) selalu full scan.
+--
+-- Sekarang:
+-- - kolom disimpan di ppp_customers + diindex
+-- - trigger BEFORE INSERT/UPDATE menghitung ulang status setiap kali row
+--   berubah (bayar, cancel-pay, isolate, enable/disable, edit, sync)
+-- - cron_jobs.rollover_billing_status menghitung ulang massal saat
+--   pergantian periode (status_period < bulan berjalan)
+-- - view lama dibuat ulang dan membaca kolom tersimpan
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0001_customer_billing_status.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+ALTER TABLE ppp_customers
+    ADD COLUMN IF NOT EXISTS payment_status_text           text    NOT NULL DEFAULT 'never_paid',
+    ADD COLUMN IF NOT EXISTS has_paid_current_period       boolean NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS should_isolate_current_period boolean NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS status_period                 date;
+
+
+-- Hitung status untuk periode bulan berjalan.
+-- Aturan sama persis dengan view lama:
+-- - isolated               : is_isolated = TRUE
+-- - paid_current_period    : last_paid_period >= awal bulan ini
+-- - never_paid             : last_paid_period IS NULL
+-- - unpaid_current_period  : selain itu
+-- should_isolate hanya untuk user enabled, belum isolate, belum bayar,
+-- dan billing_start_date (kalau ada) tidak di bulan depan.
+CREATE OR REPLACE FUNCTION ppp_customers_set_billing_status()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    period date := date_trunc('month', CURRENT_DATE)::date;
+BEGIN
+    NEW.status_period := period;
+    NEW.has_paid_current_period :=
+        NEW.last_paid_period IS NOT NULL AND NEW.last_paid_period >= period;
+
+    NEW.payment_status_text := CASE
+        WHEN COALESCE(NEW.is_isolated, FALSE) THEN 'isolated'
+        WHEN NEW.has_paid_current_period       THEN 'paid_current_period'
+        WHEN NEW.last_paid_period IS NULL      THEN 'never_paid'
+        ELSE 'unpaid_current_period'
+    END;
+
+    NEW.should_isolate_current_period :=
+        COALESCE(NEW.is_enabled, FALSE)
+        AND NOT COALESCE(NEW.is_isolated, FALSE)
+        AND NOT NEW.has_paid_current_period
+        AND (
+            NEW.billing_start_date IS NULL
+            OR date_trunc('month', NEW.billing_start_date)::date <= period
+        );
+
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_ppp_customers_billing_status ON ppp_customers;
+CREATE TRIGGER trg_ppp_customers_billing_status
+    BEFORE INSERT OR UPDATE ON ppp_customers
+    FOR EACH ROW
+    EXECUTE FUNCTION ppp_customers_set_billing_status();
+
+-- Isi awal untuk semua row yang sudah ada (trigger yang menghitung).
+UPDATE ppp_customers SET status_period = NULL;
+
+
+-- Index untuk filter status di list customers / petugas / dashboard,
+-- laporan unpaid, dan seleksi cron isolasi & notifikasi.
+CREATE INDEX IF NOT EXISTS idx_ppp_customers_reseller_status
+    ON ppp_customers (reseller_id, payment_status_text);
+
+CREATE INDEX IF NOT EXISTS idx_ppp_customers_unpaid
+    ON ppp_customers (reseller_id)
+    WHERE has_paid_current_period = FALSE;
+
+CREATE INDEX IF NOT EXISTS idx_ppp_customers_should_isolate
+    ON ppp_customers (reseller_id)
+    WHERE should_isolate_current_period = TRUE;
+
+-- Dipakai rollover untuk mencari row yang statusnya masih periode lama.
+CREATE INDEX IF NOT EXISTS idx_ppp_customers_status_period
+    ON ppp_customers (status_period);
+
+
+-- ---------------------------------------------------------------------------
+-- View dibuat ulang supaya membaca kolom tersimpan.
+-- Urutan drop mengikuti dependensi; tanpa CASCADE supaya migrasi berhenti
+-- kalau ternyata ada view lain yang bergantung (lebih aman dicek manual).
+-- ---------------------------------------------------------------------------
+
+DROP VIEW IF EXISTS v_reseller_unpaid_summary;
+DROP VIEW IF EXISTS v_unpaid_customers_current_period;
+DROP VIEW IF EXISTS v_customers;
+DROP VIEW IF EXISTS v_payment_status_detail;
+
+CREATE VIEW v_payment_status_detail AS
+SELECT
+    c.id                                         AS customer_id,
+    c.reseller_id,
+    COALESCE(r.display_name, r.router_username)  AS reseller_name,
+    c.ppp_username,
+    c.full_name,
+    c.address,
+    c.wa_number,
+    c.petugas_name,
+    c.profile_id,
+    p.name                                       AS profile_name,
+    COALESCE(p.monthly_price, 0)                 AS monthly_price,
+    c.is_enabled,
+    c.is_isolated,
+    c.billing_start_date,
+    c.last_paid_period,
+    c.payment_status_text,
+    c.has_paid_current_period,
+    c.should_isolate_current_period,
+    c.last_connected_at,
+    c.last_disconnected_at
+FROM ppp_customers c
+JOIN resellers r      ON r.id = c.reseller_id
+LEFT JOIN ppp_profiles p ON p.id = c.profile_id;
+
+CREATE VIEW v_customers AS
+SELECT
+    c.id                                         AS customer_id,
+    c.reseller_id,
+    COALESCE(r.display_name, r.router_username)  AS reseller_name,
+    c.ppp_username,
+    c.full_name,
+    c.address,
+    c.wa_number,
+    c.petugas_name,
+    c.profile_id,
+    p.name                                       AS profile_name,
+    COALESCE(p.monthly_price, 0)                 AS monthly_price,
+    c.is_enabled,
+    c.is_isolated,
+    c.billing_start_date,
+    c.last_paid_period,
+    c.payment_status_text,
+    c.has_paid_current_period,
+    c.should_isolate_current_period
+FROM ppp_customers c
+JOIN resellers r      ON r.id = c.reseller_id
+LEFT JOIN ppp_profiles p ON p.id = c.profile_id;
+
+CREATE VIEW v_unpaid_customers_current_period AS
+SELECT
+    c.id                                         AS customer_id,
+    c.reseller_id,
+    COALESCE(r.display_name, r.router_username)  AS reseller_name,
+    c.ppp_username,
+    c.full_name,
+    c.wa_number,
+    c.petugas_name,
+    c.profile_id,
+    p.name                                       AS profile_name,
+    COALESCE(p.monthly_price, 0)                 AS monthly_price,
+    c.is_enabled,
+    c.is_isolated,
+    c.payment_status_text,
+    c.status_period                              AS current_period
+FROM ppp_customers c
+JOIN resellers r      ON r.id = c.reseller_id
+LEFT JOIN ppp_profiles p ON p.id = c.profile_id
+WHERE c.has_paid_current_period = FALSE;
+
+CREATE VIEW v_reseller_unpaid_summary AS
+SELECT
+    v.reseller_id,
+    v.reseller_name,
+    COUNT(*)                       AS unpaid_customer_count,
+    COALESCE(SUM(v.monthly_price), 0) AS unpaid_total_amount
+FROM v_unpaid_customers_current_period v
+GROUP BY v.reseller_id, v.reseller_name;
+
+COMMIT;
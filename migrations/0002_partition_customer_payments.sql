@@ -0,0 +1,117 @@
+-- migrations/0002_partition_customer_payments.sql
+-- ---------------------------------------------------------------------------
+-- customer_payments diubah menjadi tabel partisi RANGE (created_at) per bulan.
+--
+-- - partisi bulanan: customer_payments_pYYYYMM
+-- - partisi default menampung row di luar range (mis. jam server ngaco)
+-- - fungsi customer_payments_ensure_partitions() membuat partisi ke depan,
+--   dipanggil cron_jobs.payment_partitions (lihat crontab)
+-- - partisi lama dilepas + diarsip ke file .csv.gz lewat CLI:
+--     python -m cron_jobs.payment_partitions archive --keep-months 12
+--
+-- Catatan: PK tabel partisi wajib mengandung kolom partisi, jadi PK menjadi
+-- (id, created_at) dan FK self-reference reversed_by_id -> id tidak bisa
+-- dipertahankan. Konsistensinya dijaga di billing_logic.reverse_customer_payment.
+--
+-- Tabel lama di-rename menjadi customer_payments_legacy (tidak dihapus).
+-- Setelah data dicek, boleh di-DROP manual.
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0002_partition_customer_payments.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+ALTER TABLE customer_payments RENAME TO customer_payments_legacy;
+
+CREATE TABLE customer_payments (
+    id               bigint      NOT NULL,
+    customer_id      integer     NOT NULL,
+    reseller_id      integer     NOT NULL,
+    months           integer     NOT NULL,
+    old_last_period  date,
+    new_last_period  date,
+    old_is_isolated  boolean,
+    new_is_isolated  boolean,
+    source           text,
+    note             text,
+    reversed_by_id   bigint,
+    created_at       timestamptz NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE SEQUENCE IF NOT EXISTS customer_payments_id_seq_v2 OWNED BY customer_payments.id;
+ALTER TABLE customer_payments
+    ALTER COLUMN id SET DEFAULT nextval('customer_payments_id_seq_v2');
+
+-- "pembayaran terakhir yang belum di-undo" per customer (cancel-pay)
+CREATE INDEX idx_customer_payments_reversible
+    ON customer_payments (customer_id, reseller_id, created_at DESC)
+    WHERE reversed_by_id IS NULL;
+
+CREATE TABLE customer_payments_default
+    PARTITION OF customer_payments DEFAULT;
+
+
+-- Buat partisi bulanan mulai bulan `from_month` sampai `months_ahead`
+-- bulan setelah bulan berjalan. Idempotent (partisi yang sudah ada dilewati).
+-- Mengembalikan jumlah partisi baru.
+CREATE OR REPLACE FUNCTION customer_payments_ensure_partitions(
+    from_month   date,
+    months_ahead integer DEFAULT 3
+)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    m        date := date_trunc('month', from_month)::date;
+    last_m   date := (date_trunc('month', CURRENT_DATE)
+                      + make_interval(months => months_ahead))::date;
+    part     text;
+    created  integer := 0;
+BEGIN
+    WHILE m <= last_m LOOP
+        part := 'customer_payments_p' || to_char(m, 'YYYYMM');
+        IF to_regclass(part) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF customer_payments
+                 FOR VALUES FROM (%L) TO (%L)',
+                part, m, (m + INTERVAL '1 month')::date
+            );
+            created := created + 1;
+        END IF;
+        m := (m + INTERVAL '1 month')::date;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Partisi untuk seluruh data lama + 3 bulan ke depan.
+SELECT customer_payments_ensure_partitions(
+    COALESCE(
+        (SELECT MIN(created_at)::date FROM customer_payments_legacy),
+        CURRENT_DATE
+    ),
+    3
+);
+
+INSERT INTO customer_payments (
+    id, customer_id, reseller_id, months,
+    old_last_period, new_last_period,
+    old_is_isolated, new_is_isolated,
+    source, note, reversed_by_id, created_at
+)
+SELECT
+    id, customer_id, reseller_id, months,
+    old_last_period, new_last_period,
+    old_is_isolated, new_is_isolated,
+    source, note, reversed_by_id, COALESCE(created_at, NOW())
+FROM customer_payments_legacy;
+
+SELECT setval(
+    'customer_payments_id_seq_v2',
+    COALESCE((SELECT MAX(id) FROM customer_payments), 0) + 1,
+    false
+);
+
+COMMIT;
@@ -0,0 +1,44 @@
+-- migrations/0003_reseller_invoices_unique_period.sql
+-- ---------------------------------------------------------------------------
+-- Satu invoice per reseller per periode, dijaga database.
+--
+-- cron_jobs.generate_reseller_invoices sekarang memakai satu statement
+-- INSERT ... SELECT ... ON CONFLICT (reseller_id, period_start) DO NOTHING
+-- (billing_logic.generate_reseller_invoices_for_current_period). Tanpa
+-- unique index ini ON CONFLICT gagal, dan dua run cron yang bersamaan bisa
+-- membuat invoice ganda.
+--
+-- Kalau sudah ada duplikat, migrasi berhenti dengan daftar reseller/periode
+-- yang harus dibereskan manual dulu:
+--   SELECT reseller_id, period_start, array_agg(id ORDER BY id)
+--   FROM reseller_invoices
+--   GROUP BY 1, 2 HAVING COUNT(*) > 1;
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0003_reseller_invoices_unique_period.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+DO $$
+DECLARE
+    dup record;
+BEGIN
+    SELECT reseller_id, period_start, COUNT(*) AS n
+    INTO dup
+    FROM reseller_invoices
+    GROUP BY reseller_id, period_start
+    HAVING COUNT(*) > 1
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'invoice ganda: reseller % periode % (% row)',
+            dup.reseller_id, dup.period_start, dup.n;
+    END IF;
+END
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS reseller_invoices_reseller_period_uniq
+    ON reseller_invoices (reseller_id, period_start);
+
+COMMIT;
@@ -0,0 +1,31 @@
+-- migrations/0004_reseller_isolation_mode.sql
+-- ---------------------------------------------------------------------------
+-- Cara isolasi dipilih per reseller (resellers.isolation_mode):
+--
+-- - 'profile'      : (default, perilaku lama) PPP secret diganti ke profile
+--                    isolasi lalu session di-kill supaya reconnect.
+-- - 'address_list' : IP session pelanggan dimasukkan ke firewall
+--                    address-list ISOLATION_ADDRESS_LIST di router; langsung
+--                    berlaku tanpa putus koneksi. Pelanggan yang offline saat
+--                    diisolir tetap diganti profile-nya (tidak ada session
+--                    yang perlu di-kill). Lihat isolation.py.
+--
+-- Mode address_list butuh rule firewall di router reseller, misal:
+--   /ip firewall filter add chain=forward src-address-list=billing-isolir action=drop
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0004_reseller_isolation_mode.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+ALTER TABLE resellers
+    ADD COLUMN IF NOT EXISTS isolation_mode text NOT NULL DEFAULT 'profile';
+
+ALTER TABLE resellers
+    DROP CONSTRAINT IF EXISTS resellers_isolation_mode_check;
+ALTER TABLE resellers
+    ADD CONSTRAINT resellers_isolation_mode_check
+    CHECK (isolation_mode IN ('profile', 'address_list'));
+
+COMMIT;
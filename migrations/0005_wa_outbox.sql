@@ -0,0 +1,70 @@
+-- migrations/0005_wa_outbox.sql
+-- ---------------------------------------------------------------------------
+-- Antrian WhatsApp (outbox) yang tahan restart.
+--
+-- Sebelumnya send_wa dipanggil langsung dari request handler & cron
+-- (bayar customer menunggu sampai 10 detik, kirim WA unpaid massal
+-- memproses semua pelanggan di dalam satu request HTTP, cron notifikasi
+-- sleep per pesan). Sekarang pemanggil cukup INSERT ke wa_outbox
+-- (wa_outbox.enqueue) lalu selesai; proses worker
+--   python -m cron_jobs.wa_outbox_worker
+-- mengambil row dengan FOR UPDATE SKIP LOCKED (aman dijalankan lebih dari
+-- satu), membatasi laju per sender (token bucket di wa_sender_buckets),
+-- retry dengan backoff, dan mencatat status pengiriman.
+--
+-- dedupe_key (mis. "unpaid_reminder:<customer>:<YYYY-MM>") unik: pesan yang
+-- sama untuk customer/periode/template tidak akan masuk antrian dua kali.
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0005_wa_outbox.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS wa_outbox (
+    id                bigserial   PRIMARY KEY,
+    sender            text        NOT NULL DEFAULT 'default',
+    to_number         text        NOT NULL,
+    message           text        NOT NULL,
+    template          text        NOT NULL,
+    reseller_id       integer,
+    customer_id       integer,
+    dedupe_key        text,
+    status            text        NOT NULL DEFAULT 'pending'
+                      CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+    attempts          integer     NOT NULL DEFAULT 0,
+    max_attempts      integer     NOT NULL DEFAULT 5,
+    next_attempt_at   timestamptz NOT NULL DEFAULT NOW(),
+    locked_at         timestamptz,
+    last_error        text,
+    provider_response jsonb,
+    created_at        timestamptz NOT NULL DEFAULT NOW(),
+    updated_at        timestamptz NOT NULL DEFAULT NOW(),
+    sent_at           timestamptz
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS wa_outbox_dedupe_key_uniq
+    ON wa_outbox (dedupe_key);
+
+-- antrian siap kirim per sender (dipakai claim worker)
+CREATE INDEX IF NOT EXISTS wa_outbox_due_idx
+    ON wa_outbox (sender, next_attempt_at)
+    WHERE status = 'pending';
+
+-- row "sending" yang tertinggal karena worker mati
+CREATE INDEX IF NOT EXISTS wa_outbox_sending_idx
+    ON wa_outbox (locked_at)
+    WHERE status = 'sending';
+
+CREATE INDEX IF NOT EXISTS wa_outbox_reseller_idx
+    ON wa_outbox (reseller_id, created_at DESC);
+
+-- Token bucket per sender: rate (pesan/detik) dan burst diatur lewat
+-- config worker (WA_RATE_PER_MINUTE, WA_RATE_BURST); row dibuat otomatis.
+CREATE TABLE IF NOT EXISTS wa_sender_buckets (
+    sender      text             PRIMARY KEY,
+    tokens      double precision NOT NULL,
+    refilled_at timestamptz      NOT NULL DEFAULT NOW()
+);
+
+COMMIT;
@@ -0,0 +1,55 @@
+-- migrations/0006_jobs.sql
+-- ---------------------------------------------------------------------------
+-- Antrian job latar belakang (jobs.py) untuk aksi UI yang lama:
+-- sinkron customer dari router, sinkron profil dari router.
+--
+-- Handler POST hanya INSERT job lalu redirect ke halaman progres
+-- (/jobs/<id>), yang polling /jobs/<id>/status. Job dijalankan proses
+--   python -m cron_jobs.job_worker
+-- yang mengambil job dengan FOR UPDATE SKIP LOCKED.
+--
+-- - satu job aktif (queued/running) per reseller: unique index parsial
+--   jobs_one_active_per_reseller; enqueue kedua mengembalikan job yang
+--   sedang berjalan
+-- - cancel_requested dicek handler di sela-sela pekerjaan
+-- - result (jsonb) disimpan setelah selesai sebagai ringkasan hasil;
+--   job selesai lebih lama dari JOB_RETENTION_DAYS dihapus worker
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0006_jobs.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id               bigserial   PRIMARY KEY,
+    kind             text        NOT NULL,
+    reseller_id      integer     REFERENCES resellers(id) ON DELETE CASCADE,
+    params           jsonb       NOT NULL DEFAULT '{}'::jsonb,
+    status           text        NOT NULL DEFAULT 'queued'
+                     CHECK (status IN ('queued', 'running', 'succeeded', 'failed', 'cancelled')),
+    progress_done    integer     NOT NULL DEFAULT 0,
+    progress_total   integer,
+    message          text,
+    result           jsonb,
+    error            text,
+    cancel_requested boolean     NOT NULL DEFAULT FALSE,
+    worker           text,
+    created_at       timestamptz NOT NULL DEFAULT NOW(),
+    started_at       timestamptz,
+    heartbeat_at     timestamptz,
+    finished_at      timestamptz
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS jobs_one_active_per_reseller
+    ON jobs (reseller_id)
+    WHERE status IN ('queued', 'running');
+
+CREATE INDEX IF NOT EXISTS jobs_queued_idx
+    ON jobs (created_at, id)
+    WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS jobs_reseller_created_idx
+    ON jobs (reseller_id, created_at DESC);
+
+COMMIT;
@@ -0,0 +1,70 @@
+-- migrations/0007_router_commands.sql
+-- ---------------------------------------------------------------------------
+-- Antrian perintah ke router (router_queue.py).
+--
+-- Aksi UI (bayar, isolate, unisolate, enable/disable, edit customer) dulu
+-- memanggil REST router di dalam request: reseller menunggu kalau router
+-- lambat, dan klik beruntun mengirim PATCH yang saling bertabrakan.
+-- Sekarang handler mengubah DB lalu INSERT perintah ke router_commands;
+-- proses worker
+--   python -m cron_jobs.router_queue_worker
+-- mengeksekusinya dengan retry + backoff dan mencatat status per perintah.
+--
+-- - paling banyak satu perintah 'pending' per PPP secret
+--   (router_commands_one_pending): perintah berikutnya untuk secret yang
+--   sama DIGABUNG ke perintah pending itu (updates di-merge, yang terakhir
+--   menang), jadi tetap satu PATCH
+-- - worker tidak mengambil perintah untuk secret yang perintah lainnya
+--   masih 'running' (satu penulisan per secret pada satu waktu)
+-- - status: pending -> running -> done / failed; 'superseded' = perintah
+--   gagal yang isinya sudah digabung ke perintah pending yang lebih baru,
+--   atau dibatalkan karena customer dihapus
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0007_router_commands.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS router_commands (
+    id              bigserial   PRIMARY KEY,
+    reseller_id     integer     NOT NULL REFERENCES resellers(id) ON DELETE CASCADE,
+    router_ip       text        NOT NULL,
+    ppp_username    text        NOT NULL,
+    customer_id     integer,
+    -- field PPP secret yang di-PATCH, mis. {"profile": "...", "disabled": "yes"}
+    updates         jsonb       NOT NULL DEFAULT '{}'::jsonb,
+    -- NULL = PATCH biasa; 'isolate' / 'unisolate' = lewat isolation.py
+    -- (address-list / kill session sesuai isolation_mode reseller)
+    isolation       text        CHECK (isolation IN ('isolate', 'unisolate')),
+    kill_session    boolean     NOT NULL DEFAULT FALSE,
+    source          text,
+    status          text        NOT NULL DEFAULT 'pending'
+                    CHECK (status IN ('pending', 'running', 'done', 'failed', 'superseded')),
+    attempts        integer     NOT NULL DEFAULT 0,
+    max_attempts    integer     NOT NULL DEFAULT 5,
+    next_attempt_at timestamptz NOT NULL DEFAULT NOW(),
+    locked_at       timestamptz,
+    last_error      text,
+    result          text,
+    created_at      timestamptz NOT NULL DEFAULT NOW(),
+    updated_at      timestamptz NOT NULL DEFAULT NOW(),
+    finished_at     timestamptz
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS router_commands_one_pending
+    ON router_commands (reseller_id, ppp_username)
+    WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS router_commands_due_idx
+    ON router_commands (next_attempt_at)
+    WHERE status = 'pending';
+
+CREATE INDEX IF NOT EXISTS router_commands_running_idx
+    ON router_commands (reseller_id, ppp_username)
+    WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS router_commands_reseller_recent_idx
+    ON router_commands (reseller_id, updated_at DESC);
+
+COMMIT;
@@ -0,0 +1,34 @@
+-- migrations/0008_sync_upsert.sql
+-- ---------------------------------------------------------------------------
+-- Sinkron router -> DB sebagai upsert (router_sync.py).
+--
+-- Sinkron customer dulu hanya menambah username baru. Sekarang data
+-- /ppp/secret di-COPY ke temp table lalu satu
+--   INSERT ... ON CONFLICT (reseller_id, ppp_username) DO UPDATE ... WHERE
+-- yang hanya menyentuh row yang berubah (profile, password, disabled).
+--
+-- - unique index (reseller_id, ppp_username) = target ON CONFLICT.
+--   Kalau CREATE INDEX gagal karena duplikat, cek dulu:
+--     SELECT reseller_id, ppp_username, COUNT(*) FROM ppp_customers
+--     GROUP BY 1, 2 HAVING COUNT(*) > 1;
+-- - router_missing_at: diisi saat sinkron dengan opsi "tandai yang tidak
+--   ada di router", dikosongkan lagi kalau secret muncul di sinkron
+--   berikutnya. Row TIDAK dihapus.
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0008_sync_upsert.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ppp_customers_reseller_username_uniq
+    ON ppp_customers (reseller_id, ppp_username);
+
+ALTER TABLE ppp_customers
+    ADD COLUMN IF NOT EXISTS router_missing_at timestamptz;
+
+CREATE INDEX IF NOT EXISTS ppp_customers_router_missing_idx
+    ON ppp_customers (reseller_id)
+    WHERE router_missing_at IS NOT NULL;
+
+COMMIT;
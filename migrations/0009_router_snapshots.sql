@@ -0,0 +1,53 @@
+-- migrations/0009_router_snapshots.sql
+-- ---------------------------------------------------------------------------
+-- Snapshot state router per reseller (router_snapshots.py).
+--
+-- Setiap baca /ppp/secret, /ppp/profile, /ppp/active, /system/resource
+-- (dan /system/identity) yang berhasil disimpan sebagai snapshot ber-versi.
+-- Halaman bisa dirender dari snapshot terakhir (dengan keterangan umur
+-- data) saat router tidak menjawab, dan sync/rekonsiliasi bisa memakai
+-- snapshot yang masih segar tanpa fetch ulang.
+--
+-- - isi snapshot disimpan sekali per hash (router_snapshot_blobs): JSON
+--   kanonik dikompres zlib, key = blake2b dari JSON tersebut
+-- - baca ulang dengan isi sama TIDAK membuat versi baru, hanya
+--   checked_at yang diperbarui
+-- - stale = TRUE: router sudah diubah setelah snapshot diambil (PATCH dari
+--   antrian router / rekonsiliasi); snapshot tetap boleh ditampilkan tapi
+--   tidak dipakai ulang untuk sync
+-- - hanya ROUTER_SNAPSHOT_KEEP versi terakhir per (reseller, kind) disimpan
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0009_router_snapshots.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS router_snapshot_blobs (
+    hash        text        PRIMARY KEY,
+    data        bytea       NOT NULL,
+    raw_bytes   integer     NOT NULL,
+    created_at  timestamptz NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS router_snapshots (
+    id          bigserial   PRIMARY KEY,
+    reseller_id integer     NOT NULL REFERENCES resellers(id) ON DELETE CASCADE,
+    kind        text        NOT NULL
+                CHECK (kind IN ('ppp_secret', 'ppp_profile', 'ppp_active', 'resource', 'identity')),
+    version     integer     NOT NULL,
+    hash        text        NOT NULL REFERENCES router_snapshot_blobs(hash),
+    item_count  integer,
+    router_ip   text,
+    -- pertama kali isi ini terbaca dari router
+    fetched_at  timestamptz NOT NULL DEFAULT NOW(),
+    -- terakhir kali router dibaca dan isinya masih sama
+    checked_at  timestamptz NOT NULL DEFAULT NOW(),
+    stale       boolean     NOT NULL DEFAULT FALSE,
+    UNIQUE (reseller_id, kind, version)
+);
+
+CREATE INDEX IF NOT EXISTS router_snapshots_hash_idx
+    ON router_snapshots (hash);
+
+COMMIT;
@@ -0,0 +1,51 @@
+-- migrations/0010_ppp_sessions.sql
+-- ---------------------------------------------------------------------------
+-- Riwayat session PPP + pengisian last_connected_at / last_disconnected_at
+-- (ppp_sessions.py, worker: python -m cron_jobs.session_tracker).
+--
+-- Kolom last_connected_at / last_disconnected_at di ppp_customers sudah
+-- tampil di list customers & petugas, tapi belum pernah diisi. Tracker
+-- membaca /ppp/active tiap router secara berkala, membandingkan dengan
+-- session yang masih terbuka di tabel ini, lalu per router dalam satu
+-- transaksi:
+--   - session baru   -> INSERT ppp_sessions, ppp_customers.last_connected_at
+--   - session hilang -> disconnected_at diisi, ppp_customers.last_disconnected_at
+--
+-- - connected_at dihitung dari uptime RouterOS (NOW() - uptime), jadi tetap
+--   akurat untuk session yang sudah tersambung sebelum tracker jalan
+-- - disconnected_at = waktu tracker pertama kali tidak melihat session itu
+--   (ketelitian = SESSION_POLL_INTERVAL)
+-- - paling banyak satu session terbuka per (reseller, username)
+-- - riwayat lebih lama dari SESSION_HISTORY_DAYS dihapus tracker
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0010_ppp_sessions.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ppp_sessions (
+    id                bigserial   PRIMARY KEY,
+    reseller_id       integer     NOT NULL REFERENCES resellers(id) ON DELETE CASCADE,
+    customer_id       integer     REFERENCES ppp_customers(id) ON DELETE CASCADE,
+    ppp_username      text        NOT NULL,
+    -- .id dari /ppp/active; berubah setiap kali user reconnect
+    router_session_id text,
+    address           text,
+    caller_id         text,
+    connected_at      timestamptz NOT NULL,
+    disconnected_at   timestamptz
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS ppp_sessions_one_open
+    ON ppp_sessions (reseller_id, ppp_username)
+    WHERE disconnected_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS ppp_sessions_customer_idx
+    ON ppp_sessions (customer_id, connected_at DESC);
+
+CREATE INDEX IF NOT EXISTS ppp_sessions_closed_idx
+    ON ppp_sessions (disconnected_at)
+    WHERE disconnected_at IS NOT NULL;
+
+COMMIT;
@@ -0,0 +1,57 @@
+-- migrations/0011_ppp_events.sql
+-- ---------------------------------------------------------------------------
+-- Event PPP up/down yang dikirim router (push), lihat ppp_events.py.
+--
+-- Sinkron profil memasang skrip on-up/on-down di /ppp/profile router
+-- reseller + scheduler "billing-ppp-events" yang mengirim antrian event
+-- secara batch ke POST /api/ppp-events/<reseller_id>. Event diterapkan ke
+-- ppp_sessions dan ppp_customers.last_connected_at / last_disconnected_at,
+-- sama seperti session tracker (polling), jadi router yang sudah push cukup
+-- di-poll sesekali.
+--
+-- - urutan event: (epoch, seq). epoch dibuat ulang setiap router reboot,
+--   seq naik per event dalam satu epoch
+-- - event_at: waktu connect/disconnect dihitung dari uptime router per event,
+--   jadi batch yang tertahan (server tidak terjangkau) tetap tercatat tepat
+-- - unique (reseller_id, epoch, seq): batch yang dikirim ulang tidak
+--   tercatat dua kali
+-- - event dengan seq lebih kecil dari event yang sudah tercatat untuk
+--   username yang sama (datang terlambat) disimpan tapi tidak diterapkan
+-- - resellers.ppp_events_last_at: terakhir kali router reseller mengirim
+--   batch (termasuk heartbeat kosong)
+--
+-- Jalankan sekali:
+--   psql "$DATABASE_URL" -f migrations/0011_ppp_events.sql
+-- ---------------------------------------------------------------------------
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ppp_events (
+    id           bigserial   PRIMARY KEY,
+    reseller_id  integer     NOT NULL REFERENCES resellers(id) ON DELETE CASCADE,
+    epoch        text        NOT NULL,
+    seq          bigint      NOT NULL,
+    event        char(1)     NOT NULL CHECK (event IN ('u', 'd')),
+    ppp_username text        NOT NULL,
+    address      text,
+    caller_id    text,
+    -- waktu kejadian di router (dari selisih uptime), bukan waktu diterima
+    event_at     timestamptz NOT NULL,
+    received_at  timestamptz NOT NULL DEFAULT NOW(),
+    UNIQUE (reseller_id, epoch, seq)
+);
+
+CREATE INDEX IF NOT EXISTS ppp_events_user_seq_idx
+    ON ppp_events (reseller_id, ppp_username, epoch, seq);
+
+CREATE INDEX IF NOT EXISTS ppp_events_received_idx
+    ON ppp_events (received_at);
+
+-- session tracker: username yang event-nya masuk selama /ppp/active dibaca
+CREATE INDEX IF NOT EXISTS ppp_events_reseller_received_idx
+    ON ppp_events (reseller_id, received_at);
+
+ALTER TABLE resellers
+    ADD COLUMN IF NOT EXISTS ppp_events_last_at timestamptz;
+
+COMMIT;
@@ -7,7 +7,8 @@ Semua fungsi di sini mengharapkan:
 - router_host        : IP atau host router (tanpa /rest)
 - api_user, api_pass : user/password REST di router tersebut
 
-HTTP client pakai requests (basic auth).
+HTTP client pakai requests (basic auth), Session per thread (http_session.py)
+supaya aman dipakai worker gunicorn gthread.
 
 Contoh base URL yang dihasilkan:
 - http://192.168.88.1/rest/system/resource
@@ -16,11 +17,19 @@ Contoh base URL yang dihasilkan:
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
 
-import requests
 from requests.auth import HTTPBasicAuth
 
+import metrics
+import profiling
+from http_session import get_session
+
 
 class MikrotikError(Exception):
     """Kesalahan komunikasi dengan Mikrotik REST API."""
@@ -60,27 +69,37 @@ def _request(
     json_body: Optional[Dict[str, Any]] = None,
     timeout: int = 10,
     use_https: bool = False,
+    params: Optional[Dict[str, Any]] = None,
 ) -> Any:
     """
     Helper umum untuk call REST API RouterOS.
 
     path: misal "/system/resource" atau "/ppp/secret"
+    params: filter query string, misal {"name": "user1"} -> hanya item yang cocok
     """
     url = _build_url(router_host, path, use_https=use_https)
 
+    started = time.perf_counter()
     try:
-        resp = requests.request(
-            method=method.upper(),
-            url=url,
-            auth=HTTPBasicAuth(api_user, api_pass),
-            json=json_body,
-            timeout=timeout,
-            # untuk HTTP biasa, verify tidak kepakai; untuk HTTPS self-signed, bisa diset False
-            verify=False if use_https else True,
-        )
+        with profiling.timed("router"):
+            resp = get_session().request(
+                method=method.upper(),
+                url=url,
+                auth=HTTPBasicAuth(api_user, api_pass),
+                json=json_body,
+                params=params,
+                timeout=timeout,
+                # untuk HTTP biasa, verify tidak kepakai; untuk HTTPS self-signed, bisa diset False
+                verify=False if use_https else True,
+            )
     except Exception as e:
+        metrics.ROUTER_LATENCY.labels(router_host).observe(time.perf_counter() - started)
+        metrics.ROUTER_REQUESTS.labels(router_host, "unreachable").inc()
         raise MikrotikError(f"Gagal koneksi ke router {router_host}: {e}") from e
 
+    metrics.ROUTER_LATENCY.labels(router_host).observe(time.perf_counter() - started)
+    metrics.ROUTER_REQUESTS.labels(router_host, "ok" if resp.ok else "error").inc()
+
     if not resp.ok:
         try:
             data = resp.json()
@@ -238,6 +257,29 @@ def update_ppp_secret(
     return data or {}
 
 
+def set_ppp_secret_by_name(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secret_name: str,
+    updates: Dict[str, Any],
+    use_https: bool = False,
+) -> None:
+    """
+    Seperti update_ppp_secret tapi satu call, tanpa download /ppp/secret:
+    POST /ppp/secret/set dengan numbers=<name> (sama dengan
+    "/ppp secret set <name> ..." di console).
+    """
+    if "," in secret_name:
+        # numbers memisah daftar item dengan koma: cari .id dulu
+        update_ppp_secret(router_host, api_user, api_pass, secret_name, updates, use_https=use_https)
+        return
+    _request(
+        "POST", router_host, "/ppp/secret/set", api_user, api_pass,
+        json_body={"numbers": secret_name, **updates}, use_https=use_https,
+    )
+
+
 def delete_ppp_secret(
     router_host: str,
     api_user: str,
@@ -300,3 +342,625 @@ def terminate_ppp_active_by_name(
             _request("DELETE", router_host, path, api_user, api_pass, use_https=use_https)
             return True
     return False
+
+
+def terminate_ppp_active_by_id(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    active_id: str,
+    use_https: bool = False,
+) -> None:
+    """
+    Terminate PPP session berdasarkan .id /ppp/active (mis. dari
+    get_ppp_active_by_name).
+    """
+    _request(
+        "DELETE", router_host, f"/ppp/active/{active_id}", api_user, api_pass,
+        use_https=use_https,
+    )
+
+
+def get_ppp_secret_by_name(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secret_name: str,
+    use_https: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Ambil satu PPP secret berdasarkan name (difilter di router, tanpa
+    download seluruh /ppp/secret). None kalau tidak ada.
+    """
+    data = _request(
+        "GET", router_host, "/ppp/secret", api_user, api_pass,
+        params={"name": secret_name}, use_https=use_https,
+    )
+    if isinstance(data, list) and data:
+        return data[0]
+    return None
+
+
+def get_ppp_active_by_name(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secret_name: str,
+    use_https: bool = False,
+) -> Optional[Dict[str, Any]]:
+    """
+    Ambil session PPP aktif berdasarkan name (difilter di router).
+    None kalau user sedang offline.
+    """
+    data = _request(
+        "GET", router_host, "/ppp/active", api_user, api_pass,
+        params={"name": secret_name}, use_https=use_https,
+    )
+    if isinstance(data, list) and data:
+        return data[0]
+    return None
+
+
+# -----------------------------------------------------------------------------
+# Firewall address-list (isolasi tanpa putus koneksi, lihat isolation.py)
+# -----------------------------------------------------------------------------
+
+def get_address_list(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    list_name: str,
+    comment: Optional[str] = None,
+    use_https: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Ambil entry /ip/firewall/address-list untuk satu list
+    (opsional difilter comment).
+    """
+    params = {"list": list_name}
+    if comment is not None:
+        params["comment"] = comment
+    data = _request(
+        "GET", router_host, "/ip/firewall/address-list", api_user, api_pass,
+        params=params, use_https=use_https,
+    )
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def add_address_list_entry(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    list_name: str,
+    address: str,
+    comment: str = "",
+    use_https: bool = False,
+    timeout: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Tambah satu address ke firewall address-list.
+    timeout (mis. "1d1h"): entry dinamis yang hilang sendiri setelahnya.
+    """
+    body = {"list": list_name, "address": address, "comment": comment}
+    if timeout:
+        body["timeout"] = timeout
+    data = _request(
+        "PUT", router_host, "/ip/firewall/address-list", api_user, api_pass,
+        json_body=body, use_https=use_https,
+    )
+    return data or {}
+
+
+def remove_address_list_entry(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    entry_id: str,
+    use_https: bool = False,
+) -> None:
+    """
+    Hapus entry address-list berdasarkan .id.
+    """
+    _request(
+        "DELETE", router_host, f"/ip/firewall/address-list/{entry_id}", api_user, api_pass,
+        use_https=use_https,
+    )
+
+
+# -----------------------------------------------------------------------------
+# Operasi massal (cron isolasi): list diambil sekali, perubahan paralel
+# -----------------------------------------------------------------------------
+
+def _run_parallel(
+    jobs: Dict[str, Any],
+    max_workers: int,
+) -> Dict[str, Optional[str]]:
+    """
+    Jalankan {key: callable} paralel. Hasil {key: None kalau sukses / pesan error}.
+    """
+    results: Dict[str, Optional[str]] = {}
+    if not jobs:
+        return results
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(jobs))),
+        thread_name_prefix="router-bulk",
+    ) as ex:
+        futures = {key: ex.submit(fn) for key, fn in jobs.items()}
+        for key, fut in futures.items():
+            try:
+                fut.result()
+                results[key] = None
+            except Exception as e:
+                results[key] = str(e)
+    return results
+
+
+def update_ppp_secrets_bulk(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secret_names: List[str],
+    updates: Dict[str, Any],
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    Update banyak PPP secret sekaligus (mis. {"profile": "ISOLIR"}).
+
+    /ppp/secret diambil SEKALI untuk mencari .id semua nama, lalu PATCH
+    dikirim paralel (maks `max_workers` ke router ini).
+
+    Return {secret_name: None kalau sukses / pesan error}.
+    Kalau list secret gagal diambil -> MikrotikError.
+    """
+    ids = {
+        sec.get("name"): sec.get(".id")
+        for sec in get_ppp_secrets(router_host, api_user, api_pass, use_https=use_https)
+    }
+
+    results: Dict[str, Optional[str]] = {}
+    jobs: Dict[str, Any] = {}
+    for name in secret_names:
+        secret_id = ids.get(name)
+        if not secret_id:
+            results[name] = f"PPP secret dengan name='{name}' tidak ditemukan"
+            continue
+        jobs[name] = (
+            lambda sid=secret_id: _request(
+                "PATCH", router_host, f"/ppp/secret/{sid}", api_user, api_pass,
+                json_body=updates, use_https=use_https,
+            )
+        )
+
+    results.update(_run_parallel(jobs, max_workers))
+    return results
+
+
+def patch_ppp_secrets_by_id(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    patches: Dict[str, Dict[str, Any]],
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    PATCH banyak PPP secret yang .id-nya sudah diketahui (mis. dari satu
+    get_ppp_secrets), masing-masing dengan field sendiri, paralel.
+    patches = {.id: {"profile": ..., "disabled": ...}}.
+    Return {.id: None / pesan error}.
+    """
+    jobs = {
+        sid: (
+            lambda sid=sid, body=body: _request(
+                "PATCH", router_host, f"/ppp/secret/{sid}", api_user, api_pass,
+                json_body=body, use_https=use_https,
+            )
+        )
+        for sid, body in patches.items()
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def create_ppp_secrets_bulk(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secrets: Dict[str, Dict[str, Any]],
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    Buat banyak PPP secret, paralel.
+    secrets = {name: {"password": ..., "profile": ..., "disabled": ...}}.
+    Return {name: None / pesan error}.
+    """
+    jobs = {
+        name: (
+            lambda name=name, body=body: _request(
+                "PUT", router_host, "/ppp/secret", api_user, api_pass,
+                json_body={"name": name, **body}, use_https=use_https,
+            )
+        )
+        for name, body in secrets.items()
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def patch_ppp_profiles_by_id(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    patches: Dict[str, Dict[str, Any]],
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    PATCH banyak PPP profile yang .id-nya sudah diketahui, paralel.
+    patches = {.id: {"on-up": ..., "on-down": ...}}.
+    Return {.id: None / pesan error}.
+    """
+    jobs = {
+        pid: (
+            lambda pid=pid, body=body: _request(
+                "PATCH", router_host, f"/ppp/profile/{pid}", api_user, api_pass,
+                json_body=body, use_https=use_https,
+            )
+        )
+        for pid, body in patches.items()
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def upsert_scheduler(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    name: str,
+    fields: Dict[str, Any],
+    use_https: bool = False,
+) -> str:
+    """
+    Buat /system/scheduler bernama `name`, atau PATCH kalau sudah ada dan
+    isinya beda. Return "dibuat" / "diperbarui" / "sama".
+    """
+    found = _request(
+        "GET", router_host, "/system/scheduler", api_user, api_pass,
+        use_https=use_https, params={"name": name},
+    )
+    if isinstance(found, list) and found:
+        current = found[0]
+        changed = {k: v for k, v in fields.items() if str(current.get(k, "")) != str(v)}
+        if not changed:
+            return "sama"
+        _request(
+            "PATCH", router_host, f"/system/scheduler/{current['.id']}", api_user, api_pass,
+            json_body=changed, use_https=use_https,
+        )
+        return "diperbarui"
+
+    _request(
+        "PUT", router_host, "/system/scheduler", api_user, api_pass,
+        json_body={"name": name, **fields}, use_https=use_https,
+    )
+    return "dibuat"
+
+
+def add_address_list_entries_bulk(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    list_name: str,
+    entries: Dict[str, str],
+    comment_prefix: str = "",
+    max_workers: int = 4,
+    use_https: bool = False,
+    timeout: Optional[str] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Tambah banyak address ke satu address-list, paralel.
+    entries = {nama: address}; comment entry = comment_prefix + nama.
+    Return {nama: None / pesan error}.
+    """
+    jobs = {
+        name: (
+            lambda name=name, addr=addr: add_address_list_entry(
+                router_host, api_user, api_pass, list_name, addr,
+                comment=f"{comment_prefix}{name}", use_https=use_https,
+                timeout=timeout,
+            )
+        )
+        for name, addr in entries.items()
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def set_address_list_timeout_bulk(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    entry_ids: List[str],
+    timeout: str,
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    Set ulang timeout banyak entry address-list (.id), paralel.
+    Return {.id: None / pesan error}.
+    """
+    jobs = {
+        eid: (
+            lambda eid=eid: _request(
+                "PATCH", router_host, f"/ip/firewall/address-list/{eid}", api_user, api_pass,
+                json_body={"timeout": timeout}, use_https=use_https,
+            )
+        )
+        for eid in entry_ids
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def remove_address_list_entries_bulk(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    entry_ids: List[str],
+    max_workers: int = 4,
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    Hapus banyak entry address-list (berdasarkan .id), paralel.
+    Return {.id: None / pesan error}.
+    """
+    jobs = {
+        eid: (
+            lambda eid=eid: remove_address_list_entry(
+                router_host, api_user, api_pass, eid, use_https=use_https,
+            )
+        )
+        for eid in entry_ids
+    }
+    return _run_parallel(jobs, max_workers)
+
+
+def _router_cpu_load(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    use_https: bool = False,
+) -> Optional[int]:
+    """CPU load router (persen), None kalau gagal dibaca."""
+    try:
+        return int(get_system_resource(router_host, api_user, api_pass, use_https=use_https).get("cpu-load"))
+    except Exception:
+        return None
+
+
+def terminate_ppp_active_waves(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    secret_names: List[str],
+    *,
+    rate: float = 5.0,
+    wave_size: int = 20,
+    jitter: float = 0.3,
+    cpu_threshold: int = 70,
+    cpu_max_wait: float = 120.0,
+    max_workers: int = 4,
+    label: str = "",
+    use_https: bool = False,
+) -> Dict[str, Optional[str]]:
+    """
+    Terminate session PPP banyak nama secara bertahap (gelombang), supaya
+    ratusan CPE tidak redial bersamaan dan CPU router tidak melonjak.
+
+    - /ppp/active diambil SEKALI; hanya nama yang sedang online diproses
+    - tiap gelombang maks `wave_size` session (DELETE paralel, maks
+      `max_workers`), jeda antar gelombang = wave_size / rate detik
+      (rate = session per detik per router), diacak +/- `jitter` (0..1)
+    - sebelum gelombang berikutnya CPU router dicek (get_system_resource);
+      kalau > `cpu_threshold` persen, tunggu dengan jeda bertambah 2x
+      sampai CPU turun atau total tunggu `cpu_max_wait` detik, lalu lanjut
+    - session yang sudah hilang sendiri (HTTP 404) dianggap sukses
+
+    Return {secret_name: None / pesan error} untuk nama yang online saja.
+    """
+    wanted = set(secret_names)
+    active: Dict[str, str] = {}
+    for sess in get_ppp_active(router_host, api_user, api_pass, use_https=use_https):
+        name = sess.get("name")
+        active_id = sess.get(".id")
+        if name in wanted and active_id and name not in active:
+            active[name] = active_id
+
+    def _delete(aid: str) -> None:
+        try:
+            _request("DELETE", router_host, f"/ppp/active/{aid}", api_user, api_pass, use_https=use_https)
+        except MikrotikError as e:
+            if "HTTP 404" not in str(e):
+                raise
+
+    items = list(active.items())
+    wave_size = max(1, wave_size)
+    interval = wave_size / rate if rate > 0 else 0.0
+    prefix = f"{label}: " if label else ""
+
+    results: Dict[str, Optional[str]] = {}
+    for start in range(0, len(items), wave_size):
+        if start:
+            time.sleep(max(0.0, interval * (1 + random.uniform(-jitter, jitter))))
+
+            waited = 0.0
+            backoff = max(interval, 1.0)
+            cpu = _router_cpu_load(router_host, api_user, api_pass, use_https=use_https)
+            while cpu is not None and cpu > cpu_threshold and waited < cpu_max_wait:
+                pause = min(backoff, cpu_max_wait - waited)
+                print(f"⏸️ {prefix}CPU router {cpu}% > {cpu_threshold}%, tunggu {pause:.0f} detik")
+                time.sleep(pause)
+                waited += pause
+                backoff *= 2
+                cpu = _router_cpu_load(router_host, api_user, api_pass, use_https=use_https)
+            if cpu is not None and cpu > cpu_threshold:
+                print(f"⚠️ {prefix}CPU router masih {cpu}% setelah {waited:.0f} detik, lanjut")
+
+        wave = items[start:start + wave_size]
+        results.update(
+            _run_parallel({name: (lambda aid=aid: _delete(aid)) for name, aid in wave}, max_workers)
+        )
+
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Snapshot status router (dashboard + /dashboard/stats)
+# -----------------------------------------------------------------------------
+
+# identity, resource, ppp/active diambil paralel; satu executor per proses
+_SNAPSHOT_POOL: Optional[ThreadPoolExecutor] = None
+_SNAPSHOT_POOL_PID: Optional[int] = None
+_SNAPSHOT_POOL_LOCK = threading.Lock()
+
+_SNAPSHOT_CALLS = {
+    "identity": "/system/identity",
+    "resource": "/system/resource",
+    "ppp_active": "/ppp/active",
+}
+
+
+def _snapshot_pool() -> ThreadPoolExecutor:
+    global _SNAPSHOT_POOL, _SNAPSHOT_POOL_PID
+    pid = os.getpid()
+    if _SNAPSHOT_POOL is None or _SNAPSHOT_POOL_PID != pid:
+        with _SNAPSHOT_POOL_LOCK:
+            if _SNAPSHOT_POOL is None or _SNAPSHOT_POOL_PID != pid:
+                _SNAPSHOT_POOL = ThreadPoolExecutor(
+                    max_workers=32, thread_name_prefix="router-snapshot"
+                )
+                _SNAPSHOT_POOL_PID = pid
+    return _SNAPSHOT_POOL
+
+
+def _fmt_bytes(b: Any) -> str:
+    try:
+        b = int(b)
+    except Exception:
+        return "N/A"
+    mb = b / (1024 * 1024)
+    return f"{mb:.0f} MB"
+
+
+def summarize_resource(resource: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ringkasan /system/resource untuk dashboard:
+    uptime, cpu_load, cpu_percent, mem_display, mem_used_pct.
+    """
+    out: Dict[str, Any] = {}
+    out["uptime"] = resource.get("uptime") or "N/A"
+    cpu_load = resource.get("cpu-load") or resource.get("cpu_load") or "N/A"
+    out["cpu_load"] = cpu_load
+
+    # coba konversi ke int untuk progress bar
+    try:
+        out["cpu_percent"] = int(str(cpu_load))
+    except Exception:
+        out["cpu_percent"] = None
+
+    free_mem = resource.get("free-memory") or resource.get("free_memory")
+    total_mem = resource.get("total-memory") or resource.get("total_memory")
+    if free_mem is not None and total_mem is not None:
+        out["mem_display"] = f"{_fmt_bytes(total_mem)} total / {_fmt_bytes(free_mem)} free"
+        # hitung persentase RAM terpakai
+        try:
+            total_i = int(total_mem)
+            out["mem_used_pct"] = int((total_i - int(free_mem)) * 100 / total_i)
+        except Exception:
+            out["mem_used_pct"] = None
+    return out
+
+
+def get_router_snapshot(
+    router_host: str,
+    api_user: str,
+    api_pass: str,
+    deadline: float = 4.0,
+    use_https: bool = False,
+    on_result: Optional[Callable[[str, Any], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Ringkasan status router untuk dashboard.
+
+    /system/identity, /system/resource dan /ppp/active dipanggil bersamaan
+    dengan satu batas waktu total `deadline` (detik). Call yang gagal atau
+    belum selesai saat deadline dibiarkan "N/A"/None; hasil call lain tetap
+    dipakai. Semua kegagalan dirangkum di router_error (None kalau semua OK).
+
+    Key hasil: router_name, uptime, cpu_load, cpu_percent, mem_display,
+    mem_used_pct, active_ppp_count, router_error.
+
+    on_result(key, data): dipanggil untuk tiap call yang berhasil
+    ("identity" / "resource" / "ppp_active", data mentah dari router),
+    mis. untuk menyimpan snapshot (router_snapshots.py).
+    """
+    snap: Dict[str, Any] = {
+        "router_name": "N/A",
+        "uptime": "N/A",
+        "cpu_load": "N/A",
+        "cpu_percent": None,
+        "mem_display": "N/A",
+        "mem_used_pct": None,
+        "active_ppp_count": None,
+        "router_error": None,
+    }
+
+    started = time.monotonic()
+    pool = _snapshot_pool()
+    futures = {
+        # context disalin supaya waktu call tercatat ke request asal (profiling)
+        key: pool.submit(
+            profiling.current_context().run,
+            _request, "GET", router_host, path, api_user, api_pass,
+            timeout=deadline, use_https=use_https,
+        )
+        for key, path in _SNAPSHOT_CALLS.items()
+    }
+    wait(futures.values(), timeout=max(0.0, deadline - (time.monotonic() - started)))
+
+    results: Dict[str, Any] = {}
+    errors: List[str] = []
+    for key, fut in futures.items():
+        if not fut.done():
+            fut.cancel()
+            errors.append(f"{_SNAPSHOT_CALLS[key]}: tidak menjawab dalam {deadline:g} detik")
+            continue
+        try:
+            results[key] = fut.result()
+        except MikrotikError as e:
+            errors.append(str(e))
+        except Exception as e:
+            errors.append(f"Error tidak terduga saat akses router: {e}")
+
+    if on_result is not None:
+        for key, data in results.items():
+            try:
+                on_result(key, data)
+            except Exception as e:
+                print(f"[router_snapshot] on_result {key} gagal: {e}")
+
+    identity = results.get("identity")
+    if isinstance(identity, dict):
+        snap["router_name"] = identity.get("name") or "N/A"
+
+    resource = results.get("resource")
+    if isinstance(resource, dict):
+        snap.update(summarize_resource(resource))
+
+    if "ppp_active" in results:
+        active_list = results["ppp_active"]
+        snap["active_ppp_count"] = len(active_list) if isinstance(active_list, list) else 0
+
+    if errors:
+        snap["router_error"] = "; ".join(errors)
+    return snap
@@ -0,0 +1,438 @@
+"""
+ppp_events.py
+-------------
+Event PPP up/down yang dikirim (push) router reseller (tabel ppp_events,
+migrations/0011). Melengkapi session tracker: router yang sudah push cukup
+di-poll sesekali (SESSION_PUSH_POLL_INTERVAL).
+
+Alur:
+- build_scripts(): skrip RouterOS per reseller
+    on-up / on-down profile : tambah satu baris ke antrian global billingQ
+                              dengan nomor urut billingSeq; on-down juga
+                              menghapus entry isolasi address-list user itu
+    scheduler               : tiap PPP_EVENTS_FLUSH_INTERVAL detik kirim
+                              isi antrian (atau heartbeat kosong) ke
+                              POST /api/ppp-events/<reseller_id>; gagal ->
+                              antrian dikembalikan, dikirim lagi nanti
+- install_scripts(): pasang skrip di semua /ppp/profile + scheduler,
+  dipanggil sinkron profil (router_sync) kalau PPP_EVENTS_BASE_URL diisi
+- parse_batch() + ingest(): dipakai endpoint blueprints/ppp_events.py
+
+Format batch (text/plain):
+    epoch=<id boot router>
+    uptime=<uptime router saat batch dikirim>
+    u,<seq>,<uptime saat event>,<address>,<caller-id>,<username>
+    d,<seq>,<uptime saat event>,<address>,<caller-id>,<username>
+
+Waktu event (event_at) = waktu batch diterima - (uptime kirim - uptime
+event): tepat walau jam router salah atau batch tertahan berjam-jam karena
+server tidak terjangkau. Tanpa uptime yang valid -> waktu diterima.
+
+Urutan & replay:
+- epoch dibuat scheduler sekali per boot (global RouterOS hilang saat
+  reboot, seq mulai lagi dari 1 dengan epoch baru)
+- (reseller_id, epoch, seq) unique: batch yang terkirim ulang (timeout
+  setelah server sudah menyimpan) di-INSERT ... ON CONFLICT DO NOTHING
+- per username hanya event dengan seq terbesar yang diterapkan, dan hanya
+  kalau tidak ada event tersimpan dengan seq lebih besar di epoch yang sama
+  (event yang datang terlambat disimpan tapi tidak mengubah session)
+- up untuk session yang sudah tercatat (mis. dibuka session tracker dari
+  /ppp/active) tidak membuka session baru; down tidak menutup session yang
+  tersambung setelah event itu (plan_events)
+- ingest satu reseller berjalan berurutan, juga terhadap session tracker
+  (advisory lock ppp_sessions.lock_reseller)
+
+Router tidak bisa menghitung HMAC isi request, jadi autentikasi memakai
+token per reseller (HMAC SECRET_KEY atas reseller_id) di header
+X-Billing-Token, dibandingkan dengan hmac.compare_digest. Token hanya
+berlaku untuk reseller_id di URL.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import hmac
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+import db
+import mikrotik_client
+import ppp_sessions
+import router_snapshots
+from config import Config
+
+TOKEN_HEADER = "X-Billing-Token"
+SCHEDULER_NAME = "billing-ppp-events"
+
+# blok skrip billing di on-up/on-down profile; isi lain di luar blok ini
+# (skrip milik reseller) tidak diubah
+_BLOCK_BEGIN = "# billing-ppp-events begin"
+_BLOCK_END = "# billing-ppp-events end"
+_BLOCK_RE = re.compile(
+    r"\n?" + re.escape(_BLOCK_BEGIN) + r".*?" + re.escape(_BLOCK_END) + r"\n?",
+    re.S,
+)
+
+# antrian di router paling panjang sekian karakter (~600 event); lebih dari
+# itu antrian dibuang, session tracker yang menutup celahnya
+_ROUTER_QUEUE_MAX = 50000
+
+_MAX_EPOCH_LEN = 64
+_MAX_FIELD_LEN = 128
+
+# selisih waktu connect yang masih dianggap session yang sama (waktu dari
+# uptime /ppp/active vs dari uptime event)
+_SAME_SESSION = datetime.timedelta(seconds=5)
+
+
+def reseller_token(rid: int) -> str:
+    return hmac.new(
+        Config.SECRET_KEY.encode("utf-8"),
+        f"ppp-events:{rid}".encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()[:40]
+
+
+def check_token(rid: int, token: Optional[str]) -> bool:
+    return bool(token) and hmac.compare_digest(reseller_token(rid), token)
+
+
+def ingest_url(rid: int, base_url: Optional[str] = None) -> str:
+    return f"{(base_url or Config.PPP_EVENTS_BASE_URL).rstrip('/')}/api/ppp-events/{rid}"
+
+
+# -----------------------------------------------------------------------------
+# Terima batch
+# -----------------------------------------------------------------------------
+
+def parse_batch(body: str) -> Tuple[str, Optional[int], List[Dict[str, Any]], int]:
+    """
+    Return (epoch, uptime router saat kirim dalam detik / None, events,
+    jumlah baris rusak). Baris event yang rusak dilewati (bukan menolak
+    batch: router akan mengirim ulang batch yang ditolak terus-menerus).
+    Tanpa baris epoch -> ValueError.
+    """
+    lines = [ln.strip() for ln in (body or "").splitlines()]
+    lines = [ln for ln in lines if ln]
+    if not lines or not lines[0].startswith("epoch="):
+        raise ValueError("baris pertama harus epoch=<id>")
+    epoch = lines[0][len("epoch="):].strip()
+    if not epoch or len(epoch) > _MAX_EPOCH_LEN:
+        raise ValueError("epoch kosong / terlalu panjang")
+
+    lines = lines[1:]
+    router_uptime = None
+    if lines and lines[0].startswith("uptime="):
+        router_uptime = ppp_sessions.parse_uptime(lines[0][len("uptime="):])
+        lines = lines[1:]
+
+    events: List[Dict[str, Any]] = []
+    invalid = 0
+    for ln in lines:
+        parts = ln.split(",", 5)
+        if len(parts) != 6 or parts[0] not in ("u", "d"):
+            invalid += 1
+            continue
+        kind, seq, uptime, address, caller_id, user = parts
+        user = user.strip()
+        if not seq.isdigit() or int(seq) <= 0 or not user or len(user) > _MAX_FIELD_LEN:
+            invalid += 1
+            continue
+        events.append({
+            "event": kind,
+            "seq": int(seq),
+            "uptime": ppp_sessions.parse_uptime(uptime),
+            "address": address.strip()[:_MAX_FIELD_LEN] or None,
+            "caller_id": caller_id.strip()[:_MAX_FIELD_LEN] or None,
+            "ppp_username": user,
+        })
+    return epoch, router_uptime, events, invalid
+
+
+def event_time(
+    received_at: datetime.datetime,
+    router_uptime: Optional[int],
+    event_uptime: Optional[int],
+) -> datetime.datetime:
+    """Waktu event dari selisih uptime router; tidak valid -> received_at."""
+    if router_uptime is None or event_uptime is None or event_uptime > router_uptime:
+        return received_at
+    return received_at - datetime.timedelta(seconds=router_uptime - event_uptime)
+
+
+def latest_per_user(events: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Event dengan seq terbesar per username."""
+    latest: Dict[str, Dict[str, Any]] = {}
+    for ev in events:
+        best = latest.get(ev["ppp_username"])
+        if best is None or ev["seq"] > best["seq"]:
+            latest[ev["ppp_username"]] = ev
+    return latest
+
+
+def plan_events(
+    latest: Dict[str, Dict[str, Any]],
+    open_by_name: Dict[str, Dict[str, Any]],
+) -> Tuple[List[Tuple[int, datetime.datetime]], List[Tuple[str, datetime.datetime]], List[Dict[str, Any]]]:
+    """
+    latest: event terbaru per username (dengan event_at), open_by_name:
+    session terbuka (id, connected_at). Return (closing, disconnected,
+    opened) untuk ppp_sessions.close_sessions / mark_disconnected /
+    open_sessions:
+    - up   : session terbuka yang tersambung sejak event ini (toleransi
+             _SAME_SESSION) = session yang sama -> dilewati; session yang
+             lebih lama ditutup pada waktu event lalu session baru dibuka
+    - down : session terbuka ditutup pada waktu event, kecuali session itu
+             tersambung setelah event (down lama untuk session sebelumnya)
+    """
+    closing: List[Tuple[int, datetime.datetime]] = []
+    disconnected: List[Tuple[str, datetime.datetime]] = []
+    opened: List[Dict[str, Any]] = []
+    for name, ev in latest.items():
+        at = ev["event_at"]
+        current = open_by_name.get(name)
+        if ev["event"] == "u":
+            if current is not None and current["connected_at"] >= at - _SAME_SESSION:
+                continue
+            if current is not None:
+                closing.append((current["id"], at))
+                disconnected.append((name, at))
+            opened.append({
+                "ppp_username": name,
+                "address": ev["address"],
+                "caller_id": ev["caller_id"],
+                "connected_at": at,
+            })
+        else:
+            if current is not None:
+                if current["connected_at"] > at + _SAME_SESSION:
+                    continue
+                closing.append((current["id"], max(at, current["connected_at"])))
+            disconnected.append((name, at))
+    return closing, disconnected, opened
+
+
+def ingest(
+    rid: int,
+    epoch: str,
+    events: List[Dict[str, Any]],
+    router_uptime: Optional[int] = None,
+) -> Optional[Dict[str, int]]:
+    """
+    Simpan batch dan terapkan ke ppp_sessions / ppp_customers dalam satu
+    transaksi. Return {"diterima", "duplikat", "terlambat", "connect",
+    "disconnect"}, atau None kalau reseller tidak ada / non-aktif.
+    """
+    result = {"diterima": len(events), "duplikat": 0, "terlambat": 0, "connect": 0, "disconnect": 0}
+
+    with db.transaction() as cur:
+        # batch reseller yang sama dan polling session tracker antre
+        if ppp_sessions.lock_reseller(cur, rid) is None:
+            return None
+        cur.execute(
+            """
+            UPDATE resellers
+            SET ppp_events_last_at = NOW()
+            WHERE id = %(rid)s
+              AND is_active = TRUE
+            RETURNING NOW() AS now
+            """,
+            {"rid": rid},
+        )
+        row = cur.fetchone()
+        if row is None:
+            return None
+        now = row["now"]
+        if not events:
+            return result
+
+        unique = {ev["seq"]: ev for ev in events}
+        inserted = execute_values(
+            cur,
+            """
+            INSERT INTO ppp_events
+                (reseller_id, epoch, seq, event, ppp_username, address, caller_id,
+                 event_at, received_at)
+            VALUES %s
+            ON CONFLICT (reseller_id, epoch, seq) DO NOTHING
+            RETURNING seq, event, ppp_username, address, caller_id, event_at
+            """,
+            [
+                (rid, epoch, ev["seq"], ev["event"], ev["ppp_username"],
+                 ev["address"], ev["caller_id"],
+                 event_time(now, router_uptime, ev["uptime"]), now)
+                for ev in unique.values()
+            ],
+            template="(%s::integer, %s, %s::bigint, %s, %s, %s, %s, %s::timestamptz, %s::timestamptz)",
+            fetch=True,
+        )
+        result["duplikat"] = len(events) - len(inserted)
+        if not inserted:
+            return result
+
+        latest = latest_per_user(inserted)
+        cur.execute(
+            """
+            SELECT ppp_username, MAX(seq) AS max_seq
+            FROM ppp_events
+            WHERE reseller_id = %(rid)s
+              AND epoch = %(epoch)s
+              AND ppp_username = ANY(%(names)s)
+            GROUP BY ppp_username
+            """,
+            {"rid": rid, "epoch": epoch, "names": list(latest)},
+        )
+        for r in cur.fetchall():
+            ev = latest.get(r["ppp_username"])
+            if ev is not None and r["max_seq"] > ev["seq"]:
+                del latest[r["ppp_username"]]
+                result["terlambat"] += 1
+
+        current = ppp_sessions.load_open_sessions(cur, rid, list(latest))
+        closing, disconnected, opened = plan_events(
+            latest, {s["ppp_username"]: s for s in current}
+        )
+        ppp_sessions.close_sessions(cur, closing)
+        ppp_sessions.mark_disconnected(cur, rid, disconnected)
+        result["disconnect"] = len(disconnected)
+        if opened:
+            result["connect"] = ppp_sessions.open_sessions(cur, rid, opened)
+
+    return result
+
+
+def purge_events() -> int:
+    """Hapus event yang lebih tua dari PPP_EVENTS_RETENTION_DAYS hari."""
+    return db.execute(
+        """
+        DELETE FROM ppp_events
+        WHERE received_at < NOW() - make_interval(days => %(days)s)
+        """,
+        {"days": Config.PPP_EVENTS_RETENTION_DAYS},
+    )
+
+
+# -----------------------------------------------------------------------------
+# Skrip router
+# -----------------------------------------------------------------------------
+
+_HOOK_SCRIPT = """\
+# billing-ppp-events begin
+:global billingSeq; :global billingQ
+:local billingUp [/system resource get uptime]
+:if ([:typeof $billingSeq] != "num") do={ :set billingSeq 0 }
+:if ([:typeof $billingQ] != "str") do={ :set billingQ "" }
+:if ([:len $billingQ] < __QUEUE_MAX__) do={
+  :set billingSeq ($billingSeq + 1)
+  :set billingQ ($billingQ . "__KIND__," . $billingSeq . "," . $billingUp . "," . $"remote-address" . "," . $"caller-id" . "," . $user . "\\n")
+}
+__CLEANUP__# billing-ppp-events end"""
+
+# on-down: IP session dilepas ke pool, entry isolasi (isolation.py) untuk IP
+# itu dihapus supaya tidak mengenai pelanggan lain yang mendapat IP sama
+_DOWN_CLEANUP = """:do { /ip firewall address-list remove [find list="__LIST__" comment=("billing:" . $user)] } on-error={}
+"""
+
+_FLUSH_SCRIPT = """\
+:global billingQ; :global billingEpoch; :global billingBeat
+:if ([:typeof $billingQ] != "str") do={ :set billingQ "" }
+:if ([:typeof $billingEpoch] != "str") do={
+  :set billingEpoch ([/system clock get date] . "-" . [/system clock get time] . "-" . [:rndnum from=100000 to=999999])
+}
+:if ([:typeof $billingBeat] != "num") do={ :set billingBeat 0 }
+:set billingBeat ($billingBeat + 1)
+:if ([:len $billingQ] > 0 || $billingBeat >= __HEARTBEAT__) do={
+  :local q $billingQ
+  :set billingQ ""
+  :set billingBeat 0
+  :do {
+    /tool fetch url="__URL__" http-method=post output=none \\
+      http-header-field="Content-Type: text/plain,__HEADER__: __TOKEN__" \\
+      http-data=("epoch=" . $billingEpoch . "\\nuptime=" . [/system resource get uptime] . "\\n" . $q)
+  } on-error={
+    :if ([:len ($q . $billingQ)] < __QUEUE_MAX__) do={ :set billingQ ($q . $billingQ) }
+  }
+}"""
+
+
+def _fill(template: str, **values: Any) -> str:
+    for key, value in values.items():
+        template = template.replace(f"__{key}__", str(value))
+    return template
+
+
+def build_scripts(rid: int, base_url: Optional[str] = None) -> Dict[str, str]:
+    """
+    Return {"on_up", "on_down"} (blok untuk profile) dan {"scheduler",
+    "interval"} untuk /system/scheduler SCHEDULER_NAME.
+    """
+    hook = _fill(_HOOK_SCRIPT, QUEUE_MAX=_ROUTER_QUEUE_MAX)
+    return {
+        "on_up": _fill(hook, KIND="u", CLEANUP=""),
+        "on_down": _fill(
+            hook, KIND="d",
+            CLEANUP=_fill(_DOWN_CLEANUP, LIST=Config.ISOLATION_ADDRESS_LIST),
+        ),
+        "scheduler": _fill(
+            _FLUSH_SCRIPT,
+            URL=ingest_url(rid, base_url),
+            HEADER=TOKEN_HEADER,
+            TOKEN=reseller_token(rid),
+            HEARTBEAT=max(1, Config.PPP_EVENTS_HEARTBEAT_EVERY),
+            QUEUE_MAX=_ROUTER_QUEUE_MAX,
+        ),
+        "interval": f"{max(1, Config.PPP_EVENTS_FLUSH_INTERVAL)}s",
+    }
+
+
+def merge_script(existing: Optional[str], block: str) -> str:
+    """Ganti blok billing di skrip profile (atau tambahkan di akhir)."""
+    rest = _BLOCK_RE.sub("\n", existing or "").strip("\n")
+    return f"{rest}\n{block}" if rest else block
+
+
+def install_scripts(rid: int, login: Dict[str, Any], profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Pasang blok on-up/on-down di semua profile `profiles` (isi /ppp/profile)
+    yang belum sama, lalu buat/perbarui scheduler. Return ringkasan
+    {"profil_diperbarui", "profil_gagal", "scheduler"}.
+    """
+    scripts = build_scripts(rid)
+    patches: Dict[str, Dict[str, Any]] = {}
+    for prof in profiles:
+        if not isinstance(prof, dict) or not prof.get(".id"):
+            continue
+        body = {}
+        for field, key in (("on-up", "on_up"), ("on-down", "on_down")):
+            merged = merge_script(prof.get(field), scripts[key])
+            if merged != (prof.get(field) or ""):
+                body[field] = merged
+        if body:
+            patches[prof[".id"]] = body
+
+    errors = {}
+    if patches:
+        errors = mikrotik_client.patch_ppp_profiles_by_id(
+            login["router_host"], login["api_user"], login["api_pass"], patches
+        )
+        router_snapshots.mark_stale(rid, ("ppp_profile",))
+
+    scheduler = mikrotik_client.upsert_scheduler(
+        login["router_host"], login["api_user"], login["api_pass"],
+        SCHEDULER_NAME,
+        {
+            "interval": scripts["interval"],
+            "start-time": "startup",
+            "on-event": scripts["scheduler"],
+            "disabled": "false",
+        },
+    )
+    failed = [pid for pid, err in errors.items() if err]
+    return {
+        "profil_diperbarui": len(patches) - len(failed),
+        "profil_gagal": len(failed),
+        "scheduler": scheduler,
+    }
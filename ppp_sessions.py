@@ -0,0 +1,292 @@
+"""
+ppp_sessions.py
+---------------
+Pelacak session PPP (tabel ppp_sessions, migrations/0010).
+
+Dipanggil worker cron_jobs/session_tracker.py per router per putaran:
+- track_router(reseller, router_ip): baca /ppp/active sekali (lewat
+  router_snapshots, jadi hasilnya juga jadi snapshot untuk view), bandingkan
+  dengan session terbuka di DB (diff_sessions), lalu satu transaksi:
+  tutup session yang hilang, buka session baru, dan update
+  ppp_customers.last_connected_at / last_disconnected_at sekaligus
+- lock_reseller / load_open_sessions / close_sessions / mark_disconnected /
+  open_sessions: penulisan ke DB, dipakai juga oleh event push dari router
+  (ppp_events.py) di bawah advisory lock reseller yang sama
+- purge_history(): hapus riwayat lama (SESSION_HISTORY_DAYS)
+
+Biaya per putaran = 1 call /ppp/active + 4-7 query per router, tidak
+tergantung jumlah customer yang online. Router yang tidak menjawab
+dilewati: session terbuka tidak ditutup karena status sebenarnya tidak
+diketahui.
+"""
+
+from __future__ import annotations
+
+import datetime
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+import db
+import router_snapshots
+from config import Config
+
+_UPTIME_PART = re.compile(r"(\d+)([wdhms])")
+_UPTIME_SECONDS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+_UPTIME_CLOCK = re.compile(r"^(?:(\d+)w)?(?:(\d+)d)?(\d+):(\d+):(\d+)(?:\.\d+)?$")
+
+# namespace advisory lock session per reseller (pg_advisory_xact_lock(ns, id))
+SESSION_LOCK_NS = 7301
+
+
+def parse_uptime(value: Any) -> Optional[int]:
+    """
+    Uptime RouterOS ("1w2d3h4m5s", "00:12:30", "3d01:02:03",
+    "1w2d03:04:05") -> detik.
+    """
+    text = str(value or "").strip()
+    if not text:
+        return None
+
+    if ":" in text:
+        # format [<n>w][<n>d]hh:mm:ss (system resource uptime, RouterOS lama)
+        m = _UPTIME_CLOCK.match(text)
+        if not m:
+            return None
+        weeks, days, h, mi, sec = (int(x) if x else 0 for x in m.groups())
+        return weeks * 604800 + days * 86400 + h * 3600 + mi * 60 + sec
+
+    parts = _UPTIME_PART.findall(text)
+    if not parts:
+        return None
+    return sum(int(num) * _UPTIME_SECONDS[unit] for num, unit in parts)
+
+
+def diff_sessions(
+    open_sessions: List[Dict[str, Any]],
+    active: List[Dict[str, Any]],
+    now: datetime.datetime,
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    open_sessions: row ppp_sessions yang masih terbuka (id, ppp_username,
+    router_session_id). active: isi /ppp/active.
+
+    Return (ditutup, dibuka):
+    - ditutup : row open_sessions yang usernamenya tidak online lagi, atau
+                online dengan .id lain (reconnect di antara dua putaran)
+    - dibuka  : {"ppp_username", "router_session_id", "address",
+                 "caller_id", "connected_at"} untuk session yang belum
+                 tercatat terbuka
+    """
+    current: Dict[str, Dict[str, Any]] = {}
+    for a in active:
+        if isinstance(a, dict) and a.get("name") and a["name"] not in current:
+            current[a["name"]] = a
+
+    by_name = {s["ppp_username"]: s for s in open_sessions}
+
+    closed: List[Dict[str, Any]] = []
+    for name, s in by_name.items():
+        a = current.get(name)
+        if a is None:
+            closed.append(s)
+        elif s.get("router_session_id") and a.get(".id") and s["router_session_id"] != a[".id"]:
+            closed.append(s)
+    closed_names = {s["ppp_username"] for s in closed}
+
+    opened: List[Dict[str, Any]] = []
+    for name, a in current.items():
+        if name in by_name and name not in closed_names:
+            continue
+        uptime = parse_uptime(a.get("uptime"))
+        opened.append({
+            "ppp_username": name,
+            "router_session_id": a.get(".id"),
+            "address": a.get("address"),
+            "caller_id": a.get("caller-id"),
+            "connected_at": now - datetime.timedelta(seconds=uptime) if uptime is not None else now,
+        })
+    return closed, opened
+
+
+def lock_reseller(cur, rid: int) -> Optional[datetime.datetime]:
+    """
+    Advisory lock (SESSION_LOCK_NS, reseller) sampai akhir transaksi;
+    polling (track_router) dan event push (ppp_events.ingest) satu reseller
+    tidak pernah tumpang tindih. Row resellers tidak dikunci, jadi INSERT
+    tabel lain yang FK ke reseller tidak ikut menunggu.
+    Return NOW() transaksi, None kalau reseller tidak ada.
+    """
+    cur.execute(
+        """
+        SELECT NOW() AS now, pg_advisory_xact_lock(%(ns)s, id)
+        FROM resellers
+        WHERE id = %(rid)s
+        """,
+        {"ns": SESSION_LOCK_NS, "rid": rid},
+    )
+    row = cur.fetchone()
+    return row["now"] if row else None
+
+
+def load_open_sessions(cur, rid: int, names: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Session terbuka reseller (opsional hanya `names`)."""
+    cur.execute(
+        """
+        SELECT id, ppp_username, router_session_id, connected_at
+        FROM ppp_sessions
+        WHERE reseller_id = %(rid)s
+          AND disconnected_at IS NULL
+          AND (%(all)s OR ppp_username = ANY(%(names)s))
+        """,
+        {"rid": rid, "all": names is None, "names": list(names or [])},
+    )
+    return cur.fetchall()
+
+
+def close_sessions(cur, closing: List[Tuple[int, datetime.datetime]]) -> None:
+    """Tutup session per id: closing = [(ppp_sessions.id, disconnected_at)]."""
+    if not closing:
+        return
+    execute_values(
+        cur,
+        """
+        UPDATE ppp_sessions s
+        SET disconnected_at = v.at
+        FROM (VALUES %s) AS v(id, at)
+        WHERE s.id = v.id
+          AND s.disconnected_at IS NULL
+        """,
+        closing,
+        template="(%s::bigint, %s::timestamptz)",
+    )
+
+
+def mark_disconnected(cur, rid: int, items: List[Tuple[str, datetime.datetime]]) -> None:
+    """last_disconnected_at = waktu terbaru; items = [(username, waktu)]."""
+    if not items:
+        return
+    execute_values(
+        cur,
+        """
+        UPDATE ppp_customers c
+        SET last_disconnected_at = v.at
+        FROM (VALUES %s) AS v(rid, name, at)
+        WHERE c.reseller_id = v.rid
+          AND c.ppp_username = v.name
+          AND (c.last_disconnected_at IS NULL OR c.last_disconnected_at < v.at)
+        """,
+        [(rid, name, at) for name, at in items],
+        template="(%s::integer, %s, %s::timestamptz)",
+    )
+
+
+def open_sessions(cur, rid: int, opened: List[Dict[str, Any]]) -> int:
+    """
+    INSERT session baru (format item = hasil diff_sessions) dan isi
+    last_connected_at. Username yang tidak ada di ppp_customers, atau yang
+    masih punya session terbuka, dilewati. Return jumlah session dibuka.
+    """
+    rows = execute_values(
+        cur,
+        """
+        INSERT INTO ppp_sessions
+            (reseller_id, customer_id, ppp_username, router_session_id,
+             address, caller_id, connected_at)
+        SELECT c.reseller_id, c.id, v.name, v.sid, v.address, v.caller_id, v.connected_at
+        FROM (VALUES %s) AS v(rid, name, sid, address, caller_id, connected_at)
+        JOIN ppp_customers c
+          ON c.reseller_id = v.rid
+         AND c.ppp_username = v.name
+        ON CONFLICT (reseller_id, ppp_username) WHERE disconnected_at IS NULL
+        DO NOTHING
+        RETURNING ppp_username, connected_at
+        """,
+        [
+            (rid, o["ppp_username"], o.get("router_session_id"), o.get("address"),
+             o.get("caller_id"), o["connected_at"])
+            for o in opened
+        ],
+        template="(%s::integer, %s, %s, %s, %s, %s::timestamptz)",
+        fetch=True,
+    )
+    if rows:
+        execute_values(
+            cur,
+            """
+            UPDATE ppp_customers c
+            SET last_connected_at = v.connected_at
+            FROM (VALUES %s) AS v(rid, name, connected_at)
+            WHERE c.reseller_id = v.rid
+              AND c.ppp_username = v.name
+              AND (c.last_connected_at IS NULL OR c.last_connected_at < v.connected_at)
+            """,
+            [(rid, r["ppp_username"], r["connected_at"]) for r in rows],
+            template="(%s::integer, %s, %s::timestamptz)",
+        )
+    return len(rows)
+
+
+def track_router(reseller: Dict[str, Any], router_ip: str) -> Dict[str, int]:
+    """
+    Satu putaran untuk satu router. Return {"online", "opened", "closed"}.
+    Router gagal dibaca -> exception (router dilewati oleh worker).
+
+    Diff & penulisan berjalan dalam satu transaksi yang memegang advisory
+    lock reseller yang sama dengan ppp_events.ingest (lock_reseller). Username yang event
+    push-nya diterima setelah /ppp/active mulai dibaca dilewati: untuk
+    mereka isi /ppp/active yang dipegang sudah kedaluwarsa.
+    """
+    rid = reseller["id"]
+    read_at = db.query_one("SELECT clock_timestamp() AS t")["t"]
+    active, meta = router_snapshots.fetch(
+        rid, "ppp_active", router_ip,
+        reseller["router_username"], reseller["router_password"],
+    )
+    if meta["error"]:
+        # fetch memberi snapshot lama saat router mati: bukan state sekarang
+        raise RuntimeError(meta["error"])
+    active = active or []
+    result = {"online": len(active), "opened": 0, "closed": 0}
+
+    with db.transaction() as cur:
+        now = lock_reseller(cur, rid)
+        if now is None:
+            return result
+
+        cur.execute(
+            """
+            SELECT DISTINCT ppp_username
+            FROM ppp_events
+            WHERE reseller_id = %(rid)s
+              AND received_at >= %(read_at)s
+            """,
+            {"rid": rid, "read_at": read_at},
+        )
+        pushed = {r["ppp_username"] for r in cur.fetchall()}
+
+        current = [s for s in load_open_sessions(cur, rid) if s["ppp_username"] not in pushed]
+        closed, opened = diff_sessions(
+            current, [a for a in active if a.get("name") not in pushed], now
+        )
+        if closed:
+            close_sessions(cur, [(s["id"], now) for s in closed])
+            mark_disconnected(cur, rid, [(s["ppp_username"], now) for s in closed])
+            result["closed"] = len(closed)
+        if opened:
+            result["opened"] = open_sessions(cur, rid, opened)
+
+    return result
+
+
+def purge_history() -> int:
+    """Hapus session yang sudah tertutup lebih dari SESSION_HISTORY_DAYS hari."""
+    return db.execute(
+        """
+        DELETE FROM ppp_sessions
+        WHERE disconnected_at IS NOT NULL
+          AND disconnected_at < NOW() - make_interval(days => %(days)s)
+        """,
+        {"days": Config.SESSION_HISTORY_DAYS},
+    )
@@ -0,0 +1,266 @@
+"""
+profiling.py
+------------
+Extension Flask untuk mengukur latency per endpoint.
+
+Per request dicatat:
+- total waktu request
+- db       : waktu di helper db.py (query_one / query_all / execute / transaction)
+- router   : waktu call REST MikroTik (mikrotik_client._request)
+- wa       : waktu kirim WhatsApp (wa_client.send_wa)
+- tpl      : waktu render template Jinja
+
+Hasilnya:
+- header Server-Timing (terlihat di tab Network DevTools browser)
+- histogram bergulir per endpoint (N request terakhir), ditampilkan di
+  /admin/profiling
+- capture cProfile satu request sesuai permintaan, dump ke file .pstats:
+    * admin login  : tambahkan ?_profile=1
+    * tanpa sesi admin (mis. halaman reseller):
+        header "X-Profile-Token: <PROFILE_TOKEN>" atau ?_profile=<PROFILE_TOKEN>
+  Nama file dikembalikan di header X-Profile-File.
+  Baca dengan: python -m pstats <file>
+
+Catatan: call yang berjalan paralel (mis. snapshot router) dijumlahkan,
+jadi angka router bisa lebih besar dari total waktu request.
+
+Pemakaian di create_app():
+    RequestProfiler(app)
+
+Pemakaian di helper:
+    with profiling.timed("db"):
+        ...
+"""
+
+from __future__ import annotations
+
+import cProfile
+import contextvars
+import hmac
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from flask import Flask, g, request, session, template_rendered, before_render_template
+
+CATEGORIES = ("db", "router", "wa", "tpl")
+
+_current: contextvars.ContextVar[Optional["RequestTimings"]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class RequestTimings:
+    """
+    Akumulasi waktu per kategori untuk satu request.
+    Bisa diisi dari beberapa thread (call paralel), jadi pakai lock.
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.totals: Dict[str, List[float]] = {c: [0.0, 0] for c in CATEGORIES}
+        self._lock = threading.Lock()
+        self._tpl_started: List[float] = []
+
+    def add(self, category: str, seconds: float) -> None:
+        with self._lock:
+            slot = self.totals.setdefault(category, [0.0, 0])
+            slot[0] += seconds
+            slot[1] += 1
+
+
+@contextmanager
+def timed(category: str) -> Iterator[None]:
+    """
+    Catat durasi blok ke kategori `category` untuk request yang sedang
+    berjalan. Di luar request (cron, script) tidak melakukan apa-apa.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(category, time.perf_counter() - started)
+
+
+def current_context() -> contextvars.Context:
+    """
+    Salinan context untuk dijalankan di thread lain (ThreadPoolExecutor),
+    supaya waktu call di thread itu tetap tercatat ke request asalnya.
+    """
+    return contextvars.copy_context()
+
+
+# ======================================================================
+# Histogram bergulir per endpoint
+# ======================================================================
+
+class _EndpointStats:
+    def __init__(self, window: int) -> None:
+        # tiap item: (total_ms, {kategori: ms})
+        self.samples: Deque[Tuple[float, Dict[str, float]]] = deque(maxlen=window)
+        self.count = 0
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class RequestProfiler:
+    """
+    Extension Flask: RequestProfiler(app) atau profiler.init_app(app).
+
+    Config:
+    - PROFILING_WINDOW : jumlah request terakhir per endpoint untuk histogram
+    - PROFILE_DIR      : folder output .pstats
+    - PROFILE_TOKEN    : token capture cProfile tanpa sesi admin (kosong = nonaktif)
+    """
+
+    def __init__(self, app: Optional[Flask] = None) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[str, _EndpointStats] = {}
+        self.window = 500
+        self.profile_dir = "/tmp"
+        self.profile_token = ""
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        self.window = int(app.config.get("PROFILING_WINDOW", 500))
+        self.profile_dir = app.config.get("PROFILE_DIR") or "/tmp"
+        self.profile_token = app.config.get("PROFILE_TOKEN") or ""
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._tpl_start, app)
+        template_rendered.connect(self._tpl_end, app)
+
+        app.extensions["request_profiler"] = self
+
+    # -------------------------------------------------------------- hooks
+
+    def _before_request(self) -> None:
+        timings = RequestTimings()
+        g._profiling_token = _current.set(timings)
+        g._profiling = timings
+
+        if self._profile_requested():
+            prof = cProfile.Profile()
+            g._profiler = prof
+            prof.enable()
+
+    def _after_request(self, response):
+        timings: Optional[RequestTimings] = g.pop("_profiling", None)
+        if timings is None:
+            return response
+
+        prof: Optional[cProfile.Profile] = g.pop("_profiler", None)
+        if prof is not None:
+            prof.disable()
+            path = self._dump_profile(prof)
+            if path:
+                response.headers["X-Profile-File"] = path
+
+        total = time.perf_counter() - timings.started
+        parts = []
+        per_cat: Dict[str, float] = {}
+        for cat in CATEGORIES:
+            seconds, count = timings.totals.get(cat, (0.0, 0))
+            ms = seconds * 1000
+            per_cat[cat] = ms
+            if count:
+                parts.append(f'{cat};dur={ms:.1f};desc="{count}x"')
+        parts.append(f"total;dur={total * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(parts)
+
+        self._record(request.endpoint or "-", total * 1000, per_cat)
+        return response
+
+    def _teardown_request(self, exc: Optional[BaseException]) -> None:
+        prof = g.pop("_profiler", None)
+        if prof is not None:
+            prof.disable()
+        token = g.pop("_profiling_token", None)
+        if token is not None:
+            _current.reset(token)
+
+    def _tpl_start(self, sender, template, context, **extra) -> None:
+        timings = _current.get()
+        if timings is not None:
+            timings._tpl_started.append(time.perf_counter())
+
+    def _tpl_end(self, sender, template, context, **extra) -> None:
+        timings = _current.get()
+        if timings is not None and timings._tpl_started:
+            timings.add("tpl", time.perf_counter() - timings._tpl_started.pop())
+
+    # ------------------------------------------------------------ cProfile
+
+    def _profile_requested(self) -> bool:
+        flag = request.args.get("_profile") or request.headers.get("X-Profile-Token") or ""
+        if not flag:
+            return False
+        if session.get("is_admin") and flag == "1":
+            return True
+        return bool(self.profile_token) and hmac.compare_digest(flag, self.profile_token)
+
+    def _dump_profile(self, prof: cProfile.Profile) -> Optional[str]:
+        endpoint = (request.endpoint or "unknown").replace(".", "-")
+        name = f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.pstats"
+        path = os.path.join(self.profile_dir, name)
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            prof.dump_stats(path)
+        except OSError as e:
+            print(f"[profiling] gagal simpan profile {path}: {e}")
+            return None
+        print(f"[profiling] cProfile {request.method} {request.path} -> {path}")
+        return path
+
+    # ----------------------------------------------------------- histogram
+
+    def _record(self, endpoint: str, total_ms: float, per_cat: Dict[str, float]) -> None:
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = _EndpointStats(self.window)
+            stats.samples.append((total_ms, per_cat))
+            stats.count += 1
+
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        """
+        Ringkasan per endpoint (proses ini saja), urut p95 terbesar.
+        """
+        with self._lock:
+            snapshot = {ep: (list(st.samples), st.count) for ep, st in self._stats.items()}
+
+        rows = []
+        for endpoint, (samples, count) in snapshot.items():
+            totals = sorted(s[0] for s in samples)
+            n = len(samples)
+            row: Dict[str, Any] = {
+                "endpoint": endpoint,
+                "count": count,
+                "window": n,
+                "p50": _percentile(totals, 50),
+                "p95": _percentile(totals, 95),
+                "p99": _percentile(totals, 99),
+                "max": totals[-1] if totals else 0.0,
+            }
+            for cat in CATEGORIES:
+                row[f"avg_{cat}"] = sum(s[1].get(cat, 0.0) for s in samples) / n if n else 0.0
+            rows.append(row)
+
+        rows.sort(key=lambda r: r["p95"], reverse=True)
+        return rows
@@ -0,0 +1,326 @@
+"""
+reconcile.py
+------------
+Rekonsiliasi PPP secret router dengan DB (DB = sumber kebenaran).
+
+DB dan router bisa berbeda karena:
+- aksi yang mengubah DB lalu gagal di router (cron isolasi, bayar)
+- secret diubah langsung lewat Winbox
+
+Per reseller:
+1. /ppp/secret dan /ppp/profile diambil SEKALI (snapshot segar dari
+   router_snapshots dipakai ulang)
+2. state yang diinginkan dari ppp_customers (+ nama profile):
+       profile  : profile isolasi kalau is_isolated, selain itu profile
+                  dari profile_id (NULL = tidak dicek)
+       disabled : "yes" kalau is_enabled = FALSE, selain itu "no"
+       password : ppp_password (NULL = tidak dicek; juga tidak dicek kalau
+                  router tidak mengirim password, user API tanpa policy
+                  "sensitive")
+3. hash per row (desired vs router) dibandingkan; hanya row yang hash-nya
+   beda yang dihitung diff per field
+4. perbaikan minimal: PATCH hanya field yang beda (paralel, pakai .id dari
+   langkah 1), PUT untuk secret yang belum ada di router; session di-kill
+   kalau profile/disabled berubah (isolation_mode 'profile')
+
+Tidak pernah menghapus secret router: secret yang tidak ada di DB hanya
+dilaporkan (orphan; impor lewat tombol Sinkron Customers). Secret yang
+masih punya perintah pending/running di router_commands dilewati.
+Customer yang ditandai router_missing_at (sinkron "tandai yang tidak ada
+di router") dan memang tidak ada di router tidak dibuat ulang, hanya
+dilaporkan (missing).
+
+Dipakai oleh cron_jobs/reconcile_routers.py (juga --dry-run).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import db
+import router_snapshots
+from config import Config
+from isolation import MODE_PROFILE, reseller_isolation_mode
+from mikrotik_client import (
+    MikrotikError,
+    create_ppp_secrets_bulk,
+    patch_ppp_secrets_by_id,
+    terminate_ppp_active_waves,
+)
+
+FIELDS = ("profile", "disabled", "password")
+
+
+def _flag(value: Any) -> str:
+    """Nilai disabled RouterOS ("true"/"false"/"yes"/"no"/bool) -> "yes"/"no"."""
+    if isinstance(value, bool):
+        return "yes" if value else "no"
+    return "yes" if str(value or "").strip().lower() in ("true", "yes") else "no"
+
+
+def row_hash(name: str, row: Dict[str, Any]) -> str:
+    """Hash field FIELDS; None/"" (tidak dicek / tidak terbaca) dianggap sama."""
+    parts = [name] + ["" if row.get(f) in (None, "") else str(row[f]) for f in FIELDS]
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=12).hexdigest()
+
+
+def load_desired(reseller_id: int) -> Dict[str, Dict[str, Any]]:
+    """
+    {ppp_username: {"profile", "disabled", "password", "customer_id",
+    "router_missing"}} dari DB.
+    """
+    rows = db.query_all(
+        """
+        SELECT
+            c.id AS customer_id,
+            c.ppp_username,
+            c.ppp_password,
+            c.is_enabled,
+            c.is_isolated,
+            c.router_missing_at IS NOT NULL AS router_missing,
+            p.name AS profile_name,
+            iso.name AS iso_profile
+        FROM ppp_customers c
+        LEFT JOIN ppp_profiles p ON p.id = c.profile_id
+        LEFT JOIN LATERAL (
+            SELECT name
+            FROM ppp_profiles
+            WHERE reseller_id = c.reseller_id
+              AND is_isolation = TRUE
+            ORDER BY id
+            LIMIT 1
+        ) iso ON c.is_isolated
+        WHERE c.reseller_id = %(rid)s
+        """,
+        {"rid": reseller_id},
+    )
+    desired: Dict[str, Dict[str, Any]] = {}
+    for r in rows:
+        desired[r["ppp_username"]] = {
+            "customer_id": r["customer_id"],
+            "profile": r["iso_profile"] if r["is_isolated"] else r["profile_name"],
+            "disabled": "no" if r["is_enabled"] else "yes",
+            "password": r["ppp_password"] or None,
+            "router_missing": r["router_missing"],
+        }
+    return desired
+
+
+def _in_flight(reseller_id: int) -> set:
+    rows = db.query_all(
+        """
+        SELECT DISTINCT ppp_username
+        FROM router_commands
+        WHERE reseller_id = %(rid)s
+          AND status IN ('pending', 'running')
+        """,
+        {"rid": reseller_id},
+    )
+    return {r["ppp_username"] for r in rows}
+
+
+def compute_plan(
+    desired: Dict[str, Dict[str, Any]],
+    secrets: List[Dict[str, Any]],
+    router_profiles: Optional[set] = None,
+    skip: Optional[set] = None,
+) -> Dict[str, Any]:
+    """
+    Bandingkan desired (DB) dengan daftar /ppp/secret. Return plan:
+        patch   : {name: {"id", "updates": {field: baru}, "was": {field: lama}}}
+        create  : {name: body PUT}
+        orphans : [nama secret router yang tidak ada di DB]
+        missing : [nama] ditandai router_missing_at & tidak ada di router
+                  (tidak dibuat)
+        invalid : [(nama, profile)] profile DB tidak ada di router (dilewati)
+        skipped : jumlah secret yang dilewati (perintah router masih jalan)
+        in_sync : jumlah row yang hash-nya sama
+    """
+    skip = skip or set()
+    actual: Dict[str, Dict[str, Any]] = {}
+    for sec in secrets:
+        name = sec.get("name") if isinstance(sec, dict) else None
+        if name and name not in actual:
+            actual[name] = {
+                "id": sec.get(".id"),
+                "profile": sec.get("profile"),
+                "disabled": _flag(sec.get("disabled")),
+                # RouterOS tidak mengirim password ke user API tanpa policy
+                # "sensitive": None = tidak terbaca
+                "password": sec.get("password") or None,
+            }
+
+    plan: Dict[str, Any] = {
+        "patch": {}, "create": {}, "orphans": [], "missing": [], "invalid": [],
+        "skipped": 0, "in_sync": 0,
+    }
+
+    for name, want in desired.items():
+        if name in skip:
+            plan["skipped"] += 1
+            continue
+
+        profile = want["profile"]
+        if profile and router_profiles is not None and profile not in router_profiles:
+            plan["invalid"].append((name, profile))
+            profile = None
+
+        have = actual.get(name)
+        if have is None and want.get("router_missing"):
+            plan["missing"].append(name)
+            continue
+        if have is None:
+            body = {"disabled": want["disabled"]}
+            if want["password"]:
+                body["password"] = want["password"]
+            if profile:
+                body["profile"] = profile
+            plan["create"][name] = body
+            continue
+
+        # field yang tidak dicek (None) memakai nilai router supaya hash sama
+        target = {
+            "profile": profile if profile else have["profile"],
+            "disabled": want["disabled"],
+            "password": (
+                have["password"] if have["password"] is None or not want["password"]
+                else want["password"]
+            ),
+        }
+        if row_hash(name, target) == row_hash(name, have):
+            plan["in_sync"] += 1
+            continue
+
+        updates = {f: target[f] for f in FIELDS if target[f] != have[f]}
+        plan["patch"][name] = {
+            "id": have["id"],
+            "updates": updates,
+            "was": {f: have[f] for f in updates},
+        }
+
+    plan["orphans"] = sorted(set(actual) - set(desired))
+    return plan
+
+
+def _read_router(reseller_id: int, kind: str, router_ip: str, api_user: str, api_pass: str) -> Any:
+    """
+    Snapshot segar (router_snapshots, ROUTER_SNAPSHOT_REUSE_AGE) dipakai
+    ulang; snapshot lama saat router tidak menjawab tidak dipakai.
+    """
+    data, meta = router_snapshots.fetch(
+        reseller_id, kind, router_ip, api_user, api_pass,
+        max_age=Config.ROUTER_SNAPSHOT_REUSE_AGE,
+    )
+    if meta["error"]:
+        raise MikrotikError(meta["error"])
+    return data
+
+
+def reconcile_reseller(
+    reseller: Dict[str, Any],
+    router_ip: Optional[str],
+    *,
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Rekonsiliasi satu reseller. Return ringkasan:
+    {name, secrets, in_sync, patch, create, orphans, missing, invalid, skipped,
+     applied, killed, failed: [(nama, error)], plan (hanya dry_run),
+     skipped_reason, seconds}
+    """
+    started = time.perf_counter()
+    summary: Dict[str, Any] = {
+        "name": reseller.get("display_name") or reseller.get("username"),
+        "secrets": 0, "in_sync": 0, "patch": 0, "create": 0, "orphans": 0,
+        "missing": 0, "invalid": 0, "skipped": 0, "applied": 0, "killed": 0,
+        "failed": [], "skipped_reason": None, "seconds": 0.0,
+    }
+
+    api_user = reseller.get("router_username")
+    api_pass = reseller.get("router_password")
+    if not api_user or not api_pass:
+        summary["skipped_reason"] = "router_username/password kosong"
+    elif not router_ip:
+        summary["skipped_reason"] = "tidak dapat router_ip dari Router Admin"
+    if summary["skipped_reason"]:
+        summary["seconds"] = time.perf_counter() - started
+        return summary
+
+    secrets = _read_router(reseller["id"], "ppp_secret", router_ip, api_user, api_pass)
+    router_profiles = {
+        p.get("name")
+        for p in _read_router(reseller["id"], "ppp_profile", router_ip, api_user, api_pass)
+        if isinstance(p, dict)
+    }
+    plan = compute_plan(
+        load_desired(reseller["id"]),
+        secrets,
+        router_profiles=router_profiles,
+        skip=_in_flight(reseller["id"]),
+    )
+
+    summary.update({
+        "secrets": len(secrets),
+        "in_sync": plan["in_sync"],
+        "patch": len(plan["patch"]),
+        "create": len(plan["create"]),
+        "orphans": len(plan["orphans"]),
+        "missing": len(plan["missing"]),
+        "invalid": len(plan["invalid"]),
+        "skipped": plan["skipped"],
+    })
+
+    if dry_run:
+        summary["plan"] = plan
+        summary["seconds"] = time.perf_counter() - started
+        return summary
+
+    concurrency = Config.RECONCILE_ROUTER_CONCURRENCY
+    patched = patch_ppp_secrets_by_id(
+        router_ip, api_user, api_pass,
+        {p["id"]: p["updates"] for p in plan["patch"].values()},
+        max_workers=concurrency,
+    )
+    id_to_name = {p["id"]: name for name, p in plan["patch"].items()}
+    created = create_ppp_secrets_bulk(
+        router_ip, api_user, api_pass, plan["create"], max_workers=concurrency,
+    )
+
+    failed: List[Tuple[str, str]] = []
+    for sid, err in patched.items():
+        if err is not None:
+            failed.append((id_to_name[sid], err))
+    for name, err in created.items():
+        if err is not None:
+            failed.append((name, f"gagal membuat secret: {err}"))
+    summary["failed"] = failed
+    summary["applied"] = (len(patched) + len(created)) - len(failed)
+    if patched or created:
+        router_snapshots.mark_stale(reseller["id"])
+
+    # profile / disabled berubah: session lama harus reconnect
+    to_kill = [
+        id_to_name[sid]
+        for sid, err in patched.items()
+        if err is None and ({"profile", "disabled"} & set(plan["patch"][id_to_name[sid]]["updates"]))
+    ]
+    if to_kill and Config.RECONCILE_KILL_SESSIONS and reseller_isolation_mode(reseller) == MODE_PROFILE:
+        try:
+            killed = terminate_ppp_active_waves(
+                router_ip, api_user, api_pass, to_kill,
+                rate=Config.TERMINATE_RATE,
+                wave_size=Config.TERMINATE_WAVE_SIZE,
+                jitter=Config.TERMINATE_WAVE_JITTER,
+                cpu_threshold=Config.TERMINATE_CPU_THRESHOLD,
+                cpu_max_wait=Config.TERMINATE_CPU_MAX_WAIT,
+                max_workers=concurrency,
+                label=summary["name"],
+            )
+            summary["killed"] = sum(1 for err in killed.values() if err is None)
+        except Exception as e:
+            print(f"ℹ️ {summary['name']}: gagal ambil /ppp/active: {e}")
+
+    summary["seconds"] = time.perf_counter() - started
+    return summary
@@ -0,0 +1,508 @@
+"""
+router_queue.py
+---------------
+Antrian perintah ke router MikroTik (tabel router_commands,
+migrations/0007_router_commands.sql).
+
+Aksi UI cukup mengubah DB lalu:
+
+    router_queue.enqueue(reseller["id"], router_ip, username,
+                         updates={"disabled": "yes"}, kill_session=True,
+                         customer_id=cid, source="toggle_enable")
+
+dan langsung redirect; halaman customers menampilkan state DB dengan
+badge "pending di router" (pending_by_username) sampai perintah selesai.
+Eksekusi dilakukan proses terpisah (cron_jobs/router_queue_worker.py):
+
+- coalescing : satu perintah 'pending' per PPP secret; enqueue berikutnya
+               untuk secret yang sama di-merge ke perintah itu
+               (updates digabung, nilai terakhir menang; isolation terakhir
+               yang tidak NULL menang; kill_session di-OR), jadi klik
+               beruntun tetap menjadi satu PATCH
+- serialisasi: claim_batch() tidak mengambil perintah untuk secret yang
+               masih punya perintah 'running'; worker memproses perintah
+               satu router secara berurutan (maks ROUTER_QUEUE_PER_ROUTER
+               per claim) dan memperbarui locked_at sebelum tiap perintah,
+               jadi reclaim_stale() proses lain hanya mengambil perintah
+               milik worker yang benar-benar mati
+- retry      : gagal koneksi / 5xx dijadwalkan ulang dengan backoff
+               (ROUTER_RETRY_BASE_DELAY x 2^(n-1)); kalau sementara itu sudah
+               ada perintah pending baru untuk secret itu, isi perintah yang
+               gagal digabung ke sana (status 'superseded'). HTTP 4xx /
+               secret tidak ada, atau jatah ROUTER_MAX_ATTEMPTS habis ->
+               'failed'. Router tidak terjangkau: sisa perintah router itu
+               di batch ditunda tanpa dicoba (attempts tidak bertambah)
+
+isolation 'isolate' / 'unisolate' dieksekusi lewat isolation.py (ganti
+profile + kill session / address-list sesuai isolation_mode reseller);
+updates["profile"] berisi nama profile isolasi / normal.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+
+import db
+import router_snapshots
+from auth import load_reseller
+from config import Config
+from isolation import isolate_on_router, unisolate_on_router
+from mikrotik_client import MikrotikError, terminate_ppp_active_by_name, update_ppp_secret
+
+# row 'running' tanpa heartbeat lebih lama dari ini dianggap milik worker
+# yang mati
+STALE_RUNNING_SECONDS = 300
+
+# error router yang tidak akan berhasil kalau diulang
+_PERMANENT_RE = re.compile(r"^HTTP 4\d\d |tidak ditemukan")
+
+# router tidak terjangkau (mikrotik_client._request): sisa perintah router
+# itu di batch yang sama ditunda tanpa dicoba
+_UNREACHABLE_RE = re.compile(r"^Gagal koneksi ke router")
+
+
+# ======================================================================
+# Enqueue & status (dipakai handler web)
+# ======================================================================
+
+def enqueue(
+    reseller_id: int,
+    router_ip: str,
+    ppp_username: str,
+    *,
+    updates: Optional[Dict[str, Any]] = None,
+    isolation: Optional[str] = None,
+    kill_session: bool = False,
+    customer_id: Optional[int] = None,
+    source: Optional[str] = None,
+) -> int:
+    """
+    Antrikan perintah untuk satu PPP secret. Kalau sudah ada perintah
+    pending untuk secret itu, perintah ini digabung ke sana.
+    Return id perintah (baru atau yang digabungi).
+    """
+    row = db.query_one(
+        """
+        INSERT INTO router_commands
+            (reseller_id, router_ip, ppp_username, customer_id,
+             updates, isolation, kill_session, source, max_attempts)
+        VALUES
+            (%(rid)s, %(ip)s, %(user)s, %(cid)s,
+             %(updates)s::jsonb, %(isolation)s, %(kill)s, %(source)s, %(max)s)
+        ON CONFLICT (reseller_id, ppp_username) WHERE status = 'pending'
+        DO UPDATE SET
+            router_ip       = EXCLUDED.router_ip,
+            customer_id     = COALESCE(EXCLUDED.customer_id, router_commands.customer_id),
+            updates         = router_commands.updates || EXCLUDED.updates,
+            isolation       = COALESCE(EXCLUDED.isolation, router_commands.isolation),
+            kill_session    = router_commands.kill_session OR EXCLUDED.kill_session,
+            source          = EXCLUDED.source,
+            attempts        = 0,
+            next_attempt_at = NOW(),
+            updated_at      = NOW()
+        RETURNING id
+        """,
+        {
+            "rid": reseller_id,
+            "ip": router_ip,
+            "user": ppp_username,
+            "cid": customer_id,
+            "updates": json.dumps(updates or {}),
+            "isolation": isolation,
+            "kill": kill_session,
+            "source": source,
+            "max": Config.ROUTER_MAX_ATTEMPTS,
+        },
+        commit=True,
+    )
+    return row["id"]
+
+
+def cancel_pending(reseller_id: int, ppp_username: str) -> int:
+    """Batalkan perintah pending satu secret (mis. customer dihapus)."""
+    return db.execute(
+        """
+        UPDATE router_commands
+        SET
+            status = 'superseded',
+            last_error = 'dibatalkan: customer dihapus',
+            finished_at = NOW(),
+            updated_at = NOW()
+        WHERE reseller_id = %(rid)s
+          AND ppp_username = %(user)s
+          AND status = 'pending'
+        """,
+        {"rid": reseller_id, "user": ppp_username},
+    )
+
+
+def pending_by_username(reseller_id: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Status perintah terbaru per PPP secret yang belum beres di router:
+    {username: {"status": "pending"/"running"/"failed", "last_error", "attempts"}}.
+    Perintah 'failed' ditampilkan sampai ada perintah lebih baru
+    (maks 1 hari).
+    """
+    rows = db.query_all(
+        """
+        SELECT DISTINCT ON (ppp_username)
+            ppp_username, status, last_error, attempts
+        FROM router_commands
+        WHERE reseller_id = %(rid)s
+          AND status <> 'superseded'
+          AND (status IN ('pending', 'running')
+               OR updated_at > NOW() - INTERVAL '1 day')
+        ORDER BY ppp_username, id DESC
+        """,
+        {"rid": reseller_id},
+    )
+    return {r["ppp_username"]: r for r in rows if r["status"] != "done"}
+
+
+# ======================================================================
+# Worker
+# ======================================================================
+
+def claim_batch(
+    limit: int,
+    per_router: int,
+    max_routers: int,
+    busy_routers: Optional[List[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Ambil perintah pending yang sudah jatuh tempo, kecuali secret yang
+    perintah sebelumnya masih 'running'. Row terkunci worker lain dilewati.
+
+    Dari `limit` perintah jatuh tempo paling awal, diambil paling banyak
+    `per_router` perintah per router untuk `max_routers` router, dan tidak
+    dari router di `busy_routers` (masih dikerjakan thread proses ini).
+    """
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            WITH candidates AS (
+                SELECT p.id, p.router_ip, p.next_attempt_at
+                FROM router_commands p
+                WHERE p.status = 'pending'
+                  AND p.next_attempt_at <= NOW()
+                  AND NOT (p.router_ip = ANY(%(busy)s))
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM router_commands r
+                      WHERE r.status = 'running'
+                        AND r.reseller_id = p.reseller_id
+                        AND r.ppp_username = p.ppp_username
+                  )
+                ORDER BY p.next_attempt_at, p.id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ),
+            ranked AS (
+                SELECT
+                    id,
+                    router_ip,
+                    row_number() OVER (PARTITION BY router_ip ORDER BY next_attempt_at, id) AS rn,
+                    min(next_attempt_at) OVER (PARTITION BY router_ip) AS first_due
+                FROM candidates
+            ),
+            routers AS (
+                SELECT router_ip
+                FROM ranked
+                GROUP BY router_ip
+                ORDER BY min(first_due), router_ip
+                LIMIT %(max_routers)s
+            )
+            UPDATE router_commands c
+            SET
+                status = 'running',
+                attempts = attempts + 1,
+                locked_at = NOW(),
+                updated_at = NOW()
+            FROM ranked
+            JOIN routers USING (router_ip)
+            WHERE c.id = ranked.id
+              AND ranked.rn <= %(per_router)s
+            RETURNING c.*
+            """,
+            {
+                "limit": limit,
+                "per_router": per_router,
+                "max_routers": max_routers,
+                "busy": list(busy_routers or []),
+            },
+        )
+        return cur.fetchall()
+
+
+def heartbeat(commands: List[Dict[str, Any]]) -> set:
+    """
+    Perbarui locked_at perintah-perintah yang masih 'running' (supaya tidak
+    dianggap basi oleh reclaim_stale proses lain). Return id yang masih
+    dipegang; id yang hilang sudah dijadwalkan ulang dan tidak boleh
+    dijalankan lagi oleh pemanggil.
+    """
+    if not commands:
+        return set()
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            UPDATE router_commands
+            SET locked_at = NOW()
+            WHERE id = ANY(%(ids)s)
+              AND status = 'running'
+              AND locked_at IS NOT NULL
+            RETURNING id
+            """,
+            {"ids": [c["id"] for c in commands]},
+        )
+        return {r["id"] for r in cur.fetchall()}
+
+
+def reclaim_stale() -> int:
+    """
+    Perintah 'running' yang tidak di-heartbeat selama STALE_RUNNING_SECONDS
+    (worker mati) dijadwalkan ulang. locked_at dikosongkan dulu dalam satu
+    UPDATE, jadi heartbeat() worker lama tidak lagi menganggapnya miliknya.
+    """
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            UPDATE router_commands
+            SET locked_at = NULL
+            WHERE id IN (
+                SELECT id
+                FROM router_commands
+                WHERE status = 'running'
+                  AND locked_at < NOW() - make_interval(secs => %(stale)s)
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING *
+            """,
+            {"stale": STALE_RUNNING_SECONDS},
+        )
+        rows = cur.fetchall()
+    for cmd in rows:
+        finish_failed(cmd, "worker berhenti saat menjalankan perintah", permanent=False)
+    return len(rows)
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff eksponensial (ROUTER_RETRY_BASE_DELAY x 2^(n-1), maks ROUTER_RETRY_MAX_DELAY) +/- 20% jitter."""
+    delay = min(
+        Config.ROUTER_RETRY_MAX_DELAY,
+        Config.ROUTER_RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)),
+    )
+    return delay * random.uniform(0.8, 1.2)
+
+
+def is_permanent(error: Exception) -> bool:
+    return isinstance(error, MikrotikError) and bool(_PERMANENT_RE.search(str(error)))
+
+
+def is_unreachable(error: Exception) -> bool:
+    return isinstance(error, MikrotikError) and bool(_UNREACHABLE_RE.search(str(error)))
+
+
+def execute_command(cmd: Dict[str, Any], reseller: Dict[str, Any]) -> str:
+    """Jalankan satu perintah ke router. Return keterangan hasil."""
+    router_ip = cmd["router_ip"]
+    username = cmd["ppp_username"]
+    updates = dict(cmd["updates"] or {})
+
+    if cmd["isolation"] == "isolate":
+        profile = updates.pop("profile", None)
+        if not profile:
+            raise MikrotikError("Profile isolasi tidak ada di perintah")
+        return "isolate: " + isolate_on_router(
+            reseller, router_ip, username, profile,
+            extra_updates={k: v for k, v in updates.items() if v is not None},
+        )
+
+    if cmd["isolation"] == "unisolate":
+        profile = updates.pop("profile", None)
+        return "unisolate: " + unisolate_on_router(
+            reseller, router_ip, username, profile,
+            extra_updates={k: v for k, v in updates.items() if v is not None},
+        )
+
+    updates = {k: v for k, v in updates.items() if v is not None}
+    how = "router tidak diubah"
+    if updates:
+        update_ppp_secret(
+            router_ip, reseller["router_username"], reseller["router_password"],
+            secret_name=username,
+            updates=updates,
+        )
+        how = "PATCH " + ", ".join(sorted(updates))
+    if cmd["kill_session"]:
+        # kill session aktif (kalau ada) supaya perubahan langsung berlaku
+        try:
+            terminate_ppp_active_by_name(
+                router_ip, reseller["router_username"], reseller["router_password"], username
+            )
+            how += " + kill session"
+        except Exception as e:
+            print(f"[router_queue] gagal terminate session {username}: {e}")
+    return how
+
+
+def finish_done(cmd: Dict[str, Any], result: str) -> None:
+    db.execute(
+        """
+        UPDATE router_commands
+        SET
+            status = 'done',
+            result = %(result)s,
+            last_error = NULL,
+            locked_at = NULL,
+            finished_at = NOW(),
+            updated_at = NOW()
+        WHERE id = %(id)s
+        """,
+        {"id": cmd["id"], "result": result[:500]},
+    )
+
+
+def finish_failed(
+    cmd: Dict[str, Any],
+    error: str,
+    permanent: bool,
+    deferred: bool = False,
+    delay: Optional[float] = None,
+) -> str:
+    """
+    Catat kegagalan. Return status akhir row:
+    - 'failed'     : permanen / jatah percobaan habis
+    - 'superseded' : ada perintah pending yang lebih baru; isi perintah
+                     ini digabung ke sana (nilai yang lebih baru menang)
+    - 'pending'    : dijadwalkan ulang dengan backoff
+
+    deferred=True: perintah tidak dicoba sama sekali (router sudah gagal
+    untuk perintah sebelumnya), attempts dikembalikan dan tidak bisa
+    'failed'; delay = jeda yang sama dengan perintah yang gagal.
+    """
+    error = error[:1000]
+    if not deferred and (permanent or cmd["attempts"] >= cmd["max_attempts"]):
+        db.execute(
+            """
+            UPDATE router_commands
+            SET
+                status = 'failed',
+                last_error = %(error)s,
+                locked_at = NULL,
+                finished_at = NOW(),
+                updated_at = NOW()
+            WHERE id = %(id)s
+            """,
+            {"id": cmd["id"], "error": error},
+        )
+        return "failed"
+
+    params = {
+        "id": cmd["id"],
+        "rid": cmd["reseller_id"],
+        "user": cmd["ppp_username"],
+        "updates": json.dumps(cmd["updates"] or {}),
+        "isolation": cmd["isolation"],
+        "kill": cmd["kill_session"],
+        "error": error,
+        "delay": delay if delay is not None else retry_delay(cmd["attempts"]),
+        "refund": 1 if deferred else 0,
+    }
+    for _ in range(2):
+        try:
+            with db.transaction() as cur:
+                cur.execute(
+                    """
+                    UPDATE router_commands p
+                    SET
+                        updates = %(updates)s::jsonb || p.updates,
+                        isolation = COALESCE(p.isolation, %(isolation)s),
+                        kill_session = p.kill_session OR %(kill)s,
+                        updated_at = NOW()
+                    WHERE p.reseller_id = %(rid)s
+                      AND p.ppp_username = %(user)s
+                      AND p.status = 'pending'
+                    RETURNING p.id
+                    """,
+                    params,
+                )
+                status = "superseded" if cur.fetchone() else "pending"
+                cur.execute(
+                    """
+                    UPDATE router_commands
+                    SET
+                        status = %(status)s,
+                        attempts = attempts - %(refund)s,
+                        last_error = %(error)s,
+                        locked_at = NULL,
+                        next_attempt_at = NOW() + make_interval(secs => %(delay)s),
+                        finished_at = CASE WHEN %(status)s = 'superseded' THEN NOW() END,
+                        updated_at = NOW()
+                    WHERE id = %(id)s
+                    """,
+                    {**params, "status": status},
+                )
+            return status
+        except psycopg2.IntegrityError:
+            # perintah pending baru masuk di antara dua UPDATE: ulangi (digabung)
+            continue
+    raise RuntimeError(f"Gagal menjadwalkan ulang perintah router {cmd['id']}")
+
+
+def run_router_commands(commands: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Jalankan perintah-perintah SATU router secara berurutan.
+    - sebelum tiap perintah, locked_at semua perintah yang belum jalan
+      diperbarui (heartbeat); perintah yang sudah diambil alih
+      reclaim_stale dilewati
+    - router tidak terjangkau: sisa perintah ditunda dengan jeda yang sama,
+      tidak dicoba satu per satu sampai timeout
+    Return jumlah per status akhir.
+    """
+    counts: Dict[str, int] = {}
+    resellers: Dict[int, Optional[Dict[str, Any]]] = {}
+    changed: set = set()
+    unreachable: Optional[str] = None
+    delay: Optional[float] = None
+    for i, cmd in enumerate(commands):
+        if unreachable is not None:
+            status = finish_failed(
+                cmd, f"ditunda: {unreachable}", permanent=False, deferred=True, delay=delay
+            )
+            counts[status] = counts.get(status, 0) + 1
+            continue
+
+        if cmd["id"] not in heartbeat(commands[i:]):
+            counts["reclaimed"] = counts.get("reclaimed", 0) + 1
+            continue
+
+        rid = cmd["reseller_id"]
+        if rid not in resellers:
+            resellers[rid] = load_reseller(rid)
+        reseller = resellers[rid]
+
+        if reseller is None or not reseller["is_active"]:
+            status = finish_failed(cmd, "reseller tidak ditemukan / non-aktif", permanent=True)
+        else:
+            try:
+                finish_done(cmd, execute_command(cmd, reseller))
+                status = "done"
+                changed.add(rid)
+            except Exception as e:
+                if is_unreachable(e):
+                    unreachable = str(e)
+                    delay = retry_delay(cmd["attempts"])
+                status = finish_failed(cmd, str(e), permanent=is_permanent(e), delay=delay)
+                print(f"[router_queue] {cmd['ppp_username']}@{cmd['router_ip']} gagal ({status}): {e}")
+        counts[status] = counts.get(status, 0) + 1
+
+    # snapshot /ppp/secret & /ppp/active reseller ini sudah tidak sesuai router
+    for rid in changed:
+        router_snapshots.mark_stale(rid)
+    return counts
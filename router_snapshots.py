@@ -0,0 +1,346 @@
+"""
+router_snapshots.py
+-------------------
+Snapshot state router per reseller (tabel router_snapshots, migrations/0009).
+
+Setiap baca router yang berhasil lewat fetch() (atau on_result sampler
+dashboard) disimpan sebagai snapshot ber-versi:
+- isi = JSON kanonik (sort_keys) dikompres zlib, disimpan sekali per hash
+  blake2b di router_snapshot_blobs
+- isi sama dengan versi terakhir -> tidak ada versi/blob baru, hanya
+  checked_at yang diperbarui
+- field yang berubah tiap detik dibuang sebelum di-hash (VOLATILE_FIELDS),
+  supaya /ppp/active yang sama tidak jadi versi baru hanya karena uptime
+
+Pemakaian:
+- view        : fetch(..., max_age=ROUTER_SNAPSHOT_VIEW_AGE); router mati ->
+                data snapshot terakhir + meta["age_seconds"] untuk keterangan
+                "snapshot N menit lalu" (describe_age)
+- sync/rekon  : fetch(..., max_age=ROUTER_SNAPSHOT_REUSE_AGE); snapshot yang
+                stale (router sudah diubah sesudahnya, mark_stale) tidak
+                dipakai ulang
+- dashboard   : fill_router_summary() mengisi ringkasan router dari
+                snapshot saat router tidak menjawab
+
+Data snapshot dari cache in-process (per hash) dipakai bersama: jangan
+diubah oleh pemanggil.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import psycopg2
+
+import db
+from config import Config
+from mikrotik_client import (
+    MikrotikError,
+    get_ppp_active,
+    get_ppp_profiles,
+    get_ppp_secrets,
+    get_system_identity,
+    get_system_resource,
+    summarize_resource,
+)
+
+# kind -> fungsi baca router
+KINDS = {
+    "ppp_secret": get_ppp_secrets,
+    "ppp_profile": get_ppp_profiles,
+    "ppp_active": get_ppp_active,
+    "resource": get_system_resource,
+    "identity": get_system_identity,
+}
+
+# field per item yang tidak ikut disimpan (berubah terus, tidak dipakai view)
+VOLATILE_FIELDS = {
+    "ppp_active": ("uptime",),
+}
+
+# (reseller_id, kind) -> waktu save terakhir di proses ini (untuk min_interval)
+_last_saved: Dict[Tuple[int, str], float] = {}
+_last_saved_lock = threading.Lock()
+
+
+def _canonical(kind: str, data: Any) -> Any:
+    drop = VOLATILE_FIELDS.get(kind)
+    if drop and isinstance(data, list):
+        return [
+            {k: v for k, v in item.items() if k not in drop} if isinstance(item, dict) else item
+            for item in data
+        ]
+    return data
+
+
+def _encode(data: Any) -> Tuple[str, bytes, int]:
+    raw = json.dumps(data, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest(), zlib.compress(raw, 6), len(raw)
+
+
+@lru_cache(maxsize=64)
+def _load_blob(hash_: str) -> Any:
+    row = db.query_one(
+        "SELECT data FROM router_snapshot_blobs WHERE hash = %(h)s",
+        {"h": hash_},
+    )
+    if row is None:
+        return None
+    return json.loads(zlib.decompress(bytes(row["data"])))
+
+
+def save(
+    reseller_id: int,
+    kind: str,
+    data: Any,
+    router_ip: Optional[str] = None,
+    min_interval: float = 0,
+) -> Optional[Dict[str, Any]]:
+    """
+    Simpan hasil baca router. Return {"version", "hash", "changed"}, atau
+    None kalau dilewati karena save terakhir (proses ini) belum lewat
+    min_interval detik.
+    """
+    key = (reseller_id, kind)
+    if min_interval > 0:
+        now = time.monotonic()
+        with _last_saved_lock:
+            if now - _last_saved.get(key, 0) < min_interval:
+                return None
+            _last_saved[key] = now
+
+    data = _canonical(kind, data)
+    hash_, blob, raw_bytes = _encode(data)
+    item_count = len(data) if isinstance(data, list) else None
+    params = {
+        "rid": reseller_id, "kind": kind, "hash": hash_, "ip": router_ip,
+        "count": item_count, "keep": max(1, Config.ROUTER_SNAPSHOT_KEEP),
+    }
+
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            SELECT version, hash
+            FROM router_snapshots
+            WHERE reseller_id = %(rid)s AND kind = %(kind)s
+            ORDER BY version DESC
+            LIMIT 1
+            FOR UPDATE
+            """,
+            params,
+        )
+        last = cur.fetchone()
+
+        if last is not None and last["hash"] == hash_:
+            cur.execute(
+                """
+                UPDATE router_snapshots
+                SET checked_at = NOW(),
+                    stale = FALSE,
+                    router_ip = COALESCE(%(ip)s, router_ip)
+                WHERE reseller_id = %(rid)s AND kind = %(kind)s AND version = %(v)s
+                """,
+                {**params, "v": last["version"]},
+            )
+            return {"version": last["version"], "hash": hash_, "changed": False}
+
+        version = (last["version"] if last else 0) + 1
+        cur.execute(
+            """
+            INSERT INTO router_snapshot_blobs (hash, data, raw_bytes)
+            VALUES (%(hash)s, %(data)s, %(raw)s)
+            ON CONFLICT (hash) DO NOTHING
+            """,
+            {**params, "data": psycopg2.Binary(blob), "raw": raw_bytes},
+        )
+        cur.execute(
+            """
+            INSERT INTO router_snapshots
+                (reseller_id, kind, version, hash, item_count, router_ip)
+            VALUES (%(rid)s, %(kind)s, %(v)s, %(hash)s, %(count)s, %(ip)s)
+            ON CONFLICT (reseller_id, kind, version) DO NOTHING
+            """,
+            {**params, "v": version},
+        )
+
+        # buang versi lama + blob yang tidak dipakai snapshot lain
+        cur.execute(
+            """
+            DELETE FROM router_snapshots
+            WHERE reseller_id = %(rid)s AND kind = %(kind)s
+              AND version <= %(v)s - %(keep)s
+            RETURNING hash
+            """,
+            {**params, "v": version},
+        )
+        old = list({r["hash"] for r in cur.fetchall()} - {hash_})
+        if old:
+            cur.execute(
+                """
+                DELETE FROM router_snapshot_blobs b
+                WHERE b.hash = ANY(%(old)s)
+                  AND NOT EXISTS (SELECT 1 FROM router_snapshots s WHERE s.hash = b.hash)
+                """,
+                {"old": old},
+            )
+
+    return {"version": version, "hash": hash_, "changed": True}
+
+
+def latest(reseller_id: int, kind: str) -> Optional[Dict[str, Any]]:
+    """
+    Snapshot terakhir: {"data", "version", "hash", "item_count", "fetched_at",
+    "checked_at", "age_seconds", "stale", "router_ip"} atau None.
+    """
+    row = db.query_one(
+        """
+        SELECT
+            version, hash, item_count, router_ip, fetched_at, checked_at, stale,
+            EXTRACT(EPOCH FROM NOW() - checked_at)::float AS age_seconds
+        FROM router_snapshots
+        WHERE reseller_id = %(rid)s AND kind = %(kind)s
+        ORDER BY version DESC
+        LIMIT 1
+        """,
+        {"rid": reseller_id, "kind": kind},
+    )
+    if row is None:
+        return None
+    data = _load_blob(row["hash"])
+    if data is None:
+        return None
+    return {**row, "data": data}
+
+
+def fetch(
+    reseller_id: int,
+    kind: str,
+    router_ip: str,
+    api_user: str,
+    api_pass: str,
+    max_age: float = 0,
+) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Baca `kind` dari router (atau snapshot). Return (data, meta):
+        meta = {"from_snapshot", "age_seconds", "version", "error"}
+
+    - max_age > 0 dan snapshot terakhir tidak stale & umurnya <= max_age
+      -> snapshot, router tidak dipanggil
+    - selain itu router dipanggil; hasil disimpan sebagai snapshot
+    - router gagal -> snapshot terakhir (apa pun umurnya) dengan
+      meta["error"]; kalau belum ada snapshot, MikrotikError diteruskan
+    """
+    snap = None
+    if max_age > 0:
+        try:
+            snap = latest(reseller_id, kind)
+        except Exception as e:
+            print(f"[router_snapshots] gagal baca snapshot {kind} reseller {reseller_id}: {e}")
+        if snap is not None and not snap["stale"] and snap["age_seconds"] <= max_age:
+            return snap["data"], {
+                "from_snapshot": True,
+                "age_seconds": snap["age_seconds"],
+                "version": snap["version"],
+                "error": None,
+            }
+
+    try:
+        data = KINDS[kind](router_ip, api_user, api_pass)
+    except MikrotikError as e:
+        if snap is None:
+            try:
+                snap = latest(reseller_id, kind)
+            except Exception:
+                snap = None
+        if snap is None:
+            raise
+        return snap["data"], {
+            "from_snapshot": True,
+            "age_seconds": snap["age_seconds"],
+            "version": snap["version"],
+            "error": str(e),
+        }
+
+    version = None
+    try:
+        saved = save(reseller_id, kind, data, router_ip=router_ip)
+        version = saved["version"] if saved else None
+    except Exception as e:
+        print(f"[router_snapshots] gagal simpan snapshot {kind} reseller {reseller_id}: {e}")
+
+    return data, {"from_snapshot": False, "age_seconds": 0.0, "version": version, "error": None}
+
+
+def mark_stale(reseller_id: int, kinds: Iterable[str] = ("ppp_secret", "ppp_active")) -> None:
+    """
+    Router reseller baru saja diubah: snapshot `kinds` tidak boleh dipakai
+    ulang oleh fetch(max_age) sampai dibaca ulang dari router.
+    """
+    try:
+        db.execute(
+            """
+            UPDATE router_snapshots
+            SET stale = TRUE
+            WHERE reseller_id = %(rid)s
+              AND kind = ANY(%(kinds)s)
+              AND stale = FALSE
+            """,
+            {"rid": reseller_id, "kinds": list(kinds)},
+        )
+    except Exception as e:
+        print(f"[router_snapshots] gagal tandai stale reseller {reseller_id}: {e}")
+
+
+def describe_age(seconds: Optional[float]) -> str:
+    """12 -> "12 detik lalu", 300 -> "5 menit lalu", dst."""
+    if seconds is None:
+        return "-"
+    s = max(0, int(seconds))
+    if s < 60:
+        return f"{s} detik lalu"
+    if s < 3600:
+        return f"{s // 60} menit lalu"
+    if s < 86400:
+        return f"{s // 3600} jam lalu"
+    return f"{s // 86400} hari lalu"
+
+
+def fill_router_summary(reseller_id: int, snap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Ringkasan dashboard (format get_router_snapshot) yang gagal/sebagian
+    N/A: isi dari snapshot resource / identity / ppp_active terakhir dan
+    tambahkan snap["snapshot_age"] (teks umur snapshot tertua yang dipakai).
+    Ringkasan tanpa router_error dikembalikan apa adanya.
+    """
+    if not snap.get("router_error"):
+        return snap
+
+    used_ages = []
+    try:
+        if snap.get("uptime") in (None, "N/A"):
+            res = latest(reseller_id, "resource")
+            if res is not None and isinstance(res["data"], dict):
+                snap.update(summarize_resource(res["data"]))
+                used_ages.append(res["age_seconds"])
+        if snap.get("router_name") in (None, "N/A"):
+            ident = latest(reseller_id, "identity")
+            if ident is not None and isinstance(ident["data"], dict):
+                snap["router_name"] = ident["data"].get("name") or "N/A"
+                used_ages.append(ident["age_seconds"])
+        if snap.get("active_ppp_count") is None:
+            act = latest(reseller_id, "ppp_active")
+            if act is not None:
+                snap["active_ppp_count"] = act["item_count"]
+                used_ages.append(act["age_seconds"])
+    except Exception as e:
+        print(f"[router_snapshots] gagal isi ringkasan dari snapshot reseller {reseller_id}: {e}")
+
+    if used_ages:
+        snap["snapshot_age"] = describe_age(max(used_ages))
+    return snap
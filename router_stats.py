@@ -0,0 +1,164 @@
+"""
+router_stats.py
+---------------
+Sampler status router bersama untuk dashboard (SSE + long polling).
+
+Sebelumnya setiap tab dashboard memanggil /dashboard/stats tiap 3 detik,
+dan setiap call = 3 request ke router. Sekarang:
+- satu sampler (thread) per (reseller_id, router_ip) per proses mengambil
+  get_router_snapshot() tiap ROUTER_STATS_INTERVAL detik
+- semua tab yang subscribe ke router itu menerima snapshot yang sama
+  (SSE /dashboard/stats/stream atau long polling /dashboard/stats?since=N)
+- sampler berhenti sendiri kalau tidak ada subscriber lebih dari
+  ROUTER_STATS_IDLE_GRACE detik (memberi waktu tab reconnect)
+
+Stream SSE menahan satu thread worker selama tersambung, jadi jumlahnya
+dibatasi per proses (SSE_MAX_STREAMS); sisanya diarahkan ke long polling.
+Long poll yang sedang menunggu juga dibatasi (STATS_LONGPOLL_MAX); di luar
+itu request langsung dijawab snapshot terakhir.
+
+Menyediakan:
+- subscription(reseller_id, router_ip, api_user, api_pass) -> context manager Sampler
+- Sampler.wait_newer(since_seq, timeout) -> (seq, snapshot)
+- try_open_stream() / close_stream()
+- try_open_poll() / close_poll()
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import router_snapshots
+from config import Config
+from mikrotik_client import get_router_snapshot
+
+_HUB_LOCK = threading.Lock()
+_SAMPLERS: Dict[Tuple[int, str], "Sampler"] = {}
+
+_STREAM_SLOTS = threading.BoundedSemaphore(Config.SSE_MAX_STREAMS)
+_POLL_SLOTS = threading.BoundedSemaphore(max(1, Config.STATS_LONGPOLL_MAX))
+
+
+class Sampler:
+    """
+    Thread pengambil snapshot untuk satu router.
+    seq naik setiap snapshot baru; subscriber menunggu seq > yang terakhir dilihat.
+    """
+
+    def __init__(self, key: Tuple[int, str], api_user: str, api_pass: str) -> None:
+        self.key = key
+        self.api_user = api_user
+        self.api_pass = api_pass
+        self.seq = 0
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self.subscribers = 0
+        self.last_seen = time.monotonic()
+        self.cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"router-stats-{key[0]}",
+            daemon=True,
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def wait_newer(self, since_seq: int, timeout: float) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Tunggu snapshot dengan seq > since_seq (maks `timeout` detik).
+        Kalau tidak ada yang baru, kembalikan seq & snapshot terakhir.
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > since_seq, timeout=timeout)
+            return self.seq, self.snapshot
+
+    def _save_snapshot(self, kind: str, data: Any) -> None:
+        router_snapshots.save(
+            self.key[0], kind, data,
+            router_ip=self.key[1],
+            min_interval=Config.ROUTER_SNAPSHOT_MIN_INTERVAL,
+        )
+
+    def _run(self) -> None:
+        interval = Config.ROUTER_STATS_INTERVAL
+        router_ip = self.key[1]
+
+        while True:
+            snap = get_router_snapshot(
+                router_ip, self.api_user, self.api_pass,
+                deadline=Config.ROUTER_SNAPSHOT_DEADLINE,
+                on_result=self._save_snapshot,
+            )
+            # router (sebagian) tidak menjawab: isi dari snapshot terakhir
+            snap = router_snapshots.fill_router_summary(self.key[0], snap)
+            with self.cond:
+                # seq = waktu sampel (ms): tetap bisa dibandingkan walau
+                # long polling berikutnya dilayani worker/sampler lain
+                self.seq = max(self.seq + 1, int(time.time() * 1000))
+                self.snapshot = snap
+                self.cond.notify_all()
+
+            time.sleep(interval)
+
+            with _HUB_LOCK:
+                idle = time.monotonic() - self.last_seen
+                if self.subscribers == 0 and idle > Config.ROUTER_STATS_IDLE_GRACE:
+                    _SAMPLERS.pop(self.key, None)
+                    return
+
+
+@contextmanager
+def subscription(
+    reseller_id: int,
+    router_ip: str,
+    api_user: str,
+    api_pass: str,
+) -> Iterator[Sampler]:
+    """
+    Ikut (atau mulai) sampler untuk router ini selama blok `with`.
+    """
+    key = (reseller_id, router_ip)
+    with _HUB_LOCK:
+        sampler = _SAMPLERS.get(key)
+        if sampler is None:
+            sampler = Sampler(key, api_user, api_pass)
+            _SAMPLERS[key] = sampler
+            sampler.start()
+        else:
+            # kredensial bisa berubah (ganti password router)
+            sampler.api_user = api_user
+            sampler.api_pass = api_pass
+        sampler.subscribers += 1
+        sampler.last_seen = time.monotonic()
+
+    try:
+        yield sampler
+    finally:
+        with _HUB_LOCK:
+            sampler.subscribers -= 1
+            sampler.last_seen = time.monotonic()
+
+
+def try_open_stream() -> bool:
+    """
+    Ambil slot stream SSE (tanpa menunggu). False = penuh, pakai long polling.
+    """
+    return _STREAM_SLOTS.acquire(blocking=False)
+
+
+def close_stream() -> None:
+    _STREAM_SLOTS.release()
+
+
+def try_open_poll() -> bool:
+    """
+    Ambil slot long poll (tanpa menunggu). False = penuh, jawab langsung.
+    """
+    return _POLL_SLOTS.acquire(blocking=False)
+
+
+def close_poll() -> None:
+    _POLL_SLOTS.release()
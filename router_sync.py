@@ -0,0 +1,354 @@
+"""
+router_sync.py
+--------------
+Handler job (jobs.py) untuk sinkron data dari router reseller ke DB:
+
+- sync_customers : /ppp/secret -> ppp_customers (upsert: user baru
+                   ditambah, profile / password / disabled diperbarui)
+- sync_profiles  : /ppp/profile -> ppp_profiles (upsert description &
+                   rate_limit; monthly_price dan is_isolation tidak diubah),
+                   lalu pasang skrip event PPP (ppp_events.install_scripts)
+                   kalau PPP_EVENTS_BASE_URL diisi
+
+Keduanya memakai cara yang sama: data router di-COPY ke temp table
+(_stage), lalu satu INSERT ... ON CONFLICT DO UPDATE ... WHERE <ada yang
+berubah> dalam satu transaksi. Row yang tidak berubah tidak di-UPDATE
+(trigger billing & index tidak tersentuh), jadi puluhan ribu secret
+selesai dalam hitungan detik.
+
+Data router dibaca lewat router_snapshots (snapshot segar dipakai ulang,
+hasil baca baru ikut disimpan sebagai snapshot).
+
+Params job: {"router_ip": "...", "mark_missing": bool, "return_url": "..."}.
+Kredensial router diambil dari row reseller saat job jalan, tidak disimpan
+di tabel jobs.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from typing import Any, Dict, Iterable, List, Sequence
+
+import db
+import jobs
+import ppp_events
+import router_snapshots
+from auth import load_reseller
+from config import Config
+
+
+def _router_login(ctx: jobs.JobContext) -> Dict[str, Any]:
+    reseller = load_reseller(ctx.reseller_id)
+    if reseller is None or not reseller["is_active"]:
+        raise RuntimeError("Reseller tidak ditemukan / non-aktif.")
+    router_ip = ctx.params.get("router_ip")
+    if not router_ip or router_ip == "-":
+        raise RuntimeError("Router IP tidak tersedia. Silakan login ulang.")
+    return {
+        "router_host": router_ip,
+        "api_user": reseller["router_username"],
+        "api_pass": reseller["router_password"],
+    }
+
+
+def _read_router(ctx: jobs.JobContext, login: Dict[str, Any], kind: str) -> Any:
+    """
+    Baca /ppp/secret atau /ppp/profile lewat router_snapshots: snapshot yang
+    belum stale dan umurnya <= ROUTER_SNAPSHOT_REUSE_AGE dipakai ulang.
+    Snapshot lama saat router tidak menjawab TIDAK dipakai untuk sinkron.
+    """
+    data, meta = router_snapshots.fetch(
+        ctx.reseller_id, kind,
+        login["router_host"], login["api_user"], login["api_pass"],
+        max_age=Config.ROUTER_SNAPSHOT_REUSE_AGE,
+    )
+    if meta["error"]:
+        raise RuntimeError(f"Router tidak menjawab: {meta['error']}")
+    if meta["from_snapshot"]:
+        ctx.summary["sumber_data"] = (
+            f"snapshot v{meta['version']} ({router_snapshots.describe_age(meta['age_seconds'])})"
+        )
+    else:
+        ctx.summary["sumber_data"] = "router"
+    return data
+
+
+def _stage(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+    """
+    CREATE TEMP TABLE <table> (kolom text, ...) lalu COPY rows ke dalamnya.
+    None -> NULL, bool -> t/f. Temp table hilang di akhir transaksi.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([
+            "" if v is None else ("t" if v is True else "f" if v is False else v)
+            for v in row
+        ])
+    buf.seek(0)
+
+    cols_sql = ", ".join(f"{c} text" for c in columns)
+    cur.execute(f"CREATE TEMP TABLE {table} ({cols_sql}) ON COMMIT DROP")
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+    cur.execute(f"ANALYZE {table}")
+
+
+def _disabled(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("true", "yes")
+
+
+@jobs.register("sync_customers", "Sinkron customer dari router")
+def sync_customers_job(ctx: jobs.JobContext) -> Dict[str, Any]:
+    """
+    - Ambil /ppp/secret dari router, COPY ke temp table
+    - Dilewati: username milik reseller lain, dan username yang masih punya
+      perintah pending/running di router_commands (perubahan DB yang belum
+      sampai router tidak boleh tertimpa)
+    - Upsert ke ppp_customers:
+        baru  : profile_name -> profile_id, is_enabled = NOT disabled
+        lama  : profile_id (kecuali customer terisolir / profile router
+                profile isolasi / profile belum ada di DB), ppp_password
+                (kalau router punya), is_enabled; hanya kalau ada yang beda
+    - mark_missing: customer reseller ini yang tidak ada di router diberi
+      router_missing_at (tidak dihapus)
+    """
+    login = _router_login(ctx)
+    rid = ctx.reseller_id
+    mark_missing = bool(ctx.params.get("mark_missing"))
+
+    ctx.progress(0, None, "Mengambil PPP secret dari router...", force=True)
+    secrets = _read_router(ctx, login, "ppp_secret")
+    if not secrets:
+        raise RuntimeError("Router tidak punya PPP secret.")
+    ctx.check_cancel()
+
+    by_name: Dict[str, tuple] = {}
+    for sec in secrets:
+        if isinstance(sec, dict) and sec.get("name") and sec["name"] not in by_name:
+            by_name[sec["name"]] = (
+                sec["name"],
+                sec.get("profile") or None,
+                sec.get("password") or None,
+                _disabled(sec.get("disabled")),
+            )
+
+    total = len(by_name)
+    ctx.progress(0, total, f"{total} secret dari router, menyimpan ke DB...", force=True)
+
+    with db.transaction() as cur:
+        _stage(cur, "_router_secrets", ("ppp_username", "profile_name", "ppp_password", "disabled"), by_name.values())
+
+        cur.execute(
+            """
+            SELECT
+                s.ppp_username,
+                EXISTS (
+                    SELECT 1 FROM ppp_customers o
+                    WHERE o.ppp_username = s.ppp_username
+                      AND o.reseller_id <> %(rid)s
+                ) AS taken,
+                EXISTS (
+                    SELECT 1 FROM router_commands rc
+                    WHERE rc.reseller_id = %(rid)s
+                      AND rc.ppp_username = s.ppp_username
+                      AND rc.status IN ('pending', 'running')
+                ) AS in_flight
+            FROM _router_secrets s
+            """,
+            {"rid": rid},
+        )
+        flags = cur.fetchall()
+        taken = sorted(r["ppp_username"] for r in flags if r["taken"])
+        in_flight = sum(1 for r in flags if r["in_flight"] and not r["taken"])
+        ctx.check_cancel()
+
+        cur.execute(
+            """
+            WITH src AS (
+                SELECT
+                    s.ppp_username,
+                    s.ppp_password,
+                    NOT s.disabled::boolean AS is_enabled,
+                    p.id AS profile_id
+                FROM _router_secrets s
+                LEFT JOIN ppp_profiles p
+                       ON p.reseller_id = %(rid)s
+                      AND p.name = s.profile_name
+                WHERE NOT EXISTS (
+                        SELECT 1 FROM ppp_customers o
+                        WHERE o.ppp_username = s.ppp_username
+                          AND o.reseller_id <> %(rid)s
+                      )
+                  AND NOT EXISTS (
+                        SELECT 1 FROM router_commands rc
+                        WHERE rc.reseller_id = %(rid)s
+                          AND rc.ppp_username = s.ppp_username
+                          AND rc.status IN ('pending', 'running')
+                      )
+            )
+            INSERT INTO ppp_customers AS c
+                (reseller_id, profile_id, ppp_username, ppp_password,
+                 is_enabled, is_isolated, created_at, updated_at)
+            SELECT
+                %(rid)s, profile_id, ppp_username, ppp_password,
+                is_enabled, FALSE, NOW(), NOW()
+            FROM src
+            ON CONFLICT (reseller_id, ppp_username)
+            DO UPDATE
+                SET profile_id = CASE
+                        WHEN c.is_isolated
+                          OR EXCLUDED.profile_id IS NULL
+                          OR (SELECT is_isolation FROM ppp_profiles WHERE id = EXCLUDED.profile_id)
+                        THEN c.profile_id
+                        ELSE EXCLUDED.profile_id
+                    END,
+                    ppp_password      = COALESCE(EXCLUDED.ppp_password, c.ppp_password),
+                    is_enabled        = EXCLUDED.is_enabled,
+                    router_missing_at = NULL,
+                    updated_at        = NOW()
+                WHERE (
+                        NOT c.is_isolated
+                    AND EXCLUDED.profile_id IS NOT NULL
+                    AND EXCLUDED.profile_id IS DISTINCT FROM c.profile_id
+                    AND NOT (SELECT is_isolation FROM ppp_profiles WHERE id = EXCLUDED.profile_id)
+                )
+                   OR (EXCLUDED.ppp_password IS NOT NULL AND EXCLUDED.ppp_password IS DISTINCT FROM c.ppp_password)
+                   OR EXCLUDED.is_enabled IS DISTINCT FROM c.is_enabled
+                   OR c.router_missing_at IS NOT NULL
+            RETURNING (xmax = 0) AS inserted
+            """,
+            {"rid": rid},
+        )
+        written = cur.fetchall()
+        inserted = sum(1 for r in written if r["inserted"])
+        updated = len(written) - inserted
+
+        missing = 0
+        if mark_missing:
+            cur.execute(
+                """
+                UPDATE ppp_customers c
+                SET router_missing_at = NOW()
+                WHERE c.reseller_id = %(rid)s
+                  AND c.router_missing_at IS NULL
+                  AND NOT EXISTS (
+                      SELECT 1 FROM _router_secrets s
+                      WHERE s.ppp_username = c.ppp_username
+                  )
+                """,
+                {"rid": rid},
+            )
+            missing = cur.rowcount
+
+    unchanged = total - len(taken) - in_flight - inserted - updated
+    ctx.summary.update({
+        "router_secrets": total,
+        "ditambahkan": inserted,
+        "diperbarui": updated,
+        "tidak_berubah": unchanged,
+        "dilewati_antrian_router": in_flight,
+        "dipakai_reseller_lain": len(taken),
+    })
+    if taken:
+        ctx.summary["contoh_bentrok"] = taken[:10]
+    if mark_missing:
+        ctx.summary["ditandai_tidak_ada_di_router"] = missing
+
+    ctx.progress(total, total, force=True)
+    return {
+        "message": (
+            f"Sinkron selesai. {inserted} user baru, {updated} diperbarui, "
+            f"{unchanged} tidak berubah."
+            + (f" {missing} user ditandai tidak ada di router." if missing else "")
+        )
+    }
+
+
+@jobs.register("sync_profiles", "Sinkron profil dari router")
+def sync_profiles_job(ctx: jobs.JobContext) -> Dict[str, Any]:
+    """
+    - Ambil /ppp/profile dari router, COPY ke temp table
+    - Upsert (reseller_id, name): profil baru is_isolation FALSE &
+      monthly_price 0, profil lama hanya description & rate_limit dan
+      hanya kalau berubah
+    - PPP_EVENTS_BASE_URL diisi: blok on-up/on-down + scheduler event PPP
+      dipasang/diperbarui di router; gagal tidak membatalkan sinkron
+    """
+    login = _router_login(ctx)
+    rid = ctx.reseller_id
+
+    ctx.progress(0, None, "Mengambil profil dari router...", force=True)
+    mt_profiles = _read_router(ctx, login, "ppp_profile")
+    if not mt_profiles:
+        raise RuntimeError("Router tidak mengembalikan data profil PPP.")
+    ctx.check_cancel()
+
+    by_name: Dict[str, tuple] = {}
+    for prof in mt_profiles:
+        if not isinstance(prof, dict) or not prof.get("name"):
+            continue
+        by_name[prof["name"]] = (
+            prof["name"],
+            prof.get("comment") or prof.get("description") or None,
+            prof.get("rate-limit") or prof.get("rate_limit") or None,
+        )
+
+    total = len(by_name)
+    ctx.progress(0, total, f"{total} profil dari router.", force=True)
+
+    with db.transaction() as cur:
+        _stage(cur, "_router_profiles", ("name", "description", "rate_limit"), by_name.values())
+        cur.execute(
+            """
+            INSERT INTO ppp_profiles AS p
+                (reseller_id, name, description, rate_limit,
+                 is_isolation, monthly_price, created_at, updated_at)
+            SELECT %(rid)s, name, description, rate_limit, FALSE, 0, NOW(), NOW()
+            FROM _router_profiles
+            ON CONFLICT (reseller_id, name)
+            DO UPDATE
+                SET description = EXCLUDED.description,
+                    rate_limit  = EXCLUDED.rate_limit,
+                    updated_at  = NOW()
+                WHERE p.description IS DISTINCT FROM EXCLUDED.description
+                   OR p.rate_limit  IS DISTINCT FROM EXCLUDED.rate_limit
+            RETURNING (xmax = 0) AS inserted
+            """,
+            {"rid": rid},
+        )
+        written: List[Dict[str, Any]] = cur.fetchall()
+
+    inserted = sum(1 for r in written if r["inserted"])
+    updated = len(written) - inserted
+    ctx.summary.update({
+        "router_profiles": total,
+        "baru": inserted,
+        "diperbarui": updated,
+        "tidak_berubah": total - len(written),
+    })
+
+    events_note = ""
+    if Config.PPP_EVENTS_BASE_URL:
+        ctx.progress(total, total, "Memasang skrip event PPP di router...", force=True)
+        try:
+            installed = ppp_events.install_scripts(rid, login, mt_profiles)
+            ctx.summary["skrip_event"] = installed
+            events_note = (
+                f" Skrip event PPP: {installed['profil_diperbarui']} profil diperbarui, "
+                f"scheduler {installed['scheduler']}."
+            )
+        except Exception as e:
+            ctx.summary["skrip_event"] = f"gagal: {e}"
+            events_note = f" Skrip event PPP gagal dipasang: {e}"
+
+    ctx.progress(total, total, force=True)
+    return {
+        "message": (
+            f"Sinkron profil selesai. {inserted} profil baru, "
+            f"{updated} profil diperbarui."
+            + events_note
+        )
+    }
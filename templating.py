@@ -0,0 +1,91 @@
+# templating.py
+"""
+Template inline (HTML ditulis sebagai string di kode Python).
+
+Semua halaman menulis HTML sebagai string (body_html) lalu dirender.
+render_template_string() mem-parse + compile string itu di SETIAP request,
+termasuk base layout ~150 baris. Di sini string didaftarkan ke loader
+dengan nama tetap (layout) atau nama hasil hash isi (body), sehingga:
+- Environment.cache Jinja menyimpan template terkompilasi per proses
+- FileSystemBytecodeCache menyimpan bytecode di disk, worker baru start hangat
+
+Catatan: body_html harus string konstan (template Jinja), bukan f-string
+berisi data; data selalu lewat context.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from flask import Flask, render_template
+from jinja2 import BaseLoader, ChoiceLoader, FileSystemBytecodeCache, TemplateNotFound
+
+
+class InlineTemplateLoader(BaseLoader):
+    """
+    Loader Jinja untuk template yang sumbernya string di kode Python.
+
+    - add(name, source)  : daftarkan template dengan nama tetap (mis. layout)
+    - register(source)   : daftarkan body_html, nama = "inline/<sha1 isi>.html"
+
+    Nama harus berakhiran .html: autoescape Flask hanya aktif untuk
+    template .html/.htm/.xml/.svg, tanpa itu {{ data }} tercetak mentah.
+    """
+
+    def __init__(self) -> None:
+        self._sources: Dict[str, str] = {}
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, source: str) -> str:
+        with self._lock:
+            self._sources[name] = source
+        return name
+
+    def register(self, source: str) -> str:
+        # lookup dict pakai hash str yang sudah di-cache Python,
+        # jadi sha1 hanya dihitung sekali per string
+        name = self._names.get(source)
+        if name is None:
+            name = "inline/" + hashlib.sha1(source.encode("utf-8")).hexdigest() + ".html"
+            with self._lock:
+                self._sources.setdefault(name, source)
+                self._names[source] = name
+        return name
+
+    def get_source(self, environment, template: str) -> Tuple[str, None, Callable[[], bool]]:
+        source = self._sources.get(template)
+        if source is None:
+            raise TemplateNotFound(template)
+        # isi template tidak pernah berubah selama proses hidup
+        return source, None, lambda: True
+
+
+INLINE_TEMPLATES = InlineTemplateLoader()
+
+
+def init_templates(app: Flask) -> None:
+    """
+    Pasang InlineTemplateLoader + bytecode cache di Jinja env milik app.
+    """
+    env = app.jinja_env
+    env.loader = ChoiceLoader([env.loader, INLINE_TEMPLATES])
+
+    cache_dir = app.config.get("TEMPLATE_CACHE_DIR")
+    if cache_dir:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            print(f"[init_templates] bytecode cache nonaktif ({cache_dir}): {e}")
+
+
+def render_inline_template(source: str, **context: Any) -> str:
+    """
+    Pengganti render_template_string(): render string template lewat
+    InlineTemplateLoader supaya hanya dikompilasi sekali per proses.
+    """
+    return render_template(INLINE_TEMPLATES.register(source), **context)
@@ -3,6 +3,23 @@ wa_client.py
 ------------
 Client sederhana untuk kirim WhatsApp melalui API yang sudah kamu sediakan.
 
+- send_wa(to, message)   : satu pesan
+- send_many(messages)    : banyak pesan paralel (keep-alive Session per
+                           thread, batas laju, endpoint batch opsional)
+- split_message(...)     : pecah daftar panjang jadi beberapa pesan
+
+Multi-gateway (Config.WA_GATEWAYS, JSON list):
+    [{"name": "wa1", "url": "https://gw1/send", "weight": 2,
+      "rate_per_minute": 30, "burst": 5, "batch_url": null}, ...]
+- tiap nomor tujuan dipetakan ke gateway "utama" dengan rendezvous
+  hashing berbobot: percakapan satu pelanggan selalu lewat nomor
+  pengirim yang sama, dan menambah gateway hanya memindahkan sebagian
+  kecil nomor
+- gateway yang gagal WA_GATEWAY_FAIL_THRESHOLD kali berturut-turut
+  (koneksi gagal, HTTP 429/5xx) dianggap down selama WA_GATEWAY_COOLDOWN
+  detik; pesan dialihkan ke gateway berikutnya dalam urutan nomor itu
+- tanpa WA_GATEWAYS: satu gateway "default" = WA_API_URL (perilaku lama)
+
 - Jika dipanggil dari dalam Flask app:
     pakai current_app.config["WA_API_URL"]
 - Jika dipanggil dari cron / script biasa (tanpa Flask context):
@@ -11,17 +28,35 @@ Client sederhana untuk kirim WhatsApp melalui API yang sudah kamu sediakan.
 
 from __future__ import annotations
 
-from typing import Any, Dict, Optional
+import hashlib
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
 
-import requests
 from flask import current_app, has_app_context
 
 from config import Config
+import metrics
+import profiling
+from http_session import get_session
 
 
 class WhatsAppError(Exception):
     """Kesalahan saat mengirim pesan WhatsApp."""
 
+    def __init__(self, message: str, status: Optional[int] = None) -> None:
+        super().__init__(message)
+        # HTTP status dari gateway (None = gagal koneksi / belum sampai gateway)
+        self.status = status
+
+
+def _is_gateway_fault(e: WhatsAppError) -> bool:
+    """Error yang menandakan gateway bermasalah (bukan pesannya)."""
+    return e.status is None or e.status == 429 or e.status >= 500
+
 
 def _get_api_url(override_url: Optional[str] = None) -> str:
     """
@@ -54,29 +89,144 @@ def _get_api_url(override_url: Optional[str] = None) -> str:
     return url
 
 
+# ======================================================================
+# Gateway
+# ======================================================================
+
+DEFAULT_GATEWAY = "default"
+
+_gateways: Optional[List[Dict[str, Any]]] = None
+_health: Dict[str, Dict[str, float]] = {}
+_health_lock = threading.Lock()
+
+
+def _parse_gateways(raw: Optional[str]) -> List[Dict[str, Any]]:
+    if not raw:
+        return [{
+            "name": DEFAULT_GATEWAY,
+            "url": None,  # None = _get_api_url() (WA_API_URL)
+            "batch_url": Config.WA_API_BATCH_URL,
+            "weight": 1.0,
+            "rate_per_minute": Config.WA_RATE_PER_MINUTE,
+            "burst": Config.WA_RATE_BURST,
+        }]
+
+    try:
+        items = json.loads(raw)
+    except ValueError as e:
+        raise WhatsAppError(f"WA_GATEWAYS bukan JSON yang valid: {e}") from e
+    if not isinstance(items, list) or not items:
+        raise WhatsAppError("WA_GATEWAYS harus berupa list gateway yang tidak kosong.")
+
+    gateways: List[Dict[str, Any]] = []
+    for idx, item in enumerate(items, start=1):
+        if not isinstance(item, dict) or not item.get("url"):
+            raise WhatsAppError(f"WA_GATEWAYS item ke-{idx} wajib punya 'url'.")
+        gateways.append({
+            "name": str(item.get("name") or f"gw{idx}"),
+            "url": item["url"],
+            "batch_url": item.get("batch_url") or None,
+            "weight": max(0.01, float(item.get("weight") or 1)),
+            "rate_per_minute": float(item.get("rate_per_minute") or Config.WA_RATE_PER_MINUTE),
+            "burst": int(item.get("burst") or Config.WA_RATE_BURST),
+        })
+    return gateways
+
+
+def get_gateways() -> List[Dict[str, Any]]:
+    """Daftar gateway dari Config.WA_GATEWAYS (dibaca sekali per proses)."""
+    global _gateways
+    if _gateways is None:
+        _gateways = _parse_gateways(Config.WA_GATEWAYS)
+    return _gateways
+
+
+def get_gateway(name: str) -> Optional[Dict[str, Any]]:
+    for gw in get_gateways():
+        if gw["name"] == name:
+            return gw
+    return None
+
+
+def gateway_order(to: str) -> List[Dict[str, Any]]:
+    """
+    Urutan gateway untuk satu nomor (rendezvous hashing berbobot):
+    gateway pertama = pengirim tetap nomor ini, sisanya urutan failover.
+    """
+    def score(gw: Dict[str, Any]) -> float:
+        digest = hashlib.sha1(f"{gw['name']}:{to}".encode()).digest()
+        u = (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 2)  # (0, 1)
+        return -gw["weight"] / math.log(u)
+
+    return sorted(get_gateways(), key=score, reverse=True)
+
+
+def gateway_healthy(name: str) -> bool:
+    state = _health.get(name)
+    return state is None or state["open_until"] <= time.monotonic()
+
+
+def _record_health(name: str, ok: bool) -> None:
+    with _health_lock:
+        state = _health.setdefault(name, {"failures": 0, "open_until": 0.0})
+        if ok:
+            state["failures"] = 0
+            state["open_until"] = 0.0
+            return
+        state["failures"] += 1
+        if state["failures"] >= Config.WA_GATEWAY_FAIL_THRESHOLD:
+            if state["open_until"] <= time.monotonic():
+                print(
+                    f"[wa_client] gateway {name} gagal {int(state['failures'])}x berturut-turut, "
+                    f"dialihkan selama {Config.WA_GATEWAY_COOLDOWN} detik"
+                )
+            state["open_until"] = time.monotonic() + Config.WA_GATEWAY_COOLDOWN
+
+
+def pick_gateway(to: str, exclude: Iterable[str] = ()) -> str:
+    """
+    Nama gateway untuk nomor `to`: gateway tetap nomor itu kalau sehat,
+    kalau tidak gateway sehat berikutnya. Kalau semua down, tetap gateway
+    tetap nomor itu.
+    """
+    excluded = set(exclude)
+    order = [gw for gw in gateway_order(to) if gw["name"] not in excluded] or gateway_order(to)
+    for gw in order:
+        if gateway_healthy(gw["name"]):
+            return gw["name"]
+    return order[0]["name"]
+
+
+def _gateway_url(gw: Dict[str, Any]) -> str:
+    return gw["url"] or _get_api_url()
+
+
 def send_wa(
     to: str,
     message: str,
     *,
     api_url: Optional[str] = None,
     extra_payload: Optional[Dict[str, Any]] = None,
+    gateway: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Kirim pesan WhatsApp.
 
     :param to: nomor tujuan (string, misal: '6281234567890')
     :param message: isi pesan
-    :param api_url: override URL API (opsional)
+    :param api_url: override URL API (opsional, tanpa routing gateway)
     :param extra_payload: dict tambahan untuk payload (opsional)
+    :param gateway: paksa lewat gateway ini (tanpa failover)
     :return: dict respon dari server (atau {"raw": "<text>"} kalau bukan JSON)
+
+    Tanpa api_url/gateway: lewat gateway tetap nomor `to`, failover ke
+    gateway berikutnya kalau gateway bermasalah.
     """
     if not to:
         raise ValueError("Nomor tujuan (to) wajib diisi")
     if not message:
         raise ValueError("Pesan WhatsApp (message) wajib diisi")
 
-    url = _get_api_url(override_url=api_url)
-
     payload: Dict[str, Any] = {
         "number": to,
         "message": message,
@@ -85,16 +235,362 @@ def send_wa(
     if extra_payload:
         payload.update(extra_payload)
 
+    if api_url:
+        return _post(api_url, payload)
+
+    if gateway:
+        gw = get_gateway(gateway)
+        if gw is None:
+            raise WhatsAppError(f"Gateway WA '{gateway}' tidak ada di WA_GATEWAYS.")
+        candidates = [gw]
+    else:
+        order = gateway_order(to)
+        # gateway sehat dulu, yang sedang down dicoba paling akhir
+        candidates = sorted(order, key=lambda g: not gateway_healthy(g["name"]))
+
+    last_error: Optional[WhatsAppError] = None
+    for gw in candidates:
+        try:
+            response = _post(_gateway_url(gw), payload, gateway=gw["name"])
+        except WhatsAppError as e:
+            if not _is_gateway_fault(e):
+                _record_health(gw["name"], True)
+                raise
+            _record_health(gw["name"], False)
+            last_error = e
+            continue
+        _record_health(gw["name"], True)
+        return response
+
+    assert last_error is not None
+    raise last_error
+
+
+def _post(
+    url: str,
+    payload: Dict[str, Any],
+    count: int = 1,
+    gateway: str = DEFAULT_GATEWAY,
+) -> Dict[str, Any]:
+    """
+    POST ke API WA lewat Session per thread (keep-alive).
+    count = jumlah pesan dalam payload (untuk metrik, >1 kalau batch).
+    """
+    started = time.perf_counter()
     try:
-        resp = requests.post(url, json=payload, timeout=10)
+        with profiling.timed("wa"):
+            resp = get_session().post(url, json=payload, timeout=10 if count == 1 else 30)
     except Exception as e:
-        raise WhatsAppError(f"Gagal menghubungi WA API: {e}") from e
+        metrics.WA_LATENCY.labels(gateway).observe(time.perf_counter() - started)
+        metrics.WA_MESSAGES.labels(gateway, "error").inc(count)
+        raise WhatsAppError(f"Gagal menghubungi WA API ({gateway}): {e}") from e
+
+    metrics.WA_LATENCY.labels(gateway).observe(time.perf_counter() - started)
+    metrics.WA_MESSAGES.labels(gateway, "ok" if resp.ok else "error").inc(count)
 
     if not resp.ok:
-        raise WhatsAppError(f"WA API error HTTP {resp.status_code}: {resp.text}")
+        raise WhatsAppError(
+            f"WA API ({gateway}) error HTTP {resp.status_code}: {resp.text}",
+            status=resp.status_code,
+        )
 
     try:
         return resp.json()
     except ValueError:
         # Kalau bukan JSON, tetap kembalikan text mentah.
         return {"raw": resp.text}
+
+
+# ======================================================================
+# Kirim banyak pesan
+# ======================================================================
+
+class _RateLimiter:
+    """Batas laju sederhana in-process: maksimal `rate` pesan per detik."""
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, count: int = 1) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval * count
+        if start > now:
+            time.sleep(start - now)
+
+
+def _batch_results(response: Dict[str, Any], count: int) -> List[Optional[str]]:
+    """
+    Hasil per pesan dari respon batch: kalau gateway mengembalikan list
+    "results" sepanjang batch, item dengan "error" atau status/ok = false
+    dianggap gagal; selain itu seluruh batch dianggap terkirim.
+    """
+    items = response.get("results") if isinstance(response, dict) else None
+    if not isinstance(items, list) or len(items) != count:
+        return [None] * count
+    errors: List[Optional[str]] = []
+    for item in items:
+        if not isinstance(item, dict):
+            errors.append(None)
+        elif item.get("error"):
+            errors.append(str(item["error"]))
+        elif item.get("ok") is False or item.get("status") is False:
+            errors.append(str(item.get("message") or "ditolak gateway"))
+        else:
+            errors.append(None)
+    return errors
+
+
+def _send_via(
+    items: List[Dict[str, Any]],
+    *,
+    url: str,
+    batch_url: Optional[str],
+    gateway: str,
+    concurrency: Optional[int],
+    rate: Optional[float],
+    track_health: bool,
+) -> None:
+    """Kirim item (sudah tervalidasi) lewat satu URL/gateway; hasil ditulis ke item."""
+    limiter = _RateLimiter(rate)
+
+    def _fail(item: Dict[str, Any], e: WhatsAppError) -> None:
+        fault = _is_gateway_fault(e)
+        item.update(ok=False, error=str(e), gateway_fault=fault)
+        if track_health:
+            _record_health(gateway, not fault)
+
+    def _one(item: Dict[str, Any]) -> None:
+        limiter.acquire()
+        payload: Dict[str, Any] = {"number": item["to"], "message": item["message"]}
+        if item.get("extra_payload"):
+            payload.update(item["extra_payload"])
+        started = time.perf_counter()
+        item["gateway"] = gateway
+        try:
+            item["response"] = _post(url, payload, gateway=gateway)
+            item.update(ok=True, error=None, gateway_fault=False)
+            if track_health:
+                _record_health(gateway, True)
+        except WhatsAppError as e:
+            _fail(item, e)
+        item["seconds"] = time.perf_counter() - started
+
+    def _batch(chunk: List[Dict[str, Any]]) -> None:
+        limiter.acquire(len(chunk))
+        payload = {
+            "messages": [
+                {"number": item["to"], "message": item["message"], **(item.get("extra_payload") or {})}
+                for item in chunk
+            ]
+        }
+        started = time.perf_counter()
+        try:
+            response = _post(batch_url, payload, count=len(chunk), gateway=gateway)
+        except WhatsAppError as e:
+            for item in chunk:
+                item.update(gateway=gateway, seconds=time.perf_counter() - started)
+                _fail(item, e)
+            return
+        if track_health:
+            _record_health(gateway, True)
+        elapsed = time.perf_counter() - started
+        for item, err in zip(chunk, _batch_results(response, len(chunk))):
+            item.update(
+                ok=err is None, error=err, response=response, gateway=gateway,
+                gateway_fault=False, seconds=elapsed,
+            )
+
+    if batch_url:
+        size = max(1, Config.WA_API_BATCH_SIZE)
+        jobs: List[Any] = [items[i:i + size] for i in range(0, len(items), size)]
+        worker = _batch
+    else:
+        jobs = items
+        worker = _one
+
+    workers = max(1, min(concurrency or Config.WA_SEND_CONCURRENCY, len(jobs) or 1))
+    if workers == 1:
+        for job in jobs:
+            worker(job)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wa-send") as ex:
+            list(ex.map(worker, jobs))
+
+
+def _send_gateway(
+    items: List[Dict[str, Any]],
+    name: str,
+    concurrency: Optional[int],
+    rate: Optional[float],
+) -> None:
+    gw = get_gateway(name)
+    if gw is None:
+        for item in items:
+            item.update(error=f"Gateway WA '{name}' tidak ada di WA_GATEWAYS.", gateway=name)
+        return
+    try:
+        url = _gateway_url(gw)
+    except WhatsAppError as e:
+        for item in items:
+            item.update(error=str(e), gateway=name)
+        return
+    _send_via(
+        items,
+        url=url,
+        batch_url=gw["batch_url"],
+        gateway=name,
+        concurrency=concurrency,
+        rate=rate,
+        track_health=True,
+    )
+
+
+def _send_routed(
+    items: List[Dict[str, Any]],
+    concurrency: Optional[int],
+    rate: Optional[float],
+    tried: Dict[int, set],
+) -> None:
+    """Kelompokkan per gateway tetap (pick_gateway), kirim semua gateway paralel."""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault(pick_gateway(item["to"], exclude=tried[id(item)]), []).append(item)
+    for name, group in groups.items():
+        for item in group:
+            tried[id(item)].add(name)
+
+    def _run(entry) -> None:
+        name, group = entry
+        gw = get_gateway(name)
+        # tanpa rate eksplisit: laju masing-masing gateway
+        gw_rate = rate if rate is not None else (gw["rate_per_minute"] / 60.0 if gw else None)
+        _send_gateway(group, name, concurrency, gw_rate)
+
+    if len(groups) == 1:
+        _run(next(iter(groups.items())))
+    else:
+        with ThreadPoolExecutor(max_workers=len(groups), thread_name_prefix="wa-gw") as ex:
+            list(ex.map(_run, groups.items()))
+
+
+def send_many(
+    messages: Iterable[Dict[str, Any]],
+    *,
+    concurrency: Optional[int] = None,
+    rate: Optional[float] = None,
+    api_url: Optional[str] = None,
+    gateway: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Kirim banyak pesan WhatsApp paralel.
+
+    :param messages: item {"to", "message"} + opsional "extra_payload";
+                     kunci lain (mis. "id" outbox) ikut dikembalikan apa adanya
+    :param concurrency: jumlah call HTTP bersamaan per gateway
+                        (default WA_SEND_CONCURRENCY)
+    :param rate: maksimal pesan per detik per gateway
+                 (None = rate_per_minute gateway; dengan api_url/gateway: tanpa batas)
+    :param api_url: kirim semua ke URL ini (tanpa routing gateway)
+    :param gateway: kirim semua lewat gateway ini (tanpa failover)
+    :return: list sesuai urutan input, tiap item ditambah
+             "ok", "response", "error", "permanent" (data pesan tidak valid,
+             percuma dicoba ulang), "gateway", "gateway_fault" dan "seconds"
+
+    Tanpa api_url/gateway: tiap pesan lewat gateway tetap nomornya; pesan
+    yang gagal karena gatewaynya bermasalah dicoba sekali lagi lewat gateway
+    sehat berikutnya. Gateway dengan batch_url (atau WA_API_BATCH_URL untuk
+    gateway default) menerima pesan per WA_API_BATCH_SIZE dalam satu POST
+    {"messages": [{"number", "message"}, ...]}.
+    Tidak pernah raise untuk kegagalan per pesan.
+    """
+    items = [dict(m) for m in messages]
+    if not items:
+        return []
+
+    for item in items:
+        item.update(
+            ok=False, response=None, error=None, permanent=False,
+            gateway=None, gateway_fault=False, seconds=0.0,
+        )
+        if not item.get("to"):
+            item.update(error="Nomor tujuan (to) wajib diisi", permanent=True)
+        elif not item.get("message"):
+            item.update(error="Pesan WhatsApp (message) wajib diisi", permanent=True)
+    valid = [item for item in items if item["error"] is None]
+    if not valid:
+        return items
+
+    if api_url:
+        _send_via(
+            valid, url=api_url, batch_url=None, gateway=DEFAULT_GATEWAY,
+            concurrency=concurrency, rate=rate, track_health=False,
+        )
+    elif gateway:
+        _send_gateway(valid, gateway, concurrency, rate)
+    else:
+        try:
+            get_gateways()
+        except WhatsAppError as e:
+            for item in valid:
+                item["error"] = str(e)
+            return items
+        tried: Dict[int, set] = {id(item): set() for item in valid}
+        _send_routed(valid, concurrency, rate, tried)
+        # failover: satu kali lagi lewat gateway lain yang sehat
+        retry = []
+        for item in valid:
+            if item["ok"] or not item["gateway_fault"]:
+                continue
+            alt = pick_gateway(item["to"], exclude=tried[id(item)])
+            if alt not in tried[id(item)] and gateway_healthy(alt):
+                retry.append(item)
+        if retry:
+            _send_routed(retry, concurrency, rate, tried)
+    return items
+
+
+def split_message(
+    header: str,
+    lines: List[str],
+    footer: str = "",
+    *,
+    max_chars: Optional[int] = None,
+) -> List[str]:
+    """
+    Susun header + daftar baris + footer menjadi pesan sesedikit mungkin
+    dengan panjang maksimal max_chars (default Config.WA_MESSAGE_MAX_CHARS).
+
+    Baris tidak pernah dipotong di tengah (kecuali satu baris sendiri sudah
+    melebihi batas). Kalau lebih dari satu pesan, baris pertama header
+    diberi penanda "(1/3)", "(2/3)", dst.
+    """
+    limit = max_chars or Config.WA_MESSAGE_MAX_CHARS
+    # sisakan tempat untuk header, footer, baris kosong & penanda bagian
+    budget = max(200, limit - len(header) - len(footer) - 16)
+
+    chunks: List[List[str]] = [[]]
+    size = 0
+    for line in lines:
+        line = line[:budget]
+        if chunks[-1] and size + len(line) + 1 > budget:
+            chunks.append([])
+            size = 0
+        chunks[-1].append(line)
+        size += len(line) + 1
+
+    total = len(chunks)
+    title, sep, rest = header.partition("\n")
+    messages: List[str] = []
+    for idx, chunk in enumerate(chunks, start=1):
+        head = header if total == 1 else f"{title} ({idx}/{total}){sep}{rest}"
+        parts = [head, "", *chunk]
+        if footer:
+            parts += ["", footer]
+        messages.append("\n".join(parts))
+    return messages
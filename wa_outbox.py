@@ -0,0 +1,434 @@
+"""
+wa_outbox.py
+------------
+Antrian WhatsApp persisten (tabel wa_outbox, migrations/0005_wa_outbox.sql).
+
+Pemanggil (request handler, cron) cukup:
+
+    wa_outbox.enqueue(nomor, pesan, template="payment_receipt",
+                      dedupe_key=f"payment_receipt:{payment_id}")
+
+lalu lanjut; tidak ada call HTTP ke API WA di jalur request. Pengiriman
+dilakukan proses terpisah (cron_jobs/wa_outbox_worker.py):
+
+- claim_batch() : ambil row siap kirim dengan FOR UPDATE SKIP LOCKED,
+                  jadi beberapa worker bisa jalan bersamaan tanpa kirim ganda
+- take_tokens() : token bucket per sender (= gateway WA) di tabel
+                  wa_sender_buckets (rate_per_minute/burst gateway),
+                  berlaku lintas proses; jadi laju total naik sebanding
+                  jumlah gateway
+- reroute_pending(): pindahkan antrian gateway yang down / sudah tidak
+                  ada di WA_GATEWAYS ke gateway sehat berikutnya
+- deliver_batch(): kirim paralel lewat wa_client.send_many, catat 'sent' atau
+                  jadwalkan retry dengan backoff eksponensial + jitter;
+                  setelah WA_MAX_ATTEMPTS percobaan status jadi 'failed'
+
+dedupe_key bersifat unik: enqueue dengan key yang sudah ada diabaikan
+(return None), misal "unpaid_reminder:<customer_id>:<YYYY-MM>".
+"""
+
+from __future__ import annotations
+
+import json
+import random
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+import db
+from config import Config
+from wa_client import get_gateway, gateway_healthy, pick_gateway, send_many
+
+# row 'sending' lebih lama dari ini dianggap milik worker yang mati
+STALE_SENDING_SECONDS = 300
+
+
+# ======================================================================
+# Enqueue (dipakai pemanggil)
+# ======================================================================
+
+def enqueue(
+    to: str,
+    message: str,
+    *,
+    template: str,
+    dedupe_key: Optional[str] = None,
+    reseller_id: Optional[int] = None,
+    customer_id: Optional[int] = None,
+    sender: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Masukkan satu pesan ke antrian.
+    sender = nama gateway (default: gateway tetap nomor tujuan, lihat
+    wa_client.pick_gateway).
+    Return id outbox, atau None kalau dedupe_key sudah pernah diantrikan.
+    """
+    if not to:
+        raise ValueError("Nomor tujuan (to) wajib diisi")
+    if not message:
+        raise ValueError("Pesan WhatsApp (message) wajib diisi")
+
+    row = db.query_one(
+        """
+        INSERT INTO wa_outbox
+            (sender, to_number, message, template, reseller_id, customer_id,
+             dedupe_key, max_attempts)
+        VALUES
+            (%(sender)s, %(to)s, %(message)s, %(template)s, %(rid)s, %(cid)s,
+             %(key)s, %(max_attempts)s)
+        ON CONFLICT (dedupe_key) DO NOTHING
+        RETURNING id
+        """,
+        {
+            "sender": sender or pick_gateway(to),
+            "to": to,
+            "message": message,
+            "template": template,
+            "rid": reseller_id,
+            "cid": customer_id,
+            "key": dedupe_key,
+            "max_attempts": Config.WA_MAX_ATTEMPTS,
+        },
+        commit=True,
+    )
+    return row["id"] if row else None
+
+
+def enqueue_many(messages: Iterable[Dict[str, Any]]) -> int:
+    """
+    Masukkan banyak pesan dalam satu INSERT.
+
+    Tiap item: {"to", "message", "template"} + opsional "dedupe_key",
+    "reseller_id", "customer_id", "sender".
+    Return jumlah pesan yang benar-benar masuk (yang dedupe_key-nya sudah
+    ada tidak dihitung).
+    """
+    values = [
+        (
+            m.get("sender") or pick_gateway(m["to"]),
+            m["to"],
+            m["message"],
+            m["template"],
+            m.get("reseller_id"),
+            m.get("customer_id"),
+            m.get("dedupe_key"),
+            Config.WA_MAX_ATTEMPTS,
+        )
+        for m in messages
+        if m.get("to") and m.get("message")
+    ]
+    if not values:
+        return 0
+
+    with db.transaction() as cur:
+        inserted = execute_values(
+            cur,
+            """
+            INSERT INTO wa_outbox
+                (sender, to_number, message, template, reseller_id, customer_id,
+                 dedupe_key, max_attempts)
+            VALUES %s
+            ON CONFLICT (dedupe_key) DO NOTHING
+            RETURNING id
+            """,
+            values,
+            fetch=True,
+        )
+    return len(inserted)
+
+
+# ======================================================================
+# Worker
+# ======================================================================
+
+def reclaim_stale() -> int:
+    """
+    Kembalikan row 'sending' yang tertinggal (worker mati di tengah kirim)
+    ke antrian, atau 'failed' kalau jatah percobaannya sudah habis.
+    """
+    return db.execute(
+        """
+        UPDATE wa_outbox
+        SET
+            status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+            last_error = COALESCE(last_error, 'worker berhenti saat mengirim'),
+            next_attempt_at = NOW(),
+            locked_at = NULL,
+            updated_at = NOW()
+        WHERE status = 'sending'
+          AND locked_at < NOW() - make_interval(secs => %(stale)s)
+        """,
+        {"stale": STALE_SENDING_SECONDS},
+    )
+
+
+def due_senders() -> List[str]:
+    """Sender yang punya pesan siap kirim."""
+    rows = db.query_all(
+        """
+        SELECT DISTINCT sender
+        FROM wa_outbox
+        WHERE status = 'pending'
+          AND next_attempt_at <= NOW()
+        """
+    )
+    return [r["sender"] for r in rows]
+
+
+def _bucket_params(sender: str) -> Tuple[float, int]:
+    """(token per detik, burst) untuk gateway `sender`."""
+    gw = get_gateway(sender)
+    per_minute = gw["rate_per_minute"] if gw else Config.WA_RATE_PER_MINUTE
+    burst = gw["burst"] if gw else Config.WA_RATE_BURST
+    return per_minute / 60.0, max(1, burst)
+
+
+def take_tokens(sender: str, want: int) -> int:
+    """
+    Ambil maksimal `want` token dari bucket sender (row dikunci selama
+    transaksi, jadi aman dipanggil dari beberapa proses).
+    Return jumlah token yang didapat (bisa 0).
+    """
+    rate, burst = _bucket_params(sender)
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            INSERT INTO wa_sender_buckets (sender, tokens, refilled_at)
+            VALUES (%(sender)s, %(burst)s, NOW())
+            ON CONFLICT (sender) DO NOTHING
+            """,
+            {"sender": sender, "burst": burst},
+        )
+        cur.execute(
+            """
+            WITH b AS (
+                SELECT
+                    sender,
+                    LEAST(
+                        %(burst)s::float8,
+                        tokens + EXTRACT(EPOCH FROM NOW() - refilled_at) * %(rate)s
+                    ) AS available
+                FROM wa_sender_buckets
+                WHERE sender = %(sender)s
+                FOR UPDATE
+            )
+            UPDATE wa_sender_buckets w
+            SET
+                tokens = b.available - LEAST(FLOOR(b.available), %(want)s),
+                refilled_at = NOW()
+            FROM b
+            WHERE w.sender = b.sender
+            RETURNING LEAST(FLOOR(b.available), %(want)s)::int AS granted
+            """,
+            {"sender": sender, "burst": burst, "rate": rate, "want": want},
+        )
+        row = cur.fetchone()
+    return max(0, row["granted"]) if row else 0
+
+
+def refund_tokens(sender: str, count: int) -> None:
+    """Kembalikan token yang tidak terpakai (row yang di-claim lebih sedikit)."""
+    if count <= 0:
+        return
+    db.execute(
+        """
+        UPDATE wa_sender_buckets
+        SET tokens = LEAST(%(burst)s::float8, tokens + %(count)s)
+        WHERE sender = %(sender)s
+        """,
+        {"sender": sender, "count": count, "burst": _bucket_params(sender)[1]},
+    )
+
+
+def claim_batch(sender: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Claim maksimal `limit` pesan siap kirim milik sender.
+    Row yang sedang di-claim worker lain dilewati (SKIP LOCKED).
+    """
+    if limit <= 0:
+        return []
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            UPDATE wa_outbox o
+            SET
+                status = 'sending',
+                attempts = o.attempts + 1,
+                locked_at = NOW(),
+                updated_at = NOW()
+            WHERE o.id IN (
+                SELECT id
+                FROM wa_outbox
+                WHERE status = 'pending'
+                  AND sender = %(sender)s
+                  AND next_attempt_at <= NOW()
+                ORDER BY next_attempt_at, id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING o.id, o.sender, o.to_number, o.message, o.template,
+                      o.attempts, o.max_attempts
+            """,
+            {"sender": sender, "limit": limit},
+        )
+        return [dict(r) for r in cur.fetchall()]
+
+
+def reroute_pending(sender: str, limit: int = 1000) -> int:
+    """
+    Pindahkan pesan 'pending' milik gateway `sender` (sedang down, atau
+    sudah tidak ada di WA_GATEWAYS) ke gateway sehat berikutnya untuk
+    nomor masing-masing. Return jumlah pesan yang dipindahkan.
+    """
+    moved = 0
+    with db.transaction() as cur:
+        cur.execute(
+            """
+            SELECT id, to_number
+            FROM wa_outbox
+            WHERE status = 'pending'
+              AND sender = %(sender)s
+            ORDER BY next_attempt_at, id
+            LIMIT %(limit)s
+            FOR UPDATE SKIP LOCKED
+            """,
+            {"sender": sender, "limit": limit},
+        )
+        updates = []
+        for row in cur.fetchall():
+            target = pick_gateway(row["to_number"], exclude=[sender])
+            if target != sender and gateway_healthy(target):
+                updates.append((row["id"], target))
+        if updates:
+            execute_values(
+                cur,
+                """
+                UPDATE wa_outbox o
+                SET sender = v.sender, updated_at = NOW()
+                FROM (VALUES %s) AS v (id, sender)
+                WHERE o.id = v.id
+                """,
+                updates,
+            )
+            moved = len(updates)
+    return moved
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff eksponensial (WA_RETRY_BASE_DELAY x 2^(n-1), maks WA_RETRY_MAX_DELAY) +/- 20% jitter."""
+    delay = min(
+        Config.WA_RETRY_MAX_DELAY,
+        Config.WA_RETRY_BASE_DELAY * (2 ** max(0, attempts - 1)),
+    )
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _mark_sent(row_id: int, response: Dict[str, Any]) -> None:
+    db.execute(
+        """
+        UPDATE wa_outbox
+        SET
+            status = 'sent',
+            sent_at = NOW(),
+            locked_at = NULL,
+            last_error = NULL,
+            provider_response = %(resp)s::jsonb,
+            updated_at = NOW()
+        WHERE id = %(id)s
+        """,
+        {"id": row_id, "resp": json.dumps(response, default=str)},
+    )
+
+
+def _mark_failed(
+    row: Dict[str, Any],
+    error: str,
+    permanent: bool,
+    reroute_to: Optional[str] = None,
+) -> str:
+    """
+    Catat kegagalan kirim. reroute_to = gateway lain untuk percobaan
+    berikutnya (failover): dicoba lagi segera tanpa backoff.
+    """
+    status = "failed" if permanent or row["attempts"] >= row["max_attempts"] else "pending"
+    if status == "pending" and reroute_to:
+        delay = 0.0
+    elif status == "pending":
+        delay = retry_delay(row["attempts"])
+    else:
+        delay = 0.0
+    db.execute(
+        """
+        UPDATE wa_outbox
+        SET
+            status = %(status)s,
+            sender = COALESCE(%(sender)s, sender),
+            next_attempt_at = NOW() + make_interval(secs => %(delay)s),
+            locked_at = NULL,
+            last_error = %(error)s,
+            updated_at = NOW()
+        WHERE id = %(id)s
+        """,
+        {
+            "id": row["id"],
+            "status": status,
+            "sender": reroute_to if status == "pending" else None,
+            "delay": delay,
+            "error": error[:1000],
+        },
+    )
+    return status
+
+
+def deliver_batch(
+    rows: List[Dict[str, Any]],
+    sender: str,
+    concurrency: Optional[int] = None,
+) -> List[str]:
+    """
+    Kirim row hasil claim_batch lewat gateway `sender` (paralel, lewat
+    wa_client.send_many) dan catat hasilnya. Laju sudah dibatasi
+    take_tokens(), jadi send_many dipanggil tanpa rate.
+
+    Kalau gagal karena gatewaynya bermasalah (koneksi, HTTP 429/5xx),
+    pesan dialihkan ke gateway sehat berikutnya untuk nomor itu.
+    Return status akhir per row: 'sent', 'pending' (dijadwalkan ulang /
+    dialihkan) atau 'failed'.
+    """
+    results = send_many(
+        ({"id": row["id"], "to": row["to_number"], "message": row["message"]} for row in rows),
+        concurrency=concurrency or Config.WA_WORKER_THREADS,
+        gateway=sender,
+    )
+    statuses: List[str] = []
+    for row, res in zip(rows, results):
+        if res["ok"]:
+            _mark_sent(row["id"], res["response"] or {})
+            statuses.append("sent")
+            continue
+        reroute_to = None
+        if res["gateway_fault"]:
+            alt = pick_gateway(row["to_number"], exclude=[sender])
+            if alt != sender and gateway_healthy(alt):
+                reroute_to = alt
+        statuses.append(_mark_failed(
+            row, res["error"] or "gagal kirim",
+            permanent=res["permanent"], reroute_to=reroute_to,
+        ))
+    return statuses
+
+
+def queue_depth() -> Dict[str, int]:
+    """Jumlah pesan per status yang belum selesai (untuk metrik & halaman admin)."""
+    rows = db.query_all(
+        """
+        SELECT status, COUNT(*) AS c
+        FROM wa_outbox
+        WHERE status IN ('pending', 'sending')
+        GROUP BY status
+        """
+    )
+    depth = {"pending": 0, "sending": 0}
+    for r in rows:
+        depth[r["status"]] = r["c"]
+    return depth